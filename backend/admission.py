@@ -0,0 +1,155 @@
+"""
+Admission control for the Z.ai proxy
+Per-client and global token buckets in front of the upstream API, with a
+bounded wait queue: a request either starts now, waits for its turn (up to a
+deadline), or is rejected straight away with 429 and Retry-After.
+"""
+
+import asyncio
+import collections
+import math
+import threading
+import time
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request cannot be admitted before its deadline or the queue is full"""
+
+    def __init__(self, reason, retry_after):
+        super().__init__(f'Rate limited ({reason}), retry after {retry_after}s')
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """
+    Token bucket that hands out reservations.
+
+    take() always succeeds and may leave the bucket in debt; the returned
+    value is how long the caller must wait for its token. Waiting callers are
+    therefore served in arrival order.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        # now can predate updated when the bucket was created after the caller read the clock
+        if now > self.updated:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def wait_time(self, now, cost=1):
+        """Seconds until `cost` tokens are available, without taking them"""
+        self._refill(now)
+        missing = cost - self.tokens
+        return missing / self.rate if missing > 0 else 0.0
+
+    def take(self, now, cost=1):
+        wait = self.wait_time(now, cost)
+        self.tokens -= cost
+        return wait
+
+
+class AdmissionController:
+    """
+    Admits requests against a global bucket and a bucket per client id.
+
+    A request that would have to wait longer than max_wait, or that arrives
+    while max_queue requests are already waiting, is rejected immediately.
+    Client buckets are kept for the max_clients most recently seen clients.
+    """
+
+    def __init__(self, global_rate=10.0, global_burst=20, client_rate=1.0, client_burst=5,
+                 max_queue=100, max_wait=10.0, max_clients=10000):
+        self.global_bucket = TokenBucket(global_rate, global_burst)
+        self.client_rate = client_rate
+        self.client_burst = client_burst
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.max_clients = max_clients
+        self._clients = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._waiting = 0
+        self._counters = collections.Counter()
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def _client_bucket(self, client_id):
+        bucket = self._clients.get(client_id)
+        if bucket is None:
+            bucket = self._clients[client_id] = TokenBucket(self.client_rate, self.client_burst)
+            if len(self._clients) > self.max_clients:
+                self._clients.popitem(last=False)
+        else:
+            self._clients.move_to_end(client_id)
+        return bucket
+
+    def reserve(self, client_id):
+        """
+        Take a token from both buckets, returning the seconds to wait before starting
+        Raises AdmissionRejected (without taking anything) when the request cannot get in
+        """
+        with self._lock:
+            now = time.monotonic()
+            client_bucket = self._client_bucket(client_id)
+            wait = max(self.global_bucket.wait_time(now), client_bucket.wait_time(now))
+
+            if wait > self.max_wait:
+                self._counters['rejected_deadline'] += 1
+                raise AdmissionRejected('deadline', max(1, math.ceil(wait)))
+            if wait > 0 and self._waiting >= self.max_queue:
+                self._counters['rejected_queue_full'] += 1
+                raise AdmissionRejected('queue full', max(1, math.ceil(wait)))
+
+            self.global_bucket.take(now)
+            client_bucket.take(now)
+            self._counters['admitted'] += 1
+            if wait > 0:
+                self._counters['queued'] += 1
+                self._waiting += 1
+                self._wait_total += wait
+                self._wait_max = max(self._wait_max, wait)
+            return wait
+
+    def _done_waiting(self):
+        with self._lock:
+            self._waiting -= 1
+
+    def acquire(self, client_id):
+        """Block until the request may start (raises AdmissionRejected)"""
+        wait = self.reserve(client_id)
+        if wait > 0:
+            try:
+                time.sleep(wait)
+            finally:
+                self._done_waiting()
+
+    async def aacquire(self, client_id):
+        """asyncio variant of acquire()"""
+        wait = self.reserve(client_id)
+        if wait > 0:
+            try:
+                await asyncio.sleep(wait)
+            finally:
+                self._done_waiting()
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+            queued = counters.get('queued', 0)
+            return {
+                'queue_depth': self._waiting,
+                'max_queue': self.max_queue,
+                'max_wait_s': self.max_wait,
+                'admitted': counters.get('admitted', 0),
+                'queued': queued,
+                'rejected_queue_full': counters.get('rejected_queue_full', 0),
+                'rejected_deadline': counters.get('rejected_deadline', 0),
+                'avg_queue_wait_ms': round(self._wait_total / queued * 1000, 1) if queued else 0.0,
+                'max_queue_wait_ms': round(self._wait_max * 1000, 1),
+                'tracked_clients': len(self._clients)
+            }
@@ -0,0 +1,231 @@
+"""
+Content-addressed store for rendered diagrams (SVG/PNG)
+The key hashes everything that determines the output: source, format, theme,
+render config and renderer version. A changed input is a new key, so entries
+never go stale and ETags are simply the key. Files live on disk under a byte
+budget with LRU eviction; recently used bodies are also kept in memory.
+"""
+
+import collections
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+
+CONTENT_TYPES = {'svg': 'image/svg+xml', 'png': 'image/png'}
+
+KEY_RE = re.compile(r'^[0-9a-f]{64}$')
+
+# Next to this module rather than in whatever directory the process starts from
+DEFAULT_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'artifact-cache')
+
+def artifact_key(source, fmt, theme, config, renderer_version):
+    """Stable key over the source, format, theme, config and renderer version"""
+    material = {
+        'source': source,
+        'format': fmt,
+        'theme': theme,
+        'config': config or {},
+        'renderer': renderer_version
+    }
+    encoded = json.dumps(material, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+def etag_for(key):
+    return f'"{key}"'
+
+def etag_matches(if_none_match, etag):
+    """If-None-Match check (weak comparison, as RFC 9110 specifies for it)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    return any(tag.strip().removeprefix('W/') == etag for tag in if_none_match.split(','))
+
+
+class Artifact:
+    def __init__(self, key, fmt, body):
+        self.key = key
+        self.fmt = fmt
+        self.body = body
+
+    @property
+    def etag(self):
+        return etag_for(self.key)
+
+    @property
+    def content_type(self):
+        return CONTENT_TYPES[self.fmt]
+
+
+class ArtifactStore:
+    """
+    Disk store with an LRU byte budget and an in-memory tier for hot bodies.
+
+    Files are <directory>/<key[:2]>/<key>.<fmt>, written atomically, so worker
+    processes sharing the directory can read each other's renders. Each
+    process tracks LRU order for the files it has seen; file mtimes carry that
+    order across restarts. The directory is created by the first put().
+    """
+
+    def __init__(self, directory, max_bytes=256 * 1024 * 1024, memory_bytes=32 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.memory_bytes = memory_bytes
+        self._lock = threading.Lock()
+        self._index = collections.OrderedDict()
+        self._disk_bytes = 0
+        self._memory = collections.OrderedDict()
+        self._memory_used = 0
+        self._counters = collections.Counter()
+        self._scan()
+
+    def path(self, key, fmt):
+        return os.path.join(self.directory, key[:2], f'{key}.{fmt}')
+
+    def _scan(self):
+        """Index files left by earlier runs, oldest access first"""
+        found = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                key, _, fmt = name.partition('.')
+                if fmt in CONTENT_TYPES and KEY_RE.match(key):
+                    stat = os.stat(os.path.join(root, name))
+                    found.append((stat.st_mtime, key, fmt, stat.st_size))
+        for _, key, fmt, size in sorted(found):
+            self._index[(key, fmt)] = size
+            self._disk_bytes += size
+        self._remove(self._evict_disk())
+
+    def _evict_disk(self):
+        """Drop LRU entries over the byte budget from the index; returns their paths (lock held)"""
+        paths = []
+        while self._disk_bytes > self.max_bytes and self._index:
+            (key, fmt), size = self._index.popitem(last=False)
+            self._disk_bytes -= size
+            self._memory_forget((key, fmt))
+            paths.append(self.path(key, fmt))
+            self._counters['evictions'] += 1
+        return paths
+
+    def _remove(self, paths):
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _memory_forget(self, entry):
+        body = self._memory.pop(entry, None)
+        if body is not None:
+            self._memory_used -= len(body)
+
+    def _memory_store(self, entry, body):
+        """Keep body in memory when it fits (lock held)"""
+        if len(body) > self.memory_bytes // 4:
+            return
+        self._memory_forget(entry)
+        self._memory[entry] = body
+        self._memory_used += len(body)
+        while self._memory_used > self.memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_used -= len(evicted)
+
+    def get(self, key, fmt):
+        """Artifact for key, or None"""
+        entry = (key, fmt)
+        with self._lock:
+            body = self._memory.get(entry)
+            if body is not None:
+                self._memory.move_to_end(entry)
+                if entry in self._index:
+                    self._index.move_to_end(entry)
+                self._counters['hits_memory'] += 1
+                return Artifact(key, fmt, body)
+
+        # Not in memory: another process may have written it, so always look on disk
+        path = self.path(key, fmt)
+        try:
+            with open(path, 'rb') as f:
+                body = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                size = self._index.pop(entry, None)
+                if size is not None:
+                    self._disk_bytes -= size
+                self._counters['misses'] += 1
+            return None
+
+        with self._lock:
+            if entry in self._index:
+                self._index.move_to_end(entry)
+            else:
+                self._index[entry] = len(body)
+                self._disk_bytes += len(body)
+            self._memory_store(entry, body)
+            self._counters['hits_disk'] += 1
+            evicted = self._evict_disk()
+        self._remove(evicted)
+        return Artifact(key, fmt, body)
+
+    def put(self, key, fmt, body):
+        """Store body under key (atomically replacing any existing file); returns the Artifact"""
+        path = self.path(key, fmt)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(body)
+            os.replace(temp, path)
+        except BaseException:
+            self._remove([temp])
+            raise
+
+        entry = (key, fmt)
+        with self._lock:
+            previous = self._index.pop(entry, None)
+            if previous is not None:
+                self._disk_bytes -= previous
+            self._index[entry] = len(body)
+            self._disk_bytes += len(body)
+            self._memory_store(entry, body)
+            self._counters['stores'] += 1
+            evicted = self._evict_disk()
+        self._remove(evicted)
+        return Artifact(key, fmt, body)
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+            entries, disk_bytes = len(self._index), self._disk_bytes
+            memory_entries, memory_used = len(self._memory), self._memory_used
+        hits = counters.get('hits_memory', 0) + counters.get('hits_disk', 0)
+        lookups = hits + counters.get('misses', 0)
+        return {
+            'hits': hits,
+            'hits_memory': counters.get('hits_memory', 0),
+            'hits_disk': counters.get('hits_disk', 0),
+            'misses': counters.get('misses', 0),
+            'stores': counters.get('stores', 0),
+            'evictions': counters.get('evictions', 0),
+            'hit_rate': round(hits / lookups, 4) if lookups else 0.0,
+            'entries': entries,
+            'disk_bytes': disk_bytes,
+            'max_bytes': self.max_bytes,
+            'memory_entries': memory_entries,
+            'memory_bytes': memory_used
+        }
+
+
+def create_artifact_store_from_env():
+    """Build the store from ARTIFACT_CACHE_* environment variables (None when disabled)"""
+    if os.getenv('ARTIFACT_CACHE_ENABLED', 'true').lower() != 'true':
+        return None
+    return ArtifactStore(
+        os.getenv('ARTIFACT_CACHE_DIR') or DEFAULT_DIRECTORY,
+        max_bytes=int(os.getenv('ARTIFACT_CACHE_MAX_BYTES', 256 * 1024 * 1024)),
+        memory_bytes=int(os.getenv('ARTIFACT_CACHE_MEMORY_BYTES', 32 * 1024 * 1024))
+    )
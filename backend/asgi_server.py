@@ -0,0 +1,500 @@
+"""
+Asyncio/ASGI serving mode for the Z.ai proxy
+Streams are served by async generators on one event loop, so an open LLM
+stream costs a coroutine instead of a blocked worker thread.
+
+Run with:
+    uvicorn asgi_server:app --host 0.0.0.0 --port 3001
+
+Routes not implemented natively here fall through to the Flask app in
+server.py, so every existing endpoint keeps working in this mode.
+"""
+
+import asyncio
+import contextlib
+import json
+import os
+import time
+
+import httpx
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Mount, Route, WebSocketRoute
+
+import server
+from admission import AdmissionRejected
+from cache import cache_bypassed, cache_key
+from metrics import CONTENT_TYPE
+from hedging import AsyncAttempt
+from multiplex import StreamMultiplexer, StreamRejected
+from prompts import get_template
+from resilience import CircuitOpenError, RetryPolicy
+from singleflight import AsyncSingleFlight, AsyncStreamFanout
+from server import (build_hedge_payload, build_payload, client_id, generation_result, hedge_thinking,
+                    provider_cache_keys, record_stream, router)
+from sse import DONE, aiter_frames
+from streaming import (DONE_EVENT, CompletionAccumulator, StreamProcessor, aprocess_frames, retry_event,
+                       validation_error_event)
+from validator import StreamingValidator, validate_diagram
+
+# Async upstream client configuration
+ASYNC_MAX_CONNECTIONS = int(os.getenv('ASYNC_MAX_CONNECTIONS', 1000))
+UPSTREAM_HTTP2 = os.getenv('UPSTREAM_HTTP2', 'false').lower() == 'true'
+
+# Multiplexed WebSocket streams (/api/ws): concurrent streams per connection, initial credit per stream
+WS_MAX_STREAMS = int(os.getenv('WS_MAX_STREAMS', 32))
+WS_STREAM_WINDOW = int(os.getenv('WS_STREAM_WINDOW', 64))
+
+# Same retry settings as server.py; httpx raises its own exception types
+retry_policy = RetryPolicy(
+    retries=server.UPSTREAM_RETRIES,
+    base_delay=server.UPSTREAM_RETRY_BASE_DELAY,
+    max_delay=server.UPSTREAM_RETRY_MAX_DELAY,
+    transient=(httpx.TransportError,)
+)
+
+def create_async_client():
+    """Create the shared async upstream client (keep-alive, optional HTTP/2)"""
+    return httpx.AsyncClient(
+        http2=UPSTREAM_HTTP2,
+        limits=httpx.Limits(
+            max_connections=ASYNC_MAX_CONNECTIONS,
+            max_keepalive_connections=server.UPSTREAM_POOL_SIZE
+        ),
+        timeout=httpx.Timeout(60, connect=10)
+    )
+
+def connect_trace(provider):
+    """httpx trace hook recording new-connection setup time (TCP + TLS) in the metrics"""
+    done_event = ('connection.start_tls.complete' if provider.endpoint.startswith('https')
+                  else 'connection.connect_tcp.complete')
+    started = None
+
+    async def trace(event, info):
+        nonlocal started
+        if event == 'connection.connect_tcp.started':
+            started = time.perf_counter()
+        elif event == done_event and started is not None:
+            server.metrics.connect.observe(time.perf_counter() - started)
+
+    return trace
+
+async def open_stream(client, provider, payload):
+    """Start a streaming completion; only this part is retried (see server.open_stream)"""
+    request = client.build_request(
+        'POST',
+        provider.endpoint,
+        headers=provider.headers(),
+        json=provider.prepare(payload),
+        extensions={'trace': connect_trace(provider)}
+    )
+    response = await client.send(request, stream=True)
+
+    try:
+        response.raise_for_status()
+    except httpx.HTTPStatusError:
+        await response.aclose()
+        raise
+    return response
+
+async def stream_upstream(client, payload, extract_code=False, validate=False, diagram_type='flowchart'):
+    """Async generator yielding SSE events from a streaming Z.ai completion (see server.stream_upstream)"""
+    attempts = 1 + server.STREAM_VALIDATE_RETRIES if validate else 1
+
+    for attempt in range(1, attempts + 1):
+        validator = StreamingValidator(
+            diagram_type,
+            max_line_errors=server.STREAM_VALIDATE_MAX_LINE_ERRORS,
+            prose_limit=server.STREAM_VALIDATE_PROSE_LIMIT
+        ) if validate else None
+        processor = StreamProcessor(extract_code, validator)
+        started = time.perf_counter()
+
+        try:
+            response, provider = await router.acall(
+                lambda provider: open_stream(client, provider, payload), retry_policy
+            )
+
+            try:
+                # Forward upstream frames as raw bytes: framing is checked, payloads are never re-serialized
+                async for event in aprocess_frames(processor, aiter_frames(response.aiter_bytes())):
+                    yield event
+            finally:
+                # Cancels the upstream generation if we stopped reading early
+                await response.aclose()
+
+        except (httpx.HTTPError, CircuitOpenError) as e:
+            print(f'Z.ai Streaming Error: {e}')
+            server.metrics.record_error('stream', e)
+            yield f'data: {json.dumps({"error": str(e)})}\n\n'.encode('utf-8')
+            return
+
+        if processor.errors is None:
+            record_stream(processor, started, provider)
+            return
+
+        print(f'Z.ai stream failed validation (attempt {attempt}/{attempts}): {processor.errors}')
+        server.metrics.record_error('stream', 'ValidationFailed')
+        if attempt < attempts:
+            yield retry_event(attempt + 1, processor.errors)
+        else:
+            yield validation_error_event(processor.errors, attempts)
+            yield DONE_EVENT
+
+async def streamed_completion(client, provider, payload, attempt):
+    """Stream one completion from a provider (see server.streamed_completion); cancelled by cancelling its task"""
+    accumulator = CompletionAccumulator()
+    async with client.stream(
+        'POST',
+        provider.endpoint,
+        headers=provider.headers(),
+        json=provider.prepare(dict(payload, stream=True)),
+        timeout=30,
+        extensions={'trace': connect_trace(provider)}
+    ) as response:
+        response.raise_for_status()
+        async for _, data in aiter_frames(response.aiter_bytes()):
+            if data.strip() == DONE:
+                break
+            if accumulator.feed(data):
+                attempt.mark_first_token()
+                router.record_ttft(provider, attempt.ttft)
+
+    return accumulator.completion()
+
+async def cache_call(method, *args):
+    """Call a response cache method, in a worker thread when it may block on the SQLite tier"""
+    if server.response_cache.disk is None:
+        return method(*args)
+    return await asyncio.to_thread(method, *args)
+
+def request_host(request):
+    """Peer address of an ASGI request (None when unknown)"""
+    return request.client.host if request.client else None
+
+def retry_later_response(error, status):
+    """429/503 response for a request turned away (see server.retry_later_response)"""
+    return JSONResponse({
+        'success': False,
+        'error': str(error),
+        'retry_after': error.retry_after
+    }, status_code=status, headers={'Retry-After': str(error.retry_after)})
+
+async def read_generation_request(request):
+    """Parse and validate the shared request body, returning (fields, body, error_response)"""
+    try:
+        data = await request.json()
+    except json.JSONDecodeError:
+        data = None
+
+    if not isinstance(data, dict) or not data.get('prompt'):
+        return None, None, JSONResponse({'error': 'Prompt is required'}, status_code=400)
+
+    if not router.providers:
+        return None, None, JSONResponse(
+            {'error': 'No upstream provider configured (set ZAI_API_KEY or PROVIDERS)'}, status_code=500
+        )
+
+    return (data['prompt'], data.get('diagramType', 'flowchart'), data.get('useThinking', True)), data, None
+
+async def health(request):
+    """Health check endpoint"""
+    return JSONResponse({
+        'status': 'ok',
+        'mode': 'asgi',
+        'zai_api_key_configured': bool(server.ZAI_API_KEY),
+        'open_streams': request.app.state.open_streams,
+        'open_websockets': request.app.state.open_websockets,
+        'retries': retry_policy.stats(),
+        'providers': router.stats(),
+        'cache': server.response_cache.stats() if server.response_cache else None,
+        'coalescing': {
+            'generate': request.app.state.inflight.stats(),
+            'stream': request.app.state.stream_fanout.stats()
+        } if server.COALESCE_ENABLED else None,
+        'hedging': server.hedger.stats() if server.hedger else None,
+        'admission': server.admission.stats() if server.admission else None,
+        'artifacts': server.artifact_store.stats() if server.artifact_store else None,
+        'sessions': server.sessions.stats(),
+        'diagram_types': server.type_stats.stats()
+    })
+
+async def metrics_endpoint(request):
+    """Prometheus metrics"""
+    state = request.app.state
+    gauges = server.metrics_gauges()
+    # The sync pool and coalescers in server.py are not used by the native routes
+    gauges.pop('upstream_pool', None)
+    gauges['retries'] = retry_policy.stats()
+    if state.inflight is not None:
+        gauges['coalescing_generate'] = state.inflight.stats()
+        gauges['coalescing_stream'] = state.stream_fanout.stats()
+    gauges['asgi'] = {'open_streams': state.open_streams, 'open_websockets': state.open_websockets}
+    return Response(server.metrics.render(gauges), media_type=CONTENT_TYPE)
+
+async def generate(request):
+    """
+    Generate Mermaid diagram from natural language
+    POST /api/generate
+    Body: { "prompt": string, "diagramType": string, "useThinking": bool, "fewShot": bool }
+    """
+    fields, body, error = await read_generation_request(request)
+    if error:
+        return error
+
+    payload = build_payload(*fields, stream=False, few_shot=body.get('fewShot'))
+    state = request.app.state
+    response_cache = server.response_cache
+
+    # Identical requests coalesce whichever provider serves them; cached responses are keyed by provider
+    key = cache_key(*fields, payload)
+    if response_cache is not None and not cache_bypassed(request.headers):
+        cached = await cache_call(response_cache.get_any, provider_cache_keys(*fields, payload))
+        if cached is not None:
+            return JSONResponse(cached, headers={'X-Cache': 'HIT'})
+
+    async def attempt_upstream(provider, attempt_payload, attempt):
+        return generation_result(await streamed_completion(state.client, provider, attempt_payload, attempt))
+
+    async def fetch(provider):
+        """One upstream attempt on a provider, returning (result, time_to_first_token or None, cache key)"""
+        key = cache_key(*fields, provider.prepare(payload))
+        # The hedge goes to the next-best provider whose breaker lets it through, if any
+        hedge_provider = router.alternate(provider) if server.hedger is not None else None
+        if hedge_provider is not None:
+            hedge_payload = build_hedge_payload(*fields, few_shot=body.get('fewShot'))
+
+            async def hedge(attempt):
+                # Admitted and recorded by the hedge provider's breaker like any other call
+                return await router.acall_on(
+                    hedge_provider,
+                    lambda: attempt_upstream(hedge_provider, hedge_payload, attempt),
+                    retry_policy,
+                    attempt
+                )
+
+            result, winner = await server.hedger.arun(
+                lambda attempt: attempt_upstream(provider, payload, attempt),
+                hedge,
+                lambda result: not validate_diagram(result['code'], get_template(fields[1]).diagram_type)
+            )
+            if winner.name == 'hedge':
+                # The hedge may have run without thinking: cache it as the request it actually made
+                key = cache_key(fields[0], fields[1], hedge_thinking(fields[2]),
+                                hedge_provider.prepare(hedge_payload))
+            return result, winner.ttft, key
+
+        if len(router.providers) > 1:
+            # Stream internally so the router learns this provider's time to first token
+            attempt = AsyncAttempt(provider.name)
+            return await attempt_upstream(provider, payload, attempt), attempt.ttft, key
+
+        response = await state.client.post(
+            provider.endpoint,
+            headers=provider.headers(),
+            json=provider.prepare(payload),
+            timeout=30,
+            extensions={'trace': connect_trace(provider)}
+        )
+
+        response.raise_for_status()
+        return generation_result(response.json()), None, key
+
+    async def call_upstream():
+        try:
+            # Only calls that reach Z.ai are rate limited: cache hits and coalesced waiters are free
+            await admit(client_id(request.headers, request_host(request)))
+
+            started = time.perf_counter()
+            (result, ttft, served_key), _ = await router.acall(fetch, retry_policy)
+        except Exception as e:
+            server.metrics.record_error('generate', e)
+            raise
+
+        elapsed = time.perf_counter() - started
+        server.metrics.record_generation('generate', elapsed, ttft, result['usage'])
+        server.type_stats.record(get_template(fields[1]).diagram_type, elapsed, result['usage'])
+
+        if response_cache is not None:
+            await cache_call(response_cache.set, served_key, result)
+
+        return result
+
+    try:
+        if state.inflight is not None:
+            result, shared = await state.inflight.do(key, call_upstream)
+        else:
+            result, shared = await call_upstream(), False
+
+        return JSONResponse(result, headers={
+            'X-Cache': 'MISS' if response_cache is not None else 'DISABLED',
+            'X-Coalesced': 'true' if shared else 'false'
+        })
+
+    except AdmissionRejected as e:
+        return retry_later_response(e, 429)
+
+    except CircuitOpenError as e:
+        return retry_later_response(e, 503)
+
+    except httpx.HTTPError as e:
+        print(f'Z.ai API Error: {e}')
+        return JSONResponse({
+            'success': False,
+            'error': str(e)
+        }, status_code=500)
+
+async def generate_stream(request):
+    """
+    Streaming endpoint for real-time generation
+    POST /api/generate/stream
+    Body: { "prompt": string, "diagramType": string, "useThinking": bool, "fewShot": bool,
+            "extractCode": bool, "validate": bool }
+    """
+    fields, body, error = await read_generation_request(request)
+    if error:
+        return error
+
+    state = request.app.state
+
+    try:
+        events = await generation_events(state, fields, body, client_id(request.headers, request_host(request)))
+    except AdmissionRejected as e:
+        return retry_later_response(e, 429)
+    except CircuitOpenError as e:
+        return retry_later_response(e, 503)
+
+    return StreamingResponse(
+        counted_stream(state, events, 'stream'),
+        media_type='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'Connection': 'keep-alive'
+        }
+    )
+
+async def generate_ws(websocket):
+    """
+    Many concurrent streaming generations over one connection
+    WS /api/ws (message protocol in multiplex.py)
+    """
+    await websocket.accept()
+    state = websocket.app.state
+    client = client_id(websocket.headers, request_host(websocket))
+
+    async def start(message):
+        """Checks /api/generate/stream makes before streaming, reported per stream instead of per request"""
+        if not message.get('prompt'):
+            raise StreamRejected('Prompt is required')
+        if not router.providers:
+            raise StreamRejected('No upstream provider configured (set ZAI_API_KEY or PROVIDERS)', 500)
+
+        fields = (message['prompt'], message.get('diagramType', 'flowchart'), message.get('useThinking', True))
+        try:
+            # Not shared: credit flow control and cancel must reach this stream's upstream request
+            events = await generation_events(state, fields, message, client, share=False)
+        except AdmissionRejected as e:
+            raise StreamRejected(str(e), 429, e.retry_after)
+        except CircuitOpenError as e:
+            raise StreamRejected(str(e), 503, e.retry_after)
+        return counted_stream(state, events, 'ws')
+
+    multiplexer = StreamMultiplexer(websocket.send_text, start, max_streams=WS_MAX_STREAMS, window=WS_STREAM_WINDOW)
+    state.open_websockets += 1
+    try:
+        async for text in websocket.iter_text():
+            await multiplexer.handle(text)
+    finally:
+        state.open_websockets -= 1
+        await multiplexer.close()
+
+async def admit(client):
+    """Take an admission token for a call about to go upstream (see server.admit)"""
+    if router.all_open():
+        raise CircuitOpenError(router.retry_after())
+    if server.admission is not None:
+        await server.admission.aacquire(client)
+
+async def generation_events(state, fields, body, client, share=True):
+    """
+    SSE event bytes for one streaming generation, shared with identical in-flight streams
+    Joining a stream is free; starting one takes an admission token (raises AdmissionRejected
+    or CircuitOpenError). share=False always starts a stream of its own, which the caller can
+    pause and close without affecting anyone else.
+    """
+    payload = build_payload(*fields, stream=True, few_shot=body.get('fewShot'))
+    extract_code = bool(body.get('extractCode', False))
+    validate = bool(body.get('validate', server.STREAM_VALIDATE))
+    diagram_type = get_template(fields[1]).diagram_type
+
+    def start():
+        return stream_upstream(state.client, payload, extract_code, validate, diagram_type)
+
+    if state.stream_fanout is None or not share:
+        await admit(client)
+        return start()
+
+    key = cache_key(*fields, payload)
+    key += (':code' if extract_code else '') + (':valid' if validate else '')
+    events = state.stream_fanout.join(key)
+    if events is None:
+        try:
+            await admit(client)
+        except (AdmissionRejected, CircuitOpenError):
+            # An identical request may have started the stream meanwhile
+            events = state.stream_fanout.join(key)
+            if events is None:
+                raise
+            return events
+        events = state.stream_fanout.subscribe(key, start)
+    return events
+
+async def counted_stream(state, events, endpoint):
+    """Pass events through, counting the open stream and recording how long it stayed open"""
+    state.open_streams += 1
+    started = time.perf_counter()
+    try:
+        async for event in events:
+            yield event
+    finally:
+        state.open_streams -= 1
+        server.metrics.sse_duration.observe(time.perf_counter() - started, endpoint)
+        # Close the upstream generator now rather than when it is garbage collected
+        await events.aclose()
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    app.state.client = create_async_client()
+    app.state.open_streams = 0
+    app.state.open_websockets = 0
+    app.state.inflight = AsyncSingleFlight() if server.COALESCE_ENABLED else None
+    app.state.stream_fanout = AsyncStreamFanout() if server.COALESCE_ENABLED else None
+    try:
+        yield
+    finally:
+        await app.state.client.aclose()
+
+app = Starlette(
+    routes=[
+        Route('/health', health, methods=['GET']),
+        Route('/metrics', metrics_endpoint, methods=['GET']),
+        Route('/api/generate', generate, methods=['POST']),
+        Route('/api/generate/stream', generate_stream, methods=['POST']),
+        WebSocketRoute('/api/ws', generate_ws),
+        # Everything else is served by the Flask app for compatibility
+        Mount('/', app=WSGIMiddleware(server.app))
+    ],
+    middleware=[
+        Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'])
+    ],
+    lifespan=lifespan
+)
+
+if __name__ == '__main__':
+    import uvicorn
+
+    port = int(os.getenv('PORT', 3001))
+    uvicorn.run(app, host='0.0.0.0', port=port)
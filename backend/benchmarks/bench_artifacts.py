@@ -0,0 +1,84 @@
+"""
+Benchmark: repeat diagram exports through the content-addressed artifact store
+
+For each flowchart in the repository (and a synthetic 1000-node graph),
+compares a full render with a memory hit, a disk hit (fresh store over the
+same directory, as after a restart or from another worker) and the ETag check
+that answers a conditional request with 304 without touching the store.
+
+Usage:
+    python benchmarks/bench_artifacts.py [--iterations 2000] [--json results.json]
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from artifacts import ArtifactStore, artifact_key, etag_for, etag_matches  # noqa: E402
+from renderer import RENDERER_VERSION, render_svg  # noqa: E402
+
+from bench_render import PROJECT_ROOT, SAMPLES, dag_source  # noqa: E402
+
+
+def per_call(fn, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--iterations', type=int, default=2000)
+    parser.add_argument('--json', help='Write results to this file')
+    args = parser.parse_args()
+
+    cases = []
+    for name in SAMPLES:
+        with open(os.path.join(PROJECT_ROOT, name), encoding='utf-8') as f:
+            cases.append((name, f.read()))
+    cases.append(('dag-1000', dag_source(1000, 7)))
+
+    print(f'{"case":<34} {"render":>10} {"memory hit":>11} {"disk hit":>10} {"304 check":>10} {"KB":>7}')
+    rows = []
+    with tempfile.TemporaryDirectory() as directory:
+        store = ArtifactStore(directory)
+        for name, source in cases:
+            key = artifact_key(source, 'svg', 'default', {}, RENDERER_VERSION)
+            renders = max(1, min(20, args.iterations // 100))
+            render = per_call(lambda: render_svg(source), renders)
+            store.put(key, 'svg', render_svg(source).encode('utf-8'))
+            memory = per_call(lambda: store.get(key, 'svg'), args.iterations)
+
+            # A store without the memory tier reads the file every time
+            disk_store = ArtifactStore(directory, memory_bytes=0)
+            disk = per_call(lambda: disk_store.get(key, 'svg'), args.iterations)
+
+            etag = etag_for(key)
+            conditional = per_call(
+                lambda: etag_matches(etag, etag_for(artifact_key(source, 'svg', 'default', {}, RENDERER_VERSION))),
+                args.iterations
+            )
+            size = len(store.get(key, 'svg').body)
+            row = {
+                'case': name,
+                'render_us': round(render * 1e6, 1),
+                'memory_hit_us': round(memory * 1e6, 2),
+                'disk_hit_us': round(disk * 1e6, 2),
+                'conditional_us': round(conditional * 1e6, 2),
+                'bytes': size
+            }
+            rows.append(row)
+            print(f'{name:<34} {render * 1e3:>8.2f}ms {memory * 1e6:>9.2f}us {disk * 1e6:>8.2f}us '
+                  f'{conditional * 1e6:>8.2f}us {size / 1024:>7.1f}')
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(rows, f, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,187 @@
+"""
+Benchmark: diagram_parser.py throughput and memory on synthetic diagrams of every graph-like type
+Generates a diagram with --edges edges (100k by default) for each type, parses
+it --repeat times and reports the best MB/s, then parses once more under
+tracemalloc to measure the memory the parsed Diagram keeps (source text
+excluded), per node and per edge. flowchart.py's object tree is measured on
+the same flowchart source for comparison, and the repository's
+test-diagram-*.mmd corpus is parsed as a sanity check.
+
+Usage:
+    python benchmarks/bench_parser.py [--edges 100000] [--repeat 3] [--json results.json]
+"""
+
+import argparse
+import gc
+import glob
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from diagram_parser import parse_diagram  # noqa: E402
+from flowchart import parse_flowchart  # noqa: E402
+
+PROJECT_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+
+SHAPES = ('[Step {}]', '(Task {})', '{{Check {}}}', '([Term {}])', '')
+
+def flowchart_source(edges, rng):
+    """~2 edges per node; every node declared once with a label, 10% of edges labelled, 50 subgraphs"""
+    count = edges // 2
+    lines = ['flowchart LR']
+    per_group = -(-count // 50)
+    for g in range(50):
+        lines.append(f'    subgraph G{g}["Group {g}"]')
+        for i in range(g * per_group, min(count, (g + 1) * per_group)):
+            lines.append(f'        N{i}' + SHAPES[i % len(SHAPES)].format(i))
+        lines.append('    end')
+    for i in range(edges):
+        source, target = rng.randrange(count), rng.randrange(count)
+        if i % 10 == 0:
+            lines.append(f'    N{source} -->|yes| N{target}')
+        elif i % 10 == 1:
+            lines.append(f'    N{source} -.-> N{target}')
+        else:
+            lines.append(f'    N{source} --> N{target}')
+    return '\n'.join(lines)
+
+def sequence_source(edges, rng):
+    names = [f'P{i}' for i in range(200)]
+    lines = ['sequenceDiagram'] + [f'    participant {name} as Service {name}' for name in names]
+    for i in range(edges):
+        if i % 1000 == 0:
+            lines.append('    loop Batch')
+        lines.append(f'    {rng.choice(names)}->>{rng.choice(names)}: request {i % 50}')
+        if i % 1000 == 999:
+            lines.append('    end')
+    if edges % 1000:
+        lines.append('    end')
+    return '\n'.join(lines)
+
+def state_source(edges, rng):
+    count = edges // 2
+    lines = ['stateDiagram-v2', '    [*] --> S0']
+    lines += [f'    S{rng.randrange(count)} --> S{rng.randrange(count)} : event{i % 40}' for i in range(edges - 1)]
+    return '\n'.join(lines)
+
+def class_source(edges, rng):
+    count = edges // 2
+    lines = ['classDiagram']
+    for i in range(0, count, 10):
+        lines += [f'    class C{i} {{', '        +String name', '        +run() bool', '    }']
+    operators = ('<|--', '*--', 'o--', '-->', '..>', '..|>')
+    lines += [f'    C{rng.randrange(count)} {operators[i % 6]} C{rng.randrange(count)}' for i in range(edges)]
+    return '\n'.join(lines)
+
+def er_source(edges, rng):
+    count = edges // 2
+    cardinalities = ('||--o{', '}|--|{', '|o--||', '}o..o{')
+    lines = ['erDiagram']
+    lines += [f'    E{rng.randrange(count)} {cardinalities[i % 4]} E{rng.randrange(count)} : rel{i % 20}'
+              for i in range(edges)]
+    return '\n'.join(lines)
+
+def sankey_source(edges, rng):
+    count = edges // 4
+    lines = ['sankey-beta', '']
+    lines += [f'Node {rng.randrange(count)},Node {rng.randrange(count)},{rng.randrange(1, 5000)}' for _ in range(edges)]
+    return '\n'.join(lines)
+
+def mindmap_source(edges, rng):
+    """A tree with `edges` edges, up to 6 levels deep"""
+    lines = ['mindmap', '  root((Root))']
+    depth = 1
+    for i in range(edges):
+        depth = max(1, min(6, depth + rng.choice((-1, 0, 1))))
+        lines.append('  ' * (depth + 1) + (f'n{i}[Topic {i}]' if i % 3 == 0 else f'Topic {i}'))
+    return '\n'.join(lines)
+
+GENERATORS = {
+    'flowchart': flowchart_source,
+    'sequence': sequence_source,
+    'state': state_source,
+    'class': class_source,
+    'er': er_source,
+    'sankey': sankey_source,
+    'mindmap': mindmap_source
+}
+
+def best_time(parse, source, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        parse(source)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def retained_bytes(parse, source):
+    """Bytes still allocated after parsing, i.e. the size of the returned tree"""
+    gc.collect()
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    result = parse(source)
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+    return result, size
+
+def measure(name, parse, source, repeat, counts):
+    seconds = best_time(parse, source, repeat)
+    result, size = retained_bytes(parse, source)
+    nodes, edges = counts(result)
+    row = {
+        'parser': name,
+        'source_bytes': len(source.encode('utf-8')),
+        'nodes': nodes,
+        'edges': edges,
+        'seconds': round(seconds, 4),
+        'mb_per_s': round(len(source.encode('utf-8')) / seconds / 1e6, 2),
+        'retained_bytes': size,
+        'bytes_per_node': round(size / max(nodes, 1), 1),
+        'bytes_per_edge': round(size / max(edges, 1), 1)
+    }
+    print(f'{name:<26} {row["source_bytes"] / 1e6:>7.2f} {nodes:>8} {edges:>8} {seconds:>8.3f}s '
+          f'{row["mb_per_s"]:>7.2f} {size / 1e6:>9.2f} {row["bytes_per_node"]:>9.1f} {row["bytes_per_edge"]:>9.1f}')
+    return row
+
+def diagram_counts(diagram):
+    return len(diagram.nodes), len(diagram.edges)
+
+def flowchart_counts(chart):
+    return len(chart.nodes), len(chart.edges)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--edges', type=int, default=100000, help='Edges per synthetic diagram')
+    parser.add_argument('--repeat', type=int, default=3, help='Timed parses per diagram (best is reported)')
+    parser.add_argument('--json', help='Write results to this file')
+    args = parser.parse_args()
+
+    print(f'{"parser":<26} {"MB":>7} {"nodes":>8} {"edges":>8} {"time":>9} {"MB/s":>7} {"kept MB":>9} '
+          f'{"B/node":>9} {"B/edge":>9}')
+    rows = []
+    for kind, generate in GENERATORS.items():
+        source = generate(args.edges, random.Random(7))
+        rows.append(dict(measure(kind, parse_diagram, source, args.repeat, diagram_counts), type=kind))
+        if kind == 'flowchart':
+            rows.append(dict(measure('flowchart (flowchart.py)', parse_flowchart, source, args.repeat,
+                                     flowchart_counts), type=kind))
+
+    corpus = sorted(glob.glob(os.path.join(PROJECT_ROOT, 'test-diagram-*.mmd')))
+    start = time.perf_counter()
+    for path in corpus:
+        with open(path, encoding='utf-8') as f:
+            parse_diagram(f.read())
+    print(f'Parsed the {len(corpus)} test-diagram-*.mmd files in {(time.perf_counter() - start) * 1000:.1f} ms')
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(rows, f, indent=2)
+
+if __name__ == '__main__':
+    main()
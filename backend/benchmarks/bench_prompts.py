@@ -0,0 +1,137 @@
+"""
+Per-diagram-type prompt measurements: tokens and latency
+
+Offline (default): system prompt size and max_tokens budget per type, and the
+cost of building a prompt per call versus looking up a precompiled template.
+
+Online (--server): sends one sample request per type (and repeat) to a running
+backend with the cache bypassed, with and without few-shot examples, and
+reports usage tokens and latency per type.
+
+Usage:
+    python benchmarks/bench_prompts.py
+    python benchmarks/bench_prompts.py --server http://localhost:3001 --repeat 3 --json results.json
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import requests  # noqa: E402
+
+from prompts import BASE_PROMPT, TYPE_SPECS, max_tokens_for, system_prompt_for  # noqa: E402
+
+SAMPLE_PROMPTS = {
+    'flowchart': 'User login with password reset and two-factor authentication',
+    'sequence': 'Browser, API gateway and auth service exchanging an OAuth token',
+    'class': 'Domain model for an online bookstore with orders, customers and books',
+    'state': 'Lifecycle of a support ticket from open to closed',
+    'er': 'Database for a school: students, courses, enrollments and teachers',
+    'gantt': 'Two-month release plan with design, build, test and launch phases',
+    'architecture': 'Web app with CDN, load balancer, API servers, cache and database',
+    'block': 'Compiler pipeline: lexer, parser, optimizer, code generator',
+    'mindmap': 'Topics to cover in an introduction to machine learning',
+    'xychart': 'Monthly active users over one year',
+    'sankey': 'Household budget flowing from income into expense categories',
+    'quadrant': 'Feature ideas by effort versus impact',
+    'treemap': 'Company budget split by department and team',
+    'kanban': 'Sprint board for a mobile app team',
+}
+
+LEGACY_MAX_TOKENS = 2000
+
+def estimate_tokens(text):
+    """Rough token estimate (~4 characters per token for English and code)"""
+    return max(1, round(len(text) / 4))
+
+def legacy_build(diagram_type):
+    """Previous build_system_prompt(): rebuilds every string on each call"""
+    type_specific = {name: spec.instructions for name, spec in TYPE_SPECS.items()}
+    return f"{BASE_PROMPT}\n\n{type_specific.get(diagram_type, type_specific['flowchart'])}"
+
+def offline_report():
+    print(f'{"type":<13} {"prompt tok":>10} {"few-shot tok":>12} {"max_tokens":>10} {"thinking":>9} {"legacy":>7}')
+    for diagram_type in TYPE_SPECS:
+        print(f'{diagram_type:<13} '
+              f'{estimate_tokens(system_prompt_for(diagram_type, False)):>10} '
+              f'{estimate_tokens(system_prompt_for(diagram_type, True)):>12} '
+              f'{max_tokens_for(diagram_type, False):>10} '
+              f'{max_tokens_for(diagram_type, True):>9} '
+              f'{LEGACY_MAX_TOKENS:>7}')
+
+    iterations = 200000
+    types = list(TYPE_SPECS)
+    for label, fn in (('per-call build', legacy_build), ('precompiled', system_prompt_for)):
+        start = time.perf_counter()
+        for i in range(iterations):
+            fn(types[i % len(types)])
+        elapsed = time.perf_counter() - start
+        print(f'{label:<15} {elapsed / iterations * 1e9:8.0f} ns/prompt')
+
+def online_report(server, repeat, use_thinking):
+    rows = []
+    for diagram_type, prompt in SAMPLE_PROMPTS.items():
+        for few_shot in (False, True):
+            latencies = []
+            completion = []
+            prompt_tokens = []
+            errors = 0
+            for _ in range(repeat):
+                start = time.perf_counter()
+                try:
+                    response = requests.post(
+                        f'{server}/api/generate',
+                        json={'prompt': prompt, 'diagramType': diagram_type,
+                              'useThinking': use_thinking, 'fewShot': few_shot},
+                        headers={'X-Cache-Bypass': '1'},
+                        timeout=120
+                    )
+                    response.raise_for_status()
+                    usage = response.json().get('usage') or {}
+                except requests.exceptions.RequestException:
+                    errors += 1
+                    continue
+                latencies.append(time.perf_counter() - start)
+                completion.append(usage.get('completion_tokens') or 0)
+                prompt_tokens.append(usage.get('prompt_tokens') or 0)
+
+            row = {
+                'type': diagram_type,
+                'few_shot': few_shot,
+                'requests': repeat,
+                'errors': errors,
+                'max_tokens': max_tokens_for(diagram_type, use_thinking),
+                'median_latency_ms': round(statistics.median(latencies) * 1000, 1) if latencies else None,
+                'avg_prompt_tokens': round(statistics.mean(prompt_tokens), 1) if prompt_tokens else None,
+                'avg_completion_tokens': round(statistics.mean(completion), 1) if completion else None
+            }
+            rows.append(row)
+            print(f'{diagram_type:<13} few-shot={str(few_shot):<5} '
+                  f'latency={row["median_latency_ms"]} ms  prompt={row["avg_prompt_tokens"]}  '
+                  f'completion={row["avg_completion_tokens"]}  budget={row["max_tokens"]}  errors={errors}')
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--server', help='Backend base URL, e.g. http://localhost:3001')
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--no-thinking', action='store_true')
+    parser.add_argument('--json', help='Write online results to this file')
+    args = parser.parse_args()
+
+    offline_report()
+
+    if args.server:
+        print()
+        rows = online_report(args.server.rstrip('/'), args.repeat, not args.no_thinking)
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump(rows, f, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+"""
+Benchmark: server-side flowchart rendering (parse, layout, SVG) on synthetic graphs
+
+Generates flowcharts of increasing size in three shapes: a tree, a layered
+DAG with some back edges (cycles) and long edges, and the same DAG grouped
+into subgraphs. Reports the time spent parsing, laying out and writing SVG,
+and the SVG size. The repository's test-diagram-flowchart.mmd and
+test-coldvox-knowledge-graph.mmd are included as real-world baselines.
+
+Usage:
+    python benchmarks/bench_render.py [--sizes 100,1000,5000] [--repeat 3] [--json results.json]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from flowchart import parse_flowchart  # noqa: E402
+from renderer import chart_svg, layout_chart  # noqa: E402
+
+PROJECT_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+SAMPLES = ('test-diagram-flowchart.mmd', 'test-coldvox-knowledge-graph.mmd')
+
+
+def tree_source(count, seed):
+    """Random tree: every node hangs off an earlier one"""
+    rng = random.Random(seed)
+    lines = ['flowchart TD']
+    for i in range(1, count):
+        parent = rng.randrange(max(0, i - 50), i)
+        lines.append(f'    N{parent}[Step {parent}] --> N{i}[Step {i}]')
+    return '\n'.join(lines)
+
+def dag_source(count, seed, clusters=0):
+    """Layered graph, ~2 edges per node: mostly adjacent layers, some long edges, ~2% short back edges"""
+    rng = random.Random(seed)
+    width = max(2, int(count ** 0.5))
+    lines = ['flowchart LR']
+    if clusters:
+        per_cluster = -(-count // clusters)
+        for c in range(clusters):
+            lines.append(f'    subgraph G{c}["Group {c}"]')
+            lines.extend(f'        N{i}(Task {i})' for i in range(c * per_cluster, min(count, (c + 1) * per_cluster)))
+            lines.append('    end')
+    for i in range(width, count):
+        for _ in range(2):
+            if rng.random() < 0.02:
+                # Loop back from up to three layers further on (retry branches)
+                target = min(count - 1, i + rng.randint(1, 3 * width))
+                lines.append(f'    N{target} -.-> N{i}')
+            else:
+                span = 1 if rng.random() < 0.85 else rng.randint(2, 4)
+                layer = i // width - span
+                if layer >= 0:
+                    lines.append(f'    N{layer * width + rng.randrange(width)} --> N{i}')
+    return '\n'.join(lines)
+
+def measure(source, repeat):
+    """Best-of-repeat timings (seconds) for each stage"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        chart = parse_flowchart(source)
+        parsed = time.perf_counter()
+
+        layout, lines = layout_chart(chart)
+        laid_out = time.perf_counter()
+
+        svg = chart_svg(chart, layout, lines)
+        rendered = time.perf_counter()
+
+        timings = {
+            'parse': parsed - start,
+            'layout': laid_out - parsed,
+            'svg': rendered - laid_out,
+            'total': rendered - start
+        }
+        if best is None or timings['total'] < best['total']:
+            best = timings
+    return chart, svg, best
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sizes', default='100,1000,5000', help='Comma-separated node counts')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--json', help='Write results to this file')
+    args = parser.parse_args()
+
+    cases = []
+    for name in SAMPLES:
+        with open(os.path.join(PROJECT_ROOT, name), encoding='utf-8') as f:
+            cases.append((name, f.read()))
+    for size in (int(value) for value in args.sizes.split(',')):
+        cases.append((f'tree-{size}', tree_source(size, args.seed)))
+        cases.append((f'dag-{size}', dag_source(size, args.seed)))
+        cases.append((f'clustered-{size}', dag_source(size, args.seed, clusters=max(2, size // 100))))
+
+    print(f'{"case":<34} {"nodes":>6} {"edges":>6} {"parse ms":>9} {"layout ms":>10} {"svg ms":>8} '
+          f'{"total ms":>9} {"svg KB":>8}')
+    rows = []
+    for name, source in cases:
+        chart, svg, timings = measure(source, args.repeat)
+        row = {
+            'case': name,
+            'nodes': len(chart.nodes),
+            'edges': len(chart.edges),
+            'subgraphs': len(chart.subgraphs),
+            'svg_bytes': len(svg.encode('utf-8')),
+            **{f'{stage}_ms': round(seconds * 1000, 2) for stage, seconds in timings.items()}
+        }
+        rows.append(row)
+        print(f'{name:<34} {row["nodes"]:>6} {row["edges"]:>6} {row["parse_ms"]:>9.1f} {row["layout_ms"]:>10.1f} '
+              f'{row["svg_ms"]:>8.1f} {row["total_ms"]:>9.1f} {row["svg_bytes"] / 1024:>8.1f}')
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(rows, f, indent=2)
+
+if __name__ == '__main__':
+    main()
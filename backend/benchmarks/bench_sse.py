@@ -0,0 +1,125 @@
+"""
+Microbenchmark: SSE forwarding in generate_stream (chunks per second)
+
+Compares the previous line-based path (decode, json.loads, json.dumps per
+chunk) with the byte-level passthrough in sse.py, on the same synthetic
+upstream stream cut at arbitrary network-read boundaries.
+
+Usage:
+    python benchmarks/bench_sse.py [--chunks 50000] [--read-size 1400]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from sse import DONE, encode_data, iter_frames, looks_like_json_object  # noqa: E402
+
+
+def build_stream(count):
+    """Synthetic Z.ai stream: reasoning and content deltas, then [DONE]"""
+    frames = []
+    for i in range(count):
+        field = 'reasoning_content' if i % 3 == 0 else 'content'
+        chunk = {
+            'id': 'chatcmpl-bench',
+            'created': 1760000000,
+            'model': 'glm-4.6',
+            'choices': [{'index': 0, 'delta': {field: f'  N{i}[Node {i}] --> N{i + 1}\n'}}]
+        }
+        frames.append(b'data: ' + json.dumps(chunk).encode('utf-8') + b'\n\n')
+    frames.append(b'data: [DONE]\n\n')
+    return b''.join(frames)
+
+
+def split_reads(stream, read_size):
+    """Cut the stream into network-read sized pieces, ignoring frame boundaries"""
+    rng = random.Random(42)
+    reads = []
+    position = 0
+    while position < len(stream):
+        size = rng.randint(read_size // 2, read_size * 3 // 2)
+        reads.append(stream[position:position + size])
+        position += size
+    return reads
+
+
+def iter_lines(reads):
+    """Equivalent of requests' Response.iter_lines() over the same reads"""
+    pending = b''
+    for chunk in reads:
+        lines = (pending + chunk).split(b'\n')
+        pending = lines.pop()
+        yield from lines
+    if pending:
+        yield pending
+
+
+def forward_legacy(reads):
+    """Previous path: decode every line, parse and re-serialize every chunk"""
+    out = 0
+    for line in iter_lines(reads):
+        if line:
+            line = line.decode('utf-8')
+            if line.startswith('data: '):
+                data = line[6:].strip()
+                if data == '[DONE]':
+                    out += 1
+                    break
+                try:
+                    parsed = json.loads(data)
+                    event = f'data: {json.dumps(parsed)}\n\n'.encode('utf-8')
+                    out += 1
+                except json.JSONDecodeError:
+                    pass
+    return out
+
+
+def forward_passthrough(reads):
+    """Current path: incremental byte parser, raw frames forwarded"""
+    out = 0
+    for _, data in iter_frames(reads):
+        if data.strip() == DONE:
+            out += 1
+            break
+        if looks_like_json_object(data):
+            event = encode_data(data)
+            out += 1
+    return out
+
+
+def measure(fn, reads, repeat):
+    best = float('inf')
+    forwarded = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        forwarded = fn(reads)
+        best = min(best, time.perf_counter() - start)
+    return forwarded, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--chunks', type=int, default=50000)
+    parser.add_argument('--read-size', type=int, default=1400)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    reads = split_reads(build_stream(args.chunks), args.read_size)
+
+    results = {}
+    for name, fn in (('legacy', forward_legacy), ('passthrough', forward_passthrough)):
+        forwarded, seconds = measure(fn, reads, args.repeat)
+        results[name] = forwarded / seconds
+        print(f'{name:<12} {forwarded:>8} chunks  {seconds * 1000:8.1f} ms  {results[name]:>12,.0f} chunks/s')
+
+    print(f'speedup      {results["passthrough"] / results["legacy"]:.2f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+Benchmark: validate_corpus.py throughput on a synthetic corpus of .mmd and Markdown files
+Copies the repository's test-diagram-*.mmd files --files times into a
+temporary directory (every fourth copy wrapped in a Markdown document with
+two fenced blocks, every tenth with an error injected), then validates it:
+cold with one worker and with --workers, warm (nothing changed, so every
+result comes from the index) and after touching 10% of the files (mtime
+changed, content not: the hash check avoids revalidating them).
+
+Usage:
+    python benchmarks/bench_validate_corpus.py [--files 5000] [--workers 8] [--json results.json]
+"""
+
+import argparse
+import glob
+import io
+import json
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from validate_corpus import validate_corpus  # noqa: E402
+
+PROJECT_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+
+def make_corpus(directory, count):
+    sources = []
+    for path in sorted(glob.glob(os.path.join(PROJECT_ROOT, 'test-diagram-*.mmd'))):
+        with open(path, encoding='utf-8') as f:
+            sources.append((os.path.basename(path), f.read()))
+    files = []
+    for i in range(count):
+        name, code = sources[i % len(sources)]
+        if i % 10 == 9:
+            code += '\n    broken [unclosed\n'
+        folder = os.path.join(directory, f'part{i // 500}')
+        os.makedirs(folder, exist_ok=True)
+        if i % 4 == 3:
+            path = os.path.join(folder, f'doc{i}.md')
+            text = f'# Document {i}\n\n```mermaid\n{code}\n```\n\nText.\n\n```mermaid\n{code}\n```\n'
+        else:
+            path = os.path.join(folder, f'{i}-{name}')
+            text = code
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        files.append(path)
+    return files
+
+def run(name, directory, index, workers, full=False):
+    report = validate_corpus([directory], io.StringIO(), workers, index, full, base=directory)
+    print(f'{name:<34} {report["files"]:>7} {report["validated_files"]:>9} {report["diagrams"]:>8} '
+          f'{report["invalid"]:>7} {report["seconds"]:>8.2f}s {report["files_per_second"]:>9.0f}')
+    return dict(report, run=name, top_errors=report['top_errors'][:3], invalid_files=len(report['invalid_files']))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--files', type=int, default=5000, help='Files in the synthetic corpus')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Validation processes')
+    parser.add_argument('--json', help='Write results to this file')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        corpus = os.path.join(directory, 'corpus')
+        files = make_corpus(corpus, args.files)
+        index = os.path.join(directory, 'index.json')
+
+        print(f'{"run":<34} {"files":>7} {"validated":>9} {"diagrams":>8} {"invalid":>7} {"time":>9} {"files/s":>9}')
+        rows = [
+            run('cold, 1 worker', corpus, None, 1),
+            run(f'cold, {args.workers} workers', corpus, index, args.workers, full=True),
+            run('warm (index, nothing changed)', corpus, index, args.workers)
+        ]
+        for path in files[::10]:
+            os.utime(path)
+        rows.append(run('10% touched (mtime only)', corpus, index, args.workers))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(rows, f, indent=2)
+
+if __name__ == '__main__':
+    main()
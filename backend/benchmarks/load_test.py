@@ -0,0 +1,356 @@
+"""
+Load test for the proxy: throughput, latency percentiles, server CPU and memory
+
+Drives /api/generate and /api/generate/stream at one or more concurrency
+levels. With --spawn flask|asgi, the mock upstream (mock_upstream.py) and the
+backend are started locally so no tokens are spent; otherwise --server points
+at a running backend and --pid lets the server's CPU and memory be sampled
+(Linux /proc). Results can be saved as a JSON baseline and compared with an
+earlier one.
+
+Usage:
+    python benchmarks/load_test.py --spawn flask --concurrency 1,8,32 --requests 200 --baseline flask
+    python benchmarks/load_test.py --spawn asgi --concurrency 1,8,32 --compare benchmarks/baselines/flask.json
+    python benchmarks/load_test.py --server http://localhost:3001 --pid 12345 --endpoints stream
+"""
+
+import argparse
+import itertools
+import json
+import math
+import os
+import platform
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+BASELINE_DIR = os.path.join(BENCH_DIR, 'baselines')
+
+sys.path.insert(0, BENCH_DIR)
+
+import requests  # noqa: E402
+
+from mock_upstream import MockUpstream  # noqa: E402
+
+ENDPOINTS = {
+    'generate': '/api/generate',
+    'stream': '/api/generate/stream'
+}
+
+
+class ProcessSampler:
+    """Samples a process's CPU time and resident memory from /proc while a level runs"""
+
+    def __init__(self, pid, interval=0.2):
+        self.pid = pid
+        self.interval = interval
+        self.clock_ticks = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+        self._stop = threading.Event()
+        self._rss = []
+        self._thread = None
+        self._start = None
+
+    def _cpu_seconds(self):
+        with open(f'/proc/{self.pid}/stat') as f:
+            # The command name may contain spaces; fields after it are fixed
+            fields = f.read().rsplit(')', 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / self.clock_ticks
+
+    def _rss_mb(self):
+        with open(f'/proc/{self.pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+        return None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self._rss.append(self._rss_mb())
+            except OSError:
+                return
+
+    def start(self):
+        if self.pid is None:
+            return self
+        try:
+            self._start = (time.perf_counter(), self._cpu_seconds())
+            self._rss.append(self._rss_mb())
+        except OSError:
+            self.pid = None
+            return self
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self.pid is None:
+            return {'cpu_percent': None, 'rss_max_mb': None, 'rss_end_mb': None}
+        self._stop.set()
+        self._thread.join()
+        try:
+            cpu = self._cpu_seconds()
+            self._rss.append(self._rss_mb())
+        except OSError:
+            return {'cpu_percent': None, 'rss_max_mb': None, 'rss_end_mb': None}
+        wall = time.perf_counter() - self._start[0]
+        samples = [value for value in self._rss if value is not None]
+        return {
+            'cpu_percent': round((cpu - self._start[1]) / wall * 100, 1) if wall > 0 else None,
+            'rss_max_mb': round(max(samples), 1) if samples else None,
+            'rss_end_mb': round(samples[-1], 1) if samples else None
+        }
+
+
+def percentile(ordered, p):
+    """Nearest-rank percentile of a sorted list (None when empty)"""
+    if not ordered:
+        return None
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+def ms(seconds):
+    return round(seconds * 1000, 1) if seconds is not None else None
+
+def request_body(index, args):
+    prompt = 'User login flow with password reset' if args.same_prompt else f'Load test {index}: user login flow'
+    return {'prompt': prompt, 'diagramType': 'flowchart', 'useThinking': args.thinking}
+
+def send_generate(session, url, body, timeout):
+    """Returns (ok, latency, time to first byte)"""
+    start = time.perf_counter()
+    response = session.post(url, json=body, timeout=timeout)
+    latency = time.perf_counter() - start
+    ok = response.status_code == 200 and response.json().get('success') is True
+    return ok, latency, None
+
+def send_stream(session, url, body, timeout):
+    start = time.perf_counter()
+    first = None
+    ok = True
+    # A fresh connection per stream: the dev server does not reliably serve a
+    # kept-alive connection again after a streamed response
+    with requests.post(url, json=body, stream=True, timeout=timeout) as response:
+        if response.status_code != 200:
+            return False, time.perf_counter() - start, None
+        tail = b''
+        for chunk in response.iter_content(chunk_size=None):
+            if first is None:
+                first = time.perf_counter() - start
+            if b'"error"' in chunk:
+                ok = False
+            tail = (tail + chunk)[-64:]
+        ok = ok and b'[DONE]' in tail
+    return ok, time.perf_counter() - start, first
+
+def run_level(server, endpoint, concurrency, total, args, pid):
+    """Send `total` requests with `concurrency` workers; returns one result row"""
+    url = server + ENDPOINTS[endpoint]
+    send = send_stream if endpoint == 'stream' else send_generate
+    counter = itertools.count()
+    lock = threading.Lock()
+    latencies, first_bytes, errors = [], [], []
+
+    def worker():
+        session = requests.Session()
+        while True:
+            index = next(counter)
+            if index >= total:
+                return
+            try:
+                ok, latency, first = send(session, url, request_body(index, args), args.timeout)
+            except requests.exceptions.RequestException as e:
+                ok, latency, first = False, None, None
+                with lock:
+                    errors.append(type(e).__name__)
+            with lock:
+                if ok:
+                    latencies.append(latency)
+                    if first is not None:
+                        first_bytes.append(first)
+                elif latency is not None:
+                    errors.append('bad_response')
+
+    sampler = ProcessSampler(pid).start()
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    process = sampler.stop()
+
+    latencies.sort()
+    first_bytes.sort()
+    return {
+        'endpoint': endpoint,
+        'concurrency': concurrency,
+        'requests': total,
+        'ok': len(latencies),
+        'errors': len(errors),
+        'error_kinds': {kind: errors.count(kind) for kind in sorted(set(errors))},
+        'duration_s': round(elapsed, 3),
+        'throughput_rps': round(len(latencies) / elapsed, 2) if elapsed > 0 else None,
+        'latency_ms': {
+            'p50': ms(percentile(latencies, 50)),
+            'p90': ms(percentile(latencies, 90)),
+            'p99': ms(percentile(latencies, 99)),
+            'max': ms(latencies[-1] if latencies else None)
+        },
+        'first_byte_ms': {
+            'p50': ms(percentile(first_bytes, 50)),
+            'p99': ms(percentile(first_bytes, 99))
+        } if first_bytes else None,
+        'server': process
+    }
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def spawn_backend(mode, upstream_url, args):
+    """Start the backend against the mock upstream; returns (process, base_url)"""
+    port = free_port()
+    env = dict(
+        os.environ,
+        PORT=str(port),
+        PROVIDERS='zai',
+        ZAI_API_KEY='mock',
+        ZAI_ENDPOINT=upstream_url,
+        CACHE_ENABLED='true' if args.cache else 'false',
+        DEBUG='false'
+    )
+    if mode == 'asgi':
+        command = [sys.executable, '-m', 'uvicorn', 'asgi_server:app', '--host', '127.0.0.1',
+                   '--port', str(port), '--log-level', 'warning']
+    else:
+        command = [sys.executable, 'server.py']
+    process = subprocess.Popen(command, cwd=BACKEND_DIR, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    base_url = f'http://127.0.0.1:{port}'
+    deadline = time.monotonic() + 20
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'{mode} backend exited with code {process.returncode}')
+        try:
+            requests.get(f'{base_url}/health', timeout=1)
+            return process, base_url
+        except requests.exceptions.RequestException:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f'{mode} backend did not start on port {port}')
+
+def print_row(row):
+    latency = row['latency_ms']
+    first = row['first_byte_ms'] or {}
+    server = row['server']
+    print(f'{row["endpoint"]:<9} c={row["concurrency"]:<4} ok={row["ok"]:<5} err={row["errors"]:<4} '
+          f'{row["throughput_rps"]:>8} req/s  p50={latency["p50"]} p90={latency["p90"]} '
+          f'p99={latency["p99"]} ms  ttfb50={first.get("p50")} ms  '
+          f'cpu={server["cpu_percent"]}% rss={server["rss_max_mb"]} MB')
+
+def compare(rows, path):
+    """Print throughput and latency changes against a saved baseline"""
+    with open(path) as f:
+        baseline = {(row['endpoint'], row['concurrency']): row for row in json.load(f)['results']}
+    print(f'\nCompared with {path}:')
+    for row in rows:
+        old = baseline.get((row['endpoint'], row['concurrency']))
+        if old is None:
+            continue
+        changes = []
+        for label, new_value, old_value in (
+            ('req/s', row['throughput_rps'], old['throughput_rps']),
+            ('p50', row['latency_ms']['p50'], old['latency_ms']['p50']),
+            ('p99', row['latency_ms']['p99'], old['latency_ms']['p99'])
+        ):
+            if new_value is not None and old_value:
+                changes.append(f'{label} {old_value} -> {new_value} ({(new_value - old_value) / old_value * 100:+.1f}%)')
+        print(f'{row["endpoint"]:<9} c={row["concurrency"]:<4} ' + '  '.join(changes))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--server', help='Base URL of a running backend')
+    parser.add_argument('--pid', type=int, help='Backend process id, for CPU/memory sampling')
+    parser.add_argument('--spawn', choices=('flask', 'asgi'), help='Start the mock upstream and this backend')
+    parser.add_argument('--endpoints', default='generate,stream', help='Comma-separated: generate, stream')
+    parser.add_argument('--concurrency', default='1,8,32', help='Comma-separated concurrency levels')
+    parser.add_argument('--requests', type=int, default=100, help='Requests per endpoint and level')
+    parser.add_argument('--timeout', type=float, default=120)
+    parser.add_argument('--thinking', action='store_true', help='Send useThinking=true')
+    parser.add_argument('--same-prompt', action='store_true', help='Identical prompts (exercises coalescing)')
+    parser.add_argument('--cache', action='store_true', help='Leave the response cache on when spawning')
+    parser.add_argument('--mock-latency', type=float, default=0.3)
+    parser.add_argument('--mock-jitter', type=float, default=0.1)
+    parser.add_argument('--mock-tokens-per-second', type=float, default=200.0)
+    parser.add_argument('--mock-error-rate', type=float, default=0.0)
+    parser.add_argument('--json', help='Write results to this file')
+    parser.add_argument('--baseline', help=f'Write results to {os.path.relpath(BASELINE_DIR)}/<name>.json')
+    parser.add_argument('--compare', help='Baseline JSON to compare against')
+    args = parser.parse_args()
+
+    if not args.server and not args.spawn:
+        parser.error('either --server or --spawn is required')
+
+    process = None
+    mock = None
+    meta = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'mode': args.spawn or 'external',
+        'thinking': args.thinking,
+        'same_prompt': args.same_prompt
+    }
+    try:
+        if args.spawn:
+            mock = MockUpstream(args.mock_latency, args.mock_jitter, args.mock_tokens_per_second,
+                                args.mock_error_rate, seed=1)
+            mock_server = mock.serve()
+            upstream_url = f'http://127.0.0.1:{mock_server.server_address[1]}/v1/chat/completions'
+            process, server = spawn_backend(args.spawn, upstream_url, args)
+            pid = process.pid
+            meta['mock'] = {
+                'latency_s': args.mock_latency,
+                'jitter_s': args.mock_jitter,
+                'tokens_per_second': args.mock_tokens_per_second,
+                'error_rate': args.mock_error_rate
+            }
+        else:
+            server = args.server.rstrip('/')
+            pid = args.pid
+
+        rows = []
+        for endpoint in args.endpoints.split(','):
+            for concurrency in (int(level) for level in args.concurrency.split(',')):
+                row = run_level(server, endpoint.strip(), concurrency, args.requests, args, pid)
+                print_row(row)
+                rows.append(row)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=10)
+
+    if mock is not None:
+        meta['mock']['requests_served'] = mock.requests
+
+    output = args.json
+    if args.baseline:
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        output = os.path.join(BASELINE_DIR, f'{args.baseline}.json')
+    if output:
+        with open(output, 'w') as f:
+            json.dump({'meta': meta, 'results': rows}, f, indent=2)
+        print(f'\nSaved {output}')
+
+    if args.compare:
+        compare(rows, args.compare)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,191 @@
+"""
+Mock OpenAI/Z.ai chat completions server for load tests
+
+Answers POST requests on any path like an OpenAI-compatible
+/chat/completions endpoint, both streaming (SSE) and non-streaming, without
+spending tokens. Latency to the first token, token rate, error rate and the
+number of reasoning chunks in thinking mode are configurable.
+
+Usage:
+    python benchmarks/mock_upstream.py --port 18080 --latency 0.8 --tokens-per-second 60
+    ZAI_ENDPOINT=http://127.0.0.1:18080/v1/chat/completions ZAI_API_KEY=mock python server.py
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+FALLBACK_DIAGRAM = """flowchart TD
+    A[Start] --> B{Logged in?}
+    B -->|Yes| C[Dashboard]
+    B -->|No| D[Login form]
+    D --> E[Validate credentials]
+    E -->|Valid| C
+    E -->|Invalid| D"""
+
+def load_diagram(diagram_type):
+    """The corpus example for a diagram type, so responses pass validation"""
+    path = os.path.join(PROJECT_ROOT, f'test-diagram-{diagram_type}.mmd')
+    try:
+        with open(path, encoding='utf-8') as f:
+            return f.read().strip()
+    except OSError:
+        return FALLBACK_DIAGRAM
+
+def tokenize(text):
+    """Split text into token-sized pieces (words with their whitespace)"""
+    return re.findall(r'\s*\S+|\s+', text)
+
+
+class MockUpstream:
+    """Configurable fake upstream; serve() runs it on a background thread"""
+
+    def __init__(self, latency=0.5, jitter=0.2, tokens_per_second=80.0, error_rate=0.0,
+                 thinking_chunks=20, diagram_type='flowchart', seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self.thinking_chunks = thinking_chunks
+        self.tokens = tokenize(load_diagram(diagram_type))
+        self.random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+
+    def _draw(self):
+        """Per-request (fail, time to first token)"""
+        with self._lock:
+            self.requests += 1
+            fail = self.random.random() < self.error_rate
+            if fail:
+                self.errors += 1
+            ttft = max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter))
+        return fail, ttft
+
+    def _chunks(self, thinking):
+        """(field, text) pieces in emission order"""
+        if thinking:
+            for index in range(self.thinking_chunks):
+                yield 'reasoning_content', f'Step {index + 1}: planning the diagram. '
+        for token in self.tokens:
+            yield 'content', token
+
+    def usage(self, thinking):
+        completion = len(self.tokens) + (self.thinking_chunks if thinking else 0)
+        return {'prompt_tokens': 120, 'completion_tokens': completion, 'total_tokens': 120 + completion}
+
+    def handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                try:
+                    body = json.loads(self.rfile.read(length) or b'{}')
+                except ValueError:
+                    body = {}
+                fail, ttft = mock._draw()
+                if fail:
+                    self._send_json(503, {'error': {'message': 'mock upstream overloaded'}})
+                    return
+
+                thinking = (body.get('thinking') or {}).get('type') == 'enabled'
+                model = body.get('model', 'mock')
+                time.sleep(ttft)
+                if body.get('stream'):
+                    self._stream(model, thinking)
+                else:
+                    self._complete(model, thinking)
+
+            def _send_json(self, status, payload):
+                data = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _complete(self, model, thinking):
+                content = []
+                reasoning = []
+                pieces = list(mock._chunks(thinking))
+                time.sleep(len(pieces) / mock.tokens_per_second)
+                for field, text in pieces:
+                    (content if field == 'content' else reasoning).append(text)
+                message = {'role': 'assistant', 'content': ''.join(content)}
+                if reasoning:
+                    message['reasoning_content'] = ''.join(reasoning)
+                self._send_json(200, {
+                    'model': model,
+                    'choices': [{'index': 0, 'message': message, 'finish_reason': 'stop'}],
+                    'usage': mock.usage(thinking)
+                })
+
+            def _stream(self, model, thinking):
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Cache-Control', 'no-cache')
+                self.send_header('Connection', 'close')
+                self.end_headers()
+                interval = 1.0 / mock.tokens_per_second
+                try:
+                    for field, text in mock._chunks(thinking):
+                        chunk = {'model': model, 'choices': [{'index': 0, 'delta': {field: text}}]}
+                        self.wfile.write(b'data: ' + json.dumps(chunk).encode('utf-8') + b'\n\n')
+                        self.wfile.flush()
+                        time.sleep(interval)
+                    final = {'model': model, 'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}],
+                             'usage': mock.usage(thinking)}
+                    self.wfile.write(b'data: ' + json.dumps(final).encode('utf-8') + b'\n\ndata: [DONE]\n\n')
+                    self.wfile.flush()
+                except (BrokenPipeError, ConnectionResetError):
+                    # The proxy cancelled the generation
+                    pass
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def serve(self, host='127.0.0.1', port=0):
+        """Start serving on a daemon thread; returns the server (server_address has the real port)"""
+        server = ThreadingHTTPServer((host, port), self.handler())
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=18080)
+    parser.add_argument('--latency', type=float, default=0.5, help='Mean time to first token (seconds)')
+    parser.add_argument('--jitter', type=float, default=0.2, help='Uniform +/- jitter on the latency (seconds)')
+    parser.add_argument('--tokens-per-second', type=float, default=80.0)
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests answered with 503')
+    parser.add_argument('--thinking-chunks', type=int, default=20, help='Reasoning chunks when thinking is enabled')
+    parser.add_argument('--diagram-type', default='flowchart', help='Corpus example returned as the content')
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+
+    mock = MockUpstream(args.latency, args.jitter, args.tokens_per_second, args.error_rate,
+                        args.thinking_chunks, args.diagram_type, args.seed)
+    server = mock.serve(args.host, args.port)
+    print(f'Mock upstream on http://{args.host}:{server.server_address[1]}/v1/chat/completions')
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == '__main__':
+    main()
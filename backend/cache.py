@@ -0,0 +1,252 @@
+"""
+Response cache for /api/generate
+Two tiers: a per-process in-memory LRU with TTL, and an optional SQLite file
+(WAL + mmap) that several worker processes share.
+"""
+
+import collections
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Payload fields that change the model output and therefore the cache key
+SAMPLING_PARAMS = ('temperature', 'top_p', 'max_tokens')
+
+def normalize_prompt(prompt):
+    """Collapse whitespace so trivially different prompts share an entry"""
+    return ' '.join(prompt.split())
+
+def cache_bypassed(headers):
+    """True when the client asked to skip cached responses (X-Cache-Bypass or Cache-Control: no-cache)"""
+    if headers.get('X-Cache-Bypass', '').lower() in ('1', 'true', 'yes'):
+        return True
+    return 'no-cache' in headers.get('Cache-Control', '').lower()
+
+def cache_key(prompt, diagram_type, use_thinking, payload):
+    """
+    Stable key over the normalized prompt, diagram type, thinking, system prompt, model and sampling params
+    The model is the payload's as prepared for a provider; without one the key identifies the request only.
+    """
+    material = {
+        'prompt': normalize_prompt(prompt),
+        'diagramType': diagram_type,
+        'useThinking': bool(use_thinking),
+        'model': payload.get('model'),
+        'system': payload['messages'][0]['content'] if payload.get('messages') else None,
+        'params': {name: payload.get(name) for name in SAMPLING_PARAMS}
+    }
+    encoded = json.dumps(material, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+class MemoryTier:
+    """Thread-safe LRU with per-entry expiry"""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, now):
+        """Return (value, expired) for key; value is None on a miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None, False
+            expires, value = entry
+            if expires <= now:
+                del self._entries[key]
+                return None, True
+            self._entries.move_to_end(key)
+            return value, False
+
+    def set(self, key, value, expires):
+        """Store value, returning the number of entries evicted to make room"""
+        with self._lock:
+            self._entries[key] = (expires, value)
+            self._entries.move_to_end(key)
+            evicted = 0
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                evicted += 1
+            return evicted
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteTier:
+    """
+    On-disk tier shared between worker processes.
+
+    WAL mode lets readers in other processes proceed while one writes, and
+    the mmap pragma keeps hot pages mapped instead of copied per read.
+    Connections are per thread because sqlite3 connections are not shared.
+    Reads never write: access times of hits are kept in memory and written
+    with the next set(), in the same transaction, and expired rows are left
+    for set() to purge. The row count is taken in that transaction too, so
+    len() does not query the database.
+    """
+
+    def __init__(self, path, max_entries, mmap_size=64 * 1024 * 1024):
+        self.path = path
+        self.max_entries = max_entries
+        self.mmap_size = mmap_size
+        self._local = threading.local()
+        # key -> last hit time, not yet written
+        self._accessed = {}
+        self._accessed_lock = threading.Lock()
+        self._connect().execute(
+            'CREATE TABLE IF NOT EXISTS responses ('
+            ' key TEXT PRIMARY KEY,'
+            ' value TEXT NOT NULL,'
+            ' expires REAL NOT NULL,'
+            ' accessed REAL NOT NULL)'
+        )
+        self._connect().execute('CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)')
+        # Rows as of this process's last write
+        self._entries = self._connect().execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(f'PRAGMA mmap_size={int(self.mmap_size)}')
+            self._local.conn = conn
+        return conn
+
+    def get(self, key, now):
+        """Return (value, expires) for key; value is None on a miss, expires is set if it had expired"""
+        conn = self._connect()
+        row = conn.execute('SELECT value, expires FROM responses WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None, None
+        value, expires = row
+        if expires <= now:
+            return None, expires
+        with self._accessed_lock:
+            self._accessed[key] = now
+        return json.loads(value), expires
+
+    def set(self, key, value, expires, now):
+        """Store value, returning the number of rows evicted to stay under max_entries"""
+        conn = self._connect()
+        with self._accessed_lock:
+            accessed, self._accessed = self._accessed, {}
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.executemany('UPDATE responses SET accessed = ? WHERE key = ?',
+                             [(when, hit) for hit, when in accessed.items()])
+            conn.execute(
+                'INSERT OR REPLACE INTO responses (key, value, expires, accessed) VALUES (?, ?, ?, ?)',
+                (key, json.dumps(value), expires, now)
+            )
+            # Drop expired rows first, then least recently used rows over the limit
+            evicted = conn.execute('DELETE FROM responses WHERE expires <= ?', (now,)).rowcount
+            evicted += conn.execute(
+                'DELETE FROM responses WHERE key IN ('
+                ' SELECT key FROM responses ORDER BY accessed DESC LIMIT -1 OFFSET ?)',
+                (self.max_entries,)
+            ).rowcount
+            entries = conn.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        self._entries = entries
+        return evicted
+
+    def __len__(self):
+        return self._entries
+
+
+class ResponseCache:
+    """Two-tier response cache with hit/miss/eviction counters"""
+
+    def __init__(self, ttl=3600, max_entries=1024, db_path=None, db_max_entries=100000):
+        self.ttl = ttl
+        self.memory = MemoryTier(max_entries)
+        self.disk = SQLiteTier(db_path, db_max_entries) if db_path else None
+        self._lock = threading.Lock()
+        self._counters = collections.Counter()
+
+    def _count(self, name, amount=1):
+        if amount:
+            with self._lock:
+                self._counters[name] += amount
+
+    def get(self, key):
+        """Look key up in memory, then on disk (promoting disk hits into memory)"""
+        return self.get_any((key,))
+
+    def get_any(self, keys):
+        """Value of the first of keys found (memory first, then disk), counted as one hit or miss"""
+        now = time.time()
+        keys = list(dict.fromkeys(keys))
+
+        for key in keys:
+            value, expired = self.memory.get(key, now)
+            if expired:
+                self._count('expired')
+            if value is not None:
+                self._count('hits_memory')
+                return value
+
+        if self.disk is not None:
+            for key in keys:
+                value, expires = self.disk.get(key, now)
+                if value is not None:
+                    self._count('hits_disk')
+                    self._count('evictions', self.memory.set(key, value, expires))
+                    return value
+                if expires is not None:
+                    self._count('expired')
+
+        self._count('misses')
+        return None
+
+    def set(self, key, value):
+        """Store value in every tier"""
+        now = time.time()
+        expires = now + self.ttl
+        evicted = self.memory.set(key, value, expires)
+        if self.disk is not None:
+            evicted += self.disk.set(key, value, expires, now)
+        self._count('stores')
+        self._count('evictions', evicted)
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+        hits = counters.get('hits_memory', 0) + counters.get('hits_disk', 0)
+        lookups = hits + counters.get('misses', 0)
+        return {
+            'hits': hits,
+            'hits_memory': counters.get('hits_memory', 0),
+            'hits_disk': counters.get('hits_disk', 0),
+            'misses': counters.get('misses', 0),
+            'stores': counters.get('stores', 0),
+            'evictions': counters.get('evictions', 0),
+            'expired': counters.get('expired', 0),
+            'hit_rate': round(hits / lookups, 4) if lookups else 0.0,
+            'memory_entries': len(self.memory),
+            'disk_entries': len(self.disk) if self.disk is not None else None,
+            'ttl_seconds': self.ttl
+        }
+
+
+def create_cache_from_env():
+    """Build the cache from CACHE_* environment variables (None when disabled)"""
+    if os.getenv('CACHE_ENABLED', 'true').lower() != 'true':
+        return None
+    return ResponseCache(
+        ttl=float(os.getenv('CACHE_TTL', 3600)),
+        max_entries=int(os.getenv('CACHE_MAX_ENTRIES', 1024)),
+        db_path=os.getenv('CACHE_DB_PATH') or None,
+        db_max_entries=int(os.getenv('CACHE_DB_MAX_ENTRIES', 100000))
+    )
@@ -0,0 +1,900 @@
+"""
+Compact Mermaid parser for every diagram type in the test-diagram corpus
+One pass over the source lines produces a Diagram: nodes, edges and groups
+in the same shape whatever the diagram type (flowchart, sequence, class,
+state, er, gantt, mindmap, quadrant, sankey, xychart, architecture, block).
+The tree stays small for very large diagrams:
+- Node and Group use __slots__, so they carry no per-object __dict__;
+- node ids are interned and stored once, however many edges mention them;
+- edges are not objects: EdgeList keeps parallel arrays of node indexes and
+  operator codes, so an edge costs a few bytes plus its label reference.
+
+flowchart.py stays the parser behind the SVG renderer; this module shares
+its link and shape syntax.
+"""
+
+import array
+import collections
+import csv
+import re
+import sys
+
+from flowchart import (AMPERSAND_RE, CLASS_SUFFIX_RE, HEADER_RE, ID_RE, IGNORED_RE, LINK_RE, SHAPE_DATA_RE,
+                       SUBGRAPH_RE, FlowchartSyntaxError, _link, _shape, _unexpected)
+
+# First word of the header -> diagram type (the names used by prompts.TYPE_SPECS and validator.py)
+HEADERS = {
+    'graph': 'flowchart',
+    'flowchart': 'flowchart',
+    'sequenceDiagram': 'sequence',
+    'classDiagram': 'class',
+    'classDiagram-v2': 'class',
+    'stateDiagram': 'state',
+    'stateDiagram-v2': 'state',
+    'erDiagram': 'er',
+    'gantt': 'gantt',
+    'mindmap': 'mindmap',
+    'quadrantChart': 'quadrant',
+    'sankey-beta': 'sankey',
+    'xychart-beta': 'xychart',
+    'architecture-beta': 'architecture',
+    'block-beta': 'block'
+}
+
+# Shape of a node declared without one
+DEFAULT_SHAPES = {
+    'flowchart': 'rect', 'sequence': 'participant', 'class': 'class', 'state': 'state', 'er': 'entity',
+    'gantt': 'task', 'mindmap': 'default', 'quadrant': 'point', 'sankey': 'node', 'xychart': 'node',
+    'architecture': 'service', 'block': 'block'
+}
+
+# Types whose open groups close at the end of the source (gantt sections never take "end")
+AUTO_CLOSE = frozenset(('gantt', 'block'))
+
+DIRECTIVE_RE = re.compile(r'^%%\{(.*)\}%%$')
+ACC_RE = re.compile(r'^(accTitle|accDescr)\s*:\s*(.*)$')
+
+# A --> B and A -->|label| B with plain ids, the bulk of large flowcharts; anything else takes the general path
+SIMPLE_LINK_RE = re.compile(r'([A-Za-z0-9_]+)\s*(-->|---|-\.->|==>)\s*(?:\|([^|"]*)\|\s*)?([A-Za-z0-9_]+)')
+
+PARTICIPANT_RE = re.compile(r'^(participant|actor)\s+(\S+?)(?:\s+as\s+(.+))?$')
+# The source is the shortest prefix followed by an arrow, so ids may contain '-' (Web-App->>API)
+MESSAGE_RE = re.compile(r'^([^<>+:]+?)\s*(<<-->>|<<->>|-->>|->>|-->|->|--x|-x|--\)|-\))\s*([+-]?)\s*'
+                        r'([^:]+?)\s*(?::(.*))?$')
+NOTE_RE = re.compile(r'^[Nn]ote\s+(left of|right of|over)\s+([^:]+?)\s*:(.*)$')
+FRAGMENTS = frozenset(('loop', 'alt', 'opt', 'par', 'critical', 'break', 'rect', 'box'))
+SECTIONS = frozenset(('else', 'and', 'option'))
+SEQUENCE_IGNORED = frozenset(('autonumber', 'activate', 'deactivate', 'create', 'destroy', 'link', 'links',
+                              'properties', 'details', 'title'))
+
+CLASS_RE = re.compile(r'^class\s+([\w`.-]+)(~[^~]+~)?(?:\["([^"]*)"\])?\s*(\{)?\s*(\})?$')
+RELATION_RE = re.compile(r'^([\w`~.-]+?)\s*(?:"([^"]*)"\s*)?((?:<\||[<*o])?(?:--|\.\.)(?:\|>|[>*o])?)\s*'
+                         r'(?:"([^"]*)"\s*)?([\w`~.-]+)\s*(?::\s*(.*))?$')
+MEMBER_RE = re.compile(r'^([\w`~.-]+)\s*:\s*(.+)$')
+ANNOTATION_RE = re.compile(r'^<<(.+?)>>\s*([\w`.-]+)$')
+NAMESPACE_RE = re.compile(r'^namespace\s+([\w.-]+)\s*\{$')
+CLASS_IGNORED = frozenset(('classDef', 'cssClass', 'style', 'click', 'link', 'callback', 'direction', 'note'))
+
+STATE_LINK_RE = re.compile(r'^(\[\*\]|[\w.-]+)(?::::[\w-]+)?\s*-->\s*(\[\*\]|[\w.-]+)(?::::[\w-]+)?\s*(?::\s*(.*))?$')
+STATE_RE = re.compile(r'^state\s+(?:"([^"]*)"\s+as\s+)?([\w.-]+)\s*(?:<<(\w+)>>)?\s*(\{)?$')
+STATE_DESCRIPTION_RE = re.compile(r'^([\w.-]+)\s*:\s*(.*)$')
+STATE_NOTE_RE = re.compile(r'^note\s+(left of|right of)\s+([\w.-]+)\s*(?::\s*(.*))?$')
+STATE_IGNORED = frozenset(('direction', 'classDef', 'class', 'style', '--', 'click'))
+
+ER_RELATION_RE = re.compile(r'^([\w-]+)\s*(\|o|\|\||\}o|\}\|)(--|\.\.)(o\||\|\||o\{|\|\{)\s*([\w-]+)\s*:\s*(.*)$')
+ENTITY_RE = re.compile(r'^([\w-]+)(?:\["([^"]*)"\])?\s*(\{)?$')
+ATTRIBUTE_RE = re.compile(r'^(\S+)\s+(\S+)(?:\s+((?:PK|FK|UK)(?:\s*,\s*(?:PK|FK|UK))*))?(?:\s+"([^"]*)")?$')
+
+GANTT_SETTINGS = frozenset(('title', 'dateFormat', 'axisFormat', 'tickInterval', 'excludes', 'includes',
+                            'todayMarker', 'weekday', 'weekend', 'inclusiveEndDates', 'topAxis', 'displayMode'))
+GANTT_TAGS = frozenset(('done', 'active', 'crit', 'milestone'))
+
+# (opening, closing, shape), longest openings first
+MINDMAP_SHAPES = (
+    ('((', '))', 'circle'),
+    ('))', '((', 'bang'),
+    ('{{', '}}', 'hexagon'),
+    ('(', ')', 'rounded'),
+    (')', '(', 'cloud'),
+    ('[', ']', 'square')
+)
+
+QUADRANT_SETTINGS = frozenset(('title', 'x-axis', 'y-axis', 'quadrant-1', 'quadrant-2', 'quadrant-3', 'quadrant-4'))
+POINT_RE = re.compile(r'^(.+?)(?::::[\w-]+)?\s*:\s*\[\s*([-+.\deE]+)\s*,\s*([-+.\deE]+)\s*\](?:\s+(.*))?$')
+
+SERIES_RE = re.compile(r'^(bar|line)\s*(?:"([^"]*)"|([^\s\[]+))?\s*\[([^\]]*)\]$')
+
+ARCHITECTURE_RE = re.compile(r'^(group|service)\s+([\w-]+)(?:\(([^)]*)\))?(?:\[([^\]]*)\])?(?:\s+in\s+([\w-]+))?$')
+JUNCTION_RE = re.compile(r'^junction\s+([\w-]+)(?:\s+in\s+([\w-]+))?$')
+ARCHITECTURE_EDGE_RE = re.compile(r'^([\w-]+)(?:\{group\})?:([LRTB])\s*(<?)-(?:-|\[([^\]]*)\]-)(>?)\s*'
+                                  r'([LRTB]):([\w-]+)(?:\{group\})?$')
+
+BLOCK_OPEN_RE = re.compile(r'block(?::([\w-]+))?(?=[\s\["(:{]|$)')
+WIDTH_RE = re.compile(r':(\d+)')
+COLUMNS_RE = re.compile(r'columns\s+(\d+|auto)\s*')
+
+
+class MermaidSyntaxError(FlowchartSyntaxError):
+    """Raised for sources the parser cannot read, with the 1-based line number"""
+
+
+class Node:
+    """
+    A node, participant, class, state, entity, task, point, service or block
+    group is an index into Diagram.groups (-1 for none); data holds type-specific
+    details: class members, entity attributes, (x, y) for quadrant points,
+    the spec fields of a gantt task, the width of a block.
+    """
+
+    __slots__ = ('id', 'label', 'shape', 'group', 'data')
+
+    def __init__(self, id, label, shape, group=-1, data=None):
+        self.id = id
+        self.label = label
+        self.shape = shape
+        self.group = group
+        self.data = data
+
+    def __repr__(self):
+        return f'Node({self.id!r}, {self.label!r}, {self.shape!r})'
+
+
+class Group:
+    """
+    A subgraph, composite state, namespace, sequence fragment, gantt section or block group
+    parent is an index into Diagram.groups (-1 for top level). For sequence
+    fragments data is [first edge, end edge) of the messages inside; for
+    blocks it is [width, columns].
+    """
+
+    __slots__ = ('id', 'title', 'parent', 'kind', 'data')
+
+    def __init__(self, id, title, parent=-1, kind='group', data=None):
+        self.id = id
+        self.title = title
+        self.parent = parent
+        self.kind = kind
+        self.data = data
+
+    def __repr__(self):
+        return f'Group({self.id!r}, {self.title!r}, {self.kind!r})'
+
+
+class EdgeList:
+    """
+    Edges as parallel arrays: sources and targets are node indexes, codes index
+    operators (the distinct link operators, e.g. '-->', '->>', '||--o{').
+    values holds weights (sankey) and data sparse per-edge details: architecture
+    ports, class cardinalities, sequence activations.
+    """
+
+    __slots__ = ('sources', 'targets', 'codes', 'operators', 'labels', 'values', 'data', '_codes')
+
+    def __init__(self):
+        self.sources = array.array('i')
+        self.targets = array.array('i')
+        self.codes = array.array('H')
+        self.operators = []
+        self.labels = []
+        self.values = None
+        self.data = None
+        self._codes = {}
+
+    def add(self, source, target, operator, label='', value=None, data=None):
+        code = self._codes.get(operator)
+        if code is None:
+            code = self._codes[operator] = len(self.operators)
+            self.operators.append(sys.intern(operator))
+        if value is not None and self.values is None:
+            self.values = array.array('d', bytes(8 * len(self.labels)))
+        if data is not None:
+            if self.data is None:
+                self.data = {}
+            self.data[len(self.labels)] = data
+        self.sources.append(source)
+        self.targets.append(target)
+        self.codes.append(code)
+        # Short labels repeat ("Yes", "No", state triggers) and are shared
+        self.labels.append(sys.intern(label) if len(label) < 32 else label)
+        if self.values is not None:
+            self.values.append(value or 0.0)
+
+    def __len__(self):
+        return len(self.labels)
+
+    def __getitem__(self, i):
+        return self.sources[i], self.targets[i], self.operators[self.codes[i]], self.labels[i]
+
+    def __iter__(self):
+        operators = self.operators
+        return zip(self.sources, self.targets, (operators[code] for code in self.codes), self.labels)
+
+
+class Diagram:
+    """
+    Parsed diagram
+    nodes keep declaration order and index maps node ids to positions in nodes;
+    settings holds scalar statements (title, dateFormat, axes, columns, accTitle);
+    items holds entries that are neither nodes nor edges: sequence notes as
+    ('note', placement, participants, text) and xychart series as (kind, title, values).
+    """
+
+    __slots__ = ('type', 'direction', 'config', 'settings', 'nodes', 'index', 'edges', 'groups', 'items')
+
+    def __init__(self, type, direction=None):
+        self.type = type
+        self.direction = direction
+        self.config = None
+        self.settings = {}
+        self.nodes = []
+        self.index = {}
+        self.edges = EdgeList()
+        self.groups = []
+        self.items = []
+
+    def node(self, id):
+        return self.nodes[self.index[id]]
+
+    def links(self):
+        """Edges as (source id, target id, operator, label) tuples"""
+        nodes = self.nodes
+        return [(nodes[source].id, nodes[target].id, operator, label)
+                for source, target, operator, label in self.edges]
+
+    def __repr__(self):
+        return f'Diagram({self.type!r}, {len(self.nodes)} nodes, {len(self.edges)} edges, {len(self.groups)} groups)'
+
+
+def _flow_operator(style, arrow, head):
+    """Normalized flowchart operator: '-->', '---', '-.->', '-.-', '==>', '===', '<-->', '--x', ..."""
+    line, plain = {'solid': ('--', '-'), 'dotted': ('-.-', ''), 'thick': ('==', '=')}[style]
+    ends = {'arrow': '>', 'cross': 'x', 'circle': 'o'}
+    tail = ends[arrow] if arrow else plain
+    return ('<' if head == 'arrow' else ends.get(head, '')) + line + tail
+
+def _unquote(text):
+    text = text.strip()
+    return text[1:-1] if len(text) > 1 and text[0] == text[-1] == '"' else text
+
+
+class _Parser:
+    def __init__(self, source):
+        self.source = source
+        self.diagram = None
+        self.line = 0
+        # Open groups (indexes into diagram.groups), innermost last
+        self.stack = []
+        self.group_ids = {}
+        self.anonymous = collections.Counter()
+        # Type-specific state: open class/entity body, open note, mindmap indentation, gantt dependencies
+        self.body = None
+        self.note = None
+        self.tree = []
+        self.pending = []
+
+    def parse(self):
+        lines = self.source.splitlines()
+        start = self.front_matter(lines)
+        handler = None
+        # Lines of a %%{init: ...}%% directive spread over several lines
+        directive_lines = None
+        for number in range(start, len(lines)):
+            raw = lines[number]
+            text = raw.strip()
+            if not text:
+                continue
+            self.line = number + 1
+            if directive_lines is not None:
+                directive_lines.append(text)
+                if not text.endswith('}%%'):
+                    continue
+                text = ' '.join(directive_lines)
+                directive_lines = None
+            elif text.startswith('%%{') and not text.endswith('}%%'):
+                directive_lines = [text]
+                continue
+            if text.startswith('%%'):
+                directive = DIRECTIVE_RE.match(text)
+                if directive and self.diagram is None:
+                    self.config = directive.group(1)
+                continue
+            try:
+                if handler is not None:
+                    handler(text, raw)
+                    continue
+                handler = self.header(text)
+            except FlowchartSyntaxError as e:
+                if isinstance(e, MermaidSyntaxError):
+                    raise
+                # Raised by the shared flowchart helpers
+                error = MermaidSyntaxError(str(e))
+                error.line = e.line
+                raise error from None
+        if self.diagram is None:
+            raise MermaidSyntaxError('Empty diagram')
+        self.finish()
+        return self.diagram
+
+    def front_matter(self, lines):
+        """Skip a leading --- YAML block; its title: becomes settings['title']"""
+        self.config = None
+        self.title = None
+        first = next((i for i, line in enumerate(lines) if line.strip()), None)
+        if first is None or lines[first].strip() != '---':
+            return 0
+        for i in range(first + 1, len(lines)):
+            text = lines[i].strip()
+            if text == '---':
+                return i + 1
+            if text.startswith('title:'):
+                self.title = _unquote(text[6:])
+        raise MermaidSyntaxError('Unterminated front matter', first + 1)
+
+    def header(self, text):
+        words = text.rstrip(';').split()
+        kind = HEADERS.get(words[0])
+        if kind is None:
+            raise MermaidSyntaxError(f'Unsupported diagram type {words[0]!r}', self.line)
+        direction = None
+        if kind == 'flowchart':
+            match = HEADER_RE.match(text.rstrip(';'))
+            if not match:
+                raise MermaidSyntaxError('Expected "flowchart <direction>" or "graph <direction>"', self.line)
+            direction = match.group(1) or 'TD'
+        elif len(words) > 1:
+            direction = words[1]
+        self.diagram = Diagram(kind, direction)
+        self.diagram.config = self.config
+        if self.title is not None:
+            self.diagram.settings['title'] = self.title
+        self.default_shape = DEFAULT_SHAPES[kind]
+        # Sequence fragments group messages (Group.data), not participants
+        self.nested = kind != 'sequence'
+        return getattr(self, f'{kind}_line')
+
+    def error(self, message):
+        return MermaidSyntaxError(message, self.line)
+
+    def unexpected(self, text):
+        return self.error(f'Unexpected {text[:40]!r} ({self.diagram.type} diagram)')
+
+    # Shared building blocks
+
+    def node(self, id, label=None, shape=None, data=None):
+        """Index of node id, declared on first use inside the innermost open group"""
+        diagram = self.diagram
+        index = diagram.index.get(id)
+        if index is None:
+            id = sys.intern(id)
+            index = diagram.index[id] = len(diagram.nodes)
+            diagram.nodes.append(Node(id, id if label is None else label, shape or self.default_shape,
+                                      self.stack[-1] if self.stack and self.nested else -1, data))
+            return index
+        node = diagram.nodes[index]
+        if label is not None:
+            node.label = label
+        if shape is not None:
+            node.shape = shape
+        if data is not None:
+            node.data = data
+        if node.group < 0 and self.stack and self.nested:
+            node.group = self.stack[-1]
+        return index
+
+    def new_node(self, id, label, shape, data=None):
+        """Append a node even if its id is taken (mindmap nodes are not unique); index keeps the first"""
+        diagram = self.diagram
+        id = sys.intern(id)
+        index = len(diagram.nodes)
+        diagram.index.setdefault(id, index)
+        diagram.nodes.append(Node(id, label, shape, self.stack[-1] if self.stack else -1, data))
+        return index
+
+    def open_group(self, id, title, kind, parent=None, data=None):
+        if id in self.group_ids:
+            raise self.error(f'Duplicate group id {id!r}')
+        groups = self.diagram.groups
+        if parent is None:
+            parent = self.stack[-1] if self.stack else -1
+        index = self.group_ids[id] = len(groups)
+        groups.append(Group(sys.intern(id), title, parent, kind, data))
+        self.stack.append(index)
+        return index
+
+    def close_group(self, keyword='end'):
+        if not self.stack:
+            raise self.error(f'"{keyword}" without a matching block')
+        return self.stack.pop()
+
+    def anonymous_id(self, prefix):
+        self.anonymous[prefix] += 1
+        return f'{prefix}{self.anonymous[prefix]}'
+
+    def common(self, text):
+        """accTitle/accDescr, valid in every type; True when handled"""
+        match = ACC_RE.match(text)
+        if match:
+            self.diagram.settings[match.group(1)] = match.group(2)
+        return bool(match)
+
+    def finish(self):
+        diagram = self.diagram
+        if self.body is not None:
+            raise MermaidSyntaxError(f'Missing "}}" for {diagram.nodes[self.body].id!r}')
+        if self.note is not None:
+            raise MermaidSyntaxError('Missing "end note"')
+        if self.stack and diagram.type not in AUTO_CLOSE:
+            raise MermaidSyntaxError(f'{diagram.groups[self.stack[-1]].id!r} is missing its end')
+        while self.stack:
+            self.close_sequence_group() if diagram.type == 'sequence' else self.stack.pop()
+        for task, ids, operator, line in self.pending:
+            for id in ids:
+                if id not in diagram.index:
+                    raise MermaidSyntaxError(f'Unknown task id {id!r}', line)
+                diagram.edges.add(diagram.index[id], task, operator)
+
+    # flowchart
+
+    def flowchart_line(self, text, raw):
+        statements = (text,) if '"' in text or ';' not in text else text.split(';')
+        for statement in statements:
+            statement = statement.strip()
+            if not statement:
+                continue
+            match = SIMPLE_LINK_RE.fullmatch(statement)
+            if match:
+                source, operator, label, target = match.groups()
+                self.diagram.edges.add(self.node(source), self.node(target), operator, label.strip() if label else '')
+            elif statement == 'end':
+                self.close_group()
+            elif statement.startswith('subgraph'):
+                match = SUBGRAPH_RE.match(statement)
+                if not match:
+                    raise self.unexpected(statement)
+                self.subgraph(match.group(1).strip())
+            elif not IGNORED_RE.match(statement) and not self.common(statement):
+                self.flow_chain(CLASS_SUFFIX_RE.sub('', statement))
+
+    def subgraph(self, spec):
+        """subgraph id, subgraph id[title] or subgraph Some title (same rules as flowchart.py)"""
+        match = ID_RE.match(spec)
+        title, end = None, 0
+        if match:
+            title, _, end = _shape(spec, len(spec) - len(spec[match.end():].lstrip()), self.line)
+        if match and title is not None and not spec[end:].strip():
+            id = match.group(1)
+        elif match and match.end() == len(spec):
+            id = title = match.group(1)
+        else:
+            id, title = self.anonymous_id('subgraph'), spec.strip('"')
+        self.open_group(id, title, 'subgraph')
+
+    def node_group(self, text, position):
+        """`A[label] & B(label) ...` -> (node indexes, new position)"""
+        indexes = []
+        while True:
+            match = ID_RE.match(text, position)
+            if not match:
+                raise self.error(f'Expected a node id at {text[position:position + 20]!r}')
+            label, shape, position = _shape(text, match.end(), self.line)
+            indexes.append(self.node(match.group(1), label, shape))
+            ampersand = AMPERSAND_RE.match(text, position)
+            if not ampersand:
+                return indexes, position
+            position = ampersand.end()
+
+    def flow_chain(self, text):
+        edges = self.diagram.edges
+        sources, position = self.node_group(text, 0)
+        while position < len(text):
+            match = LINK_RE.match(text, position)
+            if not match or match.end() == position:
+                if text[position:].strip():
+                    raise self.error(_unexpected(text, position))
+                return
+            style, arrow, head, label = _link(match)
+            operator = _flow_operator(style, arrow, head)
+            targets, position = self.node_group(text, match.end())
+            for source in sources:
+                for target in targets:
+                    edges.add(source, target, operator, label)
+            sources = targets
+
+    # sequence
+
+    def sequence_line(self, text, raw):
+        word = text.split(None, 1)[0]
+        if word in FRAGMENTS:
+            self.open_group(self.anonymous_id(word), text[len(word):].strip(), word, data=[len(self.diagram.edges), None])
+        elif word in SECTIONS:
+            if not self.stack:
+                raise self.error(f'"{word}" outside alt/par/critical')
+            parent = self.diagram.groups[self.stack[-1]].parent
+            self.close_sequence_group()
+            self.open_group(self.anonymous_id(word), text[len(word):].strip(), word, parent,
+                            [len(self.diagram.edges), None])
+        elif word == 'end':
+            self.close_sequence_group()
+        elif word in ('participant', 'actor'):
+            match = PARTICIPANT_RE.match(text)
+            if not match:
+                raise self.unexpected(text)
+            kind, id, alias = match.groups()
+            self.node(id, alias.strip() if alias else None, kind)
+        elif word in ('Note', 'note'):
+            match = NOTE_RE.match(text)
+            if not match:
+                raise self.unexpected(text)
+            placement, participants, note = match.groups()
+            names = tuple(self.diagram.nodes[self.node(name.strip())].id for name in participants.split(','))
+            self.diagram.items.append(('note', placement, names, note.strip()))
+        elif word in SEQUENCE_IGNORED:
+            if word == 'title':
+                self.diagram.settings['title'] = text[5:].strip()
+        elif not self.common(text):
+            match = MESSAGE_RE.match(text)
+            if not match:
+                raise self.unexpected(text)
+            source, operator, activation, target, message = match.groups()
+            self.diagram.edges.add(self.node(source), self.node(target), operator, (message or '').strip(),
+                                   data=activation or None)
+
+    def close_sequence_group(self):
+        group = self.diagram.groups[self.close_group()]
+        group.data[1] = len(self.diagram.edges)
+
+    # class
+
+    def class_line(self, text, raw):
+        diagram = self.diagram
+        if self.body is not None:
+            if text == '}':
+                self.body = None
+            else:
+                diagram.nodes[self.body].data.append(text)
+            return
+        match = RELATION_RE.match(text)
+        if match:
+            source, left, operator, right, target, label = match.groups()
+            diagram.edges.add(self.node(source), self.node(target), operator, (label or '').strip(),
+                              data=(left, right) if left or right else None)
+            return
+        if text.startswith('class '):
+            match = CLASS_RE.match(CLASS_SUFFIX_RE.sub('', text))
+            if not match:
+                raise self.unexpected(text)
+            id, generic, label, opened, closed = match.groups()
+            index = self.node(id, label or (id + generic if generic else None))
+            if opened and not closed:
+                node = diagram.nodes[index]
+                if node.data is None:
+                    node.data = []
+                self.body = index
+            return
+        match = MEMBER_RE.match(text)
+        if match:
+            node = diagram.nodes[self.node(match.group(1))]
+            if node.data is None:
+                node.data = []
+            node.data.append(match.group(2).strip())
+            return
+        match = ANNOTATION_RE.match(text)
+        if match:
+            self.node(match.group(2), shape=sys.intern(match.group(1)))
+            return
+        match = NAMESPACE_RE.match(text)
+        if match:
+            self.open_group(match.group(1), match.group(1), 'namespace')
+        elif text == '}':
+            self.close_group('}')
+        elif text.split(None, 1)[0] not in CLASS_IGNORED and not self.common(text):
+            raise self.unexpected(text)
+
+    # state
+
+    def state_line(self, text, raw):
+        diagram = self.diagram
+        if self.note is not None:
+            if text in ('end note', 'endnote'):
+                self.note = None
+            return
+        match = STATE_LINK_RE.match(text)
+        if match:
+            source, target, label = match.groups()
+            diagram.edges.add(self.state(source, 'start'), self.state(target, 'end'), '-->', (label or '').strip())
+            return
+        word = text.split(None, 1)[0]
+        if word == 'state':
+            match = STATE_RE.match(CLASS_SUFFIX_RE.sub('', text))
+            if not match:
+                raise self.unexpected(text)
+            description, id, stereotype, opened = match.groups()
+            self.node(id, description, stereotype or ('composite' if opened else None))
+            if opened:
+                self.open_group(id, description or id, 'state')
+        elif text == '}':
+            self.close_group('}')
+        elif word == 'note':
+            match = STATE_NOTE_RE.match(text)
+            if not match:
+                raise self.unexpected(text)
+            placement, id, note = match.groups()
+            if note is None:
+                self.note = id
+            else:
+                diagram.items.append(('note', placement, (id,), note.strip()))
+        elif word in STATE_IGNORED or self.common(text):
+            return
+        else:
+            match = STATE_DESCRIPTION_RE.match(text)
+            if match:
+                self.node(match.group(1), match.group(2).strip())
+            elif re.fullmatch(r'[\w.-]+', text):
+                self.node(text)
+            else:
+                raise self.unexpected(text)
+
+    def state(self, id, side):
+        """[*] is the start (as a source) or end (as a target) of the enclosing composite state"""
+        if id != '[*]':
+            return self.node(id)
+        scope = self.diagram.groups[self.stack[-1]].id if self.stack else 'root'
+        return self.node(f'{scope}_{side}', '', side)
+
+    # er
+
+    def er_line(self, text, raw):
+        diagram = self.diagram
+        if self.body is not None:
+            if text == '}':
+                self.body = None
+                return
+            match = ATTRIBUTE_RE.match(text)
+            if not match:
+                raise self.unexpected(text)
+            diagram.nodes[self.body].data.append(match.groups())
+            return
+        match = ER_RELATION_RE.match(text)
+        if match:
+            source, left, line, right, target, label = match.groups()
+            diagram.edges.add(self.node(source), self.node(target), left + line + right, _unquote(label))
+            return
+        match = ENTITY_RE.match(text)
+        if match:
+            id, alias, opened = match.groups()
+            index = self.node(id, alias)
+            if opened:
+                node = diagram.nodes[index]
+                if node.data is None:
+                    node.data = []
+                self.body = index
+        elif not self.common(text):
+            raise self.unexpected(text)
+
+    # gantt
+
+    def gantt_line(self, text, raw):
+        diagram = self.diagram
+        word, _, rest = text.partition(' ')
+        if word in GANTT_SETTINGS:
+            diagram.settings[word] = rest.strip()
+        elif word == 'section':
+            if self.stack:
+                self.stack.pop()
+            self.open_group(self.anonymous_id('section'), rest.strip(), 'section')
+        elif self.common(text):
+            return
+        else:
+            label, colon, spec = text.partition(':')
+            if not colon:
+                raise self.unexpected(text)
+            parts = [part.strip() for part in spec.split(',')]
+            tags = tuple(part for part in parts if part in GANTT_TAGS)
+            fields = [part for part in parts if part not in GANTT_TAGS]
+            id = fields.pop(0) if len(fields) >= 3 else self.anonymous_id('task')
+            index = self.node(id, label.strip(), 'milestone' if 'milestone' in tags else None,
+                              (tags, tuple(fields)))
+            for field in fields:
+                keyword, _, ids = field.partition(' ')
+                if keyword in ('after', 'until'):
+                    self.pending.append((index, ids.split(), keyword, self.line))
+
+    # mindmap
+
+    def mindmap_line(self, text, raw):
+        if text.startswith('::'):
+            # ::icon(...) and :::class decorate the previous node
+            return
+        indent = len(raw) - len(raw.lstrip())
+        tree = self.tree
+        while tree and tree[-1][0] >= indent:
+            tree.pop()
+        if not tree and self.diagram.nodes:
+            raise self.error('A mindmap has a single root')
+
+        id = label = text
+        shape = self.default_shape
+        for opening, closing, name in MINDMAP_SHAPES:
+            position = text.find(opening)
+            if position >= 0 and text.endswith(closing) and len(text) >= position + len(opening) + len(closing):
+                label = _unquote(text[position + len(opening):len(text) - len(closing)])
+                id = text[:position].strip() or label
+                shape = name
+                break
+        index = self.new_node(id, label, shape)
+        if tree:
+            self.diagram.edges.add(tree[-1][1], index, '')
+        tree.append((indent, index))
+
+    # quadrant
+
+    def quadrant_line(self, text, raw):
+        word, _, rest = text.partition(' ')
+        if word in QUADRANT_SETTINGS:
+            self.diagram.settings[word] = rest.strip()
+            return
+        match = POINT_RE.match(text)
+        if match:
+            name, x, y, _ = match.groups()
+            try:
+                point = (float(x), float(y))
+            except ValueError:
+                raise self.error(f'Invalid point coordinates [{x}, {y}]') from None
+            self.node(name.strip(), data=point)
+        elif word not in ('classDef',) and not self.common(text):
+            raise self.unexpected(text)
+
+    # sankey
+
+    def sankey_line(self, text, raw):
+        fields = text.split(',') if '"' not in text else next(csv.reader([text]))
+        if len(fields) != 3:
+            raise self.error(f'Expected "source,target,value", got {text[:40]!r}')
+        try:
+            value = float(fields[2])
+        except ValueError:
+            raise self.error(f'Invalid flow value {fields[2]!r}') from None
+        self.diagram.edges.add(self.node(fields[0].strip()), self.node(fields[1].strip()), '', value=value)
+
+    # xychart
+
+    def xychart_line(self, text, raw):
+        word, _, rest = text.partition(' ')
+        if word in ('title', 'x-axis', 'y-axis'):
+            self.diagram.settings[word] = _unquote(rest) if word == 'title' else rest.strip()
+            return
+        match = SERIES_RE.match(text)
+        if match:
+            kind, quoted, bare, values = match.groups()
+            try:
+                series = array.array('d', (float(value) for value in values.split(',') if value.strip()))
+            except ValueError:
+                raise self.error(f'Invalid {kind} values') from None
+            self.diagram.items.append((kind, quoted or bare or '', series))
+        elif not self.common(text):
+            raise self.unexpected(text)
+
+    # architecture
+
+    def architecture_line(self, text, raw):
+        diagram = self.diagram
+        match = ARCHITECTURE_EDGE_RE.match(text)
+        if match:
+            source, source_port, left, label, right, target_port, target = match.groups()
+            diagram.edges.add(self.node(source), self.node(target), f'{left}--{right}', label or '',
+                              data=f'{source_port}:{target_port}')
+            return
+        match = ARCHITECTURE_RE.match(text)
+        junction = None if match else JUNCTION_RE.match(text)
+        if match:
+            kind, id, icon, label, parent = match.groups()
+        elif junction:
+            kind, (id, parent), icon, label = 'junction', junction.groups(), 'junction', None
+        elif self.common(text):
+            return
+        else:
+            raise self.unexpected(text)
+        if parent is not None and parent not in self.group_ids:
+            raise self.error(f'Unknown group {parent!r}')
+        group = self.group_ids[parent] if parent is not None else -1
+        if kind == 'group':
+            self.open_group(id, label or id, sys.intern(icon or 'group'), group)
+            # Groups nest through "in", not through blocks
+            self.stack.pop()
+        else:
+            index = self.node(id, label, sys.intern(icon) if icon else 'junction' if kind == 'junction' else None)
+            diagram.nodes[index].group = group
+
+    # block
+
+    def block_line(self, text, raw):
+        position = 0
+        pending = None
+        while position < len(text):
+            while position < len(text) and text[position].isspace():
+                position += 1
+            if position >= len(text):
+                break
+            if text.startswith('columns', position):
+                match = COLUMNS_RE.match(text, position)
+                if not match:
+                    raise self.unexpected(text)
+                if self.stack:
+                    self.diagram.groups[self.stack[-1]].data[1] = match.group(1)
+                else:
+                    self.diagram.settings['columns'] = match.group(1)
+                position = match.end()
+                continue
+            if text.startswith('end', position) and text[position + 3:position + 4] in ('', ' ', ';'):
+                self.close_group()
+                position += 3
+                continue
+            if position == 0 and (IGNORED_RE.match(text) or self.common(text)):
+                return
+            index, position = self.block_item(text, position)
+            if pending is not None and index is not None:
+                source, operator, label = pending
+                self.diagram.edges.add(source, index, operator, label)
+                pending = None
+            link = LINK_RE.match(text, position)
+            if link and link.end() > position and index is not None:
+                style, arrow, head, label = _link(link)
+                pending = (index, _flow_operator(style, arrow, head), label)
+                position = link.end()
+        if pending is not None:
+            raise self.error('Link without a target block')
+
+    def block_item(self, text, position):
+        """One block, space or composite opening at position -> (node index or None, new position)"""
+        opening = BLOCK_OPEN_RE.match(text, position)
+        if opening:
+            label, _, position = _shape(text, opening.end(), self.line)
+            width = WIDTH_RE.match(text, position)
+            if width:
+                position = width.end()
+            id = opening.group(1) or self.anonymous_id('block')
+            self.open_group(id, label or id, 'block', data=[int(width.group(1)) if width else None, None])
+            return None, position
+        match = ID_RE.match(text, position)
+        if not match:
+            if SHAPE_DATA_RE.match(text, position):
+                raise self.error(_unexpected(text, position))
+            raise self.error(f'Expected a block at {text[position:position + 20]!r}')
+        id = match.group(1)
+        label, shape, position = _shape(text, match.end(), self.line)
+        width = WIDTH_RE.match(text, position)
+        if width:
+            position = width.end()
+        if id == 'space':
+            index = self.new_node(self.anonymous_id('space'), '', 'space')
+            self.diagram.nodes[index].data = int(width.group(1)) if width else None
+            return None, position
+        return self.node(id, label, shape, int(width.group(1)) if width else None), position
+
+
+def parse_diagram(source):
+    """Parse any supported diagram; raises MermaidSyntaxError"""
+    return _Parser(source).parse()
+
+def diagram_type(source):
+    """Type of the first header in source ('flowchart', 'sequence', ...), or None"""
+    front_matter = None
+    directive = False
+    for line in source.splitlines():
+        line = line.strip()
+        if directive:
+            directive = not line.endswith('}%%')
+            continue
+        if line == '---' and front_matter is not False:
+            front_matter = not front_matter
+        elif front_matter:
+            continue
+        elif line.startswith('%%{') and not line.endswith('}%%'):
+            directive = True
+        elif line and not line.startswith('%%'):
+            return HEADERS.get(line.split(None, 1)[0])
+        elif line:
+            continue
+        if front_matter is None:
+            front_matter = False
+    return None
@@ -0,0 +1,130 @@
+"""
+Mermaid code extraction from model output
+extract_mermaid_code() cleans a complete response; MermaidStreamExtractor does
+the same incrementally, one content delta at a time.
+"""
+
+import re
+
+# First words that open a Mermaid diagram (or a directive/comment before it)
+MERMAID_HEADERS = frozenset((
+    'graph', 'flowchart', 'sequenceDiagram', 'classDiagram', 'classDiagram-v2',
+    'stateDiagram', 'stateDiagram-v2', 'erDiagram', 'gantt', 'pie', 'journey',
+    'gitGraph', 'mindmap', 'timeline', 'quadrantChart', 'requirementDiagram',
+    'C4Context', 'C4Container', 'C4Component', 'C4Dynamic', 'C4Deployment',
+    'sankey-beta', 'xychart-beta', 'block-beta', 'architecture-beta',
+    'packet-beta', 'kanban', 'treemap', 'treemap-beta', 'radar-beta'
+))
+
+FENCE = '```'
+
+def extract_mermaid_code(content):
+    """Extract clean Mermaid code from AI response"""
+    code = content.strip()
+
+    # Remove markdown code blocks
+    code = re.sub(r'^```mermaid\n?', '', code, flags=re.IGNORECASE)
+    code = re.sub(r'^```\n?', '', code)
+    code = re.sub(r'\n?```$', '', code)
+
+    return code.strip()
+
+def is_mermaid_header(line):
+    """True if a stripped line starts a diagram (header keyword, %% directive or comment)"""
+    if line.startswith('%%'):
+        return True
+    words = line.split(None, 1)
+    return bool(words) and words[0] in MERMAID_HEADERS
+
+
+class MermaidStreamExtractor:
+    """
+    Streaming state machine that strips code fences and prose around the code.
+
+    States: 'preamble' (before the code starts), 'code', 'done' (closing fence
+    seen; anything after it is ignored). In the preamble, whole lines are
+    buffered until they turn out to be an opening fence, a diagram header or
+    prose. Inside the code, text is emitted as soon as it cannot be the start
+    of a closing fence, so each feed() costs O(delta).
+    """
+
+    def __init__(self):
+        self.state = 'preamble'
+        self._held = ''
+        self._line_started = False
+        self._emitted = []
+        self._raw = []
+
+    def feed(self, text):
+        """Consume a content delta, returning the clean code delta (possibly '')"""
+        self._raw.append(text)
+        if self.state == 'done':
+            return ''
+
+        out = []
+        buffer = self._held + text
+        self._held = ''
+        start = 0
+        while self.state != 'done':
+            end = buffer.find('\n', start)
+            if end < 0:
+                self._partial(buffer[start:], out)
+                break
+            self._line(buffer[start:end], out)
+            start = end + 1
+
+        delta = ''.join(out)
+        if delta:
+            self._emitted.append(delta)
+        return delta
+
+    def finish(self):
+        """Flush at end of stream, returning the last clean code delta"""
+        delta = ''
+        if self.state == 'code' and self._held and not self._held.strip().startswith(FENCE):
+            delta = self._held
+            self._emitted.append(delta)
+        self._held = ''
+        self.state = 'done'
+        return delta
+
+    @property
+    def code(self):
+        """Canonical code: the emitted stream, or a full-response extraction if no code was recognised"""
+        code = ''.join(self._emitted).strip()
+        return code if code else extract_mermaid_code(''.join(self._raw))
+
+    def _line(self, line, out):
+        if self.state == 'preamble':
+            stripped = line.strip()
+            if stripped.startswith(FENCE):
+                self.state = 'code'
+            elif is_mermaid_header(stripped):
+                self.state = 'code'
+                out.append(line + '\n')
+            return
+
+        # Inside the code: a line that has not been emitted yet may be the closing fence
+        if not self._line_started and line.strip().startswith(FENCE):
+            self.state = 'done'
+            return
+        out.append(line + '\n')
+        self._line_started = False
+
+    def _partial(self, partial, out):
+        if self.state == 'preamble' or not partial:
+            self._held = partial
+            return
+
+        if self._line_started:
+            out.append(partial)
+            return
+
+        stripped = partial.lstrip()
+        if FENCE.startswith(stripped) or stripped.startswith(FENCE):
+            # Could still become a closing fence: wait for more text
+            self._held = partial
+            return
+
+        out.append(partial)
+        self._line_started = True
@@ -0,0 +1,332 @@
+"""
+Flowchart parser
+Parses Mermaid `flowchart`/`graph` sources into nodes, edges and subgraphs
+for the server-side renderer. Styling statements (classDef, class, style,
+linkStyle, click) are accepted and ignored.
+"""
+
+import re
+
+DIRECTIONS = ('TD', 'TB', 'BT', 'LR', 'RL')
+
+HEADER_RE = re.compile(r'^(?:graph|flowchart)(?:\s+(TD|TB|BT|LR|RL))?\s*$')
+SUBGRAPH_RE = re.compile(r'^subgraph\s+(.+)$')
+IGNORED_RE = re.compile(r'^(?:classDef|class|style|linkStyle|click|direction|accTitle|accDescr)\b')
+# '@' starts Mermaid 11 shape data and edge ids, so it never belongs to an id
+ID_RE = re.compile(r'\s*([^\s&;|"\'\[\](){}<>=.:@-][^\s&;|"\'\[\](){}<>=:@-]*)')
+# A class name may contain '-', but not the '--', '-.' or '->' of a link that follows it (A:::hot-->B)
+CLASS_SUFFIX_RE = re.compile(r':::(?:\w|-(?![-.>]))+')
+AMPERSAND_RE = re.compile(r'\s*&')
+
+# Link operators: A --> B, A --- B, A -.-> B, A ==> B, A --o B, A <--> B, with an
+# optional |label|, and the text form A -- label --> B. Without a space after the
+# opening (A--label-->B) the label cannot start like the rest of a link (A--oB is a circle end).
+LINK_RE = re.compile(r'''
+    \s*
+    (?:
+        (?P<thead><)?(?P<topen>--|==|-\.)(?:\s+|(?=[^\s|=.>xo-]|[xo]\w))
+        (?P<text>[^|]+?)\s*(?P<tline>-{2,}|={2,}|\.+-)(?P<ttail>>|[xo](?!\w))?
+      | (?P<head><|[xo](?=[-=]))?(?P<line>-{3,}|={3,}|-{2}(?=[>xo])|={2}(?=[>xo])|-\.+-)(?P<tail>>|[xo](?!\w))?
+    )
+    (?:\s*\|(?P<label>[^|]*)\|)?
+''', re.X)
+
+# Text that starts like a link but that LINK_RE does not accept (A ~~~ B, A -- B)
+LINK_START_RE = re.compile(r'\s*(?:<|[xo](?=[-=.]))?[-=.~]')
+# Mermaid 11 shape data (A@{ shape: rect }), which the renderer does not support
+SHAPE_DATA_RE = re.compile(r'\s*@\{')
+
+# (opening, closing, shape), longest openings first
+SHAPES = (
+    ('(((', ')))', 'double_circle'),
+    ('((', '))', 'circle'),
+    ('([', '])', 'stadium'),
+    ('[[', ']]', 'subroutine'),
+    ('[(', ')]', 'cylinder'),
+    ('{{', '}}', 'hexagon'),
+    ('[/', '/]', 'parallelogram'),
+    ('[\\', '\\]', 'parallelogram_alt'),
+    ('(', ')', 'round'),
+    ('[', ']', 'rect'),
+    ('{', '}', 'diamond'),
+    ('>', ']', 'flag'),
+)
+
+# [/ ... \] and [\ ... /] are trapezoids
+TRAPEZOIDS = {('[/', '\\]'): 'trapezoid', ('[\\', '/]'): 'trapezoid_alt'}
+
+
+class FlowchartSyntaxError(ValueError):
+    """Raised for sources the parser cannot read, with the 1-based line number"""
+
+    def __init__(self, message, line=None):
+        super().__init__(f'Line {line}: {message}' if line else message)
+        self.line = line
+
+
+class Node:
+    def __init__(self, id, label=None, shape='rect'):
+        self.id = id
+        self.label = id if label is None else label
+        self.shape = shape
+        self.subgraph = None
+
+    def __repr__(self):
+        return f'Node({self.id!r}, {self.label!r}, {self.shape!r})'
+
+
+class Edge:
+    """style is 'solid', 'dotted' or 'thick'; arrow/head are None, 'arrow', 'cross' or 'circle'"""
+
+    def __init__(self, source, target, label='', style='solid', arrow='arrow', head=None):
+        self.source = source
+        self.target = target
+        self.label = label
+        self.style = style
+        self.arrow = arrow
+        self.head = head
+
+    def __repr__(self):
+        return f'Edge({self.source!r}, {self.target!r}, {self.label!r})'
+
+
+class Subgraph:
+    def __init__(self, id, title, parent=None):
+        self.id = id
+        self.title = title
+        self.parent = parent
+        self.nodes = []
+
+    def __repr__(self):
+        return f'Subgraph({self.id!r}, {self.title!r})'
+
+
+class Flowchart:
+    """Parsed diagram; nodes keep declaration order"""
+
+    def __init__(self, direction='TD'):
+        self.direction = direction
+        self.nodes = {}
+        self.edges = []
+        self.subgraphs = {}
+
+    def chain(self, node):
+        """Subgraph ids containing the node, outermost first"""
+        chain = []
+        current = self.nodes[node].subgraph
+        while current is not None:
+            chain.append(current)
+            current = self.subgraphs[current].parent
+        chain.reverse()
+        return chain
+
+    def depth(self, subgraph):
+        """Nesting level of a subgraph (0 for top level)"""
+        level = 0
+        parent = self.subgraphs[subgraph].parent
+        while parent is not None:
+            level += 1
+            parent = self.subgraphs[parent].parent
+        return level
+
+
+ARROWS = {'>': 'arrow', 'x': 'cross', 'o': 'circle', '<': 'arrow'}
+
+def _link(match):
+    """(style, arrow, head, label) for a LINK_RE match"""
+    if match.group('topen'):
+        operator = match.group('topen') + match.group('tline')
+        tail, head, label = match.group('ttail'), match.group('thead'), match.group('text')
+    else:
+        operator = match.group('line')
+        tail, head, label = match.group('tail'), match.group('head'), ''
+    if match.group('label') is not None:
+        label = match.group('label')
+    style = 'thick' if '=' in operator else 'dotted' if '.' in operator else 'solid'
+    return style, ARROWS.get(tail), ARROWS.get(head), label.strip().strip('"')
+
+def _unexpected(text, position):
+    """Error message for text at position that is neither a link nor the end of the statement"""
+    snippet = text[position:position + 20].strip()
+    if SHAPE_DATA_RE.match(text, position):
+        return f'Unsupported shape syntax {snippet!r} (use A[text], A(text), A{{text}} or another bracket shape)'
+    if LINK_START_RE.match(text, position):
+        return f'Unsupported link syntax {snippet!r} (use -->, ---, -.->, ==>, -- text --> or -->|text|)'
+    return f'Unexpected {snippet!r}'
+
+def _shape(text, position, line):
+    """Parse an optional shape after a node id; returns (label, shape, new position)"""
+    for opening, closing, shape in SHAPES:
+        if not text.startswith(opening, position):
+            continue
+        start = position + len(opening)
+        if text.startswith('"', start):
+            quote_end = text.find('"', start + 1)
+            if quote_end < 0:
+                raise FlowchartSyntaxError('Unterminated quoted label', line)
+            label = text[start + 1:quote_end]
+            search_from = quote_end + 1
+        else:
+            label = None
+            search_from = start
+        if opening in ('[/', '[\\'):
+            # Parallelograms and trapezoids close with either slash
+            ends = [(text.find(end, search_from), end) for end in ('/]', '\\]')]
+            ends = [(index, end) for index, end in ends if index >= 0]
+            if not ends:
+                raise FlowchartSyntaxError(f'Missing closing bracket for {opening}', line)
+            close_at, closing = min(ends)
+            shape = TRAPEZOIDS.get((opening, closing), shape)
+        else:
+            close_at = text.find(closing, search_from)
+            if close_at < 0:
+                raise FlowchartSyntaxError(f'Missing closing {closing!r}', line)
+        if label is None:
+            label = text[start:close_at].strip()
+        return label, shape, close_at + len(closing)
+    return None, None, position
+
+
+class _Parser:
+    def __init__(self, source):
+        self.source = source
+        self.chart = None
+        self.stack = []
+        self.anonymous = 0
+
+    def parse(self):
+        for number, raw in enumerate(self.source.splitlines(), 1):
+            line = raw.strip()
+            if not line or line.startswith('%%'):
+                continue
+            if self.chart is None:
+                match = HEADER_RE.match(line.rstrip(';'))
+                if not match:
+                    raise FlowchartSyntaxError('Expected "flowchart <direction>" or "graph <direction>"', number)
+                self.chart = Flowchart(match.group(1) or 'TD')
+                continue
+            statements = [line] if '"' in line else [part.strip() for part in line.split(';')]
+            for statement in statements:
+                if statement:
+                    self.statement(statement, number)
+        if self.chart is None:
+            raise FlowchartSyntaxError('Empty diagram')
+        if self.stack:
+            raise FlowchartSyntaxError(f'Subgraph {self.stack[-1]!r} is missing "end"')
+        self.resolve_subgraph_edges()
+        return self.chart
+
+    def statement(self, text, line):
+        if text == 'end':
+            if not self.stack:
+                raise FlowchartSyntaxError('"end" without a matching subgraph', line)
+            self.stack.pop()
+            return
+        match = SUBGRAPH_RE.match(text)
+        if match:
+            self.open_subgraph(match.group(1).strip(), line)
+            return
+        if IGNORED_RE.match(text):
+            return
+        self.chain(CLASS_SUFFIX_RE.sub('', text), line)
+
+    def open_subgraph(self, spec, line):
+        """subgraph id, subgraph id[title] or subgraph Some title"""
+        match = ID_RE.match(spec)
+        title, end = None, 0
+        if match:
+            # Allow "subgraph id [title]" as well as "subgraph id[title]"
+            title, _, end = _shape(spec, len(spec) - len(spec[match.end():].lstrip()), line)
+        if match and title is not None and not spec[end:].strip():
+            id = match.group(1)
+        elif match and match.end() == len(spec):
+            id = title = match.group(1)
+        else:
+            self.anonymous += 1
+            id, title = f'subgraph{self.anonymous}', spec.strip('"')
+        if id in self.chart.subgraphs:
+            raise FlowchartSyntaxError(f'Duplicate subgraph id {id!r}', line)
+        self.chart.subgraphs[id] = Subgraph(id, title, self.stack[-1] if self.stack else None)
+        self.stack.append(id)
+
+    def node_group(self, text, position, line):
+        """Parse `A[label] & B(label) ...`; returns (node ids, new position)"""
+        ids = []
+        while True:
+            match = ID_RE.match(text, position)
+            if not match:
+                raise FlowchartSyntaxError(f'Expected a node id at {text[position:position + 20]!r}', line)
+            id = match.group(1)
+            label, shape, position = _shape(text, match.end(), line)
+            self.declare(id, label, shape)
+            ids.append(id)
+            ampersand = AMPERSAND_RE.match(text, position)
+            if not ampersand:
+                return ids, position
+            position = ampersand.end()
+
+    def declare(self, id, label, shape):
+        nodes = self.chart.nodes
+        node = nodes.get(id)
+        if node is None:
+            node = nodes[id] = Node(id, label, shape or 'rect')
+        elif label is not None:
+            node.label, node.shape = label, shape
+        if node.subgraph is None and self.stack:
+            node.subgraph = self.stack[-1]
+            self.chart.subgraphs[node.subgraph].nodes.append(id)
+
+    def chain(self, text, line):
+        """A node statement or a chain of links: A --> B -->|x| C & D"""
+        sources, position = self.node_group(text, 0, line)
+        while position < len(text):
+            match = LINK_RE.match(text, position)
+            if not match or match.end() == position:
+                if text[position:].strip():
+                    raise FlowchartSyntaxError(_unexpected(text, position), line)
+                return
+            style, arrow, head, label = _link(match)
+            targets, position = self.node_group(text, match.end(), line)
+            for source in sources:
+                for target in targets:
+                    self.chart.edges.append(Edge(source, target, label, style, arrow, head))
+            sources = targets
+
+    def resolve_subgraph_edges(self):
+        """Edges to a subgraph id attach to its first node (the renderer has no cluster ports)"""
+        chart = self.chart
+        for id, subgraph in chart.subgraphs.items():
+            node = chart.nodes.get(id)
+            if node is None or node.label != id or node.shape != 'rect':
+                continue
+            members = self.members(id)
+            if not members:
+                continue
+            del chart.nodes[id]
+            if node.subgraph is not None:
+                chart.subgraphs[node.subgraph].nodes.remove(id)
+            for edge in chart.edges:
+                if edge.source == id:
+                    edge.source = members[0]
+                if edge.target == id:
+                    edge.target = members[0]
+
+    def members(self, subgraph_id):
+        members = list(self.chart.subgraphs[subgraph_id].nodes)
+        for child in self.chart.subgraphs.values():
+            if child.parent == subgraph_id:
+                members.extend(self.members(child.id))
+        return [member for member in members if member != subgraph_id]
+
+
+def parse_flowchart(source):
+    """Parse a flowchart/graph diagram; raises FlowchartSyntaxError"""
+    return _Parser(source).parse()
+
+def is_flowchart(source):
+    """True when the first statement is a flowchart/graph header"""
+    for line in source.splitlines():
+        line = line.strip()
+        if line and not line.startswith('%%'):
+            return bool(HEADER_RE.match(line.rstrip(';')))
+    return False
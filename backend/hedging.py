@@ -0,0 +1,216 @@
+"""
+Hedged upstream requests for /api/generate
+If the primary request has not produced a first token after a delay taken
+from the observed time-to-first-token distribution, a second (hedge) request
+is fired. The first valid result wins and the other request is cancelled.
+"""
+
+import asyncio
+import collections
+import math
+import queue
+import threading
+import time
+
+
+class Attempt:
+    """One upstream request taking part in a hedge (thread version)"""
+
+    def __init__(self, name):
+        self.name = name
+        self.started = time.perf_counter()
+        self.ttft = None
+        self.cancelled = False
+        self.on_cancel = None
+        self.first_token = threading.Event()
+
+    def mark_first_token(self):
+        if self.ttft is None:
+            self.ttft = time.perf_counter() - self.started
+            self.first_token.set()
+
+    def cancel(self):
+        """Stop the attempt (on_cancel is set by the attempt once it has something to close)"""
+        self.cancelled = True
+        on_cancel = self.on_cancel
+        if on_cancel is not None:
+            try:
+                on_cancel()
+            except Exception:
+                pass
+
+
+class AsyncAttempt(Attempt):
+    """One upstream request taking part in a hedge (asyncio version)"""
+
+    def __init__(self, name):
+        super().__init__(name)
+        self.first_token = asyncio.Event()
+
+
+class Hedger:
+    """
+    Runs a primary attempt and, when it is slow to start, a hedge attempt.
+
+    The hedge delay is the `percentile` of recent time-to-first-token samples,
+    clamped to [min_delay, max_delay]; initial_delay applies until
+    min_samples have been seen.
+    """
+
+    def __init__(self, percentile=95, min_delay=0.5, max_delay=10.0, initial_delay=3.0,
+                 window=500, min_samples=20):
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.initial_delay = initial_delay
+        self.min_samples = min_samples
+        self._samples = collections.deque(maxlen=window)
+        self._lock = threading.Lock()
+        self._counters = collections.Counter()
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def record_ttft(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def _quantile(self, samples, percentile):
+        ordered = sorted(samples)
+        index = max(0, math.ceil(percentile / 100 * len(ordered)) - 1)
+        return ordered[index]
+
+    def delay(self):
+        """Seconds to wait for the primary's first token before hedging"""
+        with self._lock:
+            samples = list(self._samples)
+        if len(samples) < self.min_samples:
+            return self.initial_delay
+        return min(max(self._quantile(samples, self.percentile), self.min_delay), self.max_delay)
+
+    def _finish(self, attempts, winner):
+        """Cancel the losers and record the outcome"""
+        for attempt in attempts:
+            if attempt is not winner and attempt.ttft is None and not attempt.cancelled:
+                # Censored sample: the attempt was at least this slow to start
+                self.record_ttft(time.perf_counter() - attempt.started)
+            if attempt is not winner:
+                attempt.cancel()
+        if len(attempts) > 1 and winner is not None:
+            self._count(f'{winner.name}_wins')
+
+    def _pick(self, outcome, pending, is_valid, state):
+        """Handle one finished attempt; returns the winning (attempt, result) or None to keep waiting"""
+        attempt, result, error = outcome
+        if attempt.ttft is not None:
+            self.record_ttft(attempt.ttft)
+        if error is not None:
+            state.setdefault('error', error)
+        elif is_valid(result):
+            return attempt, result
+        elif 'fallback' not in state:
+            # Successful but invalid: only used if nothing valid arrives
+            state['fallback'] = (attempt, result)
+        if not pending:
+            if 'fallback' in state:
+                return state['fallback']
+            raise state['error']
+        return None
+
+    def run(self, primary, hedge, is_valid):
+        """
+        Run primary(attempt) and, if needed, hedge(attempt) on threads
+        Returns (result, winning Attempt); raises the first error if every attempt failed
+        """
+        results = queue.Queue()
+
+        def launch(fn, attempt):
+            def target():
+                try:
+                    outcome = (attempt, fn(attempt), None)
+                except Exception as e:
+                    outcome = (attempt, None, e)
+                # A finished attempt counts as started for the hedge timer
+                attempt.first_token.set()
+                results.put(outcome)
+            threading.Thread(target=target, daemon=True).start()
+            return attempt
+
+        self._count('requests')
+        attempts = [launch(primary, Attempt('primary'))]
+
+        if not attempts[0].first_token.wait(self.delay()):
+            self._count('hedged')
+            attempts.append(launch(hedge, Attempt('hedge')))
+
+        state = {}
+        pending = len(attempts)
+        winner = None
+        try:
+            while True:
+                pending -= 1
+                picked = self._pick(results.get(), pending, is_valid, state)
+                if picked is not None:
+                    winner, result = picked
+                    return result, winner
+        finally:
+            self._finish(attempts, winner)
+
+    async def arun(self, primary, hedge, is_valid):
+        """asyncio variant of run(): primary/hedge are coroutine functions taking an AsyncAttempt"""
+        async def wrapped(fn, attempt):
+            try:
+                return attempt, await fn(attempt), None
+            except Exception as e:
+                return attempt, None, e
+            finally:
+                attempt.first_token.set()
+
+        self._count('requests')
+        primary_attempt = AsyncAttempt('primary')
+        tasks = {asyncio.ensure_future(wrapped(primary, primary_attempt)): primary_attempt}
+
+        try:
+            await asyncio.wait_for(primary_attempt.first_token.wait(), self.delay())
+        except asyncio.TimeoutError:
+            self._count('hedged')
+            hedge_attempt = AsyncAttempt('hedge')
+            tasks[asyncio.ensure_future(wrapped(hedge, hedge_attempt))] = hedge_attempt
+
+        state = {}
+        pending = set(tasks)
+        winner = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                done = list(done)
+                for index, task in enumerate(done):
+                    # Both attempts can finish in one wakeup: the ones not looked at yet are still outstanding
+                    outstanding = len(pending) + len(done) - index - 1
+                    picked = self._pick(task.result(), outstanding, is_valid, state)
+                    if picked is not None:
+                        winner, result = picked
+                        return result, winner
+        finally:
+            self._finish(list(tasks.values()), winner)
+            for task in pending:
+                task.cancel()
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+            samples = list(self._samples)
+        requests = counters.get('requests', 0)
+        hedged = counters.get('hedged', 0)
+        return {
+            'requests': requests,
+            'hedged': hedged,
+            'hedge_rate': round(hedged / requests, 4) if requests else 0.0,
+            'primary_wins': counters.get('primary_wins', 0),
+            'hedge_wins': counters.get('hedge_wins', 0),
+            'current_delay_ms': round(self.delay() * 1000, 1),
+            'ttft_samples': len(samples),
+            'ttft_p50_ms': round(self._quantile(samples, 50) * 1000, 1) if samples else None,
+            'ttft_p95_ms': round(self._quantile(samples, 95) * 1000, 1) if samples else None
+        }
@@ -0,0 +1,379 @@
+"""
+Layered (Sugiyama-style) graph layout
+Greedy cycle removal, longest-path layering, dummy nodes along long edges,
+barycenter crossing reduction and barycenter-aligned coordinates. Works on
+plain ids and box sizes; flowchart.py and renderer.py supply those.
+"""
+
+import heapq
+
+VERTICAL = ('TD', 'TB', 'BT')
+
+
+class Layout:
+    """
+    nodes: id -> (center x, center y, width, height)
+    edges: one polyline [(x, y), ...] per input edge, source to target
+    clusters: id -> (left, top, width, height)
+    """
+
+    def __init__(self, width, height, nodes, edges, clusters):
+        self.width = width
+        self.height = height
+        self.nodes = nodes
+        self.edges = edges
+        self.clusters = clusters
+
+
+def _break_cycles(count, sources, targets, out_edges, in_edges):
+    """
+    Edge indices to reverse so the graph is acyclic (Eades-Lin-Smyth greedy
+    heuristic): peel off sinks and sources, otherwise the vertex with the
+    largest out-degree minus in-degree, and reverse edges pointing backwards
+    in the resulting order
+    """
+    outdegree = [len(edges) for edges in out_edges]
+    indegree = [len(edges) for edges in in_edges]
+    removed = [False] * count
+    sinks = [v for v in range(count) if outdegree[v] == 0]
+    starts = [v for v in range(count) if outdegree[v] and indegree[v] == 0]
+    heap = [(indegree[v] - outdegree[v], v) for v in range(count)]
+    heapq.heapify(heap)
+    head, tail = [], []
+
+    def remove(vertex):
+        removed[vertex] = True
+        for edge in out_edges[vertex]:
+            other = targets[edge]
+            if not removed[other]:
+                indegree[other] -= 1
+                _requeue(other)
+        for edge in in_edges[vertex]:
+            other = sources[edge]
+            if not removed[other]:
+                outdegree[other] -= 1
+                _requeue(other)
+
+    def _requeue(vertex):
+        if outdegree[vertex] == 0:
+            sinks.append(vertex)
+        elif indegree[vertex] == 0:
+            starts.append(vertex)
+        else:
+            heapq.heappush(heap, (indegree[vertex] - outdegree[vertex], vertex))
+
+    remaining = count
+    while remaining:
+        if sinks:
+            vertex = sinks.pop()
+            if not removed[vertex]:
+                tail.append(vertex)
+                remove(vertex)
+                remaining -= 1
+            continue
+        if starts:
+            vertex = starts.pop()
+            if not removed[vertex]:
+                head.append(vertex)
+                remove(vertex)
+                remaining -= 1
+            continue
+        key, vertex = heapq.heappop(heap)
+        if removed[vertex] or key != indegree[vertex] - outdegree[vertex]:
+            continue
+        head.append(vertex)
+        remove(vertex)
+        remaining -= 1
+
+    rank = [0] * count
+    for position, vertex in enumerate(head + tail[::-1]):
+        rank[vertex] = position
+    return {edge for edge in range(len(sources))
+            if sources[edge] != targets[edge] and rank[sources[edge]] > rank[targets[edge]]}
+
+def _assign_layers(count, dag):
+    """Longest-path layering, then sources pulled down next to their first successor"""
+    successors = [[] for _ in range(count)]
+    indegree = [0] * count
+    for source, target in dag:
+        successors[source].append(target)
+        indegree[target] += 1
+
+    order = [vertex for vertex in range(count) if indegree[vertex] == 0]
+    remaining = list(indegree)
+    for vertex in order:
+        for target in successors[vertex]:
+            remaining[target] -= 1
+            if remaining[target] == 0:
+                order.append(target)
+
+    layer = [0] * count
+    for vertex in order:
+        for target in successors[vertex]:
+            if layer[target] < layer[vertex] + 1:
+                layer[target] = layer[vertex] + 1
+    for vertex in reversed(order):
+        if indegree[vertex] == 0 and successors[vertex]:
+            layer[vertex] = min(layer[target] for target in successors[vertex]) - 1
+    return layer
+
+def _common_prefix(first, second):
+    length = 0
+    for a, b in zip(first, second):
+        if a != b:
+            break
+        length += 1
+    return first[:length]
+
+def _order_key(vertices, bary, chains):
+    """Sort key keeping each cluster contiguous, clusters ordered by their mean barycenter"""
+    if not chains:
+        return bary.__getitem__
+    totals = {}
+    for vertex in vertices:
+        for cluster in chains[vertex]:
+            entry = totals.get(cluster)
+            if entry is None:
+                totals[cluster] = [bary[vertex], 1]
+            else:
+                entry[0] += bary[vertex]
+                entry[1] += 1
+    means = {cluster: total / count for cluster, (total, count) in totals.items()}
+    return lambda vertex: tuple((means[c], c) for c in chains[vertex]) + ((bary[vertex], ''),)
+
+def _reorder(layers, neighbours, position, chains, forward):
+    """One barycenter sweep over the layers, top-down or bottom-up"""
+    indices = range(1, len(layers)) if forward else range(len(layers) - 2, -1, -1)
+    bary = {}
+    for index in indices:
+        vertices = layers[index]
+        lookup = position.__getitem__
+        for vertex in vertices:
+            adjacent = neighbours[vertex]
+            bary[vertex] = sum(map(lookup, adjacent)) / len(adjacent) if adjacent else position[vertex]
+        vertices.sort(key=_order_key(vertices, bary, chains))
+        for slot, vertex in enumerate(vertices):
+            position[vertex] = slot
+
+def _place(vertices, desired, gaps):
+    """
+    Positions as close to `desired` as the minimum gaps allow, keeping order:
+    the average of the leftmost-feasible and rightmost-feasible placements
+    """
+    count = len(vertices)
+    left = [0.0] * count
+    right = [0.0] * count
+    for i in range(count):
+        want = desired[i]
+        left[i] = want if i == 0 else max(want, left[i - 1] + gaps[i - 1])
+    for i in range(count - 1, -1, -1):
+        want = desired[i]
+        right[i] = want if i == count - 1 else min(want, right[i + 1] - gaps[i])
+    return [(a + b) / 2 for a, b in zip(left, right)]
+
+def _clip(center, size, toward):
+    """Point where the segment from a box center toward `toward` leaves the box"""
+    cx, cy = center
+    dx, dy = toward[0] - cx, toward[1] - cy
+    if dx == 0 and dy == 0:
+        return center
+    half_w, half_h = size[0] / 2, size[1] / 2
+    scale = min(half_w / abs(dx) if dx else float('inf'), half_h / abs(dy) if dy else float('inf'))
+    return (cx + dx * scale, cy + dy * scale)
+
+def layered_layout(nodes, edges, sizes, direction='TD', chains=None, node_sep=30, rank_sep=50,
+                   edge_sep=10, sweeps=4, align_passes=2, margin=16, cluster_padding=12, cluster_title=24):
+    """
+    Lay out `nodes` (ids, in declaration order) and `edges` ((source, target) pairs).
+
+    sizes: id -> (width, height). chains: id -> subgraph ids containing the node,
+    outermost first; members of a subgraph are kept together and boxed.
+    """
+    chains = chains or {}
+    index = {node: i for i, node in enumerate(nodes)}
+    count = len(nodes)
+    sources = [index[source] for source, _ in edges]
+    targets = [index[target] for _, target in edges]
+    out_edges = [[] for _ in range(count)]
+    in_edges = [[] for _ in range(count)]
+    for edge, (source, target) in enumerate(zip(sources, targets)):
+        if source != target:
+            out_edges[source].append(edge)
+            in_edges[target].append(edge)
+
+    reverse = _break_cycles(count, sources, targets, out_edges, in_edges)
+    dag = []
+    for edge, (source, target) in enumerate(zip(sources, targets)):
+        if source == target:
+            continue
+        dag.append((target, source) if edge in reverse else (source, target))
+    layer = _assign_layers(count, dag)
+
+    # Long edges become chains of dummy vertices, one per layer crossed
+    vertical = direction in VERTICAL
+    chain_of = [tuple(chains.get(node, ())) for node in nodes]
+    breadth = [sizes[node][0] if vertical else sizes[node][1] for node in nodes]
+    depth = [sizes[node][1] if vertical else sizes[node][0] for node in nodes]
+    paths = []
+    up = [[] for _ in range(count)]
+    down = [[] for _ in range(count)]
+    dag_index = 0
+    for edge, (source, target) in enumerate(zip(sources, targets)):
+        if source == target:
+            paths.append(None)
+            continue
+        top, bottom = dag[dag_index]
+        dag_index += 1
+        path = [top]
+        shared = _common_prefix(chain_of[top], chain_of[bottom])
+        for rank in range(layer[top] + 1, layer[bottom]):
+            dummy = len(layer)
+            layer.append(rank)
+            chain_of.append(shared)
+            breadth.append(edge_sep)
+            depth.append(0)
+            up.append([])
+            down.append([])
+            path.append(dummy)
+        path.append(bottom)
+        for upper, lower in zip(path, path[1:]):
+            down[upper].append(lower)
+            up[lower].append(upper)
+        paths.append(path[::-1] if edge in reverse else path)
+
+    total = len(layer)
+    layers = [[] for _ in range(max(layer, default=-1) + 1)]
+    for vertex in range(total):
+        layers[layer[vertex]].append(vertex)
+
+    # Crossing reduction
+    position = [0] * total
+    for vertices in layers:
+        for slot, vertex in enumerate(vertices):
+            position[vertex] = slot
+    has_clusters = any(chain_of)
+    sort_chains = chain_of if has_clusters else None
+    for _ in range(sweeps):
+        _reorder(layers, up, position, sort_chains, True)
+        _reorder(layers, down, position, sort_chains, False)
+
+    # Coordinates across layers: pack, then align with neighbours
+    def gap(a, b):
+        crossed = 0
+        if has_clusters:
+            shared = len(_common_prefix(chain_of[a], chain_of[b]))
+            crossed = len(chain_of[a]) + len(chain_of[b]) - 2 * shared
+        separation = node_sep if a < count and b < count else edge_sep
+        return (breadth[a] + breadth[b]) / 2 + separation + crossed * cluster_padding
+
+    cross = [0.0] * total
+    layer_gaps = []
+    for vertices in layers:
+        gaps = [gap(a, b) for a, b in zip(vertices, vertices[1:])]
+        layer_gaps.append(gaps)
+        offset = 0.0
+        for slot, vertex in enumerate(vertices):
+            cross[vertex] = offset
+            if slot < len(gaps):
+                offset += gaps[slot]
+
+    for _ in range(align_passes):
+        for neighbours, indices in ((up, range(1, len(layers))), (down, range(len(layers) - 2, -1, -1))):
+            for i in indices:
+                vertices = layers[i]
+                lookup = cross.__getitem__
+                desired = [sum(map(lookup, neighbours[vertex])) / len(neighbours[vertex])
+                           if neighbours[vertex] else cross[vertex] for vertex in vertices]
+                for vertex, value in zip(vertices, _place(vertices, desired, layer_gaps[i])):
+                    cross[vertex] = value
+
+    # Coordinates along the layers
+    spacing = rank_sep + (cluster_title if has_clusters else 0)
+    along = [0.0] * len(layers)
+    previous = None
+    for i, vertices in enumerate(layers):
+        thickness = max((depth[vertex] for vertex in vertices), default=0)
+        along[i] = 0.0 if previous is None else along[i - 1] + previous / 2 + spacing + thickness / 2
+        previous = thickness
+
+    def point(vertex):
+        a, c = along[layer[vertex]], cross[vertex]
+        return (c, a) if vertical else (a, c)
+
+    boxes = {}
+    for i, node in enumerate(nodes):
+        x, y = point(i)
+        boxes[node] = (x, y) + tuple(sizes[node])
+
+    # Subgraph boxes, innermost first so parents can enclose their children
+    clusters = {}
+    if has_clusters:
+        members = {}
+        for i, node in enumerate(nodes):
+            for cluster in chain_of[i]:
+                members.setdefault(cluster, []).append(node)
+        nesting = {}
+        children = {}
+        for chain in chain_of[:count]:
+            for level, cluster in enumerate(chain):
+                nesting[cluster] = level
+                if level:
+                    children.setdefault(chain[level - 1], set()).add(cluster)
+        for cluster in sorted(members, key=lambda c: -nesting[c]):
+            left = top = float('inf')
+            right = bottom = float('-inf')
+            for node in members[cluster]:
+                x, y, w, h = boxes[node]
+                left, right = min(left, x - w / 2), max(right, x + w / 2)
+                top, bottom = min(top, y - h / 2), max(bottom, y + h / 2)
+            for child in children.get(cluster, ()):
+                cl, ct, cw, ch = clusters[child]
+                left, right = min(left, cl), max(right, cl + cw)
+                top, bottom = min(top, ct), max(bottom, ct + ch)
+            left -= cluster_padding
+            right += cluster_padding
+            # The title strip goes on the side that ends up on top after flipping
+            top -= cluster_padding + (0 if direction == 'BT' else cluster_title)
+            bottom += cluster_padding + (cluster_title if direction == 'BT' else 0)
+            clusters[cluster] = (left, top, right - left, bottom - top)
+
+    polylines = []
+    for edge, path in enumerate(paths):
+        if path is None:
+            x, y, w, h = boxes[edges[edge][0]]
+            polylines.append([(x + w / 2, y - h / 4), (x + w / 2 + 20, y - h / 4),
+                              (x + w / 2 + 20, y + h / 4), (x + w / 2, y + h / 4)])
+            continue
+        points = [point(vertex) for vertex in path]
+        source, target = edges[edge]
+        points[0] = _clip(points[0], sizes[source], points[1])
+        points[-1] = _clip(points[-1], sizes[target], points[-2])
+        polylines.append(points)
+
+    # Normalise to a margin and flip for BT/RL
+    extents = [(x - w / 2, y - h / 2, x + w / 2, y + h / 2) for x, y, w, h in boxes.values()]
+    extents += [(l, t, l + w, t + h) for l, t, w, h in clusters.values()]
+    extents += [(x, y, x, y) for points in polylines for x, y in points]
+    if not extents:
+        return Layout(2 * margin, 2 * margin, {}, [], {})
+    min_x = min(e[0] for e in extents)
+    min_y = min(e[1] for e in extents)
+    width = max(e[2] for e in extents) - min_x + 2 * margin
+    height = max(e[3] for e in extents) - min_y + 2 * margin
+
+    flip_x = direction == 'RL'
+    flip_y = direction == 'BT'
+
+    def transform(x, y):
+        x, y = x - min_x + margin, y - min_y + margin
+        return (width - x if flip_x else x, height - y if flip_y else y)
+
+    nodes_out = {}
+    for node, (x, y, w, h) in boxes.items():
+        nodes_out[node] = transform(x, y) + (w, h)
+    clusters_out = {}
+    for cluster, (l, t, w, h) in clusters.items():
+        x, y = transform(l, t)
+        clusters_out[cluster] = (x - w if flip_x else x, y - h if flip_y else y, w, h)
+    edges_out = [[transform(x, y) for x, y in points] for points in polylines]
+    return Layout(width, height, nodes_out, edges_out, clusters_out)
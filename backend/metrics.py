@@ -0,0 +1,196 @@
+"""
+Prometheus metrics for the generation pipeline
+Histograms and counters are split into lock stripes picked by thread id, so
+concurrent requests almost never wait on each other to record a sample.
+/metrics merges the stripes and renders the Prometheus text format.
+"""
+
+import bisect
+import threading
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+STRIPES = 16
+
+# Seconds; generations routinely take 5-30 s
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+TOKEN_RATE_BUCKETS = (1, 2.5, 5, 10, 20, 40, 80, 160, 320)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _number(value):
+    if isinstance(value, float):
+        return repr(value) if value != int(value) else str(int(value))
+    return str(value)
+
+
+class _Stripe:
+    __slots__ = ('lock', 'series')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.series = {}
+
+
+class _Striped:
+    """Base for metrics whose series are summed over lock stripes at scrape time"""
+
+    kind = None
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._stripes = [_Stripe() for _ in range(STRIPES)]
+
+    def _stripe(self):
+        return self._stripes[threading.get_ident() % STRIPES]
+
+    def _merged(self):
+        merged = {}
+        for stripe in self._stripes:
+            with stripe.lock:
+                snapshot = [(labels, list(values)) for labels, values in stripe.series.items()]
+            for labels, values in snapshot:
+                total = merged.get(labels)
+                if total is None:
+                    merged[labels] = values
+                else:
+                    for index, value in enumerate(values):
+                        total[index] += value
+        return merged
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+        for labels, values in sorted(self._merged().items()):
+            lines.extend(self._render_series(labels, values))
+        return lines
+
+
+class Counter(_Striped):
+    kind = 'counter'
+
+    def inc(self, *labels, amount=1):
+        stripe = self._stripe()
+        with stripe.lock:
+            values = stripe.series.get(labels)
+            if values is None:
+                values = stripe.series[labels] = [0]
+            values[0] += amount
+
+    def _render_series(self, labels, values):
+        return [f'{self.name}{_labels(self.labelnames, labels)} {_number(values[0])}']
+
+
+class Histogram(_Striped):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        # values: one count per bucket plus +Inf, then the sum
+        index = bisect.bisect_left(self.buckets, value)
+        stripe = self._stripe()
+        with stripe.lock:
+            values = stripe.series.get(labels)
+            if values is None:
+                values = stripe.series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            values[index] += 1
+            values[-1] += value
+
+    def _render_series(self, labels, values):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + ('+Inf',), values):
+            cumulative += count
+            le = f'le="{bound}"' if bound == '+Inf' else f'le="{_number(bound)}"'
+            lines.append(f'{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}')
+        label_text = _labels(self.labelnames, labels)
+        lines.append(f'{self.name}_sum{label_text} {_number(round(values[-1], 6))}')
+        lines.append(f'{self.name}_count{label_text} {cumulative}')
+        return lines
+
+
+def error_class(error):
+    """Label value for an exception: the class name, plus the status for HTTP errors"""
+    name = type(error).__name__
+    response = getattr(error, 'response', None)
+    status = getattr(response, 'status_code', None)
+    return f'{name}_{status}' if status else name
+
+def gauge_lines(prefix, stats):
+    """Render the numeric values of a stats() dict as gauges named <prefix>_<key>"""
+    lines = []
+    for key, value in (stats or {}).items():
+        if isinstance(value, bool):
+            value = int(value)
+        if not isinstance(value, (int, float)):
+            continue
+        name = f'{prefix}_{key}'
+        lines.append(f'# TYPE {name} gauge')
+        lines.append(f'{name} {_number(value)}')
+    return lines
+
+
+class PipelineMetrics:
+    """The metrics recorded by the Flask and ASGI generation paths"""
+
+    def __init__(self, namespace='mermaid'):
+        self.namespace = namespace
+        self.connect = Histogram(
+            f'{namespace}_upstream_connect_seconds',
+            'Time to open a new upstream connection (TCP + TLS)')
+        self.ttft = Histogram(
+            f'{namespace}_time_to_first_token_seconds',
+            'Time from sending the upstream request to the first content or reasoning token',
+            ('endpoint',))
+        self.generation = Histogram(
+            f'{namespace}_generation_seconds',
+            'Total upstream generation time',
+            ('endpoint',))
+        self.tokens_per_second = Histogram(
+            f'{namespace}_tokens_per_second',
+            'Completion tokens per second of generation time',
+            ('endpoint',), buckets=TOKEN_RATE_BUCKETS)
+        self.sse_duration = Histogram(
+            f'{namespace}_sse_stream_seconds',
+            'How long a client SSE stream stayed open',
+            ('endpoint',))
+        self.errors = Counter(
+            f'{namespace}_errors_total',
+            'Failed generations by error class',
+            ('endpoint', 'class'))
+        self._metrics = (self.connect, self.ttft, self.generation, self.tokens_per_second,
+                         self.sse_duration, self.errors)
+
+    def record_generation(self, endpoint, seconds, ttft=None, usage=None):
+        """Record one finished upstream generation"""
+        self.generation.observe(seconds, endpoint)
+        if ttft is not None:
+            self.ttft.observe(ttft, endpoint)
+        completion_tokens = (usage or {}).get('completion_tokens')
+        if completion_tokens and seconds > 0:
+            self.tokens_per_second.observe(completion_tokens / seconds, endpoint)
+
+    def record_error(self, endpoint, error):
+        """Count a failure; `error` is an exception or a class label"""
+        self.errors.inc(endpoint, error if isinstance(error, str) else error_class(error))
+
+    def render(self, gauges=None):
+        """Prometheus text exposition; gauges maps a name to a stats() dict"""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for group, stats in (gauges or {}).items():
+            lines.extend(gauge_lines(f'{self.namespace}_{group}', stats))
+        return '\n'.join(lines) + '\n'
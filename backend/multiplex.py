@@ -0,0 +1,182 @@
+"""
+Multiplexed generation streams over one WebSocket
+Browsers cap HTTP connections per host, so many concurrent SSE streams stall.
+One WebSocket carries any number of generations instead, each tagged with a
+client-chosen id. This module holds the protocol; the socket itself and the
+upstream streams come from asgi_server.py.
+
+Client messages (JSON text):
+    {"type": "generate", "id": "a", "prompt": ..., <same fields as /api/generate/stream>, "window": 64}
+    {"type": "cancel", "id": "a"}
+    {"type": "credit", "id": "a", "credit": 32}
+
+Server messages:
+    {"type": "event", "id": "a", "event": null | "code_delta" | ..., "data": {...}}
+    {"type": "done", "id": "a"}
+    {"type": "cancelled", "id": "a"}
+    {"type": "error", "id": "a", "error": ..., "status": 429, "retry_after": 3}
+
+Flow control is credit based, per stream: every event costs one credit, a
+stream with none left stops reading upstream until the client grants more.
+A slow pane therefore never holds up the others on the same connection.
+"""
+
+import asyncio
+import json
+
+from sse import DONE, SSEParser, looks_like_json_object
+
+
+class StreamRejected(Exception):
+    """A generate message that cannot start (bad request, admission, open circuit)"""
+
+    def __init__(self, message, status=400, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class _Stream:
+    def __init__(self, stream_id, credit):
+        self.id = stream_id
+        self.credit = credit
+        self.resumed = asyncio.Event()
+        self.task = None
+
+    async def spend(self):
+        """Wait for a credit and take it"""
+        while self.credit <= 0:
+            self.resumed.clear()
+            await self.resumed.wait()
+        self.credit -= 1
+
+    def grant(self, credit):
+        self.credit += credit
+        self.resumed.set()
+
+
+def event_message(stream_id, event, data):
+    """Wrap one SSE frame; data that is not a JSON object is sent as a string"""
+    text = data.decode('utf-8', errors='replace')
+    payload = text
+    if looks_like_json_object(data):
+        # Parsed and re-encoded: upstream bytes never end up in the message unchecked
+        try:
+            payload = json.loads(text)
+        except ValueError:
+            pass
+    return json.dumps({
+        'type': 'event',
+        'id': stream_id,
+        'event': event.decode('utf-8', errors='replace') if event else None,
+        'data': payload
+    })
+
+
+class StreamMultiplexer:
+    """
+    Protocol state of one connection.
+
+    send(text) writes a message to the socket; start(message) validates a
+    generate message and returns its async iterator of SSE event bytes, or
+    raises StreamRejected. Each stream runs in its own task, so cancelling one
+    closes its upstream request without touching the others.
+    """
+
+    def __init__(self, send, start, max_streams=32, window=64):
+        self._send = send
+        self._start = start
+        self.max_streams = max_streams
+        self.window = window
+        self._streams = {}
+        self._send_lock = asyncio.Lock()
+
+    async def send_json(self, message):
+        await self.send_text(json.dumps(message))
+
+    async def send_text(self, text):
+        # One writer at a time: stream tasks share the socket
+        async with self._send_lock:
+            await self._send(text)
+
+    async def error(self, stream_id, message, status=400, retry_after=None):
+        body = {'type': 'error', 'id': stream_id, 'error': message, 'status': status}
+        if retry_after is not None:
+            body['retry_after'] = retry_after
+        await self.send_json(body)
+
+    async def handle(self, text):
+        """Process one client message"""
+        try:
+            message = json.loads(text)
+        except ValueError:
+            message = None
+        if not isinstance(message, dict):
+            await self.error(None, 'Messages must be JSON objects')
+            return
+
+        kind, stream_id = message.get('type'), message.get('id')
+        if not isinstance(stream_id, str) or not stream_id:
+            await self.error(None, 'id must be a non-empty string')
+        elif kind == 'generate':
+            await self._open(stream_id, message)
+        elif kind == 'cancel':
+            await self._cancel(stream_id)
+        elif kind == 'credit':
+            stream = self._streams.get(stream_id)
+            credit = message.get('credit')
+            if stream is not None and isinstance(credit, int) and credit > 0:
+                stream.grant(credit)
+        else:
+            await self.error(stream_id, f'Unknown message type: {kind}')
+
+    async def _open(self, stream_id, message):
+        if stream_id in self._streams:
+            await self.error(stream_id, 'A stream with this id is already running')
+            return
+        if len(self._streams) >= self.max_streams:
+            await self.error(stream_id, f'At most {self.max_streams} concurrent streams per connection', 429)
+            return
+
+        window = message.get('window', self.window)
+        stream = _Stream(stream_id, window if isinstance(window, int) and window > 0 else self.window)
+        self._streams[stream_id] = stream
+        stream.task = asyncio.ensure_future(self._run(stream, message))
+
+    async def _run(self, stream, message):
+        events = None
+        try:
+            events = await self._start(message)
+            parser = SSEParser()
+            async for chunk in events:
+                for event, data in parser.feed(chunk):
+                    if data.strip() == DONE:
+                        continue
+                    await stream.spend()
+                    await self.send_text(event_message(stream.id, event, data))
+            await self.send_json({'type': 'done', 'id': stream.id})
+        except StreamRejected as e:
+            await self.error(stream.id, str(e), e.status, e.retry_after)
+        except Exception as e:
+            # Usually the socket closing under a send; close() cancels the rest
+            print(f'WebSocket stream {stream.id} failed: {e}')
+        finally:
+            self._streams.pop(stream.id, None)
+            if events is not None:
+                # Runs the upstream generator's cleanup, which closes the upstream request
+                await events.aclose()
+
+    async def _cancel(self, stream_id):
+        stream = self._streams.get(stream_id)
+        if stream is None:
+            return
+        stream.task.cancel()
+        await asyncio.gather(stream.task, return_exceptions=True)
+        await self.send_json({'type': 'cancelled', 'id': stream_id})
+
+    async def close(self):
+        """Connection gone: cancel every stream"""
+        tasks = [stream.task for stream in self._streams.values()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
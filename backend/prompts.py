@@ -0,0 +1,171 @@
+"""
+Diagram-type-aware prompt templates
+System prompts are compiled once at import, per diagram type, with optional
+few-shot examples from the test-diagram-*.mmd corpus and a per-type
+max_tokens budget sized to what that diagram type actually needs.
+"""
+
+import os
+import threading
+from collections import namedtuple
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+BASE_PROMPT = ("You are an expert at creating Mermaid diagrams. Generate ONLY the Mermaid code "
+               "without any explanations, markdown code blocks, or additional text. The code should "
+               "be production-ready and follow Mermaid best practices.")
+
+# instructions: type-specific guidance
+# max_tokens: answer budget (code only); thinking mode adds THINKING_TOKENS on top
+TypeSpec = namedtuple('TypeSpec', 'instructions max_tokens')
+
+TYPE_SPECS = {
+    'flowchart': TypeSpec(
+        "Create a flowchart (use 'flowchart TD' or 'flowchart LR' syntax). Use appropriate "
+        "node shapes: rectangles for processes, diamonds for decisions, circles for start/end.",
+        1200),
+    'sequence': TypeSpec(
+        "Create a sequence diagram (use 'sequenceDiagram' syntax). Include participants, "
+        "messages with arrows (->>, -->, ->>), and optional notes.",
+        1000),
+    'class': TypeSpec(
+        "Create a class diagram (use 'classDiagram' syntax). Include classes with properties "
+        "and methods, and relationships (inheritance, composition, association).",
+        1500),
+    'state': TypeSpec(
+        "Create a state diagram (use 'stateDiagram-v2' syntax). Include states, transitions, "
+        "and use [*] for start/end states.",
+        800),
+    'er': TypeSpec(
+        "Create an entity-relationship diagram (use 'erDiagram' syntax). Include entities with "
+        "attributes and relationships (||--o{, }|--|{, etc.).",
+        1200),
+    'gantt': TypeSpec(
+        "Create a Gantt chart (use 'gantt' syntax). Include title, dateFormat, sections, and "
+        "tasks with start dates and durations.",
+        900),
+    'architecture': TypeSpec(
+        "Create an architecture diagram (use 'architecture-beta' syntax). Declare groups with "
+        "'group id(icon)[Label]', services with 'service id(icon)[Label] in group', and connect "
+        "them with edges such as 'a:R --> L:b'.",
+        1000),
+    'block': TypeSpec(
+        "Create a block diagram (use 'block-beta' syntax). Set 'columns N', declare blocks with "
+        "ids and labels, nest them with 'block:id ... end', and link them with arrows.",
+        900),
+    'mindmap': TypeSpec(
+        "Create a mindmap (use 'mindmap' syntax). Start with a single root such as "
+        "'root((Topic))' and express the hierarchy through indentation only.",
+        800),
+    'xychart': TypeSpec(
+        "Create an XY chart (use 'xychart-beta' syntax). Include a title, 'x-axis [labels]', "
+        "'y-axis \"Label\" min --> max', and one or more 'bar [...]' or 'line [...]' series.",
+        500),
+    'sankey': TypeSpec(
+        "Create a Sankey diagram (use 'sankey-beta' syntax). After the header, write one "
+        "'source,target,value' CSV row per flow with no extra spaces.",
+        900),
+    'quadrant': TypeSpec(
+        "Create a quadrant chart (use 'quadrantChart' syntax). Include title, x-axis and y-axis "
+        "with 'Low --> High' labels, quadrant-1 to quadrant-4 names, and points as 'Name: [x, y]' "
+        "with coordinates between 0 and 1.",
+        600),
+    'treemap': TypeSpec(
+        "Create a treemap as a top-down hierarchy (use 'graph TD' syntax). Put each node's value "
+        "in its label, e.g. Dev[\"Development: $600,000\"], and connect parents to children.",
+        900),
+    'kanban': TypeSpec(
+        "Create a kanban board as a left-to-right flowchart (use 'graph LR' syntax). Use one "
+        "subgraph per column (Backlog, In Progress, Review, Done) containing the task nodes.",
+        900),
+}
+
+DEFAULT_TYPE = 'flowchart'
+
+# Reasoning tokens count against max_tokens when thinking mode is on
+THINKING_TOKENS = int(os.getenv('PROMPT_THINKING_TOKENS', 1024))
+
+FEW_SHOT_DEFAULT = os.getenv('PROMPT_FEW_SHOT', 'false').lower() == 'true'
+EXAMPLES_DIR = os.getenv('PROMPT_EXAMPLES_DIR', PROJECT_ROOT)
+
+PromptTemplate = namedtuple('PromptTemplate', 'diagram_type system_prompt few_shot_prompt max_tokens')
+
+def load_example(diagram_type, examples_dir=EXAMPLES_DIR):
+    """Read test-diagram-<type>.mmd from the corpus (None if missing)"""
+    path = os.path.join(examples_dir, f'test-diagram-{diagram_type}.mmd')
+    try:
+        with open(path, encoding='utf-8') as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+def compile_templates(examples_dir=EXAMPLES_DIR):
+    """Build every system prompt once, with and without its corpus example"""
+    templates = {}
+    for diagram_type, spec in TYPE_SPECS.items():
+        system_prompt = f"{BASE_PROMPT}\n\n{spec.instructions}"
+        example = load_example(diagram_type, examples_dir)
+        few_shot_prompt = (
+            f"{system_prompt}\n\nExample of the expected output format:\n{example}"
+            if example else system_prompt
+        )
+        templates[diagram_type] = PromptTemplate(diagram_type, system_prompt, few_shot_prompt, spec.max_tokens)
+    return templates
+
+TEMPLATES = compile_templates()
+
+def get_template(diagram_type):
+    """Template for a diagram type, falling back to flowchart for unknown types"""
+    return TEMPLATES.get(diagram_type) or TEMPLATES[DEFAULT_TYPE]
+
+def system_prompt_for(diagram_type, few_shot=None):
+    """Precompiled system prompt, optionally with a few-shot example"""
+    template = get_template(diagram_type)
+    if FEW_SHOT_DEFAULT if few_shot is None else few_shot:
+        return template.few_shot_prompt
+    return template.system_prompt
+
+def max_tokens_for(diagram_type, use_thinking):
+    """Per-type token budget, plus headroom for reasoning in thinking mode"""
+    budget = get_template(diagram_type).max_tokens
+    return budget + THINKING_TOKENS if use_thinking else budget
+
+
+class TypeStats:
+    """Per-diagram-type token usage and latency of completed generations"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._types = {}
+
+    def record(self, diagram_type, seconds, usage):
+        usage = usage or {}
+        with self._lock:
+            entry = self._types.setdefault(diagram_type, {
+                'requests': 0,
+                'seconds': 0.0,
+                'prompt_tokens': 0,
+                'completion_tokens': 0,
+                'max_seconds': 0.0
+            })
+            entry['requests'] += 1
+            entry['seconds'] += seconds
+            entry['max_seconds'] = max(entry['max_seconds'], seconds)
+            entry['prompt_tokens'] += usage.get('prompt_tokens') or 0
+            entry['completion_tokens'] += usage.get('completion_tokens') or 0
+
+    def stats(self):
+        with self._lock:
+            snapshot = {name: dict(entry) for name, entry in self._types.items()}
+        report = {}
+        for name, entry in sorted(snapshot.items()):
+            count = entry['requests']
+            report[name] = {
+                'requests': count,
+                'max_tokens': get_template(name).max_tokens,
+                'avg_latency_ms': round(entry['seconds'] / count * 1000, 1),
+                'max_latency_ms': round(entry['max_seconds'] * 1000, 1),
+                'avg_prompt_tokens': round(entry['prompt_tokens'] / count, 1),
+                'avg_completion_tokens': round(entry['completion_tokens'] / count, 1)
+            }
+        return report
@@ -0,0 +1,300 @@
+"""
+Upstream providers and latency-aware routing
+Any OpenAI-compatible chat completions endpoint (Z.ai, OpenAI, a local Ollama
+or llama.cpp server, ...) can serve generations. The router sends each call
+to the provider with the lowest EWMA time-to-first-token, inflated by its
+EWMA error rate, and fails over to the next provider on transient errors.
+"""
+
+import asyncio
+import os
+import random
+import re
+import threading
+import time
+
+from resilience import CircuitOpenError, settle_failure
+
+# Settings for providers that need no configuration beyond an API key
+BUILTIN_PROVIDERS = {
+    'zai': {
+        'endpoint': 'https://api.z.ai/api/coding/paas/v4/chat/completions',
+        'model': 'glm-4.6',
+        'thinking': True
+    },
+    'openai': {
+        'endpoint': 'https://api.openai.com/v1/chat/completions',
+        'model': 'gpt-4o-mini',
+        'thinking': False
+    },
+    'ollama': {
+        'endpoint': 'http://localhost:11434/v1/chat/completions',
+        'model': 'llama3.1',
+        'thinking': False,
+        'keyless': True
+    }
+}
+
+
+class Provider:
+    """One OpenAI-compatible chat completions endpoint"""
+
+    def __init__(self, name, endpoint, model, api_key=None, thinking=False, breaker=None):
+        self.name = name
+        self.endpoint = endpoint
+        self.model = model
+        self.api_key = api_key
+        self.thinking = thinking
+        self.breaker = breaker
+
+    def headers(self):
+        headers = {
+            'Content-Type': 'application/json',
+            'Accept-Language': 'en-US,en'
+        }
+        if self.api_key:
+            headers['Authorization'] = f'Bearer {self.api_key}'
+        return headers
+
+    def prepare(self, payload):
+        """Adapt a generation payload to this provider (model name, thinking support)"""
+        payload = dict(payload, model=self.model)
+        if not self.thinking:
+            payload.pop('thinking', None)
+        return payload
+
+    def __repr__(self):
+        return f'Provider({self.name!r}, {self.endpoint!r}, {self.model!r})'
+
+
+def providers_from_env(breaker_factory=None):
+    """
+    Providers named in PROVIDERS (default: zai), configured by <NAME>_ENDPOINT,
+    <NAME>_MODEL, <NAME>_API_KEY and <NAME>_THINKING. Providers that need an API
+    key and have none are skipped.
+    """
+    providers = []
+    for name in os.getenv('PROVIDERS', 'zai').split(','):
+        name = re.sub(r'[^a-z0-9_]', '_', name.strip().lower())
+        if not name:
+            continue
+        prefix = name.upper()
+        builtin = BUILTIN_PROVIDERS.get(name, {})
+        endpoint = os.getenv(f'{prefix}_ENDPOINT', builtin.get('endpoint'))
+        model = os.getenv(f'{prefix}_MODEL', builtin.get('model'))
+        api_key = os.getenv(f'{prefix}_API_KEY')
+        thinking = os.getenv(f'{prefix}_THINKING', str(builtin.get('thinking', False))).lower() == 'true'
+
+        if not endpoint or not model:
+            print(f'⚠️  Provider {name}: {prefix}_ENDPOINT and {prefix}_MODEL are required, skipping')
+            continue
+        if not api_key and name in BUILTIN_PROVIDERS and not builtin.get('keyless'):
+            continue
+
+        providers.append(Provider(
+            name, endpoint, model, api_key, thinking,
+            breaker_factory() if breaker_factory else None
+        ))
+    return providers
+
+
+class ProviderRouter:
+    """
+    Orders providers by expected latency and runs calls with failover.
+
+    Each provider keeps an EWMA of its time to first token and of its error
+    rate (1 for a transient failure, 0 for a success). Its score is
+    ewma_ttft / (1 - ewma_errors), the expected wait for a successful start.
+    Providers without a latency sample yet score 0 so they get tried, and with
+    probability `explore` a random provider is moved to the front so that
+    stale estimates (e.g. of a recovered provider) get refreshed.
+    """
+
+    def __init__(self, providers, alpha=0.2, explore=0.05):
+        self.providers = list(providers)
+        self.alpha = alpha
+        self.explore = explore
+        self._lock = threading.Lock()
+        self._state = {
+            provider.name: {'ttft': None, 'errors': 0.0, 'calls': 0, 'failures': 0}
+            for provider in self.providers
+        }
+
+    def _score(self, provider):
+        state = self._state[provider.name]
+        if state['ttft'] is None:
+            return 0.0
+        return state['ttft'] / max(1.0 - state['errors'], 0.05)
+
+    def ranked(self, providers=None):
+        """Providers best-first"""
+        providers = self.providers if providers is None else providers
+        with self._lock:
+            ordered = sorted(providers, key=self._score)
+        if len(ordered) > 1 and random.random() < self.explore:
+            ordered.insert(0, ordered.pop(random.randrange(1, len(ordered))))
+        return ordered
+
+    def choose(self, tried=()):
+        """
+        Best provider whose breaker lets a call through, preferring ones not tried yet
+        Raises CircuitOpenError when every breaker is open
+        """
+        fresh = [provider for provider in self.providers if provider not in tried]
+        stale = [provider for provider in self.providers if provider in tried]
+        error = None
+        for provider in self.ranked(fresh) + self.ranked(stale):
+            if provider.breaker is None:
+                return provider
+            try:
+                provider.breaker.before_call()
+                return provider
+            except CircuitOpenError as e:
+                error = e if error is None or e.retry_after < error.retry_after else error
+        raise error or CircuitOpenError(1)
+
+    def alternate(self, provider):
+        """
+        Best healthy provider other than `provider` (for hedging), else `provider` itself
+        None when every breaker would reject the hedge; the hedge takes its breaker slot in call_on()
+        """
+        for candidate in [other for other in self.ranked() if other is not provider] + [provider]:
+            if candidate.breaker is None or not candidate.breaker.is_open():
+                return candidate
+        return None
+
+    def call_on(self, provider, fn, policy, attempt):
+        """
+        Run fn() once on a given provider outside call() (a hedge request)
+        The provider's breaker must let it through (else CircuitOpenError) and
+        the outcome is recorded as for call(). Failures are not retried, and an
+        attempt cancelled because another one won counts as neither outcome.
+        """
+        if provider.breaker is not None:
+            provider.breaker.before_call()
+        try:
+            result = fn()
+        except Exception as e:
+            if not attempt.cancelled:
+                self._failed_once(provider, policy, e)
+            raise
+        self._succeeded(provider, policy, 1)
+        return result
+
+    async def acall_on(self, provider, fn, policy, attempt):
+        """asyncio variant of call_on(); fn is a coroutine function, cancelled by cancelling its task"""
+        if provider.breaker is not None:
+            provider.breaker.before_call()
+        try:
+            result = await fn()
+        except Exception as e:
+            if not attempt.cancelled:
+                self._failed_once(provider, policy, e)
+            raise
+        self._succeeded(provider, policy, 1)
+        return result
+
+    def all_open(self):
+        """True when every provider's breaker would reject a call"""
+        return all(provider.breaker is not None and provider.breaker.is_open() for provider in self.providers)
+
+    def retry_after(self):
+        """Seconds until the first breaker lets a probe through"""
+        return min((p.breaker.retry_after() for p in self.providers if p.breaker is not None), default=1)
+
+    def record_ttft(self, provider, seconds):
+        with self._lock:
+            state = self._state[provider.name]
+            previous = state['ttft']
+            state['ttft'] = seconds if previous is None else previous + self.alpha * (seconds - previous)
+
+    def record_result(self, provider, failed):
+        with self._lock:
+            state = self._state[provider.name]
+            state['calls'] += 1
+            state['failures'] += 1 if failed else 0
+            state['errors'] += self.alpha * ((1.0 if failed else 0.0) - state['errors'])
+
+    def _failed(self, provider, policy, error, attempt):
+        """Record a failed call; returns True when it should be retried"""
+        self.record_result(provider, policy.is_transient(error))
+        return settle_failure(policy, provider.breaker, error, attempt)
+
+    def _failed_once(self, provider, policy, error):
+        """Record a failed call that will not be retried"""
+        transient = policy.is_transient(error)
+        self.record_result(provider, transient)
+        if provider.breaker is not None:
+            # As in settle_failure: a non-transient error still proves the upstream is answering
+            if transient:
+                provider.breaker.record_failure()
+            else:
+                provider.breaker.record_success()
+
+    def _succeeded(self, provider, policy, attempt):
+        self.record_result(provider, False)
+        if provider.breaker is not None:
+            provider.breaker.record_success()
+        if attempt > 1:
+            policy.count('recovered')
+
+    def call(self, fn, policy):
+        """
+        Run fn(provider) on the best provider, retrying transient failures
+        Retries go to providers not tried yet without waiting; once all have
+        been tried, the policy's backoff applies. Returns (result, provider).
+        """
+        attempt = 1
+        tried = []
+        while True:
+            provider = self.choose(tried)
+            try:
+                result = fn(provider)
+            except Exception as e:
+                if not self._failed(provider, policy, e, attempt):
+                    raise
+                tried.append(provider)
+                if len(set(tried)) >= len(self.providers):
+                    time.sleep(policy.delay(attempt, e))
+                attempt += 1
+                continue
+            self._succeeded(provider, policy, attempt)
+            return result, provider
+
+    async def acall(self, fn, policy):
+        """asyncio variant of call(); fn is a coroutine function"""
+        attempt = 1
+        tried = []
+        while True:
+            provider = self.choose(tried)
+            try:
+                result = await fn(provider)
+            except Exception as e:
+                if not self._failed(provider, policy, e, attempt):
+                    raise
+                tried.append(provider)
+                if len(set(tried)) >= len(self.providers):
+                    await asyncio.sleep(policy.delay(attempt, e))
+                attempt += 1
+                continue
+            self._succeeded(provider, policy, attempt)
+            return result, provider
+
+    def stats(self):
+        with self._lock:
+            snapshot = {name: dict(state) for name, state in self._state.items()}
+            scores = {provider.name: self._score(provider) for provider in self.providers}
+        report = {}
+        for provider in self.providers:
+            state = snapshot[provider.name]
+            report[provider.name] = {
+                'endpoint': provider.endpoint,
+                'model': provider.model,
+                'calls': state['calls'],
+                'failures': state['failures'],
+                'ewma_ttft_ms': round(state['ttft'] * 1000, 1) if state['ttft'] is not None else None,
+                'ewma_error_rate': round(state['errors'], 4),
+                'score_ms': round(scores[provider.name] * 1000, 1),
+                'circuit_breaker': provider.breaker.stats() if provider.breaker else None
+            }
+        return report
@@ -0,0 +1,272 @@
+"""
+Server-side SVG rendering for flowchart/graph diagrams
+Pure Python: flowchart.py parses, layout.py places, this module measures
+labels and writes the SVG, so diagrams can be exported, thumbnailed and
+previewed without a browser. Text widths are estimated, not measured.
+"""
+
+import html
+import math
+import re
+import textwrap
+
+from flowchart import parse_flowchart
+from layout import layered_layout
+
+try:
+    import cairosvg
+except ImportError:  # PNG export is optional
+    cairosvg = None
+
+# Bump when output changes for the same source, so cached renders are invalidated
+RENDERER_VERSION = '2'
+
+FONT_SIZE = 14
+CHAR_WIDTH = 7.4
+LINE_HEIGHT = 18
+PAD_X = 15
+PAD_Y = 10
+MAX_LABEL_CHARS = 36
+
+THEMES = {
+    'default': {
+        'background': '#ffffff', 'node_fill': '#ECECFF', 'node_stroke': '#9370DB', 'text': '#333333',
+        'edge': '#333333', 'cluster_fill': '#ffffde', 'cluster_stroke': '#aaaa33', 'label_fill': '#e8e8e8'
+    },
+    'dark': {
+        'background': '#333333', 'node_fill': '#1f2020', 'node_stroke': '#cccccc', 'text': '#e0dfdf',
+        'edge': '#d3d3d3', 'cluster_fill': '#161616', 'cluster_stroke': '#aaaaaa', 'label_fill': '#585858'
+    },
+    'forest': {
+        'background': '#ffffff', 'node_fill': '#cde498', 'node_stroke': '#13540c', 'text': '#000000',
+        'edge': '#008000', 'cluster_fill': '#cdffb2', 'cluster_stroke': '#6eaa49', 'label_fill': '#e8e8e8'
+    },
+    'neutral': {
+        'background': '#ffffff', 'node_fill': '#eeeeee', 'node_stroke': '#999999', 'text': '#333333',
+        'edge': '#666666', 'cluster_fill': '#fafafa', 'cluster_stroke': '#bbbbbb', 'label_fill': '#ffffff'
+    },
+}
+
+# Mermaid flowchart config keys honoured by the layout, with their defaults
+CONFIG_DEFAULTS = {'nodeSpacing': 30, 'rankSpacing': 50}
+
+
+class RasterizerUnavailable(RuntimeError):
+    """PNG output needs cairosvg, which is not installed"""
+
+
+BREAK_RE = re.compile(r'<br\s*/?>', re.IGNORECASE)
+ENTITY_RE = re.compile(r'#(\d+|quot|amp|lt|gt);')
+ENTITIES = {'quot': '"', 'amp': '&', 'lt': '<', 'gt': '>'}
+
+
+def label_lines(label, max_chars=MAX_LABEL_CHARS):
+    """[(text, bold)] display lines: <br/> breaks, #quot;-style entities, **bold**, word wrap"""
+    label = ENTITY_RE.sub(lambda m: ENTITIES.get(m.group(1)) or chr(int(m.group(1))), label)
+    lines = []
+    for part in BREAK_RE.split(label):
+        part = part.strip()
+        bold = part.startswith('**') and part.endswith('**') and len(part) > 4
+        part = html.unescape(part.replace('**', ''))
+        for text in textwrap.wrap(part, max_chars) or ['']:
+            lines.append((text, bold))
+    return lines
+
+def text_size(lines):
+    width = max(len(text) * (CHAR_WIDTH + (0.6 if bold else 0)) for text, bold in lines)
+    return width, len(lines) * LINE_HEIGHT
+
+def node_size(shape, lines):
+    """(width, height) of a node box for the given label lines"""
+    text_w, text_h = text_size(lines)
+    width, height = text_w + 2 * PAD_X, text_h + 2 * PAD_Y
+    if shape in ('circle', 'double_circle'):
+        diameter = max(width, height)
+        return diameter, diameter
+    if shape == 'diamond':
+        return 1.4 * text_w + 2 * PAD_X, 1.8 * text_h + 2 * PAD_Y
+    if shape in ('hexagon', 'stadium', 'parallelogram', 'parallelogram_alt', 'trapezoid', 'trapezoid_alt', 'flag'):
+        return width + height / 2, height
+    if shape == 'subroutine':
+        return width + 16, height
+    if shape == 'cylinder':
+        return width, height + 16
+    return width, height
+
+def _f(value):
+    return f'{value:.1f}'
+
+def _polygon(points, attrs):
+    return f'<polygon points="{" ".join(f"{_f(x)},{_f(y)}" for x, y in points)}" {attrs}/>'
+
+def _shape_svg(shape, cx, cy, w, h, attrs):
+    left, top, right, bottom = cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2
+    if shape in ('rect', 'round', 'stadium', 'subroutine'):
+        radius = {'round': 5, 'stadium': h / 2}.get(shape, 0)
+        svg = f'<rect x="{_f(left)}" y="{_f(top)}" width="{_f(w)}" height="{_f(h)}" rx="{_f(radius)}" {attrs}/>'
+        if shape == 'subroutine':
+            svg += (f'<path d="M{_f(left + 8)},{_f(top)}V{_f(bottom)}M{_f(right - 8)},{_f(top)}'
+                    f'V{_f(bottom)}" {attrs}/>')
+        return svg
+    if shape in ('circle', 'double_circle'):
+        svg = f'<circle cx="{_f(cx)}" cy="{_f(cy)}" r="{_f(w / 2)}" {attrs}/>'
+        if shape == 'double_circle':
+            svg += f'<circle cx="{_f(cx)}" cy="{_f(cy)}" r="{_f(w / 2 - 4)}" {attrs}/>'
+        return svg
+    if shape == 'cylinder':
+        ry = 8
+        return (f'<path d="M{_f(left)},{_f(top + ry)}A{_f(w / 2)},{ry} 0 0,0 {_f(right)},{_f(top + ry)}'
+                f'A{_f(w / 2)},{ry} 0 0,0 {_f(left)},{_f(top + ry)}V{_f(bottom - ry)}'
+                f'A{_f(w / 2)},{ry} 0 0,0 {_f(right)},{_f(bottom - ry)}V{_f(top + ry)}" {attrs}/>')
+    slant = h / 2
+    points = {
+        'diamond': [(cx, top), (right, cy), (cx, bottom), (left, cy)],
+        'hexagon': [(left + slant / 2, top), (right - slant / 2, top), (right, cy),
+                    (right - slant / 2, bottom), (left + slant / 2, bottom), (left, cy)],
+        'parallelogram': [(left + slant, top), (right, top), (right - slant, bottom), (left, bottom)],
+        'parallelogram_alt': [(left, top), (right - slant, top), (right, bottom), (left + slant, bottom)],
+        'trapezoid': [(left + slant, top), (right - slant, top), (right, bottom), (left, bottom)],
+        'trapezoid_alt': [(left, top), (right, top), (right - slant, bottom), (left + slant, bottom)],
+        'flag': [(left, top), (right, top), (right, bottom), (left, bottom), (left + slant / 2, cy)],
+    }.get(shape)
+    if points is None:
+        return f'<rect x="{_f(left)}" y="{_f(top)}" width="{_f(w)}" height="{_f(h)}" {attrs}/>'
+    return _polygon(points, attrs)
+
+def _text_svg(lines, cx, cy, color, css_class='label'):
+    first = cy - (len(lines) - 1) * LINE_HEIGHT / 2
+    spans = []
+    for i, (text, bold) in enumerate(lines):
+        weight = ' font-weight="bold"' if bold else ''
+        spans.append(f'<tspan x="{_f(cx)}" y="{_f(first + i * LINE_HEIGHT)}"{weight}>{html.escape(text)}</tspan>')
+    return f'<text class="{css_class}" fill="{color}">{"".join(spans)}</text>'
+
+def _midpoint(points):
+    """Point halfway along a polyline"""
+    lengths = [math.dist(a, b) for a, b in zip(points, points[1:])]
+    remaining = sum(lengths) / 2
+    for (a, b), length in zip(zip(points, points[1:]), lengths):
+        if remaining <= length and length:
+            t = remaining / length
+            return a[0] + (b[0] - a[0]) * t, a[1] + (b[1] - a[1]) * t
+        remaining -= length
+    return points[-1]
+
+def _markers(color):
+    return (
+        '<defs>'
+        f'<marker id="arrow" viewBox="0 0 10 10" refX="9" refY="5" markerWidth="8" markerHeight="8" '
+        f'orient="auto-start-reverse"><path d="M0,0L10,5L0,10z" fill="{color}"/></marker>'
+        f'<marker id="circle" viewBox="0 0 10 10" refX="5" refY="5" markerWidth="8" markerHeight="8" '
+        f'orient="auto-start-reverse"><circle cx="5" cy="5" r="4" fill="{color}"/></marker>'
+        f'<marker id="cross" viewBox="0 0 10 10" refX="5" refY="5" markerWidth="9" markerHeight="9" '
+        f'orient="auto-start-reverse"><path d="M1,1L9,9M9,1L1,9" stroke="{color}" stroke-width="2"/></marker>'
+        '</defs>'
+    )
+
+def render_config(config):
+    """Known layout settings from a Mermaid-style config dict, validated; unknown keys are dropped"""
+    if config is None:
+        return {}
+    if not isinstance(config, dict):
+        raise ValueError('config must be an object')
+    settings = {}
+    for name in CONFIG_DEFAULTS:
+        if name in config:
+            value = config[name]
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or not 0 <= value <= 500:
+                raise ValueError(f'config.{name} must be a number between 0 and 500')
+            settings[name] = value
+    return settings
+
+def layout_chart(chart, config=None):
+    """Measure labels and lay out a parsed Flowchart; returns (layout, label lines by node id)"""
+    settings = dict(CONFIG_DEFAULTS, **render_config(config))
+    ids = list(chart.nodes)
+    lines = {id: label_lines(chart.nodes[id].label) for id in ids}
+    sizes = {id: node_size(chart.nodes[id].shape, lines[id]) for id in ids}
+    chains = {id: chart.chain(id) for id in ids if chart.nodes[id].subgraph is not None}
+    # Leave room for edge labels between ranks
+    labelled = any(edge.label for edge in chart.edges)
+    layout = layered_layout(
+        ids, [(edge.source, edge.target) for edge in chart.edges], sizes, chart.direction, chains,
+        node_sep=settings['nodeSpacing'], rank_sep=settings['rankSpacing'] + (20 if labelled else 0)
+    )
+    return layout, lines
+
+def chart_svg(chart, layout, lines, theme='default'):
+    """SVG document for a laid-out Flowchart"""
+    colors = THEMES.get(theme)
+    if colors is None:
+        raise ValueError(f'Unknown theme {theme!r} (expected one of {", ".join(THEMES)})')
+
+    width, height = layout.width, layout.height
+    out = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{_f(width)}" height="{_f(height)}" '
+        f'viewBox="0 0 {_f(width)} {_f(height)}" font-family="trebuchet ms, verdana, arial, sans-serif" '
+        f'font-size="{FONT_SIZE}">',
+        '<style>.label{text-anchor:middle;dominant-baseline:central}'
+        '.cluster-label{text-anchor:middle;dominant-baseline:central;font-weight:bold}</style>',
+        _markers(colors['edge']),
+        f'<rect width="100%" height="100%" fill="{colors["background"]}"/>'
+    ]
+
+    # Outer subgraphs first so nested ones are drawn on top
+    cluster_attrs = f'fill="{colors["cluster_fill"]}" stroke="{colors["cluster_stroke"]}"'
+    for id, (left, top, w, h) in sorted(layout.clusters.items(), key=lambda item: chart.depth(item[0])):
+        out.append(f'<rect x="{_f(left)}" y="{_f(top)}" width="{_f(w)}" height="{_f(h)}" {cluster_attrs}/>')
+        title = label_lines(chart.subgraphs[id].title, max_chars=int(w / CHAR_WIDTH) or 1)[:1]
+        out.append(_text_svg(title, left + w / 2, top + 16, colors['text'], 'cluster-label'))
+
+    edge_labels = []
+    for edge, points in zip(chart.edges, layout.edges):
+        attrs = [f'stroke="{colors["edge"]}"', 'fill="none"']
+        if edge.style == 'thick':
+            attrs.append('stroke-width="3.5"')
+        else:
+            attrs.append('stroke-width="1.5"')
+        if edge.style == 'dotted':
+            attrs.append('stroke-dasharray="3 3"')
+        if edge.arrow:
+            attrs.append(f'marker-end="url(#{edge.arrow})"')
+        if edge.head:
+            attrs.append(f'marker-start="url(#{edge.head})"')
+        path = 'M' + 'L'.join(f'{_f(x)},{_f(y)}' for x, y in points)
+        out.append(f'<path d="{path}" {" ".join(attrs)}/>')
+        if edge.label:
+            edge_labels.append((label_lines(edge.label), _midpoint(points)))
+
+    node_attrs = f'fill="{colors["node_fill"]}" stroke="{colors["node_stroke"]}" stroke-width="1"'
+    for id in chart.nodes:
+        cx, cy, w, h = layout.nodes[id]
+        out.append(_shape_svg(chart.nodes[id].shape, cx, cy, w, h, node_attrs))
+        out.append(_text_svg(lines[id], cx, cy, colors['text']))
+
+    for text, (x, y) in edge_labels:
+        w, h = text_size(text)
+        out.append(f'<rect x="{_f(x - w / 2 - 2)}" y="{_f(y - h / 2)}" width="{_f(w + 4)}" height="{_f(h)}" '
+                   f'fill="{colors["label_fill"]}" opacity="0.9"/>')
+        out.append(_text_svg(text, x, y, colors['text']))
+
+    out.append('</svg>')
+    return ''.join(out)
+
+def render_chart(chart, theme='default', config=None):
+    """SVG for a parsed Flowchart"""
+    if theme not in THEMES:
+        raise ValueError(f'Unknown theme {theme!r} (expected one of {", ".join(THEMES)})')
+    layout, lines = layout_chart(chart, config)
+    return chart_svg(chart, layout, lines, theme)
+
+def render_svg(source, theme='default', config=None):
+    """
+    Render a flowchart/graph Mermaid source to an SVG string
+    Raises FlowchartSyntaxError for unparseable sources, ValueError for unknown themes or bad config
+    """
+    return render_chart(parse_flowchart(source), theme, config)
+
+def svg_to_png(svg, scale=2.0):
+    """Rasterize an SVG string; raises RasterizerUnavailable without cairosvg"""
+    if cairosvg is None:
+        raise RasterizerUnavailable('PNG output needs cairosvg (pip install cairosvg)')
+    return cairosvg.svg2png(bytestring=svg.encode('utf-8'), scale=scale)
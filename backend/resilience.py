@@ -0,0 +1,195 @@
+"""
+Retries and circuit breaking around upstream calls
+Transient failures (connection errors, timeouts, 429/5xx) are retried with
+jittered exponential backoff. A circuit breaker stops sending requests while
+the upstream keeps failing, so callers fail in milliseconds instead of
+waiting out the full timeout, and probes it again after a cool-down.
+"""
+
+import collections
+import math
+import random
+import threading
+import time
+
+RETRY_STATUSES = frozenset((429, 500, 502, 503, 504))
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the upstream while the breaker is open"""
+
+    def __init__(self, retry_after):
+        super().__init__(f'Upstream circuit open, retry after {retry_after}s')
+        self.retry_after = retry_after
+
+
+def response_status(error):
+    """HTTP status attached to an exception (requests or httpx), if any"""
+    return getattr(getattr(error, 'response', None), 'status_code', None)
+
+def retry_after_seconds(error):
+    """Retry-After header of an HTTP error response, in seconds (None if absent or a date)"""
+    headers = getattr(getattr(error, 'response', None), 'headers', None) or {}
+    try:
+        return max(0.0, float(headers.get('Retry-After')))
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryPolicy:
+    """
+    Which failures to retry and how long to wait between attempts.
+
+    transient: exception classes that are always worth retrying (connection
+    errors, timeouts). Exceptions carrying an HTTP response are retried when
+    the status is in RETRY_STATUSES.
+    """
+
+    def __init__(self, retries=2, base_delay=0.25, max_delay=4.0, transient=()):
+        self.retries = retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.transient = tuple(transient)
+        self._lock = threading.Lock()
+        self._counters = collections.Counter()
+
+    def is_transient(self, error):
+        status = response_status(error)
+        if status is not None:
+            return status in RETRY_STATUSES
+        return isinstance(error, self.transient)
+
+    def delay(self, attempt, error=None):
+        """Full-jitter exponential backoff before retry number `attempt` (1-based)"""
+        ceiling = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        delay = random.uniform(0, ceiling)
+        retry_after = retry_after_seconds(error)
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_delay))
+        return delay
+
+    def count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+        return {
+            'max_retries': self.retries,
+            'retries': counters.get('retries', 0),
+            'recovered': counters.get('recovered', 0),
+            'exhausted': counters.get('exhausted', 0)
+        }
+
+
+class CircuitBreaker:
+    """
+    Closed -> open after failure_threshold consecutive failures; open -> half-open
+    after recovery_time; half-open lets half_open_probes calls through and closes
+    on the first success or reopens on a failure.
+    """
+
+    STATE_CODES = {'closed': 0, 'half_open': 1, 'open': 2}
+
+    def __init__(self, failure_threshold=5, recovery_time=30.0, half_open_probes=1):
+        self.failure_threshold = failure_threshold
+        self.recovery_time = recovery_time
+        self.half_open_probes = half_open_probes
+        self._lock = threading.Lock()
+        self._state = 'closed'
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probes = 0
+        self._probe_at = 0.0
+        self._counters = collections.Counter()
+
+    def _current_state(self, now):
+        if self._state == 'open' and now - self._opened_at >= self.recovery_time:
+            self._state = 'half_open'
+            self._probes = 0
+        elif self._state == 'half_open' and now - self._probe_at >= self.recovery_time:
+            # Probes that never reported back (e.g. cancelled) must not wedge the breaker
+            self._probes = 0
+        return self._state
+
+    def before_call(self):
+        """Raise CircuitOpenError unless a call may go upstream now"""
+        with self._lock:
+            now = time.monotonic()
+            state = self._current_state(now)
+            if state == 'closed':
+                return
+            if state == 'half_open' and self._probes < self.half_open_probes:
+                self._probes += 1
+                self._probe_at = now
+                self._counters['probes'] += 1
+                return
+            self._counters['rejected'] += 1
+            raise CircuitOpenError(self._retry_after(now))
+
+    def _retry_after(self, now):
+        return max(1, math.ceil(self.recovery_time - (now - self._opened_at)))
+
+    def retry_after(self):
+        """Whole seconds until the breaker lets a probe through"""
+        with self._lock:
+            return self._retry_after(time.monotonic())
+
+    def is_open(self):
+        """True while calls would be rejected outright (no probe slot free)"""
+        with self._lock:
+            state = self._current_state(time.monotonic())
+            return state == 'open' or (state == 'half_open' and self._probes >= self.half_open_probes)
+
+    def record_success(self):
+        with self._lock:
+            if self._state != 'closed':
+                self._counters['closed'] += 1
+            self._state = 'closed'
+            self._failures = 0
+            self._probes = 0
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == 'half_open' or self._failures >= self.failure_threshold:
+                if self._state != 'open':
+                    self._counters['opened'] += 1
+                self._state = 'open'
+                self._opened_at = time.monotonic()
+                self._probes = 0
+
+    def stats(self):
+        with self._lock:
+            state = self._current_state(time.monotonic())
+            counters = dict(self._counters)
+            return {
+                'state': state,
+                'state_code': self.STATE_CODES[state],
+                'consecutive_failures': self._failures,
+                'failure_threshold': self.failure_threshold,
+                'recovery_time_s': self.recovery_time,
+                'opened': counters.get('opened', 0),
+                'closed': counters.get('closed', 0),
+                'probes': counters.get('probes', 0),
+                'rejected': counters.get('rejected', 0)
+            }
+
+
+def settle_failure(policy, breaker, error, attempt):
+    """Record a failed attempt on the breaker and policy; returns True when it should be retried"""
+    transient = policy.is_transient(error)
+    if breaker is not None:
+        # A non-transient error (e.g. 400) still proves the upstream is answering
+        if transient:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+    if not transient:
+        return False
+    if attempt > policy.retries:
+        policy.count('exhausted')
+        return False
+    policy.count('retries')
+    return True
@@ -8,89 +8,227 @@ from flask_cors import CORS
 import requests
 import json
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
 
+from admission import AdmissionController, AdmissionRejected
+from artifacts import (CONTENT_TYPES, KEY_RE, Artifact, artifact_key, create_artifact_store_from_env, etag_for,
+                       etag_matches)
+from cache import cache_bypassed, cache_key, create_cache_from_env
+from extraction import extract_mermaid_code
+from flowchart import is_flowchart
+from hedging import Attempt, Hedger
+from metrics import CONTENT_TYPE, PipelineMetrics
+from prompts import DEFAULT_TYPE, TypeStats, get_template, max_tokens_for, system_prompt_for
+from providers import ProviderRouter, providers_from_env
+from renderer import RENDERER_VERSION, RasterizerUnavailable, render_config, render_svg, svg_to_png
+from resilience import CircuitBreaker, CircuitOpenError, RetryPolicy
+from sessions import PatchError, SessionConflict, SessionStore, apply_reply, refine_messages, session_dict
+from singleflight import SingleFlight, StreamFanout
+from sse import DONE, iter_frames
+from streaming import (DONE_EVENT, CompletionAccumulator, StreamProcessor, process_frames, retry_event,
+                       validation_error_event)
+from upstream import UpstreamClient
+from validator import StreamingValidator, validate_diagram
+
 # Load environment variables
 load_dotenv()
 
 app = Flask(__name__)
 CORS(app)
 
-# Z.ai Configuration
+# Z.ai Configuration (ZAI_ENDPOINT/ZAI_MODEL can override the defaults, see providers.py)
 ZAI_API_KEY = os.getenv('ZAI_API_KEY')
-ZAI_ENDPOINT = 'https://api.z.ai/api/coding/paas/v4/chat/completions'
+
+# Upstream connection pool (shared by all endpoints, reuses keep-alive connections)
+UPSTREAM_POOL_SIZE = int(os.getenv('UPSTREAM_POOL_SIZE', 32))
+UPSTREAM_POOL_BLOCK = os.getenv('UPSTREAM_POOL_BLOCK', 'false').lower() == 'true'
+
+# Latency histograms and error counters served at /metrics
+metrics = PipelineMetrics()
+
+upstream = UpstreamClient(
+    pool_maxsize=UPSTREAM_POOL_SIZE,
+    pool_block=UPSTREAM_POOL_BLOCK,
+    on_connect=metrics.connect.observe
+)
+
+# Retries with jittered backoff, and per-provider circuit breakers that fail fast while upstream is unhealthy
+UPSTREAM_RETRIES = int(os.getenv('UPSTREAM_RETRIES', 2))
+UPSTREAM_RETRY_BASE_DELAY = float(os.getenv('UPSTREAM_RETRY_BASE_DELAY', 0.25))
+UPSTREAM_RETRY_MAX_DELAY = float(os.getenv('UPSTREAM_RETRY_MAX_DELAY', 4))
+BREAKER_ENABLED = os.getenv('BREAKER_ENABLED', 'true').lower() == 'true'
+BREAKER_FAILURE_THRESHOLD = int(os.getenv('BREAKER_FAILURE_THRESHOLD', 5))
+BREAKER_RECOVERY_TIME = float(os.getenv('BREAKER_RECOVERY_TIME', 30))
+BREAKER_HALF_OPEN_PROBES = int(os.getenv('BREAKER_HALF_OPEN_PROBES', 1))
+
+retry_policy = RetryPolicy(
+    retries=UPSTREAM_RETRIES,
+    base_delay=UPSTREAM_RETRY_BASE_DELAY,
+    max_delay=UPSTREAM_RETRY_MAX_DELAY,
+    transient=(requests.exceptions.ConnectionError, requests.exceptions.Timeout)
+)
+
+def create_breaker():
+    """Circuit breaker for one provider (None when BREAKER_ENABLED=false)"""
+    if not BREAKER_ENABLED:
+        return None
+    return CircuitBreaker(
+        failure_threshold=BREAKER_FAILURE_THRESHOLD,
+        recovery_time=BREAKER_RECOVERY_TIME,
+        half_open_probes=BREAKER_HALF_OPEN_PROBES
+    )
+
+# Upstream providers (PROVIDERS, default zai), routed by EWMA time-to-first-token and error rate
+ROUTER_EWMA_ALPHA = float(os.getenv('ROUTER_EWMA_ALPHA', 0.2))
+ROUTER_EXPLORE = float(os.getenv('ROUTER_EXPLORE', 0.05))
+
+router = ProviderRouter(providers_from_env(create_breaker), alpha=ROUTER_EWMA_ALPHA, explore=ROUTER_EXPLORE)
+
+# Response cache for /api/generate (None when CACHE_ENABLED=false)
+response_cache = create_cache_from_env()
+
+# Coalesce identical in-flight generations into one upstream call
+COALESCE_ENABLED = os.getenv('COALESCE_ENABLED', 'true').lower() == 'true'
+inflight = SingleFlight() if COALESCE_ENABLED else None
+stream_fanout = StreamFanout() if COALESCE_ENABLED else None
+
+# Token usage and latency per diagram type
+type_stats = TypeStats()
+
+# Streaming validation: cancel doomed generations early, then retry or report
+STREAM_VALIDATE = os.getenv('STREAM_VALIDATE', 'false').lower() == 'true'
+STREAM_VALIDATE_RETRIES = int(os.getenv('STREAM_VALIDATE_RETRIES', 1))
+STREAM_VALIDATE_MAX_LINE_ERRORS = int(os.getenv('STREAM_VALIDATE_MAX_LINE_ERRORS', 3))
+STREAM_VALIDATE_PROSE_LIMIT = int(os.getenv('STREAM_VALIDATE_PROSE_LIMIT', 600))
+
+# Hedged /api/generate requests: a second request races a primary that is slow to start
+HEDGE_ENABLED = os.getenv('HEDGE_ENABLED', 'false').lower() == 'true'
+HEDGE_PERCENTILE = float(os.getenv('HEDGE_PERCENTILE', 95))
+HEDGE_MIN_DELAY = float(os.getenv('HEDGE_MIN_DELAY', 0.5))
+HEDGE_MAX_DELAY = float(os.getenv('HEDGE_MAX_DELAY', 10))
+HEDGE_INITIAL_DELAY = float(os.getenv('HEDGE_INITIAL_DELAY', 3))
+HEDGE_DISABLE_THINKING = os.getenv('HEDGE_DISABLE_THINKING', 'true').lower() == 'true'
+
+hedger = Hedger(
+    percentile=HEDGE_PERCENTILE,
+    min_delay=HEDGE_MIN_DELAY,
+    max_delay=HEDGE_MAX_DELAY,
+    initial_delay=HEDGE_INITIAL_DELAY
+) if HEDGE_ENABLED else None
+
+# Admission control: token buckets in front of Z.ai, early 429 when saturated
+ADMISSION_ENABLED = os.getenv('ADMISSION_ENABLED', 'false').lower() == 'true'
+ADMISSION_GLOBAL_RATE = float(os.getenv('ADMISSION_GLOBAL_RATE', 10))
+ADMISSION_GLOBAL_BURST = int(os.getenv('ADMISSION_GLOBAL_BURST', 20))
+ADMISSION_CLIENT_RATE = float(os.getenv('ADMISSION_CLIENT_RATE', 1))
+ADMISSION_CLIENT_BURST = int(os.getenv('ADMISSION_CLIENT_BURST', 5))
+ADMISSION_MAX_QUEUE = int(os.getenv('ADMISSION_MAX_QUEUE', 100))
+ADMISSION_MAX_WAIT = float(os.getenv('ADMISSION_MAX_WAIT', 10))
+ADMISSION_CLIENT_HEADER = os.getenv('ADMISSION_CLIENT_HEADER', '')
+
+admission = AdmissionController(
+    global_rate=ADMISSION_GLOBAL_RATE,
+    global_burst=ADMISSION_GLOBAL_BURST,
+    client_rate=ADMISSION_CLIENT_RATE,
+    client_burst=ADMISSION_CLIENT_BURST,
+    max_queue=ADMISSION_MAX_QUEUE,
+    max_wait=ADMISSION_MAX_WAIT
+) if ADMISSION_ENABLED else None
+
+# Content-addressed store for /api/render output (None when ARTIFACT_CACHE_ENABLED=false)
+artifact_store = create_artifact_store_from_env()
+render_flight = SingleFlight()
+
+# Refinement sessions: the diagram stays on the server and the model answers with line edits
+SESSION_MAX = int(os.getenv('SESSION_MAX', 1000))
+SESSION_TTL = float(os.getenv('SESSION_TTL', 3600))
+SESSION_HISTORY_TURNS = int(os.getenv('SESSION_HISTORY_TURNS', 4))
+
+sessions = SessionStore(max_sessions=SESSION_MAX, ttl=SESSION_TTL, history_turns=SESSION_HISTORY_TURNS)
+
+# Batch generation limits
+BATCH_CONCURRENCY = int(os.getenv('BATCH_CONCURRENCY', 8))
+BATCH_MAX_ITEMS = int(os.getenv('BATCH_MAX_ITEMS', 500))
 
 @app.route('/health', methods=['GET'])
 def health():
     """Health check endpoint"""
     return jsonify({
         'status': 'ok',
-        'zai_api_key_configured': bool(ZAI_API_KEY)
+        'zai_api_key_configured': bool(ZAI_API_KEY),
+        'upstream_pool': upstream.stats(),
+        'retries': retry_policy.stats(),
+        'providers': router.stats(),
+        'cache': response_cache.stats() if response_cache else None,
+        'coalescing': {
+            'generate': inflight.stats(),
+            'stream': stream_fanout.stats()
+        } if COALESCE_ENABLED else None,
+        'hedging': hedger.stats() if hedger else None,
+        'admission': admission.stats() if admission else None,
+        'artifacts': artifact_store.stats() if artifact_store else None,
+        'sessions': sessions.stats(),
+        'diagram_types': type_stats.stats()
     })
 
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Prometheus metrics"""
+    return Response(metrics.render(metrics_gauges()), content_type=CONTENT_TYPE)
+
+def metrics_gauges():
+    """Point-in-time gauges for /metrics, taken from the same stats as /health"""
+    gauges = {'upstream_pool': upstream.stats(), 'retries': retry_policy.stats()}
+    for name, stats in router.stats().items():
+        breaker_stats = {f'breaker_{key}': value for key, value in (stats['circuit_breaker'] or {}).items()}
+        gauges[f'provider_{name}'] = dict(stats, **breaker_stats)
+    if response_cache is not None:
+        gauges['cache'] = response_cache.stats()
+    if COALESCE_ENABLED:
+        gauges['coalescing_generate'] = inflight.stats()
+        gauges['coalescing_stream'] = stream_fanout.stats()
+    if hedger is not None:
+        gauges['hedging'] = hedger.stats()
+    if admission is not None:
+        gauges['admission'] = admission.stats()
+    if artifact_store is not None:
+        gauges['artifacts'] = artifact_store.stats()
+    gauges['sessions'] = sessions.stats()
+    return gauges
+
 @app.route('/api/generate', methods=['POST'])
 def generate():
     """
     Generate Mermaid diagram from natural language
     POST /api/generate
-    Body: { "prompt": string, "diagramType": string, "useThinking": bool }
+    Body: { "prompt": string, "diagramType": string, "useThinking": bool, "fewShot": bool }
     """
     data = request.json
     prompt = data.get('prompt')
     diagram_type = data.get('diagramType', 'flowchart')
     use_thinking = data.get('useThinking', True)
+    few_shot = data.get('fewShot')
 
     if not prompt:
         return jsonify({'error': 'Prompt is required'}), 400
 
-    if not ZAI_API_KEY:
-        return jsonify({'error': 'ZAI_API_KEY not configured'}), 500
-
-    # Build system prompt
-    system_prompt = build_system_prompt(diagram_type)
-
-    # Build request payload
-    payload = {
-        'model': 'glm-4.6',
-        'messages': [
-            {'role': 'system', 'content': system_prompt},
-            {'role': 'user', 'content': prompt}
-        ],
-        'temperature': 0.7,
-        'max_tokens': 2000,
-        'stream': False
-    }
-
-    # Add thinking mode if enabled
-    if use_thinking:
-        payload['thinking'] = {'type': 'enabled'}
+    if not router.providers:
+        return jsonify({'error': 'No upstream provider configured (set ZAI_API_KEY or PROVIDERS)'}), 500
 
     try:
-        response = requests.post(
-            ZAI_ENDPOINT,
-            headers={
-                'Content-Type': 'application/json',
-                'Authorization': f'Bearer {ZAI_API_KEY}',
-                'Accept-Language': 'en-US,en'
-            },
-            json=payload,
-            timeout=30
+        result, headers = generate_result(
+            prompt, diagram_type, use_thinking, cache_bypassed(request.headers), few_shot,
+            client_id(request.headers, request.remote_addr)
         )
+        return jsonify(result), 200, headers
 
-        response.raise_for_status()
-        data = response.json()
+    except AdmissionRejected as e:
+        return retry_later_response(e, 429)
 
-        # Extract generated code
-        generated_code = data['choices'][0]['message']['content']
-        reasoning_content = data['choices'][0]['message'].get('reasoning_content')
-
-        return jsonify({
-            'success': True,
-            'code': extract_mermaid_code(generated_code),
-            'reasoning': reasoning_content,
-            'model': data.get('model'),
-            'usage': data.get('usage')
-        })
+    except CircuitOpenError as e:
+        return retry_later_response(e, 503)
 
     except requests.exceptions.RequestException as e:
         print(f'Z.ai API Error: {e}')
@@ -99,83 +237,133 @@ def generate():
             'error': str(e)
         }), 500
 
+@app.route('/api/generate/batch', methods=['POST'])
+def generate_batch():
+    """
+    Generate many diagrams concurrently, streaming results as NDJSON
+    POST /api/generate/batch
+    Body: { "items": [{ "prompt": string, "diagramType": string, "useThinking": bool, "fewShot": bool }],
+            "concurrency": int }
+    """
+    data = request.json
+    items = data.get('items') if isinstance(data, dict) else None
+
+    if not isinstance(items, list) or not items:
+        return jsonify({'error': 'items must be a non-empty list'}), 400
+
+    if len(items) > BATCH_MAX_ITEMS:
+        return jsonify({'error': f'At most {BATCH_MAX_ITEMS} items per batch'}), 400
+
+    if not router.providers:
+        return jsonify({'error': 'No upstream provider configured (set ZAI_API_KEY or PROVIDERS)'}), 500
+
+    concurrency = data.get('concurrency', BATCH_CONCURRENCY)
+    if isinstance(concurrency, bool) or not isinstance(concurrency, int):
+        return jsonify({'error': 'concurrency must be an integer'}), 400
+    concurrency = max(1, min(concurrency, BATCH_CONCURRENCY))
+    bypass = cache_bypassed(request.headers)
+    client = client_id(request.headers, request.remote_addr)
+
+    def run_item(item):
+        if not isinstance(item, dict) or not item.get('prompt'):
+            raise ValueError('Prompt is required')
+        result, _ = generate_result(
+            item['prompt'],
+            item.get('diagramType', 'flowchart'),
+            item.get('useThinking', True),
+            bypass,
+            item.get('fewShot'),
+            client
+        )
+        return result
+
+    def generate_ndjson():
+        """One line per item as it finishes, then a summary line"""
+        succeeded = 0
+        usage_totals = {}
+
+        executor = ThreadPoolExecutor(max_workers=concurrency)
+        try:
+            futures = {executor.submit(run_item, item): index for index, item in enumerate(items)}
+
+            for future in as_completed(futures):
+                line = {'type': 'item', 'index': futures[future]}
+                try:
+                    result = future.result()
+                    line.update(result)
+                    succeeded += 1
+                    for name, value in (result.get('usage') or {}).items():
+                        if isinstance(value, (int, float)):
+                            usage_totals[name] = usage_totals.get(name, 0) + value
+                except Exception as e:
+                    # One failed item must not abort the rest of the batch
+                    line.update({'success': False, 'error': str(e)})
+                yield json.dumps(line) + '\n'
+        finally:
+            # Client gone or batch done: drop items that have not started
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        yield json.dumps({
+            'type': 'summary',
+            'total': len(items),
+            'succeeded': succeeded,
+            'failed': len(items) - succeeded,
+            'usage': usage_totals
+        }) + '\n'
+
+    return Response(
+        stream_with_context(generate_ndjson()),
+        mimetype='application/x-ndjson',
+        headers={'Cache-Control': 'no-cache'}
+    )
+
 @app.route('/api/generate/stream', methods=['POST'])
 def generate_stream():
     """
     Streaming endpoint for real-time generation
     POST /api/generate/stream
-    Body: { "prompt": string, "diagramType": string, "useThinking": bool }
+    Body: { "prompt": string, "diagramType": string, "useThinking": bool, "fewShot": bool,
+            "extractCode": bool, "validate": bool }
     """
     data = request.json
     prompt = data.get('prompt')
     diagram_type = data.get('diagramType', 'flowchart')
     use_thinking = data.get('useThinking', True)
+    few_shot = data.get('fewShot')
+    extract_code = bool(data.get('extractCode', False))
+    validate = bool(data.get('validate', STREAM_VALIDATE))
 
     if not prompt:
         return jsonify({'error': 'Prompt is required'}), 400
 
-    if not ZAI_API_KEY:
-        return jsonify({'error': 'ZAI_API_KEY not configured'}), 500
+    if not router.providers:
+        return jsonify({'error': 'No upstream provider configured (set ZAI_API_KEY or PROVIDERS)'}), 500
 
-    system_prompt = build_system_prompt(diagram_type)
+    payload = build_payload(prompt, diagram_type, use_thinking, stream=True, few_shot=few_shot)
 
-    payload = {
-        'model': 'glm-4.6',
-        'messages': [
-            {'role': 'system', 'content': system_prompt},
-            {'role': 'user', 'content': prompt}
-        ],
-        'temperature': 0.7,
-        'max_tokens': 2000,
-        'stream': True
-    }
+    def start():
+        return stream_upstream(payload, extract_code, validate, get_template(diagram_type).diagram_type)
 
-    if use_thinking:
-        payload['thinking'] = {'type': 'enabled'}
+    events = None
+    if stream_fanout is not None:
+        key = cache_key(prompt, diagram_type, use_thinking, payload)
+        key += (':code' if extract_code else '') + (':valid' if validate else '')
+        # Joining an identical in-flight stream is free
+        events = stream_fanout.join(key)
 
-    def generate_stream_response():
-        """Generator function for SSE streaming"""
+    if events is None:
         try:
-            response = requests.post(
-                ZAI_ENDPOINT,
-                headers={
-                    'Content-Type': 'application/json',
-                    'Authorization': f'Bearer {ZAI_API_KEY}',
-                    'Accept-Language': 'en-US,en'
-                },
-                json=payload,
-                stream=True,
-                timeout=60
-            )
-
-            response.raise_for_status()
-
-            # Parse SSE stream
-            for line in response.iter_lines():
-                if line:
-                    line = line.decode('utf-8')
-                    if line.startswith('data: '):
-                        data = line[6:].strip()
-
-                        if data == '[DONE]':
-                            yield 'data: [DONE]\n\n'
-                            break
-
-                        try:
-                            # Forward the parsed JSON to client
-                            parsed = json.loads(data)
-                            yield f'data: {json.dumps(parsed)}\n\n'
-                        except json.JSONDecodeError:
-                            # Skip malformed JSON
-                            pass
-
-        except requests.exceptions.RequestException as e:
-            print(f'Z.ai Streaming Error: {e}')
-            error_data = {'error': str(e)}
-            yield f'data: {json.dumps(error_data)}\n\n'
+            admit(client_id(request.headers, request.remote_addr))
+        except (AdmissionRejected, CircuitOpenError) as e:
+            # An identical request may have started the stream meanwhile
+            events = stream_fanout.join(key) if stream_fanout is not None else None
+            if events is None:
+                return retry_later_response(e, 429 if isinstance(e, AdmissionRejected) else 503)
+        if events is None:
+            events = stream_fanout.subscribe(key, start) if stream_fanout is not None else start()
 
     return Response(
-        stream_with_context(generate_stream_response()),
+        stream_with_context(timed_stream(events)),
         mimetype='text/event-stream',
         headers={
             'Cache-Control': 'no-cache',
@@ -183,50 +371,526 @@ def generate_stream():
         }
     )
 
-def build_system_prompt(diagram_type):
-    """Build system prompt based on diagram type"""
-    base_prompt = ("You are an expert at creating Mermaid diagrams. Generate ONLY the Mermaid code "
-                   "without any explanations, markdown code blocks, or additional text. The code should "
-                   "be production-ready and follow Mermaid best practices.")
-
-    type_specific = {
-        'flowchart': ("Create a flowchart (use 'flowchart TD' or 'flowchart LR' syntax). Use appropriate "
-                      "node shapes: rectangles for processes, diamonds for decisions, circles for start/end."),
-        'sequence': ("Create a sequence diagram (use 'sequenceDiagram' syntax). Include participants, "
-                     "messages with arrows (->>, -->, ->>), and optional notes."),
-        'class': ("Create a class diagram (use 'classDiagram' syntax). Include classes with properties "
-                  "and methods, and relationships (inheritance, composition, association)."),
-        'state': ("Create a state diagram (use 'stateDiagram-v2' syntax). Include states, transitions, "
-                  "and use [*] for start/end states."),
-        'er': ("Create an entity-relationship diagram (use 'erDiagram' syntax). Include entities with "
-               "attributes and relationships (||--o{, }|--|{, etc.)."),
-        'gantt': ("Create a Gantt chart (use 'gantt' syntax). Include title, dateFormat, sections, and "
-                  "tasks with start dates and durations.")
+@app.route('/api/render', methods=['POST'])
+def render():
+    """
+    Render a flowchart/graph diagram to SVG or PNG on the server
+    POST /api/render
+    Body: { "code": string, "format": "svg" | "png", "theme": string, "config": { "nodeSpacing", "rankSpacing" } }
+    """
+    data = request.json
+    data = data if isinstance(data, dict) else {}
+    code = data.get('code')
+    code = extract_mermaid_code(code) if isinstance(code, str) else ''
+    fmt = data.get('format', 'svg')
+    theme = data.get('theme', 'default')
+
+    if not code:
+        return jsonify({'error': 'Code is required'}), 400
+    if not isinstance(fmt, str) or fmt not in CONTENT_TYPES:
+        return jsonify({'error': f'format must be one of {", ".join(CONTENT_TYPES)}'}), 400
+    if not isinstance(theme, str):
+        return jsonify({'error': 'theme must be a string'}), 400
+    if not is_flowchart(code):
+        return jsonify({'error': 'Only flowchart/graph diagrams can be rendered on the server'}), 422
+
+    try:
+        config = render_config(data.get('config'))
+        key = artifact_key(code, fmt, theme, config, RENDERER_VERSION)
+        # The key covers every input, so a matching ETag is current without rendering
+        if etag_matches(request.headers.get('If-None-Match'), etag_for(key)):
+            return Response(status=304, headers=artifact_headers(key, fmt))
+        artifact, cache_status = render_artifact(key, code, fmt, theme, config)
+    except ValueError as e:
+        # FlowchartSyntaxError, unknown themes and bad config
+        return jsonify({'error': str(e)}), 400
+    except RasterizerUnavailable as e:
+        return jsonify({'error': str(e)}), 501
+
+    headers = artifact_headers(key, fmt)
+    headers['X-Cache'] = cache_status
+    return Response(artifact.body, content_type=artifact.content_type, headers=headers)
+
+@app.route('/api/artifacts/<name>', methods=['GET'])
+def get_artifact(name):
+    """
+    A rendered diagram by its content address (the Content-Location of /api/render)
+    GET /api/artifacts/<key>.<svg|png>
+    """
+    key, _, fmt = name.partition('.')
+    if fmt not in CONTENT_TYPES or not KEY_RE.match(key):
+        return jsonify({'error': 'Not found'}), 404
+
+    headers = artifact_headers(key, fmt)
+    headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    if etag_matches(request.headers.get('If-None-Match'), etag_for(key)):
+        return Response(status=304, headers=headers)
+
+    artifact = artifact_store.get(key, fmt) if artifact_store is not None else None
+    if artifact is None:
+        return jsonify({'error': 'Not found'}), 404
+    return Response(artifact.body, content_type=artifact.content_type, headers=headers)
+
+def artifact_headers(key, fmt):
+    return {'ETag': etag_for(key), 'Content-Location': f'/api/artifacts/{key}.{fmt}'}
+
+def render_artifact(key, code, fmt, theme, config):
+    """Rendered artifact from the store, or rendered now (once per key when concurrent); returns (artifact, X-Cache)"""
+    if artifact_store is not None:
+        artifact = artifact_store.get(key, fmt)
+        if artifact is not None:
+            return artifact, 'HIT'
+
+    def build():
+        svg = render_svg(code, theme, config)
+        body = svg.encode('utf-8') if fmt == 'svg' else svg_to_png(svg)
+        if artifact_store is not None:
+            return artifact_store.put(key, fmt, body)
+        return Artifact(key, fmt, body)
+
+    artifact, shared = render_flight.do(key, build)
+    if artifact_store is None:
+        return artifact, 'DISABLED'
+    return artifact, 'COALESCED' if shared else 'MISS'
+
+@app.route('/api/sessions', methods=['POST'])
+def create_session():
+    """
+    Start a refinement session from existing code or a first generation
+    POST /api/sessions
+    Body: { "code": string } or { "prompt": string, "useThinking": bool, "fewShot": bool }, plus "diagramType"
+    """
+    data = request.json or {}
+    diagram_type = data.get('diagramType', 'flowchart')
+    code = extract_mermaid_code(data.get('code') or '')
+    prompt = data.get('prompt')
+
+    if not code and not prompt:
+        return jsonify({'error': 'Code or prompt is required'}), 400
+
+    usage = None
+    if not code:
+        if not router.providers:
+            return jsonify({'error': 'No upstream provider configured (set ZAI_API_KEY or PROVIDERS)'}), 500
+        try:
+            result, _ = generate_result(
+                prompt, diagram_type, data.get('useThinking', True), cache_bypassed(request.headers),
+                data.get('fewShot'), client_id(request.headers, request.remote_addr)
+            )
+        except AdmissionRejected as e:
+            return retry_later_response(e, 429)
+        except CircuitOpenError as e:
+            return retry_later_response(e, 503)
+        except requests.exceptions.RequestException as e:
+            print(f'Z.ai API Error: {e}')
+            return jsonify({'success': False, 'error': str(e)}), 500
+        code, usage = result['code'], result['usage']
+
+    session = sessions.create(diagram_type, code)
+    return jsonify(dict(session_dict(session), success=True, usage=usage)), 201
+
+@app.route('/api/sessions/<session_id>', methods=['GET', 'DELETE'])
+def session_state(session_id):
+    """
+    Current diagram of a session, or end it
+    GET|DELETE /api/sessions/<id>
+    """
+    if request.method == 'DELETE':
+        if not sessions.delete(session_id):
+            return jsonify({'error': 'Session not found'}), 404
+        return '', 204
+
+    session = sessions.get(session_id)
+    if session is None:
+        return jsonify({'error': 'Session not found'}), 404
+    return jsonify(session_dict(session))
+
+@app.route('/api/sessions/<session_id>/refine', methods=['POST'])
+def refine_session(session_id):
+    """
+    Apply a natural-language change to a session's diagram
+    POST /api/sessions/<id>/refine
+    Body: { "prompt": string, "useThinking": bool, "version": int }
+    The model answers with line edits that are applied here; "version" (optional)
+    makes the call fail with 409 if the session has moved on since the client last saw it.
+    """
+    data = request.json or {}
+    prompt = data.get('prompt')
+
+    if not prompt:
+        return jsonify({'error': 'Prompt is required'}), 400
+
+    session = sessions.get(session_id)
+    if session is None:
+        return jsonify({'error': 'Session not found'}), 404
+
+    if data.get('version', session.version) != session.version:
+        return jsonify({'error': 'Session has changed', 'version': session.version}), 409
+
+    if not router.providers:
+        return jsonify({'error': 'No upstream provider configured (set ZAI_API_KEY or PROVIDERS)'}), 500
+
+    payload = build_refine_payload(session, prompt, data.get('useThinking', False))
+
+    try:
+        completion = refine_completion(payload, client_id(request.headers, request.remote_addr))
+    except AdmissionRejected as e:
+        return retry_later_response(e, 429)
+    except CircuitOpenError as e:
+        return retry_later_response(e, 503)
+    except requests.exceptions.RequestException as e:
+        print(f'Z.ai API Error: {e}')
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+    reply = completion['choices'][0]['message']['content']
+    try:
+        code, mode, edits = apply_reply(session.code, reply)
+    except PatchError as e:
+        metrics.record_error('refine', e)
+        return jsonify({'success': False, 'error': str(e), 'reply': reply}), 422
+
+    # Reject edits that break a diagram which validated before
+    errors = validate_diagram(code, session.diagram_type)
+    if errors and not validate_diagram(session.code, session.diagram_type):
+        metrics.record_error('refine', 'ValidationFailed')
+        return jsonify({'success': False, 'error': 'Edited diagram failed validation', 'errors': errors,
+                        'reply': reply}), 422
+
+    try:
+        session = sessions.commit(session, code, prompt, mode)
+    except SessionConflict as e:
+        return jsonify({'success': False, 'error': str(e)}), 409
+
+    return jsonify(dict(session_dict(session), success=True, mode=mode, edits=edits,
+                        usage=completion.get('usage')))
+
+def generate_result(prompt, diagram_type, use_thinking, bypass_cache=False, few_shot=None, client=None):
+    """
+    Run one non-streaming generation through the cache, the coalescing layer and admission control
+    Returns (result, response_headers); raises RequestException on upstream failure
+    (after retries), AdmissionRejected when a cache miss cannot be admitted and
+    CircuitOpenError while every provider's circuit breaker is open
+    """
+    payload = build_payload(prompt, diagram_type, use_thinking, stream=False, few_shot=few_shot)
+
+    # Identical requests coalesce whichever provider serves them; cached responses are keyed by provider
+    key = cache_key(prompt, diagram_type, use_thinking, payload)
+    if response_cache is not None and not bypass_cache:
+        cached = response_cache.get_any(provider_cache_keys(prompt, diagram_type, use_thinking, payload))
+        if cached is not None:
+            return cached, {'X-Cache': 'HIT'}
+
+    def fetch(provider):
+        """
+        One upstream attempt on a provider
+        Returns (result, time_to_first_token or None, cache key of the request that produced the result)
+        """
+        key = cache_key(prompt, diagram_type, use_thinking, provider.prepare(payload))
+        # The hedge goes to the next-best provider whose breaker lets it through, if any
+        hedge_provider = router.alternate(provider) if hedger is not None else None
+        if hedge_provider is not None:
+            hedge_payload = build_hedge_payload(prompt, diagram_type, use_thinking, few_shot)
+
+            def hedge(attempt):
+                # Admitted and recorded by the hedge provider's breaker like any other call
+                return router.call_on(
+                    hedge_provider,
+                    lambda: generation_result(streamed_completion(hedge_provider, hedge_payload, attempt)),
+                    retry_policy,
+                    attempt
+                )
+
+            result, winner = hedger.run(
+                lambda attempt: generation_result(streamed_completion(provider, payload, attempt)),
+                hedge,
+                lambda result: not validate_diagram(result['code'], get_template(diagram_type).diagram_type)
+            )
+            if winner.name == 'hedge':
+                # The hedge may have run without thinking: cache it as the request it actually made
+                key = cache_key(prompt, diagram_type, hedge_thinking(use_thinking),
+                                hedge_provider.prepare(hedge_payload))
+            return result, winner.ttft, key
+
+        if len(router.providers) > 1:
+            # Stream internally so the router learns this provider's time to first token
+            attempt = Attempt(provider.name)
+            return generation_result(streamed_completion(provider, payload, attempt)), attempt.ttft, key
+
+        response = upstream.post(
+            provider.endpoint,
+            headers=provider.headers(),
+            json=provider.prepare(payload),
+            timeout=30
+        )
+
+        response.raise_for_status()
+        return generation_result(response.json()), None, key
+
+    def call_upstream():
+        try:
+            # Only calls that reach Z.ai are rate limited: cache hits and coalesced waiters are free
+            admit(client)
+
+            started = time.perf_counter()
+            (result, ttft, served_key), _ = router.call(fetch, retry_policy)
+        except Exception as e:
+            metrics.record_error('generate', e)
+            raise
+
+        elapsed = time.perf_counter() - started
+        metrics.record_generation('generate', elapsed, ttft, result['usage'])
+        type_stats.record(get_template(diagram_type).diagram_type, elapsed, result['usage'])
+
+        if response_cache is not None:
+            response_cache.set(served_key, result)
+
+        return result
+
+    if inflight is not None:
+        result, shared = inflight.do(key, call_upstream)
+    else:
+        result, shared = call_upstream(), False
+
+    return result, {
+        'X-Cache': 'MISS' if response_cache is not None else 'DISABLED',
+        'X-Coalesced': 'true' if shared else 'false'
     }
 
-    specific = type_specific.get(diagram_type, type_specific['flowchart'])
-    return f"{base_prompt}\n\n{specific}"
+def refine_completion(payload, client=None):
+    """
+    One non-streaming refinement call through admission control, the router and retries
+    Returns the raw completion; raises like generate_result (refinements are never cached)
+    """
+    def fetch(provider):
+        response = upstream.post(
+            provider.endpoint,
+            headers=provider.headers(),
+            json=provider.prepare(payload),
+            timeout=60
+        )
+        response.raise_for_status()
+        return response.json()
+
+    try:
+        admit(client)
+
+        started = time.perf_counter()
+        completion, _ = router.call(fetch, retry_policy)
+    except Exception as e:
+        metrics.record_error('refine', e)
+        raise
+
+    metrics.record_generation('refine', time.perf_counter() - started, None, completion.get('usage'))
+    return completion
+
+def streamed_completion(provider, payload, attempt):
+    """
+    Stream one completion from a provider and return it in non-streaming shape
+    The first token is reported to the attempt (for hedging) and to the router
+    """
+    accumulator = CompletionAccumulator()
+    response = upstream.post(
+        provider.endpoint,
+        headers=provider.headers(),
+        json=provider.prepare(dict(payload, stream=True)),
+        stream=True,
+        timeout=30
+    )
+    attempt.on_cancel = lambda: upstream.abort(response)
+
+    try:
+        if attempt.cancelled:
+            raise requests.exceptions.ConnectionError('Hedged attempt cancelled')
+        response.raise_for_status()
+        for _, data in iter_frames(response.iter_content(chunk_size=None)):
+            if data.strip() == DONE:
+                break
+            if accumulator.feed(data):
+                attempt.mark_first_token()
+                router.record_ttft(provider, attempt.ttft)
+    finally:
+        response.close()
+
+    return accumulator.completion()
+
+def client_id(headers, remote_addr):
+    """Identity used for per-client rate limits (ADMISSION_CLIENT_HEADER, else the peer address)"""
+    if ADMISSION_CLIENT_HEADER and headers.get(ADMISSION_CLIENT_HEADER):
+        return headers.get(ADMISSION_CLIENT_HEADER)
+    return remote_addr or 'unknown'
+
+def admit(client):
+    """
+    Take an admission token for a call about to go upstream
+    Raises CircuitOpenError, before any token is taken, while every provider's breaker is open
+    """
+    if router.all_open():
+        raise CircuitOpenError(router.retry_after())
+    if admission is not None:
+        admission.acquire(client)
+
+def retry_later_response(error, status):
+    """429/503 response for a request turned away by admission control or the circuit breaker"""
+    return jsonify({
+        'success': False,
+        'error': str(error),
+        'retry_after': error.retry_after
+    }), status, {'Retry-After': str(error.retry_after)}
+
+def open_stream(provider, payload):
+    """Start a streaming completion; only this part is retried (nothing has reached the client yet)"""
+    response = upstream.post(
+        provider.endpoint,
+        headers=provider.headers(),
+        json=provider.prepare(payload),
+        stream=True,
+        timeout=60
+    )
+
+    try:
+        response.raise_for_status()
+    except requests.exceptions.HTTPError:
+        response.close()
+        raise
+    return response
+
+def stream_upstream(payload, extract_code=False, validate=False, diagram_type=DEFAULT_TYPE):
+    """
+    Generator yielding SSE events from a streaming Z.ai completion
+
+    Frames are forwarded as raw bytes. With extract_code, content deltas are
+    replaced by clean `code_delta` events (fences and prose stripped on the
+    fly) and a final `code` event carries the canonical code. With validate,
+    the code is checked while it streams; a doomed generation is cancelled
+    upstream and retried (after a `retry` event) or reported as a
+    validation_error.
+    """
+    attempts = 1 + STREAM_VALIDATE_RETRIES if validate else 1
+
+    for attempt in range(1, attempts + 1):
+        validator = StreamingValidator(
+            diagram_type,
+            max_line_errors=STREAM_VALIDATE_MAX_LINE_ERRORS,
+            prose_limit=STREAM_VALIDATE_PROSE_LIMIT
+        ) if validate else None
+        processor = StreamProcessor(extract_code, validator)
+        started = time.perf_counter()
 
-def extract_mermaid_code(content):
-    """Extract clean Mermaid code from AI response"""
-    import re
+        try:
+            response, provider = router.call(lambda provider: open_stream(provider, payload), retry_policy)
+
+            try:
+                # Forward upstream frames as raw bytes: framing is checked, payloads are never re-serialized
+                yield from process_frames(processor, iter_frames(response.iter_content(chunk_size=None)))
+            finally:
+                # Cancels the upstream generation if we stopped reading early
+                response.close()
 
-    code = content.strip()
+        except (requests.exceptions.RequestException, CircuitOpenError) as e:
+            print(f'Z.ai Streaming Error: {e}')
+            metrics.record_error('stream', e)
+            error_data = {'error': str(e)}
+            yield f'data: {json.dumps(error_data)}\n\n'.encode('utf-8')
+            return
+
+        if processor.errors is None:
+            record_stream(processor, started, provider)
+            return
+
+        print(f'Z.ai stream failed validation (attempt {attempt}/{attempts}): {processor.errors}')
+        metrics.record_error('stream', 'ValidationFailed')
+        if attempt < attempts:
+            yield retry_event(attempt + 1, processor.errors)
+        else:
+            yield validation_error_event(processor.errors, attempts)
+            yield DONE_EVENT
+
+def record_stream(processor, started, provider, endpoint='stream'):
+    """Record a completed streaming generation in the metrics and the provider router"""
+    elapsed = time.perf_counter() - started
+    ttft = processor.first_token_at - started if processor.first_token_at is not None else None
+    metrics.record_generation(endpoint, elapsed, ttft, processor.usage)
+    if ttft is not None:
+        router.record_ttft(provider, ttft)
+
+def timed_stream(events, endpoint='stream'):
+    """Pass events through, recording how long the client stream stayed open"""
+    started = time.perf_counter()
+    try:
+        yield from events
+    finally:
+        metrics.sse_duration.observe(time.perf_counter() - started, endpoint)
 
-    # Remove markdown code blocks
-    code = re.sub(r'^```mermaid\n?', '', code, flags=re.IGNORECASE)
-    code = re.sub(r'^```\n?', '', code)
-    code = re.sub(r'\n?```$', '', code)
+def provider_cache_keys(prompt, diagram_type, use_thinking, payload):
+    """Cache keys the response to payload would have if each provider served it, best provider first"""
+    return [cache_key(prompt, diagram_type, use_thinking, provider.prepare(payload)) for provider in router.ranked()]
+
+def build_payload(prompt, diagram_type, use_thinking, stream, few_shot=None):
+    """Build the chat completion payload (Provider.prepare adds the model)"""
+    payload = {
+        'messages': [
+            {'role': 'system', 'content': build_system_prompt(diagram_type, few_shot)},
+            {'role': 'user', 'content': prompt}
+        ],
+        'temperature': 0.7,
+        'max_tokens': max_tokens_for(diagram_type, use_thinking),
+        'stream': stream
+    }
+
+    # Add thinking mode if enabled
+    if use_thinking:
+        payload['thinking'] = {'type': 'enabled'}
+
+    return payload
+
+def build_refine_payload(session, instruction, use_thinking):
+    """Payload for a refinement: edits against the numbered diagram, budgeted for a full rewrite as fallback"""
+    payload = {
+        'messages': refine_messages(session, instruction),
+        'temperature': 0.2,
+        'max_tokens': max_tokens_for(session.diagram_type, use_thinking),
+        'stream': False
+    }
+    if use_thinking:
+        payload['thinking'] = {'type': 'enabled'}
+    return payload
+
+def build_hedge_payload(prompt, diagram_type, use_thinking, few_shot=None):
+    """Payload for the hedge request: same prompt, optionally without thinking so it starts sooner"""
+    return build_payload(prompt, diagram_type, hedge_thinking(use_thinking), stream=False, few_shot=few_shot)
+
+def hedge_thinking(use_thinking):
+    """Whether the hedge request asks for thinking"""
+    return use_thinking and not HEDGE_DISABLE_THINKING
+
+def generation_result(data):
+    """Build the /api/generate response body from a Z.ai completion"""
+    message = data['choices'][0]['message']
+
+    return {
+        'success': True,
+        'code': extract_mermaid_code(message['content']),
+        'reasoning': message.get('reasoning_content'),
+        'model': data.get('model'),
+        'usage': data.get('usage')
+    }
 
-    return code.strip()
+def build_system_prompt(diagram_type, few_shot=None):
+    """Build system prompt based on diagram type (precompiled in prompts.py)"""
+    return system_prompt_for(diagram_type, few_shot)
 
 if __name__ == '__main__':
     port = int(os.getenv('PORT', 3001))
     print(f'✅ Z.ai Proxy Server running on http://localhost:{port}')
     print('📊 Endpoints:')
     print('   - GET  /health')
+    print('   - GET  /metrics')
     print('   - POST /api/generate')
     print('   - POST /api/generate/stream')
+    print('   - POST /api/generate/batch')
+    print('   - POST /api/render')
+    print('   - POST /api/sessions, POST /api/sessions/<id>/refine')
     print(f'\n🔑 Z.ai API Key: {"✓ Configured" if ZAI_API_KEY else "✗ Missing"}')
+    print(f'🔀 Providers: {", ".join(p.name for p in router.providers) or "none"}')
 
     app.run(host='0.0.0.0', port=port, debug=os.getenv('DEBUG', 'false').lower() == 'true')
@@ -0,0 +1,216 @@
+"""
+Refinement sessions for iterative diagram edits
+A session keeps the current diagram and the last few instructions on the
+server. A refinement sends the model the numbered diagram plus the new
+instruction and asks for line edits instead of a whole new diagram; the edits
+are applied here. Output tokens then scale with the size of the change, not
+the size of the diagram.
+"""
+
+import collections
+import re
+import threading
+import time
+import uuid
+
+from extraction import extract_mermaid_code, is_mermaid_header
+from prompts import TYPE_SPECS, get_template
+
+PATCH_PROMPT = (
+    "You edit an existing Mermaid diagram. Reply ONLY with edit operations against the numbered "
+    "lines of the current diagram, without explanations or code blocks:\n"
+    "@@ replace A-B   followed by the lines that replace lines A to B\n"
+    "@@ insert N      followed by the lines to insert after line N (0 inserts at the top)\n"
+    "@@ delete A-B    removes lines A to B\n"
+    "A single line can be written as 'replace A' or 'delete A'. Line numbers always refer to the "
+    "diagram as shown, not to the result of earlier operations. Do not include the line numbers in "
+    "new lines, and keep the diagram's indentation. If the request changes most of the diagram, "
+    "reply with the complete new diagram instead."
+)
+
+OP_RE = re.compile(r'^@@\s*(replace|insert|delete)\s+(\d+)(?:\s*-\s*(\d+))?\s*(?:@@)?\s*$', re.IGNORECASE)
+
+Session = collections.namedtuple('Session', 'id diagram_type code version history')
+
+
+class PatchError(ValueError):
+    """The model reply is neither applicable edits nor a complete diagram"""
+
+
+class SessionConflict(RuntimeError):
+    """The session moved to another version while a refinement was in flight"""
+
+
+def number_lines(code):
+    """The diagram as the model sees it: one 'N| line' per line"""
+    lines = code.split('\n')
+    width = len(str(len(lines)))
+    return '\n'.join(f'{number:>{width}}| {line}' for number, line in enumerate(lines, 1))
+
+def refine_messages(session, instruction):
+    """Chat messages for one refinement: the patch instructions, the numbered diagram and recent requests"""
+    spec = TYPE_SPECS[session.diagram_type]
+    parts = [f'Current diagram:\n{number_lines(session.code)}']
+    if session.history:
+        earlier = '\n'.join(f'- {text}' for text in session.history)
+        parts.append(f'Earlier requests (already applied):\n{earlier}')
+    parts.append(f'Request: {instruction}')
+    return [
+        {'role': 'system', 'content': f'{PATCH_PROMPT}\n\n{spec.instructions}'},
+        {'role': 'user', 'content': '\n\n'.join(parts)}
+    ]
+
+def parse_patch(reply):
+    """
+    List of (op, start, end, lines) from a model reply; [] when it contains no edit operations
+    Anything before the first operation (a preamble the model added despite the prompt) is ignored
+    """
+    ops = []
+    for line in reply.split('\n'):
+        match = OP_RE.match(line.strip())
+        if match:
+            op, start = match.group(1).lower(), int(match.group(2))
+            end = int(match.group(3)) if match.group(3) else start
+            ops.append((op, start, end, []))
+        elif ops:
+            ops[-1][3].append(line)
+
+    # Trailing blank lines, and the closing fence of a block that followed a preamble
+    for _, _, _, lines in ops:
+        while lines and lines[-1].strip() in ('', '```'):
+            lines.pop()
+    return ops
+
+def apply_patch(code, ops):
+    """Apply edits whose line numbers all refer to the original code; raises PatchError"""
+    lines = code.split('\n')
+    count = len(lines)
+    replaced = {}
+    inserted = collections.defaultdict(list)
+
+    for op, start, end, new_lines in ops:
+        if op == 'insert':
+            if not 0 <= start <= count:
+                raise PatchError(f'insert after line {start}, but the diagram has {count} lines')
+            inserted[start].extend(new_lines)
+            continue
+        if not 1 <= start <= end <= count:
+            raise PatchError(f'{op} {start}-{end} is outside lines 1-{count}')
+        if any(number in replaced for number in range(start, end + 1)):
+            raise PatchError(f'{op} {start}-{end} overlaps an earlier edit')
+        if op == 'delete' and any(line.strip() for line in new_lines):
+            raise PatchError(f'delete {start}-{end} has content')
+        replaced[start] = new_lines if op == 'replace' else []
+        for number in range(start + 1, end + 1):
+            replaced[number] = []
+
+    result = list(inserted[0])
+    for number, line in enumerate(lines, 1):
+        result.extend(replaced.get(number, (line,)))
+        result.extend(inserted.get(number, ()))
+    return '\n'.join(result)
+
+def apply_reply(code, reply):
+    """
+    New code from a model reply: edits applied to code, or a complete diagram
+    Returns (code, mode, edits) where mode is 'patch' or 'full'
+    """
+    ops = parse_patch(extract_mermaid_code(reply))
+    if ops:
+        return apply_patch(code, ops).strip(), 'patch', len(ops)
+
+    full = extract_mermaid_code(reply)
+    first = full.split('\n', 1)[0].strip()
+    if full and is_mermaid_header(first):
+        return full, 'full', 0
+    raise PatchError('Reply contained neither edit operations nor a diagram')
+
+
+class SessionStore:
+    """
+    In-memory sessions with idle expiry and an LRU cap.
+
+    Sessions are immutable snapshots; commit() replaces one with the next
+    version, so a refinement computed from a stale version is detected
+    instead of silently overwriting a concurrent edit.
+    """
+
+    def __init__(self, max_sessions=1000, ttl=3600, history_turns=4):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.history_turns = history_turns
+        self._lock = threading.Lock()
+        self._sessions = collections.OrderedDict()
+        self._counters = collections.Counter()
+
+    def create(self, diagram_type, code):
+        session = Session(uuid.uuid4().hex, get_template(diagram_type).diagram_type, code, 1, ())
+        with self._lock:
+            self._store(session)
+            self._counters['created'] += 1
+        return session
+
+    def get(self, session_id):
+        """Current session, or None when unknown or expired"""
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return None
+            expires, session = entry
+            if expires <= time.monotonic():
+                del self._sessions[session_id]
+                self._counters['expired'] += 1
+                return None
+            self._store(session)
+            return session
+
+    def commit(self, session, code, instruction, mode):
+        """Store the next version of session; raises SessionConflict if it is no longer current"""
+        history = (session.history + (instruction,))[-self.history_turns:] if self.history_turns else ()
+        updated = session._replace(code=code, version=session.version + 1, history=history)
+        with self._lock:
+            entry = self._sessions.get(session.id)
+            if entry is None or entry[1].version != session.version:
+                self._counters['conflicts'] += 1
+                raise SessionConflict(f'Session {session.id} changed while this refinement was running')
+            self._store(updated)
+            self._counters[f'refined_{mode}'] += 1
+        return updated
+
+    def delete(self, session_id):
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def _store(self, session):
+        """Insert or refresh a session as most recently used (lock held)"""
+        self._sessions[session.id] = (time.monotonic() + self.ttl, session)
+        self._sessions.move_to_end(session.id)
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+            self._counters['evicted'] += 1
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+            active = len(self._sessions)
+        return {
+            'active': active,
+            'max_sessions': self.max_sessions,
+            'created': counters.get('created', 0),
+            'refined_patch': counters.get('refined_patch', 0),
+            'refined_full': counters.get('refined_full', 0),
+            'conflicts': counters.get('conflicts', 0),
+            'expired': counters.get('expired', 0),
+            'evicted': counters.get('evicted', 0)
+        }
+
+
+def session_dict(session):
+    """JSON body describing a session"""
+    return {
+        'sessionId': session.id,
+        'diagramType': session.diagram_type,
+        'version': session.version,
+        'code': session.code,
+        'history': list(session.history)
+    }
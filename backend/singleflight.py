@@ -0,0 +1,339 @@
+"""
+Request coalescing for identical in-flight generations
+Only one upstream call runs per key; every concurrent caller shares it.
+"""
+
+import asyncio
+import threading
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Coalesce concurrent calls with the same key into one execution (threads)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.executed = 0
+        self.coalesced = 0
+
+    def do(self, key, fn):
+        """Run fn() once per in-flight key; returns (result, shared)"""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                self.executed += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+        return call.result, False
+
+    def stats(self):
+        with self._lock:
+            in_flight = len(self._calls)
+        return {'in_flight': in_flight, 'executed': self.executed, 'coalesced': self.coalesced}
+
+
+class _Broadcast:
+    """Append-only chunk buffer that many subscribers read at their own pace"""
+
+    def __init__(self):
+        self.chunks = []
+        self.finished = False
+        self.cond = threading.Condition()
+        # Open subscriptions; the producer stops once the last one closes
+        self.subscribers = 0
+        self.abandoned = False
+
+    def publish(self, chunk):
+        with self.cond:
+            self.chunks.append(chunk)
+            self.cond.notify_all()
+
+    def finish(self):
+        with self.cond:
+            self.finished = True
+            self.cond.notify_all()
+
+    def subscribe(self):
+        """Yield every chunk from the start of the stream, then follow it live"""
+        position = 0
+        while True:
+            with self.cond:
+                while position >= len(self.chunks) and not self.finished:
+                    self.cond.wait()
+                pending = self.chunks[position:]
+                finished = self.finished
+            position += len(pending)
+            yield from pending
+            if finished and not pending:
+                return
+
+
+class _Subscription:
+    """One subscriber's chunk iterator; close() leaves the broadcast"""
+
+    def __init__(self, chunks, leave):
+        self._chunks = chunks
+        self._leave = leave
+        self.closed = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.closed:
+            raise StopIteration
+        try:
+            return next(self._chunks)
+        except BaseException:
+            self.close()
+            raise
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self._chunks.close()
+            self._leave()
+
+
+class StreamFanout:
+    """
+    Share one upstream stream between identical concurrent requests (threads).
+
+    The first request starts a producer thread that drains the upstream
+    generator into a buffer. Every subscriber, including the first, keeps its
+    own cursor into that buffer, so a late joiner replays what it missed and
+    then follows the live stream. A client disconnecting never stalls others.
+    When the last subscriber closes before the stream ends, the upstream
+    generator is closed after its next chunk and the key is released.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._streams = {}
+        self.executed = 0
+        self.coalesced = 0
+        self.cancelled = 0
+
+    def subscribe(self, key, start):
+        """Return a chunk iterator for key; start() creates the upstream generator if none is running"""
+        with self._lock:
+            broadcast = self._streams.get(key)
+            if broadcast is None:
+                broadcast = self._streams[key] = _Broadcast()
+                self.executed += 1
+                threading.Thread(target=self._produce, args=(key, broadcast, start), daemon=True).start()
+            else:
+                self.coalesced += 1
+            broadcast.subscribers += 1
+        return _Subscription(broadcast.subscribe(), lambda: self._leave(key, broadcast))
+
+    def join(self, key):
+        """Subscribe to key's stream if one is in flight; None if the caller would have to start it"""
+        with self._lock:
+            broadcast = self._streams.get(key)
+            if broadcast is None:
+                return None
+            self.coalesced += 1
+            broadcast.subscribers += 1
+        return _Subscription(broadcast.subscribe(), lambda: self._leave(key, broadcast))
+
+    def _leave(self, key, broadcast):
+        with self._lock:
+            broadcast.subscribers -= 1
+            if broadcast.subscribers or broadcast.finished:
+                return
+            # Nobody is reading: stop the producer, and let the next request start a fresh call
+            broadcast.abandoned = True
+            self.cancelled += 1
+            if self._streams.get(key) is broadcast:
+                del self._streams[key]
+
+    def _produce(self, key, broadcast, start):
+        upstream = start()
+        try:
+            for chunk in upstream:
+                if broadcast.abandoned:
+                    break
+                broadcast.publish(chunk)
+        except Exception as e:
+            # Subscribers see the stream end; the generators in server.py report their own errors as events
+            print(f'Shared stream failed: {e}')
+        finally:
+            # Runs the generator's cleanup, which cancels the upstream request if it stopped early
+            upstream.close()
+            # New requests after this point start a fresh upstream call
+            with self._lock:
+                if self._streams.get(key) is broadcast:
+                    del self._streams[key]
+            broadcast.finish()
+
+    def stats(self):
+        with self._lock:
+            in_flight = len(self._streams)
+        return {'in_flight': in_flight, 'executed': self.executed, 'coalesced': self.coalesced,
+                'cancelled': self.cancelled}
+
+
+class AsyncSingleFlight:
+    """Coalesce concurrent calls with the same key into one execution (asyncio)"""
+
+    def __init__(self):
+        self._calls = {}
+        self.executed = 0
+        self.coalesced = 0
+
+    async def do(self, key, fn):
+        """Await fn() once per in-flight key; returns (result, shared)"""
+        future = self._calls.get(key)
+        if future is not None:
+            self.coalesced += 1
+            # shield: a cancelled follower must not cancel the shared call
+            return await asyncio.shield(future), True
+
+        self.executed += 1
+        future = self._calls[key] = asyncio.ensure_future(fn())
+        future.add_done_callback(lambda _: self._calls.pop(key, None))
+        return await asyncio.shield(future), False
+
+    def stats(self):
+        return {'in_flight': len(self._calls), 'executed': self.executed, 'coalesced': self.coalesced}
+
+
+class _AsyncBroadcast:
+    def __init__(self):
+        self.chunks = []
+        self.finished = False
+        self.changed = asyncio.Event()
+        self.producer = None
+        self.subscribers = 0
+
+    async def subscribe(self):
+        position = 0
+        while True:
+            if position < len(self.chunks):
+                pending = self.chunks[position:]
+                position += len(pending)
+                for chunk in pending:
+                    yield chunk
+                continue
+            if self.finished:
+                return
+            self.changed.clear()
+            await self.changed.wait()
+
+
+class _AsyncSubscription:
+    """One subscriber's async chunk iterator; aclose() leaves the broadcast"""
+
+    def __init__(self, chunks, leave):
+        self._chunks = chunks
+        self._leave = leave
+        self.closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.closed:
+            raise StopAsyncIteration
+        try:
+            return await self._chunks.__anext__()
+        except BaseException:
+            await self.aclose()
+            raise
+
+    async def aclose(self):
+        if not self.closed:
+            self.closed = True
+            await self._chunks.aclose()
+            self._leave()
+
+
+class AsyncStreamFanout:
+    """
+    Share one upstream async stream between identical concurrent requests (asyncio)
+    When the last subscriber closes before the stream ends, the producer task
+    is cancelled (closing the upstream generator) and the key is released.
+    """
+
+    def __init__(self):
+        self._streams = {}
+        self.executed = 0
+        self.coalesced = 0
+        self.cancelled = 0
+
+    def subscribe(self, key, start):
+        """Return an async chunk iterator for key; start() creates the upstream async generator"""
+        broadcast = self._streams.get(key)
+        if broadcast is None:
+            broadcast = self._streams[key] = _AsyncBroadcast()
+            self.executed += 1
+            # Keep a reference: the event loop only holds tasks weakly
+            broadcast.producer = asyncio.ensure_future(self._produce(key, broadcast, start))
+        else:
+            self.coalesced += 1
+        broadcast.subscribers += 1
+        return _AsyncSubscription(broadcast.subscribe(), lambda: self._leave(key, broadcast))
+
+    def join(self, key):
+        """Subscribe to key's stream if one is in flight; None if the caller would have to start it"""
+        broadcast = self._streams.get(key)
+        if broadcast is None:
+            return None
+        self.coalesced += 1
+        broadcast.subscribers += 1
+        return _AsyncSubscription(broadcast.subscribe(), lambda: self._leave(key, broadcast))
+
+    def _leave(self, key, broadcast):
+        broadcast.subscribers -= 1
+        if broadcast.subscribers or broadcast.finished:
+            return
+        self.cancelled += 1
+        if self._streams.get(key) is broadcast:
+            del self._streams[key]
+        broadcast.producer.cancel()
+
+    async def _produce(self, key, broadcast, start):
+        upstream = start()
+        try:
+            async for chunk in upstream:
+                broadcast.chunks.append(chunk)
+                broadcast.changed.set()
+        finally:
+            # Runs the generator's cleanup, which cancels the upstream request if it stopped early
+            await upstream.aclose()
+            if self._streams.get(key) is broadcast:
+                del self._streams[key]
+            broadcast.finished = True
+            broadcast.changed.set()
+
+    def stats(self):
+        return {'in_flight': len(self._streams), 'executed': self.executed, 'coalesced': self.coalesced,
+                'cancelled': self.cancelled}
@@ -0,0 +1,100 @@
+"""
+Incremental byte-level Server-Sent Events parser
+Upstream frames are forwarded as raw bytes: no utf-8 decode, json.loads or
+json.dumps on the hot path.
+"""
+
+import json
+
+DONE = b'[DONE]'
+
+
+class SSEParser:
+    """
+    Push parser for an SSE byte stream.
+
+    feed() accepts arbitrary network reads; frames split across reads are
+    buffered until their terminating blank line arrives. Multi-line `data:`
+    fields are joined with b'\\n' as the SSE spec requires.
+    """
+
+    __slots__ = ('_buffer', '_data', '_event')
+
+    def __init__(self):
+        self._buffer = b''
+        self._data = []
+        self._event = None
+
+    def feed(self, chunk):
+        """Consume bytes, returning a list of (event, data) tuples for every completed frame"""
+        buffer = self._buffer + chunk if self._buffer else chunk
+        frames = []
+        start = 0
+        while True:
+            end = buffer.find(b'\n', start)
+            if end < 0:
+                break
+            line = buffer[start:end]
+            start = end + 1
+            if line.endswith(b'\r'):
+                line = line[:-1]
+
+            if not line:
+                # Blank line dispatches the pending frame
+                if self._data:
+                    frames.append((self._event, b'\n'.join(self._data)))
+                self._data = []
+                self._event = None
+            elif line.startswith(b'data:'):
+                value = line[5:]
+                self._data.append(value[1:] if value.startswith(b' ') else value)
+            elif line.startswith(b'event:'):
+                self._event = line[6:].strip()
+            # Comments (':') and other fields (id:, retry:) are ignored
+
+        self._buffer = buffer[start:]
+        return frames
+
+    def flush(self):
+        """Dispatch a trailing frame left unterminated at end of stream"""
+        frames = self.feed(b'\n\n') if self._buffer else []
+        if self._data:
+            frames.append((self._event, b'\n'.join(self._data)))
+            self._data = []
+        return frames
+
+
+def iter_frames(chunks):
+    """Yield (event, data) frames from an iterable of raw byte chunks"""
+    parser = SSEParser()
+    for chunk in chunks:
+        yield from parser.feed(chunk)
+    yield from parser.flush()
+
+
+async def aiter_frames(chunks):
+    """Yield (event, data) frames from an async iterable of raw byte chunks"""
+    parser = SSEParser()
+    async for chunk in chunks:
+        for frame in parser.feed(chunk):
+            yield frame
+    for frame in parser.flush():
+        yield frame
+
+
+def encode_data(data):
+    """Frame raw data bytes as an SSE event, one `data:` line per embedded line"""
+    if b'\n' in data:
+        return b''.join(b'data: ' + line + b'\n' for line in data.split(b'\n')) + b'\n'
+    return b'data: ' + data + b'\n\n'
+
+
+def encode_event(name, payload):
+    """Frame a named event with a JSON payload"""
+    return b'event: ' + name.encode('utf-8') + b'\ndata: ' + json.dumps(payload).encode('utf-8') + b'\n\n'
+
+
+def looks_like_json_object(data):
+    """Cheap framing check standing in for json.loads on forwarded chunks"""
+    data = data.strip()
+    return data.startswith(b'{') and data.endswith(b'}')
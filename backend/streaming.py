@@ -0,0 +1,208 @@
+"""
+Per-frame processing for /api/generate/stream
+Shared by the Flask (server.py) and ASGI (asgi_server.py) streaming paths;
+this module does no I/O of its own.
+"""
+
+import json
+import time
+
+from extraction import MermaidStreamExtractor
+from sse import DONE, encode_data, encode_event, looks_like_json_object
+
+DONE_EVENT = b'data: [DONE]\n\n'
+
+def code_events(delta):
+    """SSE event for a clean code delta (nothing when the delta is empty)"""
+    if delta:
+        return [encode_event('code_delta', {'type': 'code_delta', 'delta': delta})]
+    return []
+
+def frame_content(data):
+    """Content delta of an upstream chunk, or None for reasoning/usage/other frames"""
+    try:
+        return json.loads(data)['choices'][0]['delta'].get('content')
+    except (ValueError, KeyError, IndexError, TypeError, AttributeError):
+        return None
+
+def retry_event(attempt, errors):
+    """Tells the client to discard what it has received so far: a new attempt is starting"""
+    return encode_event('retry', {'type': 'retry', 'attempt': attempt, 'errors': errors})
+
+def validation_error_event(errors, attempts):
+    """Final structured error after every attempt failed validation"""
+    return encode_data(json.dumps({
+        'type': 'validation_error',
+        'error': 'Generated diagram failed validation',
+        'errors': errors,
+        'attempts': attempts
+    }).encode('utf-8'))
+
+
+class StreamProcessor:
+    """
+    Turns one upstream attempt's data frames into client SSE events.
+
+    Without extraction or validation, frames pass through as raw bytes. With
+    extract_code, content deltas become code_delta events and a final code
+    event. With a StreamingValidator, the clean code is checked as it grows;
+    once the output is doomed, `errors` is set and the caller must cancel the
+    upstream request.
+
+    For metrics, `first_token_at` (perf_counter) and `usage` are picked up
+    along the way; only frames before the first token and frames carrying
+    usage are parsed for that.
+    """
+
+    def __init__(self, extract_code=False, validator=None):
+        self.extract_code = extract_code
+        self.validator = validator
+        self.extractor = MermaidStreamExtractor() if extract_code or validator is not None else None
+        self.raw_chars = 0
+        self.errors = None
+        self.first_token_at = None
+        self.usage = None
+
+    def _observe(self, data):
+        try:
+            chunk = json.loads(data)
+        except ValueError:
+            return
+        if not isinstance(chunk, dict):
+            return
+        self.usage = chunk.get('usage') or self.usage
+        if self.first_token_at is None:
+            try:
+                delta = chunk['choices'][0]['delta']
+            except (KeyError, IndexError, TypeError):
+                return
+            if delta.get('content') or delta.get('reasoning_content'):
+                self.first_token_at = time.perf_counter()
+
+    def frame(self, data):
+        """Events to send for one upstream data frame"""
+        if self.first_token_at is None or b'"usage"' in data:
+            self._observe(data)
+
+        if self.extractor is None:
+            return [encode_data(data)]
+
+        content = frame_content(data)
+        if not content:
+            return [encode_data(data)]
+
+        self.raw_chars += len(content)
+        delta = self.extractor.feed(content)
+
+        if self.validator is not None:
+            doomed = self.validator.feed(delta, self.raw_chars)
+            if doomed:
+                self.errors = doomed
+                return []
+
+        return code_events(delta) if self.extract_code else [encode_data(data)]
+
+    def done(self):
+        """Events that close a stream before [DONE] (none if the final validation fails)"""
+        if self.extractor is None:
+            return []
+
+        delta = self.extractor.finish()
+
+        if self.validator is not None:
+            doomed = self.validator.feed(delta, self.raw_chars) or self.validator.finish()
+            if doomed:
+                self.errors = doomed
+                return []
+
+        if not self.extract_code:
+            return []
+        return code_events(delta) + [encode_event('code', {'type': 'code', 'code': self.extractor.code})]
+
+
+class CompletionAccumulator:
+    """
+    Rebuilds a non-streaming completion body from streamed chunks.
+
+    Used by hedged /api/generate requests, which stream upstream so the time
+    to first token can be observed. feed() returns True for the first frame
+    that carries content or reasoning.
+    """
+
+    def __init__(self):
+        self.model = None
+        self.usage = None
+        self._content = []
+        self._reasoning = []
+
+    def feed(self, data):
+        try:
+            chunk = json.loads(data)
+        except ValueError:
+            return False
+        if not isinstance(chunk, dict):
+            return False
+
+        self.model = chunk.get('model') or self.model
+        self.usage = chunk.get('usage') or self.usage
+        try:
+            delta = chunk['choices'][0]['delta']
+        except (KeyError, IndexError, TypeError):
+            return False
+
+        first = not self._content and not self._reasoning
+        content = delta.get('content')
+        reasoning = delta.get('reasoning_content')
+        if content:
+            self._content.append(content)
+        if reasoning:
+            self._reasoning.append(reasoning)
+        return first and bool(content or reasoning)
+
+    def completion(self):
+        """Body in the shape of a non-streaming chat completion"""
+        return {
+            'choices': [{'message': {
+                'content': ''.join(self._content),
+                'reasoning_content': ''.join(self._reasoning) or None
+            }}],
+            'model': self.model,
+            'usage': self.usage
+        }
+
+
+def process_frames(processor, frames):
+    """Drive a processor over (event, data) frames; stops early when the output is doomed"""
+    for _, data in frames:
+        if data.strip() == DONE:
+            yield from processor.done()
+            if processor.errors is None:
+                yield DONE_EVENT
+            return
+
+        if not looks_like_json_object(data):
+            # Skip malformed chunks
+            continue
+
+        yield from processor.frame(data)
+        if processor.errors is not None:
+            return
+
+async def aprocess_frames(processor, frames):
+    """Async variant of process_frames() for an async iterable of frames"""
+    async for _, data in frames:
+        if data.strip() == DONE:
+            for event in processor.done():
+                yield event
+            if processor.errors is None:
+                yield DONE_EVENT
+            return
+
+        if not looks_like_json_object(data):
+            # Skip malformed chunks
+            continue
+
+        for event in processor.frame(data):
+            yield event
+        if processor.errors is not None:
+            return
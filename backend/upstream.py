@@ -0,0 +1,119 @@
+"""
+Pooled upstream HTTP client for the Z.ai proxy
+Keeps TCP+TLS connections to the API alive between requests
+"""
+
+import socket
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+
+def timed_pool_classes(on_connect):
+    """Connection pool classes that report each new connection's setup time to on_connect(seconds)"""
+    def timed(connection_cls):
+        class TimedConnection(connection_cls):
+            def connect(self):
+                started = time.perf_counter()
+                super().connect()
+                on_connect(time.perf_counter() - started)
+        return TimedConnection
+
+    class TimedHTTPConnectionPool(HTTPConnectionPool):
+        ConnectionCls = timed(HTTPConnection)
+
+    class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+        ConnectionCls = timed(HTTPSConnection)
+
+    return {'http': TimedHTTPConnectionPool, 'https': TimedHTTPSConnectionPool}
+
+
+class UpstreamClient:
+    """
+    Thread-safe pooled client shared by all endpoints.
+
+    Each worker thread gets its own requests.Session (sessions hold a cookie
+    jar and are not safe to share), but every session mounts the same
+    HTTPAdapter, so all threads draw from one keep-alive connection pool.
+    """
+
+    def __init__(self, pool_connections=4, pool_maxsize=32, pool_block=False, on_connect=None):
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self._adapter = HTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            pool_block=pool_block
+        )
+        if on_connect is not None:
+            self._adapter.poolmanager.pool_classes_by_scheme = timed_pool_classes(on_connect)
+        self._local = threading.local()
+
+    def _session(self):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            session.headers['Connection'] = 'keep-alive'
+            session.mount('https://', self._adapter)
+            session.mount('http://', self._adapter)
+            self._local.session = session
+        return session
+
+    def post(self, url, **kwargs):
+        """POST through the shared pool (same arguments as requests.post)"""
+        return self._session().post(url, **kwargs)
+
+    @staticmethod
+    def abort(response):
+        """
+        Cancel a streamed response from another thread
+
+        response.close() waits for a reader blocked on the same socket, so the
+        socket is shut down first to wake that reader up immediately.
+        """
+        sock = getattr(getattr(response.raw, 'connection', None), 'sock', None)
+        if sock is None:
+            # http.client drops the connection's socket once the server says it
+            # will close, but the response's reader still holds it
+            reader = getattr(getattr(response.raw, '_fp', None), 'fp', None)
+            sock = getattr(getattr(reader, 'raw', None), '_sock', None)
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        response.close()
+
+    def stats(self):
+        """Connection pool statistics, summed over all upstream hosts"""
+        created = 0
+        idle = 0
+        in_use = 0
+        served = 0
+        pools = self._adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            created += pool.num_connections
+            served += pool.num_requests
+            # The pool queue is pre-filled with None placeholders; real
+            # entries are idle keep-alive connections waiting for reuse
+            idle += sum(1 for conn in list(pool.pool.queue) if conn is not None)
+            in_use += pool.pool.maxsize - pool.pool.qsize()
+
+        return {
+            'pool_maxsize': self.pool_maxsize,
+            'open_connections': in_use + idle,
+            'idle_connections': idle,
+            'connections_opened': created,
+            'requests': served,
+            'reused_connections': max(served - created, 0)
+        }
+
+    def close(self):
+        self._adapter.close()
@@ -0,0 +1,297 @@
+"""
+Parallel validation of .mmd files and Markdown-embedded diagrams
+Applies validator.py's rules (the Python port of validateSyntax() and
+validateTypeSpecific() from tests/diagram-validator.js) to every diagram
+under the given paths, across a process pool. Each diagram's result is
+streamed as one NDJSON line as soon as its file is done, and a JSON summary
+is written at the end.
+
+Files unchanged since the last run are not read again: an index keeps each
+file's size, mtime, SHA-256 and results. A file whose mtime changed but whose
+content hash did not is not revalidated either. Editing validator.py or this
+module invalidates the whole index.
+
+The diagram type comes from the file name for test-diagram-<type>.mmd (as in
+the JS validator), otherwise from the diagram header; 'unknown' when a block
+has none.
+
+Usage:
+    python validate_corpus.py [paths ...] [--workers 8] [--output results.ndjson] [--report summary.json]
+                              [--index .validation-index.json] [--full] [--parse]
+"""
+
+import argparse
+import collections
+import concurrent.futures
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+
+from diagram_parser import MermaidSyntaxError, diagram_type, parse_diagram
+from extraction import MERMAID_HEADERS
+from validator import validate_diagram
+
+MODULE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+EXTENSIONS = ('.mmd', '.mermaid', '.md', '.markdown')
+MARKDOWN_EXTENSIONS = ('.md', '.markdown')
+SKIP_DIRS = frozenset(('.git', 'node_modules', '__pycache__', '.venv', 'venv', 'dist', 'build', 'target'))
+
+TYPE_FROM_NAME_RE = re.compile(r'^test-diagram-([\w-]+)\.mmd$')
+FENCE_RE = re.compile(r'^(\s*)(`{3,}|~{3,})\s*mermaid\s*$')
+LINE_PREFIX_RE = re.compile(r'^Line \d+: ')
+
+# Paths per pool task: enough to amortize inter-process overhead, small enough to stream steadily
+BATCH_SIZE = 64
+
+INDEX_VERSION = 1
+
+def rules_version(parse=False):
+    """Hash of the rule sources and options; a different value invalidates every cached result"""
+    sha = hashlib.sha256(f'{INDEX_VERSION}:{parse}'.encode())
+    for name in ('validator.py', 'validate_corpus.py', 'diagram_parser.py', 'flowchart.py'):
+        with open(os.path.join(MODULE_DIR, name), 'rb') as f:
+            sha.update(f.read())
+    return sha.hexdigest()[:16]
+
+def markdown_diagrams(text):
+    """(first code line number, code) for each ```mermaid / ~~~mermaid fenced block"""
+    diagrams = []
+    lines = text.split('\n')
+    i = 0
+    while i < len(lines):
+        match = FENCE_RE.match(lines[i])
+        if not match:
+            i += 1
+            continue
+        fence = match.group(2)
+        start = i + 1
+        end = start
+        while end < len(lines) and not lines[end].strip().startswith(fence):
+            end += 1
+        diagrams.append((start + 1, '\n'.join(lines[start:end])))
+        i = end + 1
+    return diagrams
+
+def file_diagrams(path, text):
+    """(line, type, code) for every diagram in a file"""
+    if path.lower().endswith(MARKDOWN_EXTENSIONS):
+        found = markdown_diagrams(text)
+    else:
+        found = [(1, text)]
+    name_match = TYPE_FROM_NAME_RE.match(os.path.basename(path))
+    diagrams = []
+    for line, code in found:
+        kind = name_match.group(1) if name_match else diagram_type(code)
+        if kind is None:
+            # Headers diagram_parser does not handle (pie, journey, gitGraph, ...)
+            words = (row.split(None, 1) for row in code.split('\n'))
+            kind = next((row[0] for row in words if row and row[0] in MERMAID_HEADERS), 'unknown')
+        diagrams.append((line, kind, code))
+    return diagrams
+
+def validate_code(code, kind, parse=False):
+    """validator.py errors for one diagram; with parse, diagram_parser syntax errors for types it knows"""
+    errors = validate_diagram(code, kind)
+    if parse and not errors and diagram_type(code) is not None:
+        try:
+            parse_diagram(code)
+        except MermaidSyntaxError as e:
+            errors = [str(e)]
+    return errors
+
+def validate_file(path, known_hash=None, parse=False):
+    """
+    Worker: read, hash and validate one file
+    Returns (path, size, mtime_ns, sha256, records); records is None when the
+    content hash equals known_hash (the caller keeps its cached records).
+    """
+    try:
+        stat = os.stat(path)
+        with open(path, 'rb') as f:
+            data = f.read()
+    except OSError as e:
+        return path, None, None, None, [{'line': 0, 'type': None, 'valid': False, 'errors': [f'Unreadable: {e}']}]
+    digest = hashlib.sha256(data).hexdigest()
+    if digest == known_hash:
+        return path, stat.st_size, stat.st_mtime_ns, digest, None
+    text = data.decode('utf-8', errors='replace')
+    records = []
+    for line, kind, code in file_diagrams(path, text):
+        errors = validate_code(code, kind, parse)
+        records.append({'line': line, 'type': kind, 'valid': not errors, 'errors': errors})
+    return path, stat.st_size, stat.st_mtime_ns, digest, records
+
+def validate_batch(paths, known_hashes, parse):
+    return [validate_file(path, known_hashes.get(path), parse) for path in paths]
+
+def find_files(paths, extensions=EXTENSIONS):
+    """Files with the given extensions under paths (files are taken as given), sorted"""
+    found = []
+    for root in paths:
+        if os.path.isfile(root):
+            found.append(os.path.abspath(root))
+            continue
+        for directory, dirs, files in os.walk(root):
+            dirs[:] = [name for name in dirs if name not in SKIP_DIRS and not name.startswith('.')]
+            found.extend(os.path.abspath(os.path.join(directory, name)) for name in files
+                         if name.lower().endswith(extensions))
+    return sorted(set(found))
+
+def load_index(path, version):
+    try:
+        with open(path, encoding='utf-8') as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return index.get('files', {}) if index.get('rules') == version else {}
+
+def save_index(path, version, files):
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump({'rules': version, 'files': files}, f, separators=(',', ':'))
+    os.replace(path + '.tmp', path)
+
+
+class Summary:
+    """Running totals for the report"""
+
+    def __init__(self):
+        self.files = 0
+        self.cached_files = 0
+        self.diagrams = 0
+        self.invalid = 0
+        self.by_type = collections.defaultdict(lambda: {'diagrams': 0, 'invalid': 0})
+        self.messages = collections.Counter()
+        self.invalid_files = []
+
+    def add(self, path, records, cached):
+        self.files += 1
+        self.cached_files += cached
+        bad = False
+        for record in records:
+            self.diagrams += 1
+            counts = self.by_type[record['type']]
+            counts['diagrams'] += 1
+            if not record['valid']:
+                self.invalid += 1
+                counts['invalid'] += 1
+                bad = True
+                self.messages.update(LINE_PREFIX_RE.sub('', error) for error in record['errors'])
+        if bad:
+            self.invalid_files.append(path)
+
+    def report(self, seconds, workers, top=20, max_files=1000):
+        return {
+            'files': self.files,
+            'validated_files': self.files - self.cached_files,
+            'cached_files': self.cached_files,
+            'diagrams': self.diagrams,
+            'valid': self.diagrams - self.invalid,
+            'invalid': self.invalid,
+            'by_type': dict(sorted(self.by_type.items(), key=lambda item: str(item[0]))),
+            'top_errors': [{'error': message, 'count': count} for message, count in self.messages.most_common(top)],
+            'invalid_files': sorted(self.invalid_files)[:max_files],
+            'seconds': round(seconds, 3),
+            'files_per_second': round(self.files / seconds, 1) if seconds else None,
+            'workers': workers
+        }
+
+
+def validate_corpus(paths, output, workers=None, index_path=None, full=False, parse=False, base=None):
+    """
+    Validate every diagram under paths, writing one NDJSON line per diagram to output
+    Returns the summary report (a dict). index_path=None disables the index.
+    """
+    start = time.perf_counter()
+    workers = workers or os.cpu_count() or 1
+    base = base or os.getcwd()
+    version = rules_version(parse)
+    index = {} if full or not index_path else load_index(index_path, version)
+    summary = Summary()
+    files = find_files(paths)
+
+    def emit(path, records, cached):
+        relative = os.path.relpath(path, base)
+        for record in records:
+            output.write(json.dumps(dict(record, path=relative, cached=cached)) + '\n')
+        summary.add(relative, records, cached)
+
+    # Unchanged size and mtime: reuse cached results without reading the file
+    pending = []
+    known_hashes = {}
+    for path in files:
+        entry = index.get(path)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            stat = None
+        if entry and stat and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+            emit(path, entry['records'], True)
+            continue
+        if entry:
+            known_hashes[path] = entry['sha256']
+        pending.append(path)
+
+    def store(result):
+        path, size, mtime_ns, digest, records = result
+        cached = records is None
+        if cached:
+            records = index[path]['records']
+        if digest is not None:
+            index[path] = {'size': size, 'mtime_ns': mtime_ns, 'sha256': digest, 'records': records}
+        emit(path, records, cached)
+
+    batches = [pending[i:i + BATCH_SIZE] for i in range(0, len(pending), BATCH_SIZE)]
+    if workers == 1 or len(batches) <= 1:
+        for batch in batches:
+            for result in validate_batch(batch, known_hashes, parse):
+                store(result)
+    else:
+        with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+            futures = [executor.submit(validate_batch, batch, {path: known_hashes[path] for path in batch
+                                                               if path in known_hashes}, parse)
+                       for batch in batches]
+            for future in concurrent.futures.as_completed(futures):
+                for result in future.result():
+                    store(result)
+    output.flush()
+
+    if index_path:
+        # Files that disappeared drop out of the index
+        present = set(files)
+        save_index(index_path, version, {path: entry for path, entry in index.items() if path in present})
+    return summary.report(time.perf_counter() - start, workers)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('paths', nargs='*', default=[os.path.dirname(MODULE_DIR)],
+                        help='Files and directories to scan (default: the repository)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Validation processes')
+    parser.add_argument('--output', default='-', help='NDJSON results file (default: stdout)')
+    parser.add_argument('--report', help='Write the JSON summary to this file')
+    parser.add_argument('--index', default='.validation-index.json',
+                        help='mtime/hash index of previous results ("" to disable)')
+    parser.add_argument('--full', action='store_true', help='Ignore the index and validate everything')
+    parser.add_argument('--parse', action='store_true',
+                        help='Also parse diagrams with diagram_parser.py and report syntax errors')
+    args = parser.parse_args()
+
+    output = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8')
+    try:
+        report = validate_corpus(args.paths, output, args.workers, args.index or None, args.full, args.parse)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    print(f'{report["files"]} files ({report["cached_files"]} unchanged), {report["diagrams"]} diagrams, '
+          f'{report["invalid"]} invalid in {report["seconds"]:.2f}s', file=sys.stderr)
+    sys.exit(1 if report['invalid'] else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,199 @@
+"""
+Mermaid diagram validation rules
+Python port of validateSyntax() and validateTypeSpecific() from
+tests/diagram-validator.js, plus StreamingValidator, which applies the same
+rules line by line while a generation is still streaming.
+"""
+
+import re
+
+from extraction import is_mermaid_header
+
+# Diagram type classifications
+DIAGRAM_TYPES = {
+    'stable': ['flowchart', 'sequence', 'class', 'state', 'er', 'gantt'],
+    'beta': ['architecture', 'block', 'mindmap', 'xychart', 'sankey', 'quadrant', 'treemap', 'kanban']
+}
+
+BETA_KEYWORDS = {
+    'architecture': 'architecture-beta',
+    'block': 'block-beta',
+    'xychart': 'xychart-beta',
+    'sankey': 'sankey-beta'
+}
+
+# (pattern, message) checked against the whole diagram; mirrors validateTypeSpecific().
+# Flowcharts also accept the 'flowchart' keyword, which the backend prompts ask for.
+TYPE_RULES = {
+    'flowchart': (re.compile(r'(graph|flowchart) (TD|LR|TB|RL|BT)'), 'Flowchart must start with graph direction'),
+    'sequence': (re.compile(r'sequenceDiagram'), 'Sequence diagram must include sequenceDiagram keyword'),
+    'class': (re.compile(r'classDiagram'), 'Class diagram must include classDiagram keyword'),
+    'state': (re.compile(r'stateDiagram'), 'State diagram must include stateDiagram keyword'),
+    'er': (re.compile(r'erDiagram'), 'ER diagram must include erDiagram keyword'),
+    'gantt': (re.compile(r'gantt'), 'Gantt chart must include gantt keyword'),
+    'architecture': (re.compile(r'architecture-beta'), 'Architecture diagram must use architecture-beta keyword'),
+    'block': (re.compile(r'block-beta'), 'Block diagram must use block-beta keyword'),
+    'mindmap': (re.compile(r'mindmap'), 'Mindmap must include mindmap keyword'),
+}
+
+
+class DiagramValidationError(ValueError):
+    """Raised by validate_type_specific() (the JS version throws)"""
+
+
+def is_beta_type(diagram_type):
+    return diagram_type in DIAGRAM_TYPES['beta']
+
+def validate_line(line, number, diagram_type):
+    """Per-line bracket and parenthesis checks from validateSyntax(); returns a list of errors"""
+    line = line.strip()
+
+    # Skip comments and empty lines
+    if line.startswith('%%') or not line:
+        return []
+
+    errors = []
+    # Skip bracket checking for class diagrams (use multi-line braces)
+    skip_brace_check = diagram_type == 'class'
+
+    if line.count('[') != line.count(']'):
+        # Allow unbalanced brackets if they're part of class syntax
+        if not skip_brace_check or ('{' not in line and '}' not in line):
+            errors.append(f'Line {number}: Unclosed brackets')
+    if line.count('(') != line.count(')'):
+        errors.append(f'Line {number}: Unclosed parentheses')
+
+    return errors
+
+def validate_braces(content, diagram_type):
+    """Global brace balance for class diagrams (ER diagrams use braces as relationship symbols)"""
+    if diagram_type != 'class':
+        return []
+    opening = content.count('{')
+    closing = content.count('}')
+    if opening != closing:
+        return [f'Unbalanced braces: {opening} opening, {closing} closing']
+    return []
+
+def validate_syntax(content, diagram_type, is_beta=None):
+    """Basic syntax checks; returns a list of error messages (empty when valid)"""
+    if is_beta is None:
+        is_beta = is_beta_type(diagram_type)
+
+    if not content or not content.strip():
+        return ['Diagram content is empty']
+
+    errors = []
+
+    if is_beta:
+        keyword = BETA_KEYWORDS.get(diagram_type)
+        if keyword and keyword not in content:
+            errors.append(f'Beta diagram missing required keyword: {keyword}')
+
+    for index, line in enumerate(content.split('\n')):
+        errors.extend(validate_line(line, index + 1, diagram_type))
+
+    errors.extend(validate_braces(content, diagram_type))
+    return errors
+
+def validate_type_specific(content, diagram_type, is_beta=None):
+    """Type-specific keyword rules; raises DiagramValidationError like the JS version"""
+    rule = TYPE_RULES.get(diagram_type)
+    if rule and not rule[0].search(content):
+        raise DiagramValidationError(rule[1])
+
+def validate_diagram(content, diagram_type, is_beta=None):
+    """validate_syntax() followed by validate_type_specific(); returns all errors as a list"""
+    errors = validate_syntax(content, diagram_type, is_beta)
+    if errors:
+        return errors
+    try:
+        validate_type_specific(content, diagram_type, is_beta)
+    except DiagramValidationError as e:
+        return [str(e)]
+    return []
+
+
+class StreamingValidator:
+    """
+    Incremental validation of a diagram as clean code deltas arrive.
+
+    feed() checks each line once it is complete, so the cost per token is
+    O(delta). A generation counts as doomed when:
+      - the header line does not carry the keyword the diagram type requires,
+      - max_line_errors lines fail the bracket/parenthesis checks, or
+      - prose_limit characters of output arrive without any Mermaid code.
+    finish() runs the full validate_diagram() rules on the complete code.
+    """
+
+    def __init__(self, diagram_type, max_line_errors=3, prose_limit=600):
+        self.diagram_type = diagram_type
+        self.max_line_errors = max_line_errors
+        self.prose_limit = prose_limit
+        self.errors = []
+        self._partial = ''
+        self._lines = 0
+        self._line_errors = 0
+        self._header_checked = False
+        self._code = []
+
+    def feed(self, delta, raw_chars=0):
+        """
+        Consume a clean code delta; raw_chars is the total raw output so far.
+        Returns the list of errors that make the generation doomed (empty while it looks fine).
+        """
+        if not delta:
+            if not self._lines and not self._partial and raw_chars > self.prose_limit:
+                return [f'No Mermaid code after {raw_chars} characters of output']
+            return []
+
+        self._code.append(delta)
+        text = self._partial + delta
+        lines = text.split('\n')
+        self._partial = lines.pop()
+
+        for line in lines:
+            self._lines += 1
+            doomed = self._check_line(line)
+            if doomed:
+                return doomed
+        return []
+
+    def finish(self):
+        """Whole-diagram checks once the stream has ended; returns errors (empty when valid)"""
+        if self._partial:
+            self._lines += 1
+            doomed = self._check_line(self._partial)
+            self._partial = ''
+            if doomed:
+                return doomed
+        return validate_diagram(''.join(self._code), self.diagram_type)
+
+    def _check_line(self, line):
+        stripped = line.strip()
+        if not self._header_checked and stripped and not stripped.startswith('%%'):
+            self._header_checked = True
+            error = self._header_error(stripped)
+            if error:
+                self.errors.append(error)
+                return list(self.errors)
+
+        line_errors = validate_line(line, self._lines, self.diagram_type)
+        if line_errors:
+            self.errors.extend(line_errors)
+            self._line_errors += 1
+            if self._line_errors >= self.max_line_errors:
+                return list(self.errors)
+        return []
+
+    def _header_error(self, header):
+        """The first code line must be a Mermaid header matching the requested type"""
+        if not is_mermaid_header(header):
+            return f'Line {self._lines}: expected a Mermaid header, got {header[:40]!r}'
+        keyword = BETA_KEYWORDS.get(self.diagram_type)
+        if keyword and not header.startswith(keyword):
+            return f'Beta diagram missing required keyword: {keyword}'
+        rule = TYPE_RULES.get(self.diagram_type)
+        if rule and not keyword and not rule[0].search(header):
+            return rule[1]
+        return None
@@ -0,0 +1,121 @@
+"""
+Benchmark: batch PNG/SVG export through ExportPool (chart_export.py) against write_image
+Exports the same batch of graph figures (from bench_graph_plot's random graphs,
+in PNG and SVG) three ways:
+    cold    - a fresh Python process per figure calling fig.write_image per
+              format, as running chart_script.py once per chart used to
+    serial  - fig.write_image in this process (kaleido warm after the first call)
+    pool    - ExportPool with --workers warm workers (startup timed separately)
+and reports images per second plus per-export p50/p95.
+
+Usage:
+    python benchmarks/bench_chart_export.py [--figures 16] [--nodes 200] [--workers 4] [--cold-max 4] [--json results.json]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_graph_plot import random_graph, vectorized_figure  # noqa: E402
+from chart_export import ExportPool, figure_jobs  # noqa: E402
+
+FORMATS = ('png', 'svg')
+
+COLD_EXPORT = '''
+import sys
+import plotly.io as pio
+fig = pio.read_json(sys.argv[1])
+for path in sys.argv[2:]:
+    fig.write_image(path)
+'''
+
+def summary(name, images, seconds, per_export, startup=None):
+    per_export = np.array(per_export) if per_export else np.zeros(1)
+    return {
+        'mode': name,
+        'images': images,
+        'seconds': round(seconds, 3),
+        'images_per_s': round(images / seconds, 2),
+        'p50_s': round(float(np.percentile(per_export, 50)), 4),
+        'p95_s': round(float(np.percentile(per_export, 95)), 4),
+        'startup_s': round(startup, 3) if startup is not None else None
+    }
+
+def run_cold(figures, directory):
+    per_export = []
+    start = time.perf_counter()
+    for stem, fig in figures.items():
+        source = os.path.join(directory, f'{stem}.json')
+        fig.write_json(source)
+        began = time.perf_counter()
+        paths = [os.path.join(directory, f'{stem}-cold.{format}') for format in FORMATS]
+        subprocess.run([sys.executable, '-c', COLD_EXPORT, source, *paths], check=True)
+        # One process per figure: split its time over the formats it wrote
+        per_export += [(time.perf_counter() - began) / len(FORMATS)] * len(FORMATS)
+    return summary('cold', len(per_export), time.perf_counter() - start, per_export)
+
+def run_serial(figures, directory):
+    per_export = []
+    start = time.perf_counter()
+    for stem, fig in figures.items():
+        for format in FORMATS:
+            began = time.perf_counter()
+            fig.write_image(os.path.join(directory, f'{stem}-serial.{format}'))
+            per_export.append(time.perf_counter() - began)
+    return summary('serial', len(per_export), time.perf_counter() - start, per_export)
+
+def run_pool(figures, directory, workers):
+    began = time.perf_counter()
+    with ExportPool(workers) as pool:
+        startup = time.perf_counter() - began
+        stems = {os.path.join(directory, f'{stem}-pool'): fig for stem, fig in figures.items()}
+        start = time.perf_counter()
+        results = pool.export(figure_jobs(stems, FORMATS))
+        elapsed = time.perf_counter() - start
+    errors = [result.error for result in results if result.error]
+    if errors:
+        raise RuntimeError(errors[0])
+    return summary(f'pool x{workers}', len(results), elapsed, [result.seconds for result in results], startup)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--figures', type=int, default=16, help='Figures in the batch (each exported as PNG and SVG)')
+    parser.add_argument('--nodes', type=int, default=200, help='Nodes per figure')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='ExportPool workers')
+    parser.add_argument('--cold-max', type=int, default=4, help='Figures exported the cold way (one process each)')
+    parser.add_argument('--json', help='Write results to this file')
+    args = parser.parse_args()
+
+    figures = {}
+    for i in range(args.figures):
+        nodes, connections, categories = random_graph(args.nodes, seed=i)
+        figures[f'graph{i}'] = vectorized_figure(nodes, connections, categories, webgl=False)
+
+    print(f'{"mode":<10} {"images":>7} {"seconds":>9} {"images/s":>9} {"p50":>8} {"p95":>8} {"startup":>8}')
+    rows = []
+    with tempfile.TemporaryDirectory() as directory:
+        cold = dict(list(figures.items())[:args.cold_max])
+        runs = [lambda: run_cold(cold, directory)] if cold else []
+        runs += [lambda: run_serial(figures, directory), lambda: run_pool(figures, directory, args.workers)]
+        for run in runs:
+            row = run()
+            startup = f'{row["startup_s"]:>7.2f}s' if row['startup_s'] is not None else f'{"-":>8}'
+            print(f'{row["mode"]:<10} {row["images"]:>7} {row["seconds"]:>8.2f}s {row["images_per_s"]:>9.2f} '
+                  f'{row["p50_s"]:>7.3f}s {row["p95_s"]:>7.3f}s {startup}')
+            rows.append(row)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(rows, f, indent=2)
+
+if __name__ == '__main__':
+    main()
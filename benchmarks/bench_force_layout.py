@@ -0,0 +1,78 @@
+"""
+Benchmark: force-directed layout (force_layout.py) on .mmd files and synthetic clustered graphs
+Synthetic graphs have clusters of 50 nodes (the subgraphs) with 90% of edges
+inside a cluster. Besides time, the table reports mean edge length against
+the mean distance of random node pairs, and the mean spread of a cluster
+against the whole layout; both ratios should be well below 1.
+
+Usage:
+    python benchmarks/bench_force_layout.py [--sizes 1000,10000] [--json results.json]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from force_layout import force_layout, layout_mmd  # noqa: E402
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MMD_FILES = ('mermaid-architecture.mmd', 'test-coldvox-knowledge-graph.mmd')
+
+def clustered_graph(count, seed=3, cluster_size=50):
+    """(E, 2) edges and cluster ids: one edge per node, 90% of them inside its cluster"""
+    rng = np.random.default_rng(seed)
+    clusters = np.arange(count) // cluster_size
+    sources = np.arange(count)
+    inside = clusters * cluster_size + rng.integers(0, cluster_size, count)
+    targets = np.where(rng.random(count) < 0.9, np.minimum(inside, count - 1), rng.integers(0, count, count))
+    edges = np.stack((sources, targets), axis=1)
+    return edges[edges[:, 0] != edges[:, 1]], clusters
+
+def quality(positions, edges, clusters):
+    """(mean edge length / mean random pair distance, mean cluster spread / layout spread)"""
+    rng = np.random.default_rng(1)
+    edge_lengths = np.hypot(*(positions[edges[:, 0]] - positions[edges[:, 1]]).T)
+    a, b = rng.integers(0, len(positions), (2, 5000))
+    pair_lengths = np.hypot(*(positions[a] - positions[b]).T)
+    spread = positions.std(axis=0).mean()
+    cluster_spread = np.mean([positions[clusters == c].std(axis=0).mean() for c in np.unique(clusters)])
+    return edge_lengths.mean() / pair_lengths.mean(), cluster_spread / spread
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sizes', default='1000,10000', help='Comma-separated synthetic node counts')
+    parser.add_argument('--json', help='Write results to this file')
+    args = parser.parse_args()
+
+    print(f'{"graph":<36} {"nodes":>7} {"edges":>7} {"seconds":>9} {"edge ratio":>11} {"cluster ratio":>14}')
+    rows = []
+    for name in MMD_FILES:
+        start = time.perf_counter()
+        nodes, connections, _, _ = layout_mmd(os.path.join(PROJECT_ROOT, name))
+        elapsed = time.perf_counter() - start
+        print(f'{name:<36} {len(nodes):>7} {len(connections):>7} {elapsed:>8.3f}s {"-":>11} {"-":>14}')
+        rows.append({'graph': name, 'nodes': len(nodes), 'edges': len(connections), 'seconds': round(elapsed, 4)})
+
+    for count in (int(size) for size in args.sizes.split(',')):
+        edges, clusters = clustered_graph(count)
+        start = time.perf_counter()
+        positions = force_layout(count, edges, clusters)
+        elapsed = time.perf_counter() - start
+        edge_ratio, cluster_ratio = quality(positions, edges, clusters)
+        name = f'synthetic-{count}'
+        print(f'{name:<36} {count:>7} {len(edges):>7} {elapsed:>8.3f}s {edge_ratio:>11.3f} {cluster_ratio:>14.3f}')
+        rows.append({'graph': name, 'nodes': count, 'edges': len(edges), 'seconds': round(elapsed, 4),
+                     'edge_ratio': round(edge_ratio, 4), 'cluster_ratio': round(cluster_ratio, 4)})
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(rows, f, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+"""
+Benchmark: vectorized graph plotting (graph_plot.py) against the per-edge approach
+The per-edge approach is the one chart_script.py used before graph_plot.py: a
+go.Scatter trace and an arrow annotation per edge, and a trace per node. Both
+build the same random graph (about 1.5 edges per node); the table shows figure
+construction, JSON serialization (what every export starts with) and, with
+--export, a PNG export through kaleido.
+
+Usage:
+    python benchmarks/bench_graph_plot.py [--sizes 100,1000,10000] [--legacy-max 300] [--export] [--json results.json]
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import plotly.graph_objects as go
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from graph_plot import plot_graph  # noqa: E402
+
+CATEGORIES = ('build', 'extension', 'desktop', 'shared')
+COLORS = {'build': '#B3E5EC', 'extension': '#A5D6A7', 'desktop': '#FFEB8A', 'shared': '#FFCDD2'}
+
+def random_graph(count, seed=7):
+    """{name: (x, y)}, (start, end) pairs and categories for a random graph with ~1.5 edges per node"""
+    rng = np.random.default_rng(seed)
+    side = max(1.0, np.sqrt(count))
+    points = rng.uniform(0, side, size=(count, 2))
+    names = [f'n{i}' for i in range(count)]
+    nodes = {name: (x, y) for name, (x, y) in zip(names, points.tolist())}
+    # Link each node to a few neighbours in x order so edges stay short, as in real layouts
+    order = np.argsort(points[:, 0])
+    starts = np.repeat(order, 2)[:int(count * 1.5)]
+    offsets = rng.integers(1, 8, size=len(starts))
+    rank = np.empty(count, dtype=np.intp)
+    rank[order] = np.arange(count)
+    targets = order[np.minimum(rank[starts] + offsets, count - 1)]
+    connections = [(names[a], names[b]) for a, b in zip(starts.tolist(), targets.tolist()) if a != b]
+    categories = {name: CATEGORIES[i % len(CATEGORIES)] for i, name in enumerate(names)}
+    return nodes, connections, categories
+
+def legacy_figure(nodes, connections, categories):
+    """The pre-graph_plot chart_script.py construction: a trace and an annotation per edge, a trace per node"""
+    fig = go.Figure()
+    for start, end in connections:
+        start_pos, end_pos = nodes[start], nodes[end]
+        fig.add_trace(go.Scatter(
+            x=[start_pos[0], end_pos[0]], y=[start_pos[1], end_pos[1]],
+            mode='lines', line=dict(color='#333333', width=2), showlegend=False, hoverinfo='skip'
+        ))
+        fig.add_annotation(
+            x=end_pos[0], y=end_pos[1], ax=start_pos[0], ay=start_pos[1],
+            xref='x', yref='y', axref='x', ayref='y',
+            arrowhead=2, arrowsize=1, arrowwidth=2, arrowcolor='#333333', showarrow=True, text=''
+        )
+    for name, pos in nodes.items():
+        fig.add_trace(go.Scatter(
+            x=[pos[0]], y=[pos[1]], mode='markers+text',
+            marker=dict(size=8, color=COLORS[categories[name]], line=dict(width=1, color='#333')),
+            text=name, showlegend=False, name=name
+        ))
+    return fig
+
+def vectorized_figure(nodes, connections, categories, webgl):
+    return plot_graph(nodes, connections, categories=categories, colors=COLORS, node_size=8,
+                      text=len(nodes) <= 1000, arrow_length=0.3, arrow_width=0.2, clearance=0.1, webgl=webgl)
+
+def measure(build, export):
+    """Seconds to build, seconds to serialize, JSON bytes and (optionally) seconds to export a PNG"""
+    start = time.perf_counter()
+    fig = build()
+    built = time.perf_counter()
+    size = len(fig.to_json())
+    serialized = time.perf_counter()
+    exported = None
+    if export:
+        with tempfile.TemporaryDirectory() as directory:
+            fig.write_image(os.path.join(directory, 'graph.png'))
+        exported = time.perf_counter() - serialized
+    return {
+        'build_s': round(built - start, 4),
+        'json_s': round(serialized - built, 4),
+        'json_bytes': size,
+        'traces': len(fig.data),
+        'annotations': len(fig.layout.annotations),
+        'export_s': round(exported, 4) if exported is not None else None
+    }
+
+def print_row(name, count, edges, result):
+    export = f'{result["export_s"]:>9.3f}s' if result['export_s'] is not None else f'{"-":>10}'
+    print(f'{name:<12} {count:>7} {edges:>7} {result["traces"]:>7} {result["build_s"]:>9.3f}s '
+          f'{result["json_s"]:>8.3f}s {result["json_bytes"] / 1024:>9.0f} {export}')
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sizes', default='100,1000,10000', help='Comma-separated node counts')
+    parser.add_argument('--legacy-max', type=int, default=300,
+                        help='Skip the per-edge approach above this many nodes (it grows quadratically)')
+    parser.add_argument('--export', action='store_true', help='Also time a PNG export (needs kaleido)')
+    parser.add_argument('--json', help='Write results to this file')
+    args = parser.parse_args()
+
+    print(f'{"approach":<12} {"nodes":>7} {"edges":>7} {"traces":>7} {"build":>10} {"json":>9} '
+          f'{"json KB":>9} {"export":>10}')
+    rows = []
+    for count in (int(size) for size in args.sizes.split(',')):
+        nodes, connections, categories = random_graph(count)
+        cases = [
+            ('vectorized', lambda: vectorized_figure(nodes, connections, categories, webgl=False)),
+            ('scattergl', lambda: vectorized_figure(nodes, connections, categories, webgl=True))
+        ]
+        if count <= args.legacy_max:
+            cases.insert(0, ('per-edge', lambda: legacy_figure(nodes, connections, categories)))
+
+        for name, build in cases:
+            result = measure(build, args.export)
+            print_row(name, count, len(connections), result)
+            rows.append(dict(result, approach=name, nodes=count, edges=len(connections)))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(rows, f, indent=2)
+
+if __name__ == '__main__':
+    main()
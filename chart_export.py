@@ -0,0 +1,104 @@
+"""
+Batch PNG/SVG export of Plotly figures through a pool of warm kaleido workers
+fig.write_image starts kaleido's headless browser on first use in every
+process, which dominates the cost of exporting a few charts. ExportPool keeps
+worker processes alive with that browser already started (each worker renders
+a tiny figure when it starts), then spreads a batch of figure x format exports
+across them. Every result carries its own render and write time.
+
+Usage:
+    from chart_export import ExportPool
+    with ExportPool(workers=4) as pool:
+        results = pool.export([(fig, 'chart.png'), (fig, 'chart.svg')])
+
+Requires plotly and kaleido.
+"""
+
+import collections
+import concurrent.futures
+import os
+import time
+
+import plotly.io as pio
+
+# Default worker count: one per core, at most this many (each holds a browser)
+MAX_WORKERS = 8
+
+# One export: figure as a dict (go.Figure is converted), output path, format (None: from the extension)
+ExportJob = collections.namedtuple('ExportJob', 'figure path format width height scale')
+ExportJob.__new__.__defaults__ = (None, None, None, None)
+
+# seconds covers rendering and writing in the worker; error is None on success
+ExportResult = collections.namedtuple('ExportResult', 'path format seconds bytes error worker')
+
+def _start_worker():
+    """Pool initializer: start kaleido so the first real export is warm"""
+    import kaleido
+    start_server = getattr(kaleido, 'start_sync_server', None)
+    if start_server is not None:
+        # kaleido >= 1 launches a browser per call unless a persistent server is running
+        start_server(silence_warnings=True)
+    pio.to_image({'data': [{'type': 'scatter', 'x': [0], 'y': [0]}]}, format='png', width=10, height=10)
+
+def _export(job):
+    """Render and write one job in a worker"""
+    start = time.perf_counter()
+    try:
+        image = pio.to_image(job.figure, format=job.format, width=job.width, height=job.height, scale=job.scale)
+        with open(job.path, 'wb') as f:
+            f.write(image)
+    except Exception as e:
+        return ExportResult(job.path, job.format, time.perf_counter() - start, 0, str(e), os.getpid())
+    return ExportResult(job.path, job.format, time.perf_counter() - start, len(image), None, os.getpid())
+
+def export_format(path, format=None):
+    """Explicit format, else the path's extension"""
+    return format or os.path.splitext(path)[1].lstrip('.').lower() or 'png'
+
+def _job(item):
+    job = item if isinstance(item, ExportJob) else ExportJob(*item)
+    figure = job.figure.to_dict() if hasattr(job.figure, 'to_dict') else job.figure
+    return job._replace(figure=figure, format=export_format(job.path, job.format))
+
+class ExportPool:
+    """
+    Long-lived pool of warm exporter processes
+
+    Create it once and call export() for every batch; close() (or leaving the
+    with block) stops the workers. The constructor returns once every worker
+    has started and warmed up, so the first batch runs at full speed.
+    """
+
+    def __init__(self, workers=None):
+        self.workers = workers or min(os.cpu_count() or 1, MAX_WORKERS)
+        self._executor = concurrent.futures.ProcessPoolExecutor(self.workers, initializer=_start_worker)
+        self.exported = 0
+        self.failed = 0
+        # One task per worker spawns them all now rather than during the first batch
+        concurrent.futures.wait([self._executor.submit(os.getpid) for _ in range(self.workers)])
+
+    def export(self, jobs):
+        """
+        Export a batch; jobs are ExportJob or (figure, path[, format, width, height, scale]) tuples
+        Returns ExportResults in job order; a failed export is reported in its result, not raised.
+        """
+        futures = [self._executor.submit(_export, _job(item)) for item in jobs]
+        results = [future.result() for future in futures]
+        failed = sum(1 for result in results if result.error)
+        self.exported += len(results) - failed
+        self.failed += failed
+        return results
+
+    def close(self):
+        self._executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def figure_jobs(figures, formats=('png', 'svg'), width=None, height=None, scale=None):
+    """ExportJobs for {output stem: figure} in every format"""
+    return [ExportJob(figure, f'{stem}.{format}', format, width, height, scale)
+            for stem, figure in figures.items() for format in formats]
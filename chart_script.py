@@ -1,150 +1,98 @@
-import plotly.graph_objects as go
-import plotly.io as pio
+import os
+import sys
+import time
 
-# Since Mermaid service is unavailable, I'll create a Plotly-based flowchart representation
-# Define node positions and connections for the Mermaid tooling architecture
+from chart_export import ExportPool, figure_jobs
+from force_layout import layout_mmd
+from graph_plot import plot_graph
 
-# Node positions (x, y coordinates)
-nodes = {
-    'Mermaid GitHub Repo': (0, 3),
-    'build-mermaid.js Script': (0, 2),
-    'Vendor Bundle (ESM)': (0, 1),
-    
-    'Chrome Extension': (-2, 0),
-    'Content Script': (-2, -1),
-    'Webpage with Mermaid': (-2, -3),
-    
-    'Tauri Desktop App': (2, 0),
-    'Editor + Preview': (2, -1),
-    'Export (SVG/PNG)': (2, -3),
-    
-    'mermaid.initialize()': (0, -1.5),
-    'mermaid.render()': (0, -2.5)
-}
+# Chart flowchart .mmd files: node positions come from the force-directed layout in force_layout.py
+# Usage: python chart_script.py [diagram.mmd ...]  (default: the Mermaid tooling architecture)
+# Each diagram is saved as <name>.png and <name>.svg; exports run in a pool of warm kaleido workers
 
-# Define colors for different categories
-colors = {
-    'build': '#B3E5EC',
-    'extension': '#A5D6A7', 
-    'desktop': '#FFEB8A',
-    'shared': '#FFCDD2'
-}
+def build_figure(source):
+    """Plotly figure for one .mmd flowchart"""
+    nodes, connections, node_categories, titles = layout_mmd(source)
 
-# Categorize nodes
-node_categories = {
-    'Mermaid GitHub Repo': 'build',
-    'build-mermaid.js Script': 'build',
-    'Vendor Bundle (ESM)': 'shared',
-    'Chrome Extension': 'extension',
-    'Content Script': 'extension', 
-    'Webpage with Mermaid': 'extension',
-    'Tauri Desktop App': 'desktop',
-    'Editor + Preview': 'desktop',
-    'Export (SVG/PNG)': 'desktop',
-    'mermaid.initialize()': 'shared',
-    'mermaid.render()': 'shared'
-}
+    # Define colors for the architecture's subgraphs; other diagrams cycle through the palette
+    colors = {
+        'build': '#B3E5EC',
+        'extension': '#A5D6A7',
+        'desktop': '#FFEB8A',
+        'shared': '#FFCDD2'
+    }
+    palette = ['#B3E5EC', '#A5D6A7', '#FFEB8A', '#FFCDD2', '#D1C4E9', '#FFE0B2', '#C8E6C9', '#F8BBD0']
+    for i, category in enumerate(category for category in titles if category not in colors):
+        colors[category] = palette[i % len(palette)]
 
-# Define connections
-connections = [
-    ('Mermaid GitHub Repo', 'build-mermaid.js Script'),
-    ('build-mermaid.js Script', 'Vendor Bundle (ESM)'),
-    ('Vendor Bundle (ESM)', 'Chrome Extension'),
-    ('Vendor Bundle (ESM)', 'Tauri Desktop App'),
-    ('Chrome Extension', 'Content Script'),
-    ('Tauri Desktop App', 'Editor + Preview'),
-    ('Content Script', 'mermaid.initialize()'),
-    ('Editor + Preview', 'mermaid.initialize()'),
-    ('mermaid.initialize()', 'mermaid.render()'),
-    ('mermaid.render()', 'Webpage with Mermaid'),
-    ('mermaid.render()', 'Export (SVG/PNG)')
-]
+    # Figure size follows the layout extent (layout units are ideal edge lengths)
+    unit_px = 180
+    xs = [x for x, _ in nodes.values()]
+    ys = [y for _, y in nodes.values()]
+    x_range = [min(xs) - 1, max(xs) + 1]
+    y_range = [min(ys) - 1, max(ys) + 1]
+    width = min(max((x_range[1] - x_range[0]) * unit_px + 160, 700), 2400)
+    height = min(max((y_range[1] - y_range[0]) * unit_px + 220, 500), 2400)
+    scale = min((width - 160) / (x_range[1] - x_range[0]), (height - 220) / (y_range[1] - y_range[0]))
 
-# Create the figure
-fig = go.Figure()
+    node_size = 80 if len(nodes) <= 40 else 24
 
-# Add connections as lines
-for start, end in connections:
-    start_pos = nodes[start]
-    end_pos = nodes[end]
-    
-    fig.add_trace(go.Scatter(
-        x=[start_pos[0], end_pos[0]], 
-        y=[start_pos[1], end_pos[1]],
-        mode='lines',
-        line=dict(color='#333333', width=2),
-        showlegend=False,
-        hoverinfo='skip'
-    ))
-    
-    # Add arrowhead
-    fig.add_annotation(
-        x=end_pos[0], y=end_pos[1],
-        ax=start_pos[0], ay=start_pos[1],
-        xref='x', yref='y',
-        axref='x', ayref='y',
-        arrowhead=2, arrowsize=1, arrowwidth=2,
-        arrowcolor='#333333',
-        showarrow=True,
-        text='',
+    # Create the figure: one trace for all connections, one for all arrowheads, one per subgraph
+    fig = plot_graph(
+        nodes, connections,
+        categories=node_categories,
+        colors=colors,
+        labels=titles,
+        node_size=node_size,
+        text=len(nodes) <= 200,
+        arrow_length=0.12,
+        arrow_width=0.1,
+        # Stop edges at the node border (node_size is in pixels)
+        clearance=node_size / 2 / scale
     )
 
-# Add nodes
-for node_name, pos in nodes.items():
-    category = node_categories[node_name]
-    color = colors[category]
-    
-    fig.add_trace(go.Scatter(
-        x=[pos[0]], y=[pos[1]],
-        mode='markers+text',
-        marker=dict(size=80, color=color, line=dict(width=2, color='#333')),
-        text=node_name,
-        textposition='middle center',
-        textfont=dict(size=10, color='black'),
-        showlegend=False,
-        name=node_name
-    ))
-
-# Add legend
-legend_items = [
-    ('Build Process', colors['build']),
-    ('Extension Path', colors['extension']),
-    ('Desktop Path', colors['desktop']),
-    ('Shared Components', colors['shared'])
-]
+    # Update layout
+    fig.update_layout(
+        title='Mermaid Tooling System Architecture' if not sys.argv[1:] else os.path.basename(source),
+        width=width,
+        height=height,
+        showlegend=True,
+        legend=dict(orientation='h', yanchor='bottom', y=1.05, xanchor='center', x=0.5),
+        xaxis=dict(
+            showgrid=False,
+            showticklabels=False,
+            zeroline=False,
+            range=x_range
+        ),
+        yaxis=dict(
+            showgrid=False,
+            showticklabels=False,
+            zeroline=False,
+            range=y_range
+        ),
+        plot_bgcolor='white',
+        paper_bgcolor='white'
+    )
+    return fig
 
-for i, (label, color) in enumerate(legend_items):
-    fig.add_trace(go.Scatter(
-        x=[None], y=[None],
-        mode='markers',
-        marker=dict(size=15, color=color, line=dict(width=2, color='#333')),
-        name=label,
-        showlegend=True
-    ))
+def main():
+    sources = sys.argv[1:] or ['mermaid-architecture.mmd']
+    figures = {os.path.splitext(os.path.basename(source))[0].replace('-', '_'): build_figure(source)
+               for source in sources}
 
-# Update layout
-fig.update_layout(
-    title='Mermaid Tooling System Architecture',
-    showlegend=True,
-    legend=dict(orientation='h', yanchor='bottom', y=1.05, xanchor='center', x=0.5),
-    xaxis=dict(
-        showgrid=False, 
-        showticklabels=False, 
-        zeroline=False,
-        range=[-3, 3]
-    ),
-    yaxis=dict(
-        showgrid=False, 
-        showticklabels=False, 
-        zeroline=False,
-        range=[-4, 4]
-    ),
-    plot_bgcolor='white',
-    paper_bgcolor='white'
-)
+    # Save the charts
+    with ExportPool(workers=min(len(figures) * 2, os.cpu_count() or 1)) as pool:
+        start = time.perf_counter()
+        results = pool.export(figure_jobs(figures))
+        elapsed = time.perf_counter() - start
 
-# Save the chart
-fig.write_image('mermaid_architecture.png')
-fig.write_image('mermaid_architecture.svg', format='svg')
+    for result in results:
+        if result.error:
+            print(f"Export of {result.path} failed: {result.error}")
+        else:
+            print(f"Saved {result.path} ({result.bytes / 1024:.0f} KB, {result.seconds:.2f}s)")
+    print(f"Exported {len(results)} images in {elapsed:.2f}s with {pool.workers} workers")
 
-print("Architecture diagram saved as mermaid_architecture.png and mermaid_architecture.svg")
\ No newline at end of file
+# Export workers re-import this module under the spawn start method, so only run as a script
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+"""
+Force-directed layout for Mermaid flowcharts, vectorized with NumPy
+Fruchterman-Reingold forces with the ideal edge length as the unit: edges pull
+their ends together, all nodes push each other apart, and nodes in the same
+subgraph are pulled towards that subgraph's centroid so clusters stay
+together. Small graphs use exact all-pairs repulsion; larger ones approximate
+it with a uniform grid, where each node is repelled by every occupied cell's
+centroid weighted by its node count (its own cell without itself).
+
+Usage:
+    from force_layout import layout_mmd
+    nodes, connections, categories, titles = layout_mmd('test-coldvox-knowledge-graph.mmd')
+
+The .mmd file is parsed with backend/flowchart.py. Requires numpy.
+"""
+
+import collections
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from flowchart import parse_flowchart  # noqa: E402
+from renderer import label_lines  # noqa: E402
+
+# Exact repulsion up to this many nodes, grid approximation above
+EXACT_MAX = 600
+
+# Nodes per repulsion batch in grid mode (bounds the (batch, cells) temporaries)
+BATCH_SIZE = 2048
+
+def _exact_repulsion(positions):
+    """Sum of 1/d repulsion from every other node (k = 1)"""
+    diff = positions[:, None, :] - positions[None, :, :]
+    dist2 = np.einsum('ijk,ijk->ij', diff, diff)
+    np.fill_diagonal(dist2, np.inf)
+    np.maximum(dist2, 1e-4, out=dist2)
+    return np.einsum('ijk,ij->ik', diff, 1.0 / dist2)
+
+def _grid_repulsion(positions, grid_size):
+    """Repulsion approximated by the node-count-weighted centroids of a grid_size x grid_size grid"""
+    count = len(positions)
+    low = positions.min(axis=0)
+    span = max(float((positions.max(axis=0) - low).max()), 1e-9)
+    cells = np.minimum(((positions - low) / span * grid_size).astype(np.intp), grid_size - 1)
+    cell = cells[:, 0] * grid_size + cells[:, 1]
+
+    occupied, own, masses = np.unique(cell, return_inverse=True, return_counts=True)
+    sums = np.stack((np.bincount(own, positions[:, 0], len(occupied)),
+                     np.bincount(own, positions[:, 1], len(occupied))), axis=1)
+    centroids = sums / masses[:, None]
+    masses = masses.astype(float)
+
+    force = np.empty_like(positions)
+    cx, cy = centroids[:, 0], centroids[:, 1]
+    for start in range(0, count, BATCH_SIZE):
+        stop = min(start + BATCH_SIZE, count)
+        dx = positions[start:stop, 0, None] - cx
+        dy = positions[start:stop, 1, None] - cy
+        weight = masses / np.maximum(dx * dx + dy * dy, 1e-4)
+        # Each node's own cell repels it from the centroid of the other nodes in that cell instead
+        weight[np.arange(stop - start), own[start:stop]] = 0.0
+        force[start:stop, 0] = (dx * weight).sum(axis=1)
+        force[start:stop, 1] = (dy * weight).sum(axis=1)
+
+    others = masses[own] - 1
+    has_others = others > 0
+    own_centroids = (sums[own][has_others] - positions[has_others]) / others[has_others, None]
+    diff = positions[has_others] - own_centroids
+    dist2 = np.maximum(np.einsum('ij,ij->i', diff, diff), 1e-4)
+    force[has_others] += diff * (others[has_others] / dist2)[:, None]
+    return force
+
+def force_layout(count, edges, clusters=None, iterations=None, seed=7, cluster_strength=0.15, gravity=0.02,
+                 grid_size=None):
+    """
+    (count, 2) positions for a graph with nodes 0..count-1, in units of the ideal edge length
+
+    edges: (E, 2) node index pairs
+    clusters: cluster index per node (-1 for none); members start together and are pulled
+        towards their cluster's centroid with cluster_strength
+    grid_size: grid cells per side for approximate repulsion (default: by node count)
+    """
+    rng = np.random.default_rng(seed)
+    edges = np.asarray(edges, dtype=np.intp).reshape(-1, 2)
+    edges = edges[edges[:, 0] != edges[:, 1]]
+    side = np.sqrt(max(count, 1))
+    positions = rng.uniform(-side / 2, side / 2, size=(count, 2))
+    if count < 2:
+        return positions
+
+    clustered = None
+    if clusters is not None:
+        clusters = np.asarray(clusters, dtype=np.intp)
+        clustered = clusters >= 0
+        if clustered.any():
+            members = clusters[clustered]
+            cluster_count = members.max() + 1
+            sizes = np.bincount(members, minlength=cluster_count)
+            centers = rng.uniform(-side / 2, side / 2, size=(cluster_count, 2))
+            spread = np.sqrt(sizes[members])[:, None] / 2
+            positions[clustered] = centers[members] + rng.normal(size=(len(members), 2)) * spread
+        else:
+            clustered = None
+
+    exact = count <= EXACT_MAX
+    if iterations is None:
+        iterations = 250 if exact else 60
+    if grid_size is None:
+        grid_size = int(np.clip(np.sqrt(count) / 4, 8, 24))
+
+    temperature = side / 8
+    cooling = temperature / (iterations + 1)
+    sources, targets = edges[:, 0], edges[:, 1]
+
+    for _ in range(iterations):
+        force = _exact_repulsion(positions) if exact else _grid_repulsion(positions, grid_size)
+
+        # Attraction d^2 along each edge, applied to both ends with one bincount per axis
+        delta = positions[targets] - positions[sources]
+        pull = delta * np.hypot(delta[:, 0], delta[:, 1])[:, None]
+        for axis in (0, 1):
+            force[:, axis] += np.bincount(sources, pull[:, axis], count) - np.bincount(targets, pull[:, axis], count)
+
+        if clustered is not None:
+            members = clusters[clustered]
+            sizes = np.bincount(members)
+            centroids = np.stack([np.bincount(members, positions[clustered, axis], len(sizes))
+                                  for axis in (0, 1)], axis=1) / np.maximum(sizes, 1)[:, None]
+            force[clustered] -= cluster_strength * (positions[clustered] - centroids[members]) * side
+
+        force -= gravity * positions
+
+        # Move along the force, at most `temperature` per step
+        length = np.hypot(force[:, 0], force[:, 1])
+        scale = np.minimum(length, temperature) / np.maximum(length, 1e-12)
+        positions += force * scale[:, None]
+        temperature -= cooling
+
+    return positions - positions.mean(axis=0)
+
+def display_label(label, max_chars=40):
+    """First line of a node label, without markup, for charts"""
+    return label_lines(label, max_chars)[0][0]
+
+def layout_mmd(path, **options):
+    """
+    Lay out a flowchart .mmd file
+    Returns ({label: (x, y)}, [(start label, end label)], {label: subgraph id}, {subgraph id: title});
+    nodes are keyed by display label (made unique with the node id when labels repeat).
+    force_layout() options can be passed through.
+    """
+    with open(path, encoding='utf-8') as f:
+        chart = parse_flowchart(f.read())
+
+    ids = list(chart.nodes)
+    index = {node_id: i for i, node_id in enumerate(ids)}
+    subgraph_index = {subgraph_id: i for i, subgraph_id in enumerate(chart.subgraphs)}
+    edges = [(index[edge.source], index[edge.target]) for edge in chart.edges]
+    clusters = [subgraph_index.get(chart.nodes[node_id].subgraph, -1) for node_id in ids]
+
+    positions = force_layout(len(ids), edges, clusters, **options)
+
+    labels = [display_label(chart.nodes[node_id].label) for node_id in ids]
+    repeated = {label for label, uses in collections.Counter(labels).items() if uses > 1}
+    labels = [f'{label} ({node_id})' if label in repeated else label for label, node_id in zip(labels, ids)]
+
+    nodes = {label: (float(x), float(y)) for label, (x, y) in zip(labels, positions)}
+    connections = [(labels[source], labels[target]) for source, target in edges]
+    categories = {label: chart.nodes[node_id].subgraph for label, node_id in zip(labels, ids)
+                  if chart.nodes[node_id].subgraph is not None}
+    titles = {subgraph_id: display_label(subgraph.title) for subgraph_id, subgraph in chart.subgraphs.items()}
+    return nodes, connections, categories, titles
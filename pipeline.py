@@ -0,0 +1,234 @@
+"""
+Incremental runner for the generator scripts (script.py ... script_6.py, chart_script.py)
+Each step declares the files it reads and writes. A step runs only when an
+input changed since its last run or an output is missing; steps that do not
+depend on each other's outputs run in parallel, each generator in its own
+process. Hashes are kept in .pipeline-state.json and are only recomputed for
+files whose size or mtime changed, so a run where nothing changed costs a
+few stat calls.
+
+Several generated files were edited by hand after generation (package.json,
+.gitignore, ...). So that a run never silently overwrites them:
+- on the first run, a step whose outputs all exist adopts them as they are;
+- a step whose outputs changed since the pipeline last wrote them is reported
+  as modified and left alone unless --force is given.
+
+Usage:
+    python pipeline.py                  # bring every step up to date
+    python pipeline.py chart manifest   # only these steps
+    python pipeline.py --list           # show each step's status without running anything
+    python pipeline.py --force chart    # rerun even if up to date or modified by hand
+"""
+
+import argparse
+import collections
+import concurrent.futures
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Hashes of every step's inputs and outputs as of its last run
+STATE_FILE = '.pipeline-state.json'
+
+# Generators running at once (each is a separate Python process)
+MAX_JOBS = os.cpu_count() or 1
+
+Step = collections.namedtuple('Step', 'name command inputs outputs')
+
+CHART_INPUTS = [
+    'chart_script.py', 'force_layout.py', 'graph_plot.py', 'chart_export.py', 'mermaid-architecture.mmd',
+    'backend/flowchart.py', 'backend/renderer.py', 'backend/layout.py'
+]
+
+STEPS = [
+    Step('manifest', ['script.py'], ['script.py'], ['manifest.json']),
+    Step('workspace', ['script_1.py'], ['script_1.py'], ['package.json', 'pnpm-workspace.yaml']),
+    Step('build-script', ['script_2.py'], ['script_2.py'], ['build-mermaid.js']),
+    Step('tauri', ['script_3.py'], ['script_3.py'], ['tauri.conf.json']),
+    Step('gitignore', ['script_4.py'], ['script_4.py'], ['.gitignore']),
+    Step('test-diagrams', ['script_5.py'], ['script_5.py'], ['quick-reference-commands.csv'] + [
+        f'test-diagram-{name}.mmd' for name in ('flowchart', 'sequence', 'class', 'state', 'er', 'gantt')
+    ]),
+    Step('summary', ['script_6.py'], ['script_6.py'], ['DELIVERABLES_SUMMARY.txt']),
+    Step('chart', ['chart_script.py'], CHART_INPUTS, ['mermaid_architecture.png', 'mermaid_architecture.svg'])
+]
+
+class FileHasher:
+    """sha256 of project files, reusing the previous hash while size and mtime are unchanged"""
+
+    def __init__(self, known=None):
+        # path -> [size, mtime_ns, sha256]
+        self.known = dict(known or {})
+
+    def digest(self, path):
+        """Hex digest, or None when the file does not exist"""
+        try:
+            stat = os.stat(os.path.join(PROJECT_ROOT, path))
+        except FileNotFoundError:
+            self.known.pop(path, None)
+            return None
+        cached = self.known.get(path)
+        if cached and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+            return cached[2]
+        sha = hashlib.sha256()
+        with open(os.path.join(PROJECT_ROOT, path), 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                sha.update(block)
+        self.known[path] = [stat.st_size, stat.st_mtime_ns, sha.hexdigest()]
+        return sha.hexdigest()
+
+    def digests(self, paths):
+        return {path: self.digest(path) for path in paths}
+
+def load_state(path=STATE_FILE):
+    try:
+        with open(os.path.join(PROJECT_ROOT, path)) as f:
+            state = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {'files': {}, 'steps': {}}
+    state.setdefault('files', {})
+    state.setdefault('steps', {})
+    return state
+
+def save_state(state, path=STATE_FILE):
+    target = os.path.join(PROJECT_ROOT, path)
+    with open(target + '.tmp', 'w') as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    os.replace(target + '.tmp', target)
+
+def step_status(step, record, hasher):
+    """
+    Why a step would run, or why not:
+    'fresh' (up to date), 'adopt' (first run, outputs present), 'missing', 'changed' or 'modified'
+    """
+    inputs = hasher.digests(step.inputs)
+    outputs = hasher.digests(step.outputs)
+    if record is None:
+        return 'adopt' if all(outputs.values()) else 'missing'
+    if not all(outputs.values()):
+        return 'missing'
+    if outputs != record.get('outputs'):
+        return 'modified'
+    if inputs != record.get('inputs'):
+        return 'changed'
+    return 'fresh'
+
+def run_step(step):
+    """Run one generator in a fresh process; returns (returncode, seconds, output)"""
+    start = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, *step.command],
+        cwd=PROJECT_ROOT,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True
+    )
+    return completed.returncode, time.perf_counter() - start, completed.stdout
+
+def stages(steps):
+    """Group steps into stages; a step comes after every step producing one of its inputs"""
+    producers = {output: step.name for step in steps for output in step.outputs}
+    depends = {step.name: {producers[path] for path in step.inputs if path in producers} - {step.name}
+               for step in steps}
+    remaining = list(steps)
+    done = set()
+    result = []
+    while remaining:
+        ready = [step for step in remaining if depends[step.name] <= done]
+        if not ready:
+            raise ValueError(f'Steps depend on each other: {", ".join(step.name for step in remaining)}')
+        result.append(ready)
+        done.update(step.name for step in ready)
+        remaining = [step for step in remaining if step.name not in done]
+    return result
+
+def record_step(step, hasher):
+    return {'inputs': hasher.digests(step.inputs), 'outputs': hasher.digests(step.outputs)}
+
+def run_pipeline(steps=STEPS, force=False, jobs=MAX_JOBS, dry_run=False, verbose=False):
+    """
+    Bring steps up to date; returns {step name: status}
+    Final statuses: 'fresh', 'adopted', 'ran', 'modified' (skipped: outputs edited by hand), 'failed',
+    'blocked' (an upstream step failed), or the would-be status when dry_run is set.
+    """
+    state = load_state()
+    hasher = FileHasher(state['files'])
+    results = {}
+    # Outputs of failed steps: steps reading them are blocked
+    failed_outputs = set()
+
+    for stage in stages(steps):
+        pending = []
+        for step in stage:
+            record = state['steps'].get(step.name)
+            status = step_status(step, record, hasher)
+            if failed_outputs.intersection(step.inputs):
+                results[step.name] = 'blocked'
+            elif dry_run:
+                results[step.name] = status if not force else 'forced'
+            elif status == 'adopt' and not force:
+                state['steps'][step.name] = record_step(step, hasher)
+                results[step.name] = 'adopted'
+            elif status in ('fresh', 'modified') and not force:
+                results[step.name] = status
+            else:
+                pending.append(step)
+
+        if not pending:
+            continue
+        with concurrent.futures.ThreadPoolExecutor(max(1, min(jobs, len(pending)))) as executor:
+            # Threads only wait on the generator processes, which do the work in parallel
+            futures = {executor.submit(run_step, step): step for step in pending}
+            for future in concurrent.futures.as_completed(futures):
+                step = futures[future]
+                returncode, seconds, output = future.result()
+                if returncode != 0:
+                    failed_outputs.update(step.outputs)
+                    results[step.name] = 'failed'
+                    print(f'✗ {step.name} failed after {seconds:.2f}s:\n{output}')
+                    continue
+                state['steps'][step.name] = record_step(step, hasher)
+                results[step.name] = 'ran'
+                print(f'✓ {step.name} ({seconds:.2f}s)')
+                if verbose:
+                    print(output)
+
+    if not dry_run:
+        state['files'] = hasher.known
+        save_state(state)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('steps', nargs='*', help='Steps to bring up to date (default: all)')
+    parser.add_argument('--force', action='store_true', help='Run the steps even if up to date or edited by hand')
+    parser.add_argument('--jobs', type=int, default=MAX_JOBS, help='Generators running at once')
+    parser.add_argument('--list', action='store_true', help='Show what would run without running anything')
+    parser.add_argument('--verbose', action='store_true', help="Print each generator's output")
+    args = parser.parse_args()
+
+    names = [step.name for step in STEPS]
+    unknown = [name for name in args.steps if name not in names]
+    if unknown:
+        parser.error(f'Unknown steps: {", ".join(unknown)} (known: {", ".join(names)})')
+    steps = [step for step in STEPS if not args.steps or step.name in args.steps]
+
+    start = time.perf_counter()
+    results = run_pipeline(steps, args.force, args.jobs, args.list, args.verbose)
+    elapsed = time.perf_counter() - start
+
+    for step in steps:
+        print(f'{step.name:<16} {results[step.name]}')
+    modified = [name for name, status in results.items() if status == 'modified']
+    if modified:
+        print(f'Outputs edited since the last run were left alone: {", ".join(modified)} (--force to regenerate)')
+    print(f'Pipeline finished in {elapsed * 1000:.0f} ms')
+    sys.exit(1 if any(status in ('failed', 'blocked') for status in results.values()) else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,12 @@
+"""Make the backend modules importable the way backend/benchmarks does, and the chart scripts at the root"""
+
+import os
+import sys
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BACKEND_DIR = os.path.join(PROJECT_ROOT, 'backend')
+
+sys.path.insert(0, BACKEND_DIR)
+# The benchmark helpers (mock upstream, load test) import each other by module name
+sys.path.insert(1, os.path.join(BACKEND_DIR, 'benchmarks'))
+sys.path.append(PROJECT_ROOT)
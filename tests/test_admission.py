@@ -0,0 +1,93 @@
+"""Token buckets and admission control (backend/admission.py)"""
+
+import asyncio
+
+import pytest
+
+from admission import AdmissionController, AdmissionRejected, TokenBucket
+
+
+def test_bucket_spends_burst_then_reserves_in_order():
+    bucket = TokenBucket(rate=2.0, burst=2)
+    now = bucket.updated
+    assert bucket.take(now) == 0.0
+    assert bucket.take(now) == 0.0
+    # In debt: each caller waits for the token after the previous one
+    assert bucket.take(now) == pytest.approx(0.5)
+    assert bucket.take(now) == pytest.approx(1.0)
+
+
+def test_bucket_refills_up_to_burst():
+    bucket = TokenBucket(rate=2.0, burst=2)
+    now = bucket.updated
+    bucket.take(now)
+    bucket.take(now)
+    assert bucket.wait_time(now + 0.25) == pytest.approx(0.25)
+    assert bucket.wait_time(now + 100) == 0.0
+    assert bucket.tokens == 2
+
+
+def test_bucket_ignores_clock_reads_older_than_its_last_update():
+    bucket = TokenBucket(rate=1.0, burst=1)
+    assert bucket.wait_time(bucket.updated - 0.001) == 0.0
+    assert bucket.tokens == 1
+
+
+def test_new_client_is_admitted_without_waiting():
+    controller = AdmissionController(client_rate=0.01, client_burst=1, max_wait=0)
+    controller.acquire('new client')
+    assert controller.stats()['queued'] == 0
+
+
+def test_client_over_its_rate_is_rejected_others_are_not():
+    controller = AdmissionController(client_rate=0.01, client_burst=2, max_wait=1.0)
+    controller.acquire('a')
+    controller.acquire('a')
+    with pytest.raises(AdmissionRejected) as rejected:
+        controller.acquire('a')
+    assert rejected.value.reason == 'deadline'
+    assert rejected.value.retry_after >= 1
+    controller.acquire('b')
+
+    stats = controller.stats()
+    assert (stats['admitted'], stats['rejected_deadline'], stats['tracked_clients']) == (3, 1, 2)
+
+
+def test_rejection_takes_no_tokens():
+    controller = AdmissionController(global_rate=1.0, global_burst=1, client_rate=100, client_burst=100,
+                                     max_wait=0)
+    controller.acquire('a')
+    tokens = controller.global_bucket.tokens
+    with pytest.raises(AdmissionRejected):
+        controller.acquire('b')
+    assert controller.global_bucket.tokens == pytest.approx(tokens, abs=0.01)
+
+
+def test_short_wait_is_queued_and_full_queue_rejects():
+    controller = AdmissionController(global_rate=50.0, global_burst=1, client_rate=100, client_burst=100,
+                                     max_queue=1, max_wait=1.0)
+    assert controller.reserve('a') == 0.0
+    assert controller.reserve('b') > 0
+    with pytest.raises(AdmissionRejected) as rejected:
+        controller.reserve('c')
+    assert rejected.value.reason == 'queue full'
+    assert controller.stats()['queue_depth'] == 1
+
+
+def test_async_acquire_waits_for_its_token():
+    controller = AdmissionController(global_rate=50.0, global_burst=1, client_rate=100, client_burst=100)
+
+    async def main():
+        await controller.aacquire('a')
+        await controller.aacquire('b')
+
+    asyncio.run(main())
+    stats = controller.stats()
+    assert (stats['admitted'], stats['queued'], stats['queue_depth']) == (2, 1, 0)
+
+
+def test_least_recently_seen_clients_are_forgotten():
+    controller = AdmissionController(max_clients=2)
+    for client in ('a', 'b', 'a', 'c'):
+        controller.acquire(client)
+    assert list(controller._clients) == ['a', 'c']
@@ -0,0 +1,41 @@
+"""Content-addressed render store (backend/artifacts.py)"""
+
+import os
+
+import artifacts
+from artifacts import ArtifactStore, artifact_key, etag_for, etag_matches
+
+KEYS = [artifact_key(f'graph TD\n  A --> B{n}', 'svg', 'default', None, '2') for n in range(3)]
+
+
+def test_default_directory_is_next_to_the_module():
+    assert os.path.dirname(artifacts.DEFAULT_DIRECTORY) == os.path.dirname(os.path.abspath(artifacts.__file__))
+
+
+def test_directory_is_created_by_the_first_put(tmp_path):
+    directory = tmp_path / 'renders'
+    store = ArtifactStore(str(directory))
+    assert store.get(KEYS[0], 'svg') is None
+    assert not directory.exists()
+
+    store.put(KEYS[0], 'svg', b'<svg/>')
+    assert (directory / KEYS[0][:2] / f'{KEYS[0]}.svg').read_bytes() == b'<svg/>'
+
+
+def test_restart_finds_files_and_evicts_least_recently_used(tmp_path):
+    store = ArtifactStore(str(tmp_path), max_bytes=10, memory_bytes=0)
+    store.put(KEYS[0], 'svg', b'aaaa')
+    store.put(KEYS[1], 'svg', b'bbbb')
+
+    restarted = ArtifactStore(str(tmp_path), max_bytes=10, memory_bytes=0)
+    assert restarted.get(KEYS[0], 'svg').body == b'aaaa'
+    restarted.put(KEYS[2], 'svg', b'cccc')
+    assert restarted.get(KEYS[1], 'svg') is None
+    assert restarted.stats()['disk_bytes'] == 8
+
+
+def test_etags():
+    etag = etag_for(KEYS[0])
+    assert etag_matches(f'W/"other", {etag}', etag)
+    assert etag_matches('*', etag)
+    assert not etag_matches(None, etag)
@@ -0,0 +1,76 @@
+"""ASGI serving mode (backend/asgi_server.py)"""
+
+import json
+
+import httpx
+import pytest
+from starlette.testclient import TestClient
+
+import asgi_server
+import server
+from cache import ResponseCache
+from providers import Provider, ProviderRouter
+
+CODE = 'flowchart TD\n    A --> B'
+
+
+def sse(*chunks):
+    frames = [f'data: {json.dumps({"choices": [{"delta": {"content": chunk}}]})}\n\n' for chunk in chunks]
+    return (''.join(frames) + 'data: [DONE]\n\n').encode()
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    """Serve the ASGI app against a fake upstream; returns the upstream request bodies"""
+    calls = []
+
+    def upstream(request):
+        body = json.loads(request.content)
+        calls.append(body)
+        if body['messages'][-1]['content'] == 'fail':
+            return httpx.Response(500, json={'error': 'boom'})
+        if body['stream']:
+            return httpx.Response(200, content=sse('```mermaid\n', CODE, '\n```'),
+                                  headers={'Content-Type': 'text/event-stream'})
+        return httpx.Response(200, json={'choices': [{'message': {'content': CODE}}], 'model': 'model-a',
+                                         'usage': {'total_tokens': 3}})
+
+    router = ProviderRouter([Provider('a', 'http://upstream/v1/chat/completions', 'model-a')], explore=0)
+    monkeypatch.setattr(server, 'router', router)
+    monkeypatch.setattr(asgi_server, 'router', router)
+    monkeypatch.setattr(server, 'response_cache', ResponseCache())
+    monkeypatch.setattr(server, 'admission', None)
+    monkeypatch.setattr(server, 'hedger', None)
+    monkeypatch.setattr(asgi_server, 'create_async_client',
+                        lambda: httpx.AsyncClient(transport=httpx.MockTransport(upstream)))
+    return calls
+
+
+def test_generate_then_cache_hit(calls):
+    with TestClient(asgi_server.app) as client:
+        first = client.post('/api/generate', json={'prompt': 'Login flow', 'useThinking': False})
+        second = client.post('/api/generate', json={'prompt': 'Login  flow', 'useThinking': False})
+    assert first.json()['code'] == CODE
+    assert (first.headers['X-Cache'], second.headers['X-Cache']) == ('MISS', 'HIT')
+    assert len(calls) == 1
+    assert calls[0]['model'] == 'model-a' and 'thinking' not in calls[0]
+
+
+def test_stream_forwards_frames_and_extracts_code(calls):
+    with TestClient(asgi_server.app) as client:
+        raw = client.post('/api/generate/stream', json={'prompt': 'Login flow'})
+        extracted = client.post('/api/generate/stream', json={'prompt': 'Login flow', 'extractCode': True})
+    assert raw.headers['Content-Type'].startswith('text/event-stream')
+    assert raw.content == sse('```mermaid\n', CODE, '\n```')
+    assert calls[0]['stream'] is True
+    assert b'event: code' in extracted.content
+    assert extracted.content.endswith(b'data: [DONE]\n\n')
+
+
+def test_request_errors(calls):
+    with TestClient(asgi_server.app) as client:
+        assert client.post('/api/generate', json={}).status_code == 400
+        assert client.post('/api/generate/stream', content=b'not json').status_code == 400
+        failed = client.post('/api/generate/stream', json={'prompt': 'fail'})
+        assert client.get('/health').json()['mode'] == 'asgi'
+    assert b'"error"' in failed.content
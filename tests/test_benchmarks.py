@@ -0,0 +1,69 @@
+"""Mock upstream and load-test helpers (backend/benchmarks)"""
+
+import json
+import types
+
+import pytest
+import requests
+
+from load_test import percentile, run_level, spawn_backend
+from mock_upstream import MockUpstream, load_diagram
+
+
+@pytest.fixture
+def mock():
+    mock = MockUpstream(latency=0, jitter=0, tokens_per_second=10000, thinking_chunks=2,
+                        diagram_type='sequence', seed=1)
+    server = mock.serve()
+    mock.url = f'http://127.0.0.1:{server.server_address[1]}'
+    yield mock
+    server.shutdown()
+    server.server_close()
+
+
+def test_completion_returns_the_corpus_diagram(mock):
+    body = requests.post(mock.url + '/v1/chat/completions',
+                         json={'model': 'glm', 'thinking': {'type': 'enabled'}}, timeout=5).json()
+    message = body['choices'][0]['message']
+    assert message['content'] == load_diagram('sequence')
+    assert message['reasoning_content'].startswith('Step 1: ')
+    assert body['model'] == 'glm'
+    assert body['usage'] == mock.usage(True)
+
+
+def test_stream_sends_reasoning_then_content_then_done(mock):
+    response = requests.post(mock.url + '/v1/chat/completions',
+                             json={'stream': True, 'thinking': {'type': 'enabled'}}, timeout=5)
+    frames = [frame[len('data: '):] for frame in response.text.split('\n\n') if frame]
+    assert frames[-1] == '[DONE]'
+    deltas = [json.loads(frame)['choices'][0]['delta'] for frame in frames[:-1]]
+    assert [list(delta) for delta in deltas[:3]] == [['reasoning_content'], ['reasoning_content'], ['content']]
+    assert ''.join(delta.get('content', '') for delta in deltas) == load_diagram('sequence')
+
+
+def test_error_rate(mock):
+    mock.error_rate = 1.0
+    assert requests.post(mock.url, json={}, timeout=5).status_code == 503
+    assert (mock.requests, mock.errors) == (1, 1)
+
+
+@pytest.mark.parametrize('endpoint', ['generate', 'stream'])
+def test_run_level_against_a_spawned_backend(mock, endpoint):
+    args = types.SimpleNamespace(cache=False, same_prompt=False, thinking=False, timeout=10)
+    process, base_url = spawn_backend('flask', mock.url + '/v1/chat/completions', args)
+    try:
+        row = run_level(base_url, endpoint, 2, 4, args, process.pid)
+    finally:
+        process.terminate()
+        process.wait()
+    assert (row['requests'], row['ok'], row['errors']) == (4, 4, 0)
+    assert row['latency_ms']['p50'] <= row['latency_ms']['max']
+    assert (row['first_byte_ms'] is not None) == (endpoint == 'stream')
+    assert row['server']['rss_max_mb'] > 0
+    assert mock.requests == 4
+
+
+def test_percentile_is_nearest_rank():
+    ordered = list(range(1, 11))
+    assert [percentile(ordered, p) for p in (50, 90, 99, 100)] == [5, 9, 10, 10]
+    assert percentile([], 50) is None
@@ -0,0 +1,53 @@
+"""Response cache tiers (backend/cache.py)"""
+
+from cache import ResponseCache, SQLiteTier, cache_key
+
+PAYLOAD = {'messages': [{'role': 'system', 'content': 'sys'}], 'temperature': 0.7, 'max_tokens': 100}
+
+
+def test_key_normalizes_prompt_and_covers_model_and_thinking():
+    key = cache_key('Login  flow\n', 'flowchart', True, PAYLOAD)
+    assert key == cache_key('Login flow', 'flowchart', True, PAYLOAD)
+    assert key != cache_key('Login flow', 'flowchart', False, PAYLOAD)
+    assert key != cache_key('Login flow', 'flowchart', True, dict(PAYLOAD, model='other'))
+
+
+def test_sqlite_reads_never_write(tmp_path):
+    tier = SQLiteTier(str(tmp_path / 'cache.db'), max_entries=10)
+    tier.set('fresh', {'v': 1}, expires=200, now=100)
+    tier.set('stale', {'v': 2}, expires=150, now=100)
+    conn = tier._connect()
+    changes = conn.total_changes
+
+    assert tier.get('fresh', 160) == ({'v': 1}, 200)
+    assert tier.get('stale', 160) == (None, 150)
+    assert tier.get('missing', 160) == (None, None)
+    assert conn.total_changes == changes
+    assert len(tier) == 2
+
+    # The next write purges the expired row and updates the count
+    tier.set('other', {'v': 3}, expires=300, now=160)
+    assert len(tier) == 2
+    assert tier.get('stale', 100) == (None, None)
+
+
+def test_sqlite_eviction_uses_buffered_hit_times(tmp_path):
+    tier = SQLiteTier(str(tmp_path / 'cache.db'), max_entries=2)
+    tier.set('a', 'a', expires=1000, now=1)
+    tier.set('b', 'b', expires=1000, now=2)
+    tier.get('a', 3)
+    assert tier.set('c', 'c', expires=1000, now=4) == 1
+    assert tier.get('b', 5) == (None, None)
+    assert tier.get('a', 5)[0] == 'a'
+
+
+def test_disk_hits_are_promoted_and_shared_between_instances(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    ResponseCache(db_path=path).set('k', {'code': 'graph TD'})
+
+    cache = ResponseCache(db_path=path)
+    assert cache.stats()['disk_entries'] == 1
+    assert cache.get_any(['missing', 'k']) == {'code': 'graph TD'}
+    assert cache.get('k') == {'code': 'graph TD'}
+    stats = cache.stats()
+    assert (stats['hits_disk'], stats['hits_memory'], stats['misses']) == (1, 1, 0)
@@ -0,0 +1,41 @@
+"""Batch chart export through warm kaleido workers (chart_export.py)"""
+
+import pytest
+
+go = pytest.importorskip('plotly.graph_objects')
+
+from chart_export import ExportJob, ExportPool, _job, export_format, figure_jobs  # noqa: E402
+
+
+def test_jobs_resolve_their_format_and_figure():
+    fig = go.Figure(go.Scatter(x=[0, 1], y=[0, 1]))
+    assert export_format('chart.SVG') == 'svg'
+    assert export_format('chart', 'jpeg') == 'jpeg'
+    assert export_format('chart') == 'png'
+
+    job = _job((fig, 'out/chart.svg'))
+    assert job == ExportJob(fig.to_dict(), 'out/chart.svg', 'svg')
+    assert _job(ExportJob({'data': []}, 'a.pdf', 'png', 100)).format == 'png'
+
+    jobs = figure_jobs({'a': fig, 'b': fig}, width=800)
+    assert [(job.path, job.format, job.width) for job in jobs] == [
+        ('a.png', 'png', 800), ('a.svg', 'svg', 800), ('b.png', 'png', 800), ('b.svg', 'svg', 800)]
+
+
+def test_pool_exports_a_batch_and_reports_failures(tmp_path):
+    pytest.importorskip('kaleido')
+    fig = go.Figure(go.Scatter(x=[0, 1], y=[0, 1]))
+    jobs = figure_jobs({str(tmp_path / 'chart'): fig}) + [(fig, str(tmp_path / 'missing' / 'chart.png'))]
+
+    with ExportPool(workers=2) as pool:
+        results = pool.export(jobs)
+        assert (pool.exported, pool.failed) == (2, 1)
+
+    assert [result.path for result in results] == [job.path if isinstance(job, ExportJob) else job[1]
+                                                   for job in jobs]
+    png, svg, missing = results
+    assert (tmp_path / 'chart.png').read_bytes()[:8] == b'\x89PNG\r\n\x1a\n'
+    assert png.bytes == (tmp_path / 'chart.png').stat().st_size and png.error is None
+    assert b'<svg' in (tmp_path / 'chart.svg').read_bytes()
+    assert 'No such file or directory' in missing.error and missing.bytes == 0
+    assert all(result.seconds > 0 for result in results)
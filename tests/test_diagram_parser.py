@@ -0,0 +1,62 @@
+"""Multi-type Mermaid parser (backend/diagram_parser.py)"""
+
+import glob
+import os
+
+import pytest
+
+from diagram_parser import MermaidSyntaxError, diagram_type, parse_diagram
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CORPUS = sorted(glob.glob(os.path.join(ROOT, 'test-diagram-*.mmd')))
+
+
+def read(path):
+    with open(path, encoding='utf-8') as f:
+        return f.read()
+
+
+def test_corpus_is_present():
+    assert len(CORPUS) >= 12
+
+
+@pytest.mark.parametrize('path', CORPUS, ids=os.path.basename)
+def test_corpus_parses(path):
+    source = read(path)
+    diagram = parse_diagram(source)
+    assert diagram.type == diagram_type(source)
+    assert diagram.nodes or diagram.items or diagram.settings
+
+
+def test_sequence_participant_ids_may_contain_hyphens():
+    diagram = parse_diagram('sequenceDiagram\n  participant Web-App\n  Web-App->>API: hi\n'
+                            '  API-->>Web-App: ok\n  Web-App-xDB: drop')
+    assert [node.id for node in diagram.nodes] == ['Web-App', 'API', 'DB']
+    assert diagram.links() == [('Web-App', 'API', '->>', 'hi'), ('API', 'Web-App', '-->>', 'ok'),
+                               ('Web-App', 'DB', '-x', 'drop')]
+
+
+def test_flowchart_shares_the_flowchart_link_syntax():
+    diagram = parse_diagram('flowchart LR\n  A--yes-->B & C\n  B -.-> D')
+    assert diagram.links() == [('A', 'B', '-->', 'yes'), ('A', 'C', '-->', 'yes'), ('B', 'D', '-.->', '')]
+
+
+@pytest.mark.parametrize('source, message', [
+    ('flowchart TD\n  A ~~~ B', 'Unsupported link syntax'),
+    ('flowchart TD\n  A@{ shape: rect }', 'Unsupported shape syntax'),
+    ('sequenceDiagram\n  Alice says hi', 'Unexpected'),
+    ('classDiagram\n  Animal ~~ Dog', 'Unexpected'),
+    ('stateDiagram-v2\n  A -> B', 'Unexpected'),
+    ('erDiagram\n  CUSTOMER ||--o{ ORDER', 'Unexpected'),
+    ('gantt\n  section A\n  Task : a1, after zz, 1d', 'Unknown task id'),
+    ('mindmap\n  root\n child', 'single root'),
+    ('quadrantChart\n  Point A: [0.5]', 'Unexpected'),
+    ('sankey-beta\n  A,B,x', 'Invalid flow value'),
+    ('xychart-beta\n  bar [1, x, 3]', 'Invalid bar values'),
+    ('architecture-beta\n  service db(database)[DB]\n  db:X -- R:api', 'Unexpected'),
+    ('block-beta\n  A -->', 'Link without a target block')
+], ids=lambda value: value.split(None, 1)[0] if '\n' in value else '')
+def test_errors_name_the_line(source, message):
+    with pytest.raises(MermaidSyntaxError, match=message) as error:
+        parse_diagram(source)
+    assert error.value.line == source.count('\n') + 1
@@ -0,0 +1,57 @@
+"""Mermaid code extraction, whole and streamed (backend/extraction.py)"""
+
+import pytest
+
+from extraction import MermaidStreamExtractor, extract_mermaid_code, is_mermaid_header
+
+CODE = 'flowchart TD\n    A["`**bold**`"] --> B\n    B --> C'
+
+RESPONSES = [
+    f'```mermaid\n{CODE}\n```\nThis diagram shows a flow.',
+    f'Here is your diagram:\n\n```\n{CODE}\n```',
+    f'Sure.\n{CODE}\n',
+    CODE,
+    f'```mermaid\n{CODE}'
+]
+
+
+def stream(chunks):
+    extractor = MermaidStreamExtractor()
+    emitted = ''.join(extractor.feed(chunk) for chunk in chunks) + extractor.finish()
+    return emitted, extractor
+
+
+@pytest.mark.parametrize('response', RESPONSES)
+def test_every_split_emits_the_same_code(response):
+    for cut in range(len(response) + 1):
+        emitted, extractor = stream([response[:cut], response[cut:]])
+        assert emitted.strip() == CODE, cut
+        assert extractor.code == CODE
+
+
+@pytest.mark.parametrize('response', RESPONSES)
+def test_one_character_chunks(response):
+    emitted, _ = stream(response)
+    assert emitted.strip() == CODE
+
+
+def test_code_is_emitted_before_the_line_ends():
+    extractor = MermaidStreamExtractor()
+    assert extractor.feed('```mermaid\nflowchart TD\n    A --') == 'flowchart TD\n    A --'
+    # Text that could still be a closing fence is held back
+    assert extractor.feed('> B\n``') == '> B\n'
+    assert extractor.feed('`\nprose after the code') == ''
+    assert extractor.state == 'done'
+
+
+def test_prose_only_falls_back_to_full_extraction():
+    emitted, extractor = stream(['I cannot draw that.'])
+    assert emitted == ''
+    assert extractor.code == extract_mermaid_code('I cannot draw that.')
+
+
+def test_headers():
+    assert is_mermaid_header('sequenceDiagram')
+    assert is_mermaid_header('%%{init: {"theme": "dark"}}%%')
+    assert not is_mermaid_header('Here is the diagram')
+    assert extract_mermaid_code(f'```mermaid\n{CODE}\n```') == CODE
@@ -0,0 +1,49 @@
+"""Flowchart parsing (backend/flowchart.py)"""
+
+import pytest
+
+from flowchart import FlowchartSyntaxError, parse_flowchart
+
+
+def edges(source):
+    chart = parse_flowchart('flowchart LR\n' + source)
+    return [(edge.source, edge.target, edge.label, edge.style, edge.arrow) for edge in chart.edges]
+
+
+@pytest.mark.parametrize('source', ['A:::hot-->B', 'A:::hot --> B', 'A:::my-class-->B', 'A-->B:::hot'])
+def test_class_suffix_before_or_after_a_link(source):
+    assert edges(source) == [('A', 'B', '', 'solid', 'arrow')]
+
+
+def test_link_forms():
+    assert edges('A -- yes --> B') == [('A', 'B', 'yes', 'solid', 'arrow')]
+    assert edges('A -. maybe .-> B') == [('A', 'B', 'maybe', 'dotted', 'arrow')]
+    assert edges('A ==>|no| B') == [('A', 'B', 'no', 'thick', 'arrow')]
+    assert edges('A --- B --> C') == [('A', 'B', '', 'solid', None), ('B', 'C', '', 'solid', 'arrow')]
+    assert edges('A --> B & C') == [('A', 'B', '', 'solid', 'arrow'), ('A', 'C', '', 'solid', 'arrow')]
+
+
+@pytest.mark.parametrize('source, expected', [
+    ('A--text-->B', ('A', 'B', 'text', 'solid', 'arrow')),
+    ('A --text--> B', ('A', 'B', 'text', 'solid', 'arrow')),
+    ('A-.maybe.->B', ('A', 'B', 'maybe', 'dotted', 'arrow')),
+    ('A==big==>B', ('A', 'B', 'big', 'thick', 'arrow')),
+    ('A--ok-->B', ('A', 'B', 'ok', 'solid', 'arrow')),
+    ('A--o B', ('A', 'B', '', 'solid', 'circle'))
+])
+def test_text_links_without_spaces(source, expected):
+    assert edges(source) == [expected]
+
+
+@pytest.mark.parametrize('source', ['A ~~~ B', 'A -- B'])
+def test_unsupported_link_forms_are_reported_as_such(source):
+    with pytest.raises(FlowchartSyntaxError) as error:
+        edges(source)
+    assert 'Unsupported link syntax' in str(error.value)
+    assert error.value.line == 2
+
+
+@pytest.mark.parametrize('source', ['A@{ shape: rect }', 'A --> B@{ shape: rect }'])
+def test_shape_data_is_rejected_not_read_as_a_node(source):
+    with pytest.raises(FlowchartSyntaxError, match='Unsupported shape syntax'):
+        edges(source)
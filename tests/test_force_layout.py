@@ -0,0 +1,65 @@
+"""Vectorized force-directed layout of flowcharts (force_layout.py)"""
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+import force_layout as module  # noqa: E402
+from force_layout import _exact_repulsion, _grid_repulsion, force_layout, layout_mmd  # noqa: E402
+
+
+def test_grid_repulsion_is_exact_when_every_node_has_its_own_cell():
+    positions = np.array([[0.0, 0.0], [1.0, 0.2], [3.0, 2.0], [0.5, 3.0]])
+    assert np.allclose(_grid_repulsion(positions, 64), _exact_repulsion(positions))
+
+
+def test_grid_repulsion_approximates_exact():
+    positions = np.random.default_rng(1).uniform(-20, 20, size=(400, 2))
+    exact = _exact_repulsion(positions)
+    error = np.linalg.norm(_grid_repulsion(positions, 16) - exact, axis=1) / np.linalg.norm(exact, axis=1)
+    assert np.median(error) < 0.1
+
+
+@pytest.mark.parametrize('count', [0, 1])
+def test_trivial_graphs(count):
+    assert force_layout(count, []).shape == (count, 2)
+
+
+def test_edges_pull_and_clusters_hold_together():
+    # Two clusters of chains, with one edge between them and a self-loop that is ignored
+    edges = [(i, i + 1) for i in range(9)] + [(i, i + 1) for i in range(10, 19)] + [(9, 10), (3, 3)]
+    clusters = [0] * 10 + [1] * 10
+    positions = force_layout(20, edges, clusters)
+
+    assert positions.shape == (20, 2)
+    assert np.allclose(positions.mean(axis=0), 0)
+    assert np.array_equal(positions, force_layout(20, edges, clusters))
+
+    distance = np.linalg.norm(positions[:, None] - positions[None], axis=2)
+    linked = np.mean([distance[a, b] for a, b in edges if a != b])
+    assert linked < distance[np.triu_indices(20, 1)].mean()
+    within = np.mean([distance[a, b] for a in range(10) for b in range(10) if a < b])
+    across = distance[:10, 10:].mean()
+    assert within < across
+
+
+def test_large_graphs_use_the_grid(monkeypatch):
+    monkeypatch.setattr(module, 'EXACT_MAX', 10)
+    monkeypatch.setattr(module, '_exact_repulsion', None)
+    positions = force_layout(50, [(i, i + 1) for i in range(49)], iterations=5)
+    assert np.isfinite(positions).all()
+
+
+def test_layout_mmd(tmp_path):
+    path = tmp_path / 'chart.mmd'
+    path.write_text('flowchart TD\n'
+                    '    subgraph core["Core **services**"]\n'
+                    '        A[API] --> B[Store]\n'
+                    '    end\n'
+                    '    B --> C[Store]\n'
+                    '    C --> D["Long<br/>label"]\n')
+    nodes, connections, categories, titles = layout_mmd(str(path), iterations=20)
+    assert set(nodes) == {'API', 'Store (B)', 'Store (C)', 'Long'}
+    assert connections == [('API', 'Store (B)'), ('Store (B)', 'Store (C)'), ('Store (C)', 'Long')]
+    assert categories == {'API': 'core', 'Store (B)': 'core'}
+    assert titles == {'core': 'Core services'}
@@ -0,0 +1,120 @@
+"""Non-streaming generation through cache, hedging and providers (backend/server.py)"""
+
+import json
+import threading
+
+import pytest
+import requests
+
+import server
+from cache import ResponseCache
+from hedging import Hedger
+from providers import Provider, ProviderRouter
+
+CODE = 'flowchart TD\n    A --> B'
+
+
+def completion(reasoning):
+    return {
+        'choices': [{'message': {'content': CODE, 'reasoning_content': reasoning}}],
+        'model': 'model-a',
+        'usage': {'prompt_tokens': 1, 'completion_tokens': 1, 'total_tokens': 2}
+    }
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    """One provider, a memory cache and a fake upstream where thinking requests are slow"""
+    monkeypatch.setattr(server, 'router', ProviderRouter([Provider('a', 'http://a', 'model-a', thinking=True)],
+                                                         explore=0))
+    monkeypatch.setattr(server, 'response_cache', ResponseCache())
+    monkeypatch.setattr(server, 'inflight', None)
+    monkeypatch.setattr(server, 'admission', None)
+    monkeypatch.setattr(server, 'HEDGE_DISABLE_THINKING', True)
+    monkeypatch.setattr(server, 'hedger', Hedger(initial_delay=0.01))
+
+    def streamed_completion(provider, payload, attempt):
+        if 'thinking' in payload:
+            cancelled = threading.Event()
+            attempt.on_cancel = cancelled.set
+            cancelled.wait(0.5)
+            return completion('thought about it')
+        attempt.mark_first_token()
+        return completion(None)
+
+    monkeypatch.setattr(server, 'streamed_completion', streamed_completion)
+
+
+def test_hedge_win_is_cached_as_the_request_the_hedge_made(backend):
+    result, headers = server.generate_result('Login flow', 'flowchart', True)
+    assert (result['reasoning'], headers['X-Cache']) == (None, 'MISS')
+    assert server.hedger.stats()['hedge_wins'] == 1
+
+    # The hedge ran without thinking: it answers a non-thinking request, not a thinking one
+    result, headers = server.generate_result('Login flow', 'flowchart', False)
+    assert headers['X-Cache'] == 'HIT'
+    result, headers = server.generate_result('Login flow', 'flowchart', True)
+    assert headers['X-Cache'] == 'MISS'
+
+
+class FakeResponse:
+    def __init__(self, status, body):
+        self.status_code = status
+        self.body = body
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            response = requests.Response()
+            response.status_code = self.status_code
+            raise requests.exceptions.HTTPError(f'{self.status_code} Client Error', response=response)
+
+    def json(self):
+        return self.body
+
+
+@pytest.fixture
+def batch_backend(monkeypatch):
+    """Unhedged, uncached generation against a fake upstream that rejects the prompt 'bad'"""
+    monkeypatch.setattr(server, 'router', ProviderRouter([Provider('a', 'http://a', 'model-a')], explore=0))
+    monkeypatch.setattr(server, 'response_cache', None)
+    monkeypatch.setattr(server, 'inflight', None)
+    monkeypatch.setattr(server, 'admission', None)
+    monkeypatch.setattr(server, 'hedger', None)
+
+    class Upstream:
+        def post(self, url, json=None, **kwargs):
+            if json['messages'][-1]['content'] == 'bad':
+                return FakeResponse(400, {})
+            return FakeResponse(200, completion(None))
+
+    monkeypatch.setattr(server, 'upstream', Upstream())
+    return server.app.test_client()
+
+
+def test_batch_reports_each_item_and_a_summary(batch_backend):
+    response = batch_backend.post('/api/generate/batch', json={
+        'items': [{'prompt': 'Login flow'}, {'prompt': 'bad'}, {'diagramType': 'sequence'}, 'x'],
+        'concurrency': 2
+    })
+    assert response.mimetype == 'application/x-ndjson'
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    items = {line['index']: line for line in lines if line['type'] == 'item'}
+
+    assert items[0]['success'] and items[0]['code'] == CODE
+    assert not items[1]['success'] and '400' in items[1]['error']
+    assert items[2] == {'type': 'item', 'index': 2, 'success': False, 'error': 'Prompt is required'}
+    assert items[3]['error'] == 'Prompt is required'
+    assert lines[-1] == {'type': 'summary', 'total': 4, 'succeeded': 1, 'failed': 3,
+                         'usage': {'prompt_tokens': 1, 'completion_tokens': 1, 'total_tokens': 2}}
+
+
+@pytest.mark.parametrize('body, error', [
+    ({'items': []}, 'items must be a non-empty list'),
+    ([{'prompt': 'x'}], 'items must be a non-empty list'),
+    ({'items': [{'prompt': 'x'}], 'concurrency': '4'}, 'concurrency must be an integer'),
+    ({'items': [{'prompt': 'x'}], 'concurrency': None}, 'concurrency must be an integer'),
+    ({'items': [{'prompt': 'x'}], 'concurrency': True}, 'concurrency must be an integer')
+])
+def test_batch_rejects_bad_bodies(batch_backend, body, error):
+    response = batch_backend.post('/api/generate/batch', json=body)
+    assert (response.status_code, response.json['error']) == (400, error)
@@ -0,0 +1,69 @@
+"""Batched, vectorized graph traces (graph_plot.py)"""
+
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('plotly')
+
+from graph_plot import arrowhead_xy, edge_xy, graph_arrays, plot_graph  # noqa: E402
+
+NODES = {'a': (0, 0), 'b': (2, 0), 'c': (2, 2)}
+CONNECTIONS = [('a', 'b'), ('b', 'c'), ('c', 'c')]
+
+
+def test_graph_arrays():
+    names, positions, edges = graph_arrays(NODES, CONNECTIONS)
+    assert names == ['a', 'b', 'c']
+    assert positions.shape == (3, 2)
+    assert edges.tolist() == [[0, 1], [1, 2], [2, 2]]
+
+
+def test_edges_are_one_nan_separated_polyline():
+    _, positions, edges = graph_arrays(NODES, CONNECTIONS)
+    x, y = edge_xy(positions, edges, clearance=0.5)
+    assert len(x) == len(y) == 9
+    assert np.isnan(x[2::3]).all()
+    # Shortened at the target only; the self-loop stays a point
+    assert x[:2].tolist() == [0, 1.5] and y[3:5].tolist() == [0, 1.5]
+    assert (x[6], y[6], x[7], y[7]) == (2, 2, 2, 2)
+
+
+def test_arrowheads_skip_self_loops_and_short_edges():
+    _, positions, edges = graph_arrays(NODES, CONNECTIONS)
+    x, y = arrowhead_xy(positions, edges, length=0.5, width=0.4)
+    assert len(x) == 10
+    # a -> b: tip at b, base half a unit back, 0.4 wide
+    assert x[:4].tolist() == [2, 1.5, 1.5, 2]
+    assert y[:4].tolist() == pytest.approx([0, 0.2, -0.2, 0])
+    x, y = arrowhead_xy(positions, edges, length=0.5, clearance=1.6)
+    assert len(x) == 0
+
+
+def test_arrowheads_follow_the_screen_aspect():
+    _, positions, edges = graph_arrays({'a': (0, 0), 'b': (1, 1)}, [('a', 'b')])
+    # One y unit shows twice as tall: the triangle is built on screen, then mapped back
+    x, y = arrowhead_xy(positions, edges, length=np.sqrt(5) / 2, width=0, aspect=2.0)
+    assert (x[1], y[1]) == pytest.approx((0.5, 0.5))
+
+
+def test_figure_holds_a_fixed_number_of_traces():
+    count = 500
+    nodes = {f'n{i}': (i % 25, i // 25) for i in range(count)}
+    connections = [(f'n{i}', f'n{(i + 1) % count}') for i in range(count)]
+    categories = {f'n{i}': 'even' if i % 2 == 0 else 'odd' for i in range(count - 1)}
+    fig = plot_graph(nodes, connections, categories=categories, colors={'even': '#f00'},
+                     labels={'odd': 'Odd nodes'})
+
+    assert [trace.mode for trace in fig.data] == ['lines', 'lines', 'markers+text', 'markers+text', 'markers+text']
+    assert fig.data[1].fill == 'toself'
+    assert [trace.name for trace in fig.data[2:]] == ['Odd nodes', 'even', 'Nodes']
+    assert [trace.showlegend for trace in fig.data[2:]] == [True, True, False]
+    assert fig.data[3].marker.color == '#f00' and len(fig.data[3].x) == 250
+    assert fig.layout.yaxis.scaleanchor == 'x'
+
+
+def test_edges_above_and_webgl():
+    fig = plot_graph(NODES, CONNECTIONS, arrow_length=0, edges_above=True, webgl=True, aspect=1.5)
+    assert [trace.type for trace in fig.data] == ['scattergl', 'scattergl']
+    assert fig.data[-1].mode == 'lines'
+    assert fig.layout.yaxis.scaleanchor is None
@@ -0,0 +1,111 @@
+"""Hedged requests (backend/hedging.py)"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from hedging import Hedger
+
+
+def valid(result):
+    return result != 'invalid'
+
+
+def test_fast_primary_is_not_hedged():
+    hedger = Hedger(initial_delay=1.0)
+    result, winner = hedger.run(lambda attempt: 'primary', lambda attempt: 'hedge', valid)
+    assert (result, winner.name) == ('primary', 'primary')
+    assert hedger.stats()['hedged'] == 0
+
+
+def test_slow_primary_is_hedged_and_cancelled():
+    hedger = Hedger(initial_delay=0.01)
+    cancelled = threading.Event()
+
+    def primary(attempt):
+        attempt.on_cancel = cancelled.set
+        cancelled.wait(5)
+        return 'primary'
+
+    result, winner = hedger.run(primary, lambda attempt: 'hedge', valid)
+    assert (result, winner.name) == ('hedge', 'hedge')
+    assert cancelled.wait(1)
+    assert hedger.stats()['hedge_wins'] == 1
+
+
+def test_invalid_result_is_only_a_fallback():
+    hedger = Hedger(initial_delay=0.01)
+
+    def primary(attempt):
+        time.sleep(0.05)
+        return 'primary'
+
+    result, winner = hedger.run(primary, lambda attempt: 'invalid', valid)
+    assert (result, winner.name) == ('primary', 'primary')
+
+    result, winner = hedger.run(lambda attempt: 'invalid', lambda attempt: 'invalid', valid)
+    assert result == 'invalid'
+
+
+def test_every_attempt_failing_raises_first_error():
+    hedger = Hedger(initial_delay=0.01)
+
+    def primary(attempt):
+        time.sleep(0.05)
+        raise ValueError('primary failed')
+
+    def hedge(attempt):
+        time.sleep(0.1)
+        raise KeyError('hedge failed')
+
+    with pytest.raises(ValueError):
+        hedger.run(primary, hedge, valid)
+
+
+def test_async_hedge_wins_when_primary_fails_in_the_same_wakeup():
+    async def main():
+        hedger = Hedger(initial_delay=0.01)
+        release = asyncio.Event()
+
+        async def primary(attempt):
+            await release.wait()
+            raise ValueError('primary failed')
+
+        async def hedge(attempt):
+            # Started once the hedge delay passes; both attempts then finish on the same loop iteration
+            release.set()
+            await release.wait()
+            return 'hedge'
+
+        return await hedger.arun(primary, hedge, valid)
+
+    for _ in range(50):
+        result, winner = asyncio.run(main())
+        assert (result, winner.name) == ('hedge', 'hedge')
+
+
+def test_async_slow_primary_is_hedged_and_cancelled():
+    async def main():
+        hedger = Hedger(initial_delay=0.01)
+        cancelled = []
+
+        async def primary(attempt):
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.append(attempt.name)
+                raise
+            return 'primary'
+
+        async def hedge(attempt):
+            attempt.mark_first_token()
+            return 'hedge'
+
+        result, winner = await hedger.arun(primary, hedge, valid)
+        await asyncio.sleep(0)
+        return result, winner, cancelled
+
+    result, winner, cancelled = asyncio.run(main())
+    assert (result, winner.name, cancelled) == ('hedge', 'hedge', ['primary'])
@@ -0,0 +1,78 @@
+"""Striped Prometheus counters and histograms (backend/metrics.py)"""
+
+import threading
+
+import requests
+
+import server
+
+from metrics import CONTENT_TYPE, Counter, Histogram, PipelineMetrics, error_class
+
+
+def in_threads(fn, count=4):
+    threads = [threading.Thread(target=fn) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def test_counter_sums_stripes_and_escapes_labels():
+    counter = Counter('demo_total', 'Demo counter', ('endpoint',))
+    in_threads(lambda: [counter.inc('gen') for _ in range(100)])
+    counter.inc('a"b\\c\nd', amount=2)
+    assert counter.render() == [
+        '# HELP demo_total Demo counter',
+        '# TYPE demo_total counter',
+        'demo_total{endpoint="a\\"b\\\\c\\nd"} 2',
+        'demo_total{endpoint="gen"} 400'
+    ]
+
+
+def test_histogram_buckets_are_cumulative_across_stripes():
+    histogram = Histogram('demo_seconds', 'Demo histogram', buckets=(0.1, 1))
+    in_threads(lambda: [histogram.observe(value) for value in (0.05, 0.1, 0.5, 2)])
+    assert histogram.render() == [
+        '# HELP demo_seconds Demo histogram',
+        '# TYPE demo_seconds histogram',
+        'demo_seconds_bucket{le="0.1"} 8',
+        'demo_seconds_bucket{le="1"} 12',
+        'demo_seconds_bucket{le="+Inf"} 16',
+        'demo_seconds_sum 10.6',
+        'demo_seconds_count 16'
+    ]
+
+
+def test_pipeline_exposition():
+    metrics = PipelineMetrics()
+    metrics.record_generation('/api/generate', 2.0, ttft=0.3, usage={'completion_tokens': 100})
+    response = requests.Response()
+    response.status_code = 502
+    metrics.record_error('/api/generate', requests.exceptions.HTTPError(response=response))
+    metrics.record_error('/api/generate/stream', 'Timeout')
+
+    text = metrics.render({'cache': {'hits': 3, 'enabled': True, 'backend': 'memory'}})
+    lines = text.splitlines()
+    assert text.endswith('\n')
+    assert 'mermaid_generation_seconds_bucket{endpoint="/api/generate",le="2.5"} 1' in lines
+    assert 'mermaid_time_to_first_token_seconds_sum{endpoint="/api/generate"} 0.3' in lines
+    assert 'mermaid_tokens_per_second_bucket{endpoint="/api/generate",le="40"} 0' in lines
+    assert 'mermaid_tokens_per_second_bucket{endpoint="/api/generate",le="80"} 1' in lines
+    assert 'mermaid_errors_total{endpoint="/api/generate",class="HTTPError_502"} 1' in lines
+    assert 'mermaid_errors_total{endpoint="/api/generate/stream",class="Timeout"} 1' in lines
+    assert lines[-4:] == ['# TYPE mermaid_cache_hits gauge', 'mermaid_cache_hits 3',
+                          '# TYPE mermaid_cache_enabled gauge', 'mermaid_cache_enabled 1']
+    # Metrics without samples still announce themselves
+    assert '# TYPE mermaid_upstream_connect_seconds histogram' in lines
+
+
+def test_error_class():
+    assert error_class(ValueError('x')) == 'ValueError'
+
+
+def test_metrics_endpoint(monkeypatch):
+    monkeypatch.setattr(server, 'response_cache', None)
+    response = server.app.test_client().get('/metrics')
+    assert response.headers['Content-Type'] == CONTENT_TYPE
+    assert '# TYPE mermaid_generation_seconds histogram' in response.get_data(as_text=True)
+    assert 'mermaid_retries_' in response.get_data(as_text=True)
@@ -0,0 +1,72 @@
+"""WebSocket stream multiplexing (backend/multiplex.py)"""
+
+import asyncio
+import json
+
+from multiplex import StreamMultiplexer, event_message
+
+
+def test_event_message_decodes_json_objects():
+    message = json.loads(event_message('a', b'code_delta', b'{"delta": "A --> B"}'))
+    assert message == {'type': 'event', 'id': 'a', 'event': 'code_delta', 'data': {'delta': 'A --> B'}}
+    assert json.loads(event_message('a', None, b'plain text'))['data'] == 'plain text'
+
+
+def test_event_message_never_splices_upstream_bytes():
+    data = b'{"x": 1}, "type": "done", "y": {}'
+    message = json.loads(event_message('a', None, data))
+    assert (message['type'], message['data']) == ('event', data.decode())
+
+
+def run_stream(events, window, steps):
+    """Open one stream over a fake upstream, run steps(multiplexer, sent) and return the sent messages"""
+    sent = []
+    closed = []
+
+    async def upstream():
+        try:
+            for event in events:
+                yield event
+        finally:
+            closed.append(True)
+
+    async def start(message):
+        return upstream()
+
+    async def send(text):
+        sent.append(json.loads(text))
+
+    async def main():
+        multiplexer = StreamMultiplexer(send, start)
+        await multiplexer.handle(json.dumps({'type': 'generate', 'id': 'a', 'prompt': 'p', 'window': window}))
+        await steps(multiplexer, sent)
+        await multiplexer.close()
+
+    asyncio.run(main())
+    return sent, closed
+
+
+def test_credit_pauses_and_resumes_a_stream():
+    events = [b'data: {"n": %d}\n\n' % n for n in range(3)] + [b'data: [DONE]\n\n']
+
+    async def steps(multiplexer, sent):
+        await asyncio.sleep(0.01)
+        assert [message['data'] for message in sent] == [{'n': 0}]
+        await multiplexer.handle(json.dumps({'type': 'credit', 'id': 'a', 'credit': 5}))
+        await asyncio.sleep(0.01)
+
+    sent, closed = run_stream(events, 1, steps)
+    assert [message['type'] for message in sent] == ['event', 'event', 'event', 'done']
+    assert closed == [True]
+
+
+def test_cancel_closes_the_upstream_stream():
+    events = [b'data: {"n": %d}\n\n' % n for n in range(10)]
+
+    async def steps(multiplexer, sent):
+        await asyncio.sleep(0.01)
+        await multiplexer.handle(json.dumps({'type': 'cancel', 'id': 'a'}))
+
+    sent, closed = run_stream(events, 2, steps)
+    assert [message['type'] for message in sent] == ['event', 'event', 'cancelled']
+    assert closed == [True]
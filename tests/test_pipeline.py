@@ -0,0 +1,80 @@
+"""Incremental, hash-tracked generator runner (pipeline.py)"""
+
+import json
+
+import pytest
+
+import pipeline
+from pipeline import Step, run_pipeline, stages
+
+# a.txt is src.txt upper-cased; b.txt counts a.txt's characters
+STEPS = [
+    Step('a', ['gen_a.py'], ['gen_a.py', 'src.txt'], ['a.txt']),
+    Step('b', ['gen_b.py'], ['gen_b.py', 'a.txt'], ['b.txt'])
+]
+
+
+@pytest.fixture
+def project(tmp_path, monkeypatch):
+    monkeypatch.setattr(pipeline, 'PROJECT_ROOT', str(tmp_path))
+    (tmp_path / 'gen_a.py').write_text("open('a.txt', 'w').write(open('src.txt').read().upper())\n")
+    (tmp_path / 'gen_b.py').write_text("open('b.txt', 'w').write(str(len(open('a.txt').read())))\n")
+    (tmp_path / 'src.txt').write_text('hello')
+    return tmp_path
+
+
+def test_status_transitions(project):
+    assert run_pipeline(STEPS, dry_run=True) == {'a': 'missing', 'b': 'missing'}
+    assert not (project / pipeline.STATE_FILE).exists()
+
+    assert run_pipeline(STEPS) == {'a': 'ran', 'b': 'ran'}
+    assert (project / 'b.txt').read_text() == '5'
+    assert run_pipeline(STEPS) == {'a': 'fresh', 'b': 'fresh'}
+
+    # a reruns; its output is the same, so b stays fresh
+    (project / 'src.txt').write_text('HELLO')
+    assert run_pipeline(STEPS, dry_run=True) == {'a': 'changed', 'b': 'fresh'}
+    assert run_pipeline(STEPS) == {'a': 'ran', 'b': 'fresh'}
+
+    (project / 'src.txt').write_text('hello world')
+    assert run_pipeline(STEPS) == {'a': 'ran', 'b': 'ran'}
+    assert (project / 'b.txt').read_text() == '11'
+
+    (project / 'a.txt').unlink()
+    assert run_pipeline(STEPS) == {'a': 'ran', 'b': 'fresh'}
+
+
+def test_hand_edits_are_kept_unless_forced(project):
+    run_pipeline(STEPS)
+    (project / 'b.txt').write_text('edited by hand')
+    assert run_pipeline(STEPS) == {'a': 'fresh', 'b': 'modified'}
+    assert (project / 'b.txt').read_text() == 'edited by hand'
+    assert run_pipeline(STEPS, force=True) == {'a': 'ran', 'b': 'ran'}
+    assert (project / 'b.txt').read_text() == '5'
+
+
+def test_existing_outputs_are_adopted_on_the_first_run(project):
+    (project / 'a.txt').write_text('kept')
+    (project / 'b.txt').write_text('kept')
+    assert run_pipeline(STEPS, dry_run=True) == {'a': 'adopt', 'b': 'adopt'}
+    assert run_pipeline(STEPS) == {'a': 'adopted', 'b': 'adopted'}
+    assert (project / 'a.txt').read_text() == 'kept'
+    assert run_pipeline(STEPS) == {'a': 'fresh', 'b': 'fresh'}
+
+    state = json.loads((project / pipeline.STATE_FILE).read_text())
+    assert set(state['steps']) == {'a', 'b'}
+    assert set(state['files']) == {'gen_a.py', 'src.txt', 'a.txt', 'gen_b.py', 'b.txt'}
+
+
+def test_failed_step_blocks_its_dependents(project):
+    (project / 'gen_a.py').write_text('raise SystemExit(3)\n')
+    assert run_pipeline(STEPS) == {'a': 'failed', 'b': 'blocked'}
+    assert 'a' not in json.loads((project / pipeline.STATE_FILE).read_text())['steps']
+
+
+def test_stages():
+    independent = Step('c', ['gen_c.py'], ['gen_c.py'], ['c.txt'])
+    assert [[step.name for step in stage] for stage in stages(STEPS + [independent])] == [['a', 'c'], ['b']]
+    cycle = [Step('x', [], ['y.txt'], ['x.txt']), Step('y', [], ['x.txt'], ['y.txt'])]
+    with pytest.raises(ValueError, match='Steps depend on each other: x, y'):
+        stages(cycle)
@@ -0,0 +1,37 @@
+"""Per-type prompt templates and token budgets (backend/prompts.py)"""
+
+import prompts
+import server
+from prompts import THINKING_TOKENS, TYPE_SPECS, compile_templates, get_template, max_tokens_for, system_prompt_for
+
+
+def test_max_tokens_follow_the_type_budget():
+    assert max_tokens_for('xychart', False) == TYPE_SPECS['xychart'].max_tokens
+    assert max_tokens_for('class', True) == TYPE_SPECS['class'].max_tokens + THINKING_TOKENS
+    assert max_tokens_for('no-such-type', False) == TYPE_SPECS['flowchart'].max_tokens
+
+
+def test_template_selection():
+    assert get_template('sequence').diagram_type == 'sequence'
+    assert get_template('no-such-type').diagram_type == 'flowchart'
+    assert TYPE_SPECS['gantt'].instructions in system_prompt_for('gantt', few_shot=False)
+
+
+def test_few_shot_prompt_carries_the_corpus_example(tmp_path, monkeypatch):
+    (tmp_path / 'test-diagram-state.mmd').write_text('stateDiagram-v2\n    [*] --> Idle\n')
+    templates = compile_templates(str(tmp_path))
+    assert templates['state'].few_shot_prompt.endswith('Example of the expected output format:\n'
+                                                       'stateDiagram-v2\n    [*] --> Idle')
+    # No example on disk: the few-shot prompt is the plain prompt
+    assert templates['sequence'].few_shot_prompt == templates['sequence'].system_prompt
+
+    monkeypatch.setattr(prompts, 'TEMPLATES', templates)
+    assert system_prompt_for('state', few_shot=True) == templates['state'].few_shot_prompt
+    assert system_prompt_for('state', few_shot=False) == templates['state'].system_prompt
+
+
+def test_payload_uses_the_type_template():
+    payload = server.build_payload('Login flow', 'er', True, stream=False)
+    assert payload['messages'][0]['content'] == system_prompt_for('er')
+    assert payload['max_tokens'] == TYPE_SPECS['er'].max_tokens + THINKING_TOKENS
+    assert payload['thinking'] == {'type': 'enabled'}
@@ -0,0 +1,206 @@
+"""Provider routing and failover (backend/providers.py)"""
+
+import asyncio
+import types
+
+import pytest
+import requests
+
+import resilience
+from hedging import AsyncAttempt, Attempt
+from providers import Provider, ProviderRouter
+from resilience import CircuitBreaker, CircuitOpenError, RetryPolicy
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(resilience, 'time', types.SimpleNamespace(monotonic=clock.monotonic))
+    return clock
+
+
+def provider(name, threshold=1):
+    return Provider(name, f'http://{name}', f'model-{name}',
+                    breaker=CircuitBreaker(failure_threshold=threshold, recovery_time=10))
+
+
+def server_error():
+    response = requests.Response()
+    response.status_code = 503
+    return requests.exceptions.HTTPError(response=response)
+
+
+def fail():
+    raise server_error()
+
+
+def test_alternate_skips_open_breakers(clock):
+    a, b = provider('a'), provider('b')
+    router = ProviderRouter([a, b], explore=0)
+    assert router.alternate(a) is b
+    b.breaker.record_failure()
+    assert router.alternate(a) is a
+    a.breaker.record_failure()
+    assert router.alternate(a) is None
+
+
+def test_hedge_call_goes_through_the_breaker(clock):
+    b = provider('b', threshold=2)
+    router = ProviderRouter([provider('a'), b], explore=0)
+    policy = RetryPolicy()
+
+    for _ in range(2):
+        with pytest.raises(requests.exceptions.HTTPError):
+            router.call_on(b, fail, policy, Attempt('hedge'))
+    assert b.breaker.is_open()
+    assert router.stats()['b']['failures'] == 2
+
+    calls = []
+    with pytest.raises(CircuitOpenError):
+        router.call_on(b, lambda: calls.append(1), policy, Attempt('hedge'))
+    assert calls == []
+
+    # Half-open: one probe, which closes the breaker when it succeeds
+    clock.now += 10
+    assert router.call_on(b, lambda: 'ok', policy, Attempt('hedge')) == 'ok'
+    assert b.breaker.stats()['state'] == 'closed'
+    assert policy.stats()['retries'] == 0
+
+
+def test_half_open_hedge_provider_gets_one_probe(clock):
+    b = provider('b')
+    router = ProviderRouter([provider('a'), b], explore=0)
+    b.breaker.record_failure()
+    clock.now += 10
+
+    def second_hedge_meanwhile():
+        with pytest.raises(CircuitOpenError):
+            router.call_on(b, lambda: 'second', RetryPolicy(), Attempt('hedge'))
+        return 'probe'
+
+    assert router.call_on(b, second_hedge_meanwhile, RetryPolicy(), Attempt('hedge')) == 'probe'
+    assert b.breaker.stats()['probes'] == 1
+
+
+def test_cancelled_hedge_is_not_a_failure(clock):
+    b = provider('b')
+    router = ProviderRouter([provider('a'), b], explore=0)
+    attempt = Attempt('hedge')
+
+    def cancelled():
+        attempt.cancel()
+        fail()
+
+    with pytest.raises(requests.exceptions.HTTPError):
+        router.call_on(b, cancelled, RetryPolicy(), attempt)
+    assert not b.breaker.is_open()
+    assert router.stats()['b']['calls'] == 0
+
+
+def test_async_hedge_call_records_its_outcome(clock):
+    b = provider('b')
+    router = ProviderRouter([provider('a'), b], explore=0)
+
+    async def failing():
+        fail()
+
+    async def main():
+        with pytest.raises(requests.exceptions.HTTPError):
+            await router.acall_on(b, failing, RetryPolicy(), AsyncAttempt('hedge'))
+
+    asyncio.run(main())
+    assert b.breaker.is_open()
+
+
+def test_lowest_expected_wait_is_chosen_first():
+    a, b, c = Provider('a', 'http://a', 'm'), Provider('b', 'http://b', 'm'), Provider('c', 'http://c', 'm')
+    router = ProviderRouter([a, b, c], alpha=0.5, explore=0)
+    # No sample yet scores 0, so an unmeasured provider is tried first
+    router.record_ttft(a, 1.0)
+    router.record_ttft(b, 0.5)
+    assert router.ranked() == [c, b, a]
+
+    router.record_ttft(c, 2.0)
+    assert router.choose() is b
+    # EWMA: 0.5 + 0.5 * (1.5 - 0.5)
+    router.record_ttft(b, 1.5)
+    assert router.stats()['b']['ewma_ttft_ms'] == 1000.0
+    # Errors inflate the score: 1.0 / (1 - 0.5) = 2.0 ties with c, a 1.0 without errors wins
+    router.record_result(b, True)
+    assert router.stats()['b']['score_ms'] == 2000.0
+    assert router.choose() is a
+    assert router.choose(tried=[a]) is b
+
+
+def test_call_fails_over_to_an_untried_provider(clock):
+    a, b = provider('a'), provider('b')
+    router = ProviderRouter([a, b], explore=0)
+    router.record_ttft(b, 1.0)
+    policy = RetryPolicy(retries=2, base_delay=0)
+    served = []
+
+    def fn(chosen):
+        served.append(chosen.name)
+        if chosen is a:
+            fail()
+        return 'ok'
+
+    assert router.call(fn, policy) == ('ok', b)
+    assert served == ['a', 'b']
+    assert a.breaker.is_open()
+    assert policy.stats()['recovered'] == 1
+
+    # a's breaker is open, so the next call goes straight to b
+    served.clear()
+    assert router.call(fn, policy) == ('ok', b)
+    assert served == ['b']
+
+
+def test_call_gives_up_after_the_retry_budget(clock):
+    a, b = provider('a', threshold=5), provider('b', threshold=5)
+    router = ProviderRouter([a, b], explore=0)
+    served = []
+
+    def fn(chosen):
+        served.append(chosen.name)
+        fail()
+
+    with pytest.raises(requests.exceptions.HTTPError):
+        router.call(fn, RetryPolicy(retries=2, base_delay=0))
+    assert sorted(served[:2]) == ['a', 'b'] and len(served) == 3
+    assert router.stats()['a']['failures'] + router.stats()['b']['failures'] == 3
+
+
+def test_non_transient_errors_are_not_retried(clock):
+    a, b = provider('a'), provider('b')
+    router = ProviderRouter([a, b], explore=0)
+    served = []
+
+    def fn(chosen):
+        served.append(chosen.name)
+        raise ValueError('bad request')
+
+    with pytest.raises(ValueError):
+        router.call(fn, RetryPolicy())
+    assert len(served) == 1
+    assert not router.all_open()
+
+
+def test_every_breaker_open_raises_circuit_open(clock):
+    a, b = provider('a'), provider('b')
+    router = ProviderRouter([a, b], explore=0)
+    a.breaker.record_failure()
+    clock.now += 4
+    b.breaker.record_failure()
+    assert router.all_open()
+    with pytest.raises(CircuitOpenError) as raised:
+        router.call(lambda chosen: 'ok', RetryPolicy())
+    assert raised.value.retry_after == pytest.approx(6)
@@ -0,0 +1,131 @@
+"""Retry policy and circuit breaker (backend/resilience.py)"""
+
+import types
+
+import pytest
+import requests
+
+import resilience
+from resilience import CircuitBreaker, CircuitOpenError, RetryPolicy, retry_after_seconds, settle_failure
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(resilience, 'time', types.SimpleNamespace(monotonic=clock.monotonic))
+    return clock
+
+
+def http_error(status, headers=None):
+    response = requests.Response()
+    response.status_code = status
+    response.headers.update(headers or {})
+    return requests.exceptions.HTTPError(response=response)
+
+
+def test_breaker_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=3, recovery_time=10)
+    for _ in range(2):
+        breaker.before_call()
+        breaker.record_failure()
+    breaker.record_success()
+    for _ in range(2):
+        breaker.record_failure()
+    assert not breaker.is_open()
+
+    breaker.record_failure()
+    assert breaker.is_open()
+    with pytest.raises(CircuitOpenError) as error:
+        breaker.before_call()
+    assert error.value.retry_after == 10
+    assert breaker.stats()['state'] == 'open'
+
+
+def test_breaker_half_open_probe_closes_on_success(clock):
+    breaker = CircuitBreaker(failure_threshold=1, recovery_time=10)
+    breaker.record_failure()
+    clock.now += 4
+    assert breaker.retry_after() == 6
+
+    clock.now += 6
+    breaker.before_call()
+    assert breaker.stats()['state'] == 'half_open'
+    # Only one probe at a time
+    assert breaker.is_open()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    breaker.record_success()
+    stats = breaker.stats()
+    assert (stats['state'], stats['opened'], stats['closed'], stats['probes'], stats['rejected']) == \
+        ('closed', 1, 1, 1, 1)
+
+
+def test_breaker_failed_probe_reopens(clock):
+    breaker = CircuitBreaker(failure_threshold=5, recovery_time=10)
+    for _ in range(5):
+        breaker.record_failure()
+    clock.now += 10
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.stats()['state'] == 'open'
+    assert breaker.retry_after() == 10
+
+
+def test_breaker_lost_probe_does_not_wedge_half_open(clock):
+    breaker = CircuitBreaker(failure_threshold=1, recovery_time=10)
+    breaker.record_failure()
+    clock.now += 10
+    breaker.before_call()
+    # The probe never reports back; after another recovery period a new probe is allowed
+    clock.now += 10
+    breaker.before_call()
+    assert breaker.stats()['probes'] == 2
+
+
+def test_retry_after_header_in_seconds_only():
+    assert retry_after_seconds(http_error(429, {'Retry-After': '3'})) == 3.0
+    assert retry_after_seconds(http_error(429, {'Retry-After': '-2'})) == 0.0
+    assert retry_after_seconds(http_error(503, {'Retry-After': 'Wed, 21 Oct 2015 07:28:00 GMT'})) is None
+    assert retry_after_seconds(http_error(503)) is None
+    assert retry_after_seconds(ValueError()) is None
+
+
+def test_delay_honours_retry_after_up_to_max_delay():
+    policy = RetryPolicy(base_delay=0.01, max_delay=4.0)
+    assert policy.delay(1, http_error(429, {'Retry-After': '2'})) == 2.0
+    assert policy.delay(1, http_error(429, {'Retry-After': '60'})) == 4.0
+    assert 0 <= policy.delay(10) <= 4.0
+
+
+def test_transient_errors():
+    policy = RetryPolicy(transient=(requests.exceptions.ConnectionError,))
+    assert policy.is_transient(http_error(503))
+    assert policy.is_transient(http_error(429))
+    assert not policy.is_transient(http_error(400))
+    assert policy.is_transient(requests.exceptions.ConnectionError())
+    assert not policy.is_transient(ValueError())
+
+
+def test_settle_failure_retries_transient_errors_until_exhausted(clock):
+    policy = RetryPolicy(retries=2)
+    breaker = CircuitBreaker(failure_threshold=10)
+    error = http_error(502)
+    assert settle_failure(policy, breaker, error, 1)
+    assert settle_failure(policy, breaker, error, 2)
+    assert not settle_failure(policy, breaker, error, 3)
+    assert policy.stats()['retries'] == 2
+    assert policy.stats()['exhausted'] == 1
+    assert breaker.stats()['consecutive_failures'] == 3
+
+    # A client error is not retried and proves the upstream is answering
+    assert not settle_failure(policy, breaker, http_error(400), 1)
+    assert breaker.stats()['consecutive_failures'] == 0
@@ -0,0 +1,59 @@
+"""Line-edit patches for refinement sessions (backend/sessions.py)"""
+
+import pytest
+
+from sessions import PatchError, apply_patch, apply_reply, parse_patch
+
+CODE = 'flowchart TD\n    A --> B\n    B --> C\n    C --> D'
+
+
+def test_parse_ops_and_single_line_forms():
+    reply = '@@ replace 2-3\n    A --> C\n\n@@ insert 0\n%% top\n@@ DELETE 4 @@\n\n'
+    assert parse_patch(reply) == [
+        ('replace', 2, 3, ['    A --> C']),
+        ('insert', 0, 0, ['%% top']),
+        ('delete', 4, 4, [])
+    ]
+
+
+def test_prose_before_the_first_op_is_skipped():
+    reply = 'Sure, here are the edits:\n\n@@ replace 2\n    A --> E'
+    assert parse_patch(reply) == [('replace', 2, 2, ['    A --> E'])]
+
+
+def test_fenced_ops_after_a_preamble():
+    reply = 'Here you go:\n```\n@@ delete 3\n```'
+    assert parse_patch(reply) == [('delete', 3, 3, [])]
+
+
+def test_reply_without_ops_is_not_a_patch():
+    assert parse_patch(CODE) == []
+    assert parse_patch('I could not find that node.') == []
+
+
+def test_line_numbers_refer_to_the_original_code():
+    ops = parse_patch('@@ insert 1\n    X --> A\n@@ delete 2\n@@ replace 4\n    C --> E')
+    assert apply_patch(CODE, ops) == 'flowchart TD\n    X --> A\n    B --> C\n    C --> E'
+
+
+def test_insert_at_top_and_after_last_line():
+    ops = parse_patch('@@ insert 0\n%% note\n@@ insert 4\n    D --> E')
+    assert apply_patch(CODE, ops) == '%% note\n' + CODE + '\n    D --> E'
+
+
+@pytest.mark.parametrize('reply, message', [
+    ('@@ replace 4-5\nX', 'outside lines 1-4'),
+    ('@@ insert 5\nX', 'the diagram has 4 lines'),
+    ('@@ replace 2-3\nX\n@@ delete 3', 'overlaps an earlier edit'),
+    ('@@ delete 2\n    A --> B', 'has content')
+])
+def test_invalid_edits_raise(reply, message):
+    with pytest.raises(PatchError, match=message):
+        apply_patch(CODE, parse_patch(reply))
+
+
+def test_apply_reply_patch_or_full_diagram():
+    assert apply_reply(CODE, 'Edits:\n@@ delete 4') == ('flowchart TD\n    A --> B\n    B --> C', 'patch', 1)
+    assert apply_reply(CODE, '```mermaid\ngraph LR\n  X --> Y\n```') == ('graph LR\n  X --> Y', 'full', 0)
+    with pytest.raises(PatchError):
+        apply_reply(CODE, 'Sorry, I cannot help with that.')
@@ -0,0 +1,184 @@
+"""Request coalescing and stream fan-out (backend/singleflight.py)"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from singleflight import AsyncSingleFlight, AsyncStreamFanout, SingleFlight, StreamFanout
+
+
+def test_singleflight_shares_one_call():
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+    results = []
+
+    def fn():
+        calls.append(1)
+        release.wait(5)
+        return 'result'
+
+    threads = [threading.Thread(target=lambda: results.append(flight.do('k', fn))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    while flight.stats()['coalesced'] < 4:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert sorted(shared for _, shared in results) == [False, True, True, True, True]
+    assert {result for result, _ in results} == {'result'}
+    assert flight.stats() == {'in_flight': 0, 'executed': 1, 'coalesced': 4}
+
+
+def test_singleflight_error_reaches_every_caller_and_releases_key():
+    flight = SingleFlight()
+    release = threading.Event()
+    errors = []
+
+    def fail():
+        release.wait(5)
+        raise ValueError('upstream failed')
+
+    def call():
+        try:
+            flight.do('k', fail)
+        except ValueError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    while flight.stats()['coalesced'] < 2:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(errors) == 3
+    assert flight.do('k', lambda: 'fresh') == ('fresh', False)
+
+
+def test_async_singleflight_cancelled_follower_keeps_shared_call():
+    async def main():
+        flight = AsyncSingleFlight()
+        release = asyncio.Event()
+
+        async def fn():
+            await release.wait()
+            return 'result'
+
+        leader = asyncio.ensure_future(flight.do('k', fn))
+        follower = asyncio.ensure_future(flight.do('k', fn))
+        await asyncio.sleep(0)
+        follower.cancel()
+        release.set()
+        assert await leader == ('result', False)
+        with pytest.raises(asyncio.CancelledError):
+            await follower
+
+    asyncio.run(main())
+
+
+def numbers(log, count=50, delay=0.005):
+    """Upstream generator that records what it produced and whether it was closed"""
+    def start():
+        try:
+            for i in range(count):
+                log.append(i)
+                time.sleep(delay)
+                yield i
+        finally:
+            log.append('closed')
+    return start
+
+
+def test_fanout_late_joiner_replays_then_follows():
+    fanout = StreamFanout()
+    log = []
+    first = fanout.subscribe('k', numbers(log, 10))
+    assert [next(first), next(first)] == [0, 1]
+    second = fanout.subscribe('k', numbers(log, 10))
+
+    assert list(second) == list(range(10))
+    assert list(first) == list(range(2, 10))
+    assert log.count('closed') == 1
+    assert fanout.stats() == {'in_flight': 0, 'executed': 1, 'coalesced': 1, 'cancelled': 0}
+
+
+def test_fanout_last_subscriber_leaving_closes_upstream():
+    fanout = StreamFanout()
+    log = []
+    subscription = fanout.subscribe('k', numbers(log))
+    assert next(subscription) == 0
+    subscription.close()
+
+    deadline = time.monotonic() + 5
+    while 'closed' not in log and time.monotonic() < deadline:
+        time.sleep(0.005)
+    assert log[-1] == 'closed'
+    assert len(log) < 10
+    assert fanout.stats()['cancelled'] == 1
+
+    # The key was released: a new request starts a fresh upstream call
+    fresh = fanout.subscribe('k', numbers([], 3, 0))
+    assert list(fresh) == [0, 1, 2]
+    assert fanout.stats()['executed'] == 2
+
+
+def test_fanout_keeps_streaming_while_a_subscriber_remains():
+    fanout = StreamFanout()
+    log = []
+    leaving = fanout.subscribe('k', numbers(log, 10))
+    staying = fanout.subscribe('k', numbers(log, 10))
+    next(leaving)
+    leaving.close()
+
+    assert list(staying) == list(range(10))
+    assert fanout.stats()['cancelled'] == 0
+
+
+def test_fanout_upstream_error_ends_every_subscription():
+    def start():
+        yield 'a'
+        raise RuntimeError('upstream broke')
+
+    fanout = StreamFanout()
+    assert list(fanout.subscribe('k', start)) == ['a']
+    assert fanout.stats()['in_flight'] == 0
+
+
+def test_async_fanout_last_subscriber_leaving_cancels_producer():
+    log = []
+
+    async def start():
+        try:
+            for i in range(50):
+                log.append(i)
+                await asyncio.sleep(0.005)
+                yield i
+        finally:
+            log.append('closed')
+
+    async def main():
+        fanout = AsyncStreamFanout()
+        subscription = fanout.subscribe('k', start)
+        assert await subscription.__anext__() == 0
+        await subscription.aclose()
+        await asyncio.sleep(0.02)
+        assert log[-1] == 'closed'
+        assert len(log) < 10
+        assert fanout.stats()['cancelled'] == 1
+
+        first = fanout.subscribe('j', start)
+        second = fanout.subscribe('j', start)
+        await first.__anext__()
+        await first.aclose()
+        assert [chunk async for chunk in second] == list(range(50))
+        assert fanout.stats() == {'in_flight': 0, 'executed': 2, 'coalesced': 1, 'cancelled': 1}
+
+    asyncio.run(main())
@@ -0,0 +1,80 @@
+"""Byte-level SSE parsing and framing (backend/sse.py)"""
+
+import asyncio
+
+from sse import SSEParser, aiter_frames, encode_data, encode_event, iter_frames, looks_like_json_object
+
+STREAM = (
+    b'data: {"choices":[{"delta":{"content":"flow"}}]}\n\n'
+    b': keep-alive comment\n\n'
+    b'event: usage\ndata: {"total_tokens":5}\n\n'
+    b'data: [DONE]\n\n'
+)
+
+FRAMES = [
+    (None, b'{"choices":[{"delta":{"content":"flow"}}]}'),
+    (b'usage', b'{"total_tokens":5}'),
+    (None, b'[DONE]')
+]
+
+
+def test_whole_stream_in_one_chunk():
+    assert list(iter_frames([STREAM])) == FRAMES
+
+
+def test_frames_split_at_every_byte():
+    assert list(iter_frames(STREAM[i:i + 1] for i in range(len(STREAM)))) == FRAMES
+
+
+def test_frames_split_at_every_offset():
+    for cut in range(1, len(STREAM)):
+        assert list(iter_frames([STREAM[:cut], STREAM[cut:]])) == FRAMES, cut
+
+
+def test_crlf_line_endings_including_split_between_cr_and_lf():
+    stream = STREAM.replace(b'\n', b'\r\n')
+    assert list(iter_frames([stream])) == FRAMES
+    cut = stream.index(b'\r\n') + 1
+    assert list(iter_frames([stream[:cut], stream[cut:]])) == FRAMES
+
+
+def test_multiline_data_is_joined_with_newlines():
+    parser = SSEParser()
+    assert parser.feed(b'data: first\ndata:second\ndata:  indented\n') == []
+    assert parser.feed(b'\n') == [(None, b'first\nsecond\n indented')]
+
+
+def test_ignored_fields_and_empty_frames():
+    parser = SSEParser()
+    assert parser.feed(b'id: 7\nretry: 1000\n\n: comment\n\n') == []
+    assert parser.feed(b'event: ping\n\ndata: x\n\n') == [(None, b'x')]
+
+
+def test_flush_dispatches_unterminated_frame():
+    parser = SSEParser()
+    assert parser.feed(b'data: a\n\ndata: tail') == [(None, b'a')]
+    assert parser.flush() == [(None, b'tail')]
+    assert parser.flush() == []
+
+
+def test_async_frames_match_sync_frames():
+    async def chunks():
+        for i in range(0, len(STREAM), 7):
+            yield STREAM[i:i + 7]
+
+    async def collect():
+        return [frame async for frame in aiter_frames(chunks())]
+
+    assert asyncio.run(collect()) == FRAMES
+
+
+def test_encode_round_trips_through_parser():
+    data = b'{"a":1}\nsecond line'
+    encoded = encode_data(data) + encode_event('code', {'code': 'graph TD'})
+    assert list(iter_frames([encoded])) == [(None, data), (b'code', b'{"code": "graph TD"}')]
+
+
+def test_looks_like_json_object():
+    assert looks_like_json_object(b' {"a": 1}\n')
+    assert not looks_like_json_object(b'{"a": 1')
+    assert not looks_like_json_object(b'[DONE]')
@@ -0,0 +1,49 @@
+"""Per-frame processing of upstream streams (backend/streaming.py)"""
+
+import json
+
+from sse import iter_frames
+from streaming import DONE_EVENT, StreamProcessor, process_frames
+from validator import StreamingValidator
+
+
+def content_frame(content):
+    return json.dumps({'choices': [{'delta': {'content': content}}]}).encode()
+
+
+def run(processor, contents):
+    frames = [(None, content_frame(content)) for content in contents] + [(None, b'[DONE]')]
+    return list(iter_frames(list(process_frames(processor, frames))))
+
+
+def test_passthrough_without_extraction():
+    frames = [(None, content_frame('graph TD')), (None, b'not json'), (None, b'[DONE]')]
+    events = list(process_frames(StreamProcessor(), frames))
+    assert events == [b'data: ' + content_frame('graph TD') + b'\n\n', DONE_EVENT]
+
+
+def test_extract_code_turns_deltas_into_code_events():
+    processor = StreamProcessor(extract_code=True)
+    events = run(processor, ['Here you go:\n```mer', 'maid\nflowchart TD\n  A -', '-> B\n``', '`\nDone.'])
+    deltas = [json.loads(data)['delta'] for event, data in events if event == b'code_delta']
+    assert ''.join(deltas) == 'flowchart TD\n  A --> B\n'
+    assert events[-2] == (b'code', json.dumps({'type': 'code', 'code': 'flowchart TD\n  A --> B'}).encode())
+    assert events[-1] == (None, b'[DONE]')
+    assert processor.first_token_at is not None
+
+
+def test_doomed_stream_stops_before_done():
+    processor = StreamProcessor(validator=StreamingValidator('sequence'))
+    frames = [(None, content_frame(content)) for content in ['flowchart TD\n', '  A --> B\n', 'never read']]
+    remaining = iter(frames + [(None, b'[DONE]')])
+    assert list(process_frames(processor, remaining)) == []
+    assert next(remaining) == (None, content_frame('  A --> B\n'))
+    assert processor.errors == ['Sequence diagram must include sequenceDiagram keyword']
+
+
+def test_final_validation_failure_withholds_done():
+    processor = StreamProcessor(extract_code=True, validator=StreamingValidator('flowchart'))
+    events = run(processor, ['flowchart TD\n  A[x'])
+    assert processor.errors == ['Line 2: Unclosed brackets']
+    assert (b'code', json.dumps({'type': 'code', 'code': 'flowchart TD\n  A[x'}).encode()) not in events
+    assert (None, b'[DONE]') not in events
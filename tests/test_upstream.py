@@ -0,0 +1,91 @@
+"""Pooled keep-alive upstream client (backend/upstream.py)"""
+
+import http.server
+import threading
+import time
+
+import pytest
+
+from upstream import UpstreamClient
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self.path == '/slow':
+            # Headers, then a body that never finishes
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            self.wfile.write(b'd\r\ndata: first\n\n\r\n')
+            self.wfile.flush()
+            time.sleep(5)
+            return
+        body = b'{"ok": true}'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def url():
+    httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    httpd.daemon_threads = True
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{httpd.server_address[1]}'
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_connections_are_reused_across_requests_and_threads(url):
+    connects = []
+    client = UpstreamClient(pool_maxsize=4, on_connect=connects.append)
+
+    def calls():
+        for _ in range(5):
+            assert client.post(url + '/', json={}, timeout=5).json() == {'ok': True}
+
+    threads = [threading.Thread(target=calls) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    stats = client.stats()
+    assert stats['requests'] == 10
+    assert stats['connections_opened'] == len(connects) <= 2
+    assert stats['reused_connections'] >= 8
+    assert stats['idle_connections'] == stats['open_connections']
+    client.close()
+
+
+def test_abort_wakes_a_blocked_reader(url):
+    client = UpstreamClient()
+    response = client.post(url + '/slow', json={}, stream=True, timeout=10)
+    chunks = response.iter_content(chunk_size=None)
+    assert next(chunks) == b'data: first\n\n'
+
+    finished = threading.Event()
+
+    def read():
+        try:
+            for _ in chunks:
+                pass
+        except Exception:
+            pass
+        finished.set()
+
+    threading.Thread(target=read, daemon=True).start()
+    time.sleep(0.05)
+    client.abort(response)
+    assert finished.wait(1)
+    client.close()
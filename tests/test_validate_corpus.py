@@ -0,0 +1,90 @@
+"""Corpus validation with the mtime/hash index (backend/validate_corpus.py)"""
+
+import io
+import json
+import os
+
+from validate_corpus import markdown_diagrams, validate_corpus
+
+FLOWCHART = 'flowchart TD\n    A[Start] --> B[Done]\n'
+SEQUENCE = 'sequenceDiagram\n    Alice->>Bob: Hi\n'
+
+MARKDOWN = f'''# Notes
+
+```mermaid
+{FLOWCHART}```
+
+Some text.
+
+~~~mermaid
+{SEQUENCE}~~~
+'''
+
+
+def run(tmp_path, **options):
+    output = io.StringIO()
+    report = validate_corpus([str(tmp_path / 'docs')], output, workers=1, index_path=str(tmp_path / 'index.json'),
+                             base=str(tmp_path / 'docs'), **options)
+    records = [json.loads(line) for line in output.getvalue().splitlines()]
+    return sorted(records, key=lambda record: (record['path'], record['line'])), report
+
+
+def write(path, text):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text, encoding='utf-8')
+
+
+def test_markdown_fences():
+    assert markdown_diagrams(MARKDOWN) == [(4, FLOWCHART.rstrip('\n')), (11, SEQUENCE.rstrip('\n'))]
+    # A ~~~ block is not closed by ```, and an unterminated block runs to the end
+    assert markdown_diagrams('~~~mermaid\ngraph TD\n```\n~~~') == [(2, 'graph TD\n```')]
+    assert markdown_diagrams('text\n  ```mermaid\ngraph TD\n  A --> B') == [(3, 'graph TD\n  A --> B')]
+
+
+def test_records_summary_and_index_reuse(tmp_path):
+    docs = tmp_path / 'docs'
+    write(docs / 'test-diagram-flowchart.mmd', FLOWCHART)
+    write(docs / 'guide' / 'README.md', MARKDOWN)
+    write(docs / 'broken.mmd', 'flowchart TD\n    A[Start --> B\n')
+    write(docs / 'ignored.txt', FLOWCHART)
+
+    records, report = run(tmp_path)
+    assert [(r['path'], r['line'], r['type'], r['valid'], r['cached']) for r in records] == [
+        ('broken.mmd', 1, 'flowchart', False, False),
+        (os.path.join('guide', 'README.md'), 4, 'flowchart', True, False),
+        (os.path.join('guide', 'README.md'), 11, 'sequence', True, False),
+        ('test-diagram-flowchart.mmd', 1, 'flowchart', True, False)
+    ]
+    assert records[0]['errors']
+    assert (report['files'], report['validated_files'], report['diagrams'], report['invalid']) == (3, 3, 4, 1)
+    assert report['by_type']['flowchart'] == {'diagrams': 3, 'invalid': 1}
+    assert report['invalid_files'] == ['broken.mmd']
+
+    # Unchanged files come from the index without being read
+    records, report = run(tmp_path)
+    assert all(record['cached'] for record in records)
+    assert (report['cached_files'], report['validated_files'], report['invalid']) == (3, 0, 1)
+
+    # Touched but identical: matched by hash; edited: validated again
+    os.utime(docs / 'broken.mmd', ns=(1, 1))
+    write(docs / 'test-diagram-flowchart.mmd', FLOWCHART + '    B --> C\n')
+    records, report = run(tmp_path)
+    cached = {record['path']: record['cached'] for record in records}
+    assert cached['broken.mmd'] and not cached['test-diagram-flowchart.mmd']
+    assert report['cached_files'] == 2
+
+    # --full ignores the index
+    records, report = run(tmp_path, full=True)
+    assert report['cached_files'] == 0
+
+
+def test_parse_reports_parser_errors_without_the_line_prefix(tmp_path):
+    write(tmp_path / 'docs' / 'shape.mmd', 'flowchart TD\n    A@{ shape: rect }\n')
+
+    records, report = run(tmp_path)
+    assert records[0]['valid']
+
+    records, report = run(tmp_path, parse=True)
+    assert not records[0]['valid'] and not records[0]['cached']
+    assert records[0]['errors'][0].startswith('Line 2: Unsupported shape syntax')
+    assert report['top_errors'][0]['error'].startswith('Unsupported shape syntax')
@@ -0,0 +1,38 @@
+"""Whole and streamed diagram validation (backend/validator.py)"""
+
+from validator import StreamingValidator, validate_diagram
+
+
+def test_valid_stream_passes():
+    validator = StreamingValidator('flowchart')
+    assert validator.feed('flowchart TD\n  A -') == []
+    assert validator.feed('-> B') == []
+    assert validator.finish() == validate_diagram('flowchart TD\n  A --> B', 'flowchart') == []
+
+
+def test_wrong_header_is_doomed_on_the_first_line():
+    assert StreamingValidator('sequence').feed('flowchart TD\n') == [
+        'Sequence diagram must include sequenceDiagram keyword']
+    assert StreamingValidator('xychart').feed('xychart\n') == [
+        "Line 1: expected a Mermaid header, got 'xychart'"]
+
+
+def test_line_errors_abort_at_the_limit():
+    validator = StreamingValidator('flowchart', max_line_errors=2)
+    assert validator.feed('flowchart TD\n  A[x --> B\n') == []
+    assert validator.errors == ['Line 2: Unclosed brackets']
+    # Line 3 only counts once its newline arrives
+    assert validator.feed('  C(y --> D') == []
+    assert validator.feed('\n') == ['Line 2: Unclosed brackets', 'Line 3: Unclosed parentheses']
+
+
+def test_prose_without_code_is_doomed_after_the_limit():
+    validator = StreamingValidator('flowchart', prose_limit=10)
+    assert validator.feed('', raw_chars=10) == []
+    assert validator.feed('', raw_chars=11) == ['No Mermaid code after 11 characters of output']
+
+
+def test_finish_checks_the_unterminated_last_line():
+    validator = StreamingValidator('flowchart')
+    assert validator.feed('flowchart TD\n  A[x') == []
+    assert validator.finish() == ['Line 2: Unclosed brackets']